@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+HTTP transport micro-benchmark
+Compares a new connection per request (how the sync Perplexity client used
+requests.post) with the pooled keep-alive clients from utils.http_transport,
+against a local TLS stub server that answers like a chat completions endpoint
+
+Usage:
+    python benchmarks/http_transport.py [--requests 200] [--latency-ms 0]
+"""
+import argparse
+import json
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from utils.http_transport import create_http_client
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+RESPONSE_BODY = json.dumps({
+    "id": "stub",
+    "model": "stub-model",
+    "choices": [{"message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}
+}).encode()
+
+REQUEST_PAYLOAD = {
+    "model": "stub-model",
+    "messages": [{"role": "user", "content": "How do I file a CAPA for a labeling deviation?"}]
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed chat completion, keeping the connection open"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.latency_seconds:
+            time.sleep(self.server.latency_seconds)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded stub server that counts accepted connections"""
+    daemon_threads = True
+
+    def __init__(self, latency_seconds: float, ssl_context=None):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency_seconds = latency_seconds
+        self.connections = 0
+        if ssl_context is not None:
+            self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+
+    def get_request(self):
+        request = super().get_request()
+        self.connections += 1
+        return request
+
+
+def _write_self_signed_cert(directory: str):
+    """Write a self-signed localhost certificate and key; returns (cert_path, key_path)"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "stub.crt")
+    key_path = os.path.join(directory, "stub.key")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+def _run(label: str, server: StubServer, count: int, send) -> dict:
+    """Time ``count`` calls of ``send`` and count the connections they opened"""
+    connections_before = server.connections
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        send()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'label': label,
+        'mean_ms': statistics.mean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[int(len(timings) * 0.95) - 1],
+        'connections': server.connections - connections_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub server think time per request")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        server_context = client_context = None
+        scheme = "http"
+        if CRYPTOGRAPHY_AVAILABLE:
+            cert_path, key_path = _write_self_signed_cert(directory)
+            server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            server_context.load_cert_chain(cert_path, key_path)
+            client_context = ssl.create_default_context(cafile=cert_path)
+            scheme = "https"
+        else:
+            print("cryptography not installed: benchmarking plain HTTP (TCP handshakes only)")
+
+        server = StubServer(args.latency_ms / 1000, server_context)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"{scheme}://localhost:{server.server_address[1]}/chat/completions"
+        verify = client_context if client_context is not None else True
+
+        def fresh_connection():
+            with httpx.Client(verify=verify) as client:
+                client.post(url, json=REQUEST_PAYLOAD).raise_for_status()
+
+        pooled_client = create_http_client(url, verify=verify)
+
+        def pooled_connection():
+            pooled_client.post(url, json=REQUEST_PAYLOAD).raise_for_status()
+
+        # Warm up imports, the server threads and the pool
+        fresh_connection()
+        pooled_connection()
+
+        results = [
+            _run("new connection per request", server, args.requests, fresh_connection),
+            _run("pooled keep-alive client", server, args.requests, pooled_connection)
+        ]
+        pooled_client.close()
+        server.shutdown()
+
+    print(f"{args.requests} POSTs per scenario to a local {scheme.upper()} stub ({args.latency_ms:g} ms think time)\n")
+    print(f"{'scenario':<30}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'connections':>14}")
+    for result in results:
+        print(
+            f"{result['label']:<30}{result['mean_ms']:>10.2f}{result['p50_ms']:>10.2f}"
+            f"{result['p95_ms']:>10.2f}{result['connections']:>14}"
+        )
+    fresh, pooled = results
+    saved = fresh['mean_ms'] - pooled['mean_ms']
+    print(f"\nHandshake savings: {saved:.2f} ms per request ({saved / fresh['mean_ms'] * 100:.0f}% of request time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Routing policy replay
+Replays a routing traffic log (AI_ROUTER_ROUTING_POLICY_LOG_PATH) against
+candidate routing rule sets offline, and compares their estimated cost,
+latency and error rate with the traffic as it was actually served
+
+A policy's choice is scored with the logged outcome when it matches what
+was served, with the log's latency and error rate for that provider/model
+when the log has other calls to it, and with the model's typical latency
+otherwise. Costs are list prices from utils.routing_policy.MODEL_PROFILES.
+
+Usage:
+    python benchmarks/routing_policy_replay.py traffic.jsonl [--policy rules.json ...] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ai_providers.anthropic_provider import AnthropicClient
+from utils.ai_providers.gemini_provider import GeminiClient
+from utils.ai_providers.openai_provider import OpenAIClient
+from utils.ai_providers.perplexity_provider import PerplexityClient
+from utils.routing_policy import (
+    DEFAULT_COMPLETION_ESTIMATE, MIN_ERROR_SAMPLES, ModelObservation, RouteRequest, RoutingPolicy,
+    estimate_cost, get_model_profile, load_policy_rules, load_traffic_log
+)
+
+DEFAULT_PROVIDERS = "gemini,openai,anthropic,perplexity"
+DEFAULT_MODELS = {
+    'openai': OpenAIClient.default_chat_model,
+    'anthropic': AnthropicClient.default_chat_model,
+    'gemini': GeminiClient.default_chat_model,
+    'perplexity': PerplexityClient.default_chat_model,
+}
+
+
+class LoggedOutcomes:
+    """Latency and error rate per (provider, model) over the whole log"""
+
+    def __init__(self, requests: List[Dict[str, Any]]):
+        self.latencies: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        self.calls: Counter = Counter()
+        self.failures: Counter = Counter()
+        for request in requests:
+            for attempt in request['attempts']:
+                key = (attempt['provider'], attempt['model'])
+                self.calls[key] += 1
+                if attempt['success']:
+                    self.latencies[key].append(attempt['latency_ms'])
+                else:
+                    self.failures[key] += 1
+
+    def observe(self, provider: str, model: str) -> ModelObservation:
+        """What a live policy would have observed, in hindsight"""
+        key = (provider, model)
+        calls = self.calls[key]
+        latencies = sorted(self.latencies[key])
+        return ModelObservation(
+            latency_ms=latencies[int(len(latencies) * 0.9) - 1] if len(latencies) >= 10 else None,
+            error_rate=self.failures[key] / calls if calls >= MIN_ERROR_SAMPLES else None,
+            calls=calls
+        )
+
+    def estimate(self, provider: str, model: str) -> Optional[Tuple[int, float]]:
+        """(median latency, error rate) of a provider/model in the log, if it was ever called"""
+        key = (provider, model)
+        if not self.calls[key]:
+            return None
+        latencies = self.latencies[key]
+        latency = int(statistics.median(latencies)) if latencies else 0
+        return latency, self.failures[key] / self.calls[key]
+
+
+def replay(
+    requests: List[Dict[str, Any]],
+    policy: Optional[RoutingPolicy],
+    outcomes: LoggedOutcomes,
+    providers: List[str]
+) -> Dict[str, Any]:
+    """
+    Replay logged requests against a policy (None: the routing that was logged)
+
+    Returns:
+        Totals and distributions of the policy's choices
+    """
+    costs: List[float] = []
+    latencies: List[int] = []
+    failure_probabilities: List[float] = []
+    choices: Counter = Counter()
+    rules: Counter = Counter()
+    sources: Counter = Counter()
+    agreement = 0
+    unpriced = 0
+
+    for logged in requests:
+        first = logged['attempts'][0]
+        served = next((attempt for attempt in logged['attempts'] if attempt['success']), logged['attempts'][-1])
+        logged_choice = (first['provider'], first['model'])
+        choice = logged_choice
+        if policy is not None:
+            request = RouteRequest(
+                logged['workload'], logged['priority'] or 'standard', logged['prompt_tokens'] or 0,
+                logged['max_tokens'], bool(logged['trim_history']), logged['request_id']
+            )
+            decision = policy.decide(request, providers, DEFAULT_MODELS, observe=outcomes.observe)
+            rules[decision.rule or 'none'] += 1
+            if decision.candidates:
+                choice = (decision.candidates[0].provider, decision.candidates[0].model)
+
+        if choice == logged_choice:
+            latency, failure_probability, source = first['latency_ms'], 0.0 if first['success'] else 1.0, 'actual'
+        elif outcomes.estimate(*choice) is not None:
+            latency, failure_probability = outcomes.estimate(*choice)
+            source = 'logged'
+        else:
+            profile = get_model_profile(choice[1])
+            latency, failure_probability, source = profile.typical_latency_ms if profile else 0, 0.0, 'typical'
+
+        prompt_tokens = served['prompt_tokens_used'] or logged['prompt_tokens'] or 0
+        completion_tokens = served['completion_tokens_used'] or logged['max_tokens'] or DEFAULT_COMPLETION_ESTIMATE
+        cost = estimate_cost(choice[1], prompt_tokens, completion_tokens)
+        if cost is None:
+            unpriced += 1
+            cost = 0.0
+
+        costs.append(cost)
+        latencies.append(latency)
+        failure_probabilities.append(failure_probability)
+        choices[f"{choice[0]}/{choice[1]}"] += 1
+        sources[source] += 1
+        agreement += choice == logged_choice
+
+    latencies.sort()
+    count = len(requests)
+    return {
+        'requests': count,
+        'total_cost_usd': round(sum(costs), 4),
+        'cost_per_1k_requests_usd': round(sum(costs) / count * 1000, 4) if count else 0.0,
+        'latency_p50_ms': latencies[count // 2] if count else None,
+        'latency_p90_ms': latencies[max(int(count * 0.9) - 1, 0)] if count else None,
+        'expected_error_rate': round(sum(failure_probabilities) / count, 4) if count else 0.0,
+        'agreement_with_log': round(agreement / count, 4) if count else 0.0,
+        'outcome_sources': dict(sources),
+        'unpriced_requests': unpriced,
+        'choices': dict(choices.most_common()),
+        'rules': dict(rules)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", help="routing traffic log (JSON lines)")
+    parser.add_argument(
+        "--policy", action="append", default=[],
+        help="rule set to replay: JSON file, inline JSON or 'builtin' (repeatable; default: builtin)"
+    )
+    parser.add_argument("--providers", default=DEFAULT_PROVIDERS, help="fallback chain the policies rank")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    requests = load_traffic_log(args.log)
+    if not requests:
+        sys.exit(f"No routed requests in {args.log}")
+    outcomes = LoggedOutcomes(requests)
+    providers = [provider.strip() for provider in args.providers.split(",") if provider.strip()]
+
+    results = {'logged': replay(requests, None, outcomes, providers)}
+    for spec in args.policy or ['builtin']:
+        rules = load_policy_rules('' if spec == 'builtin' else spec)
+        results[spec] = replay(requests, RoutingPolicy(rules), outcomes, providers)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{len(requests)} logged requests from {args.log}\n")
+    print(f"{'policy':<30}{'cost USD':>12}{'per 1k':>10}{'p50 ms':>10}{'p90 ms':>10}{'errors':>9}{'agree':>8}")
+    for label, result in results.items():
+        print(
+            f"{label[:29]:<30}{result['total_cost_usd']:>12.4f}{result['cost_per_1k_requests_usd']:>10.3f}"
+            f"{result['latency_p50_ms']:>10}{result['latency_p90_ms']:>10}"
+            f"{result['expected_error_rate']:>9.1%}{result['agreement_with_log']:>8.0%}"
+        )
+    for label, result in results.items():
+        choices = ", ".join(f"{choice} {count}" for choice, count in result['choices'].items())
+        print(f"\n{label}: {choices}")
+        print(f"  outcomes from {result['outcome_sources']}; unpriced requests: {result['unpriced_requests']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,29 @@
 Help assistant routes for API v2
 Provides AI-powered help and support functionality
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_login import login_required, current_user
+import json
 import logging
 from datetime import datetime
 
 from models import db, HelpConversation, HelpMessage
 from utils.ai_router import get_ai_router
+from utils.rate_limiter import PRIORITY_INTERACTIVE
 
 logger = logging.getLogger(__name__)
 
+# Conversation turns sent with a help query. Every turn is paid for on every
+# call, so this stays small; the router still trims the oldest turns for
+# providers whose context window can't hold them
+HELP_HISTORY_MESSAGES = 10
+
+# How long a help request waits for an identical request's answer before giving up
+HELP_DEDUPE_TIMEOUT_SECONDS = 60.0
+
+# Routing policy workload: short help queries go to a fast, cheap model
+HELP_WORKLOAD = 'help'
+
 help_bp = Blueprint('help', __name__)
 
 
@@ -48,34 +61,21 @@ def help_assistant():
                 page_url=page_url
             )
         
-        # Build system prompt based on context
-        system_prompt = _build_help_system_prompt(context, page_url)
-        
-        # Get conversation history for authenticated users
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        if conversation:
-            # Add recent conversation history
-            recent_messages = HelpMessage.query.filter_by(
-                conversation_id=conversation.id
-            ).order_by(HelpMessage.created_date.desc()).limit(10).all()
-            
-            # Add messages in chronological order
-            for msg in reversed(recent_messages):
-                messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
-        
-        # Add current query
-        messages.append({"role": "user", "content": query})
+        messages = _build_help_messages(conversation, context, page_url, query)
         
         # Get AI response
         ai_router = get_ai_router()
         success, response, metadata = ai_router.generate_chat_completion(
             messages=messages,
             temperature=0.3,  # Lower temperature for more consistent help responses
-            max_tokens=1000
+            max_tokens=1000,
+            hedge=True,  # Interactive and latency-sensitive: allow a backup provider request
+            cache=True,  # Help answers are generic; repeated questions can be served from cache
+            dedupe=True,  # A class asking the same question at once shares one provider call
+            dedupe_timeout=HELP_DEDUPE_TIMEOUT_SECONDS,
+            trim_history=True,
+            priority=PRIORITY_INTERACTIVE,  # A user is waiting: goes ahead of batch work
+            workload=HELP_WORKLOAD
         )
         
         if not success:
@@ -87,27 +87,7 @@ def help_assistant():
         
         # Save conversation for authenticated users
         if conversation:
-            # Save user message
-            user_message = HelpMessage(
-                conversation_id=conversation.id,
-                role='user',
-                content=query
-            )
-            db.session.add(user_message)
-            
-            # Save assistant response
-            assistant_message = HelpMessage(
-                conversation_id=conversation.id,
-                role='assistant',
-                content=response,
-                ai_provider=metadata.get('router_provider_used'),
-                processing_time_ms=metadata.get('router_response_time_ms')
-            )
-            db.session.add(assistant_message)
-            
-            # Update conversation timestamp
-            conversation.updated_date = datetime.now()
-            db.session.commit()
+            _save_help_exchange(conversation, query, response, metadata)
         
         return jsonify({
             'success': True,
@@ -116,7 +96,8 @@ def help_assistant():
             'conversation_id': conversation.id if conversation else None,
             'metadata': {
                 'provider': metadata.get('router_provider_used'),
-                'response_time_ms': metadata.get('router_response_time_ms')
+                'response_time_ms': metadata.get('router_response_time_ms'),
+                'cache_hit': metadata.get('router_cache_hit')
             }
         })
         
@@ -130,6 +111,108 @@ def help_assistant():
         }), 500
 
 
+@help_bp.route('/assistant/stream', methods=['POST'])
+def help_assistant_stream():
+    """
+    Streaming variant of the help assistant using Server-Sent Events
+    Sends 'token' events as the answer is generated, then a final 'done' event
+    (or 'error'); the conversation is saved once the answer is complete
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'JSON data required'
+        }), 400
+    
+    query = data.get('query', '').strip()
+    context = data.get('context', 'general')
+    page_url = data.get('page_url', '')
+    
+    if not query:
+        return jsonify({
+            'success': False,
+            'error': 'Query is required'
+        }), 400
+    
+    try:
+        conversation = None
+        if current_user.is_authenticated:
+            conversation = _get_or_create_conversation(
+                user_id=current_user.id,
+                context=context,
+                page_url=page_url
+            )
+        
+        messages = _build_help_messages(conversation, context, page_url, query)
+    except Exception as e:
+        logger.error(f"Help assistant stream setup error: {e}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': 'Help service temporarily unavailable'
+        }), 500
+    
+    def generate():
+        response_parts = []
+        try:
+            ai_router = get_ai_router()
+            for event in ai_router.stream_chat_completion(
+                messages=messages,
+                temperature=0.3,  # Lower temperature for more consistent help responses
+                max_tokens=1000,
+                trim_history=True,
+                priority=PRIORITY_INTERACTIVE,
+                workload=HELP_WORKLOAD
+            ):
+                if event['type'] == 'token':
+                    response_parts.append(event['content'])
+                    yield _sse_event('token', {'content': event['content']})
+                
+                elif event['type'] == 'done':
+                    metadata = event['metadata']
+                    if conversation:
+                        _save_help_exchange(conversation, query, ''.join(response_parts), metadata)
+                    
+                    yield _sse_event('done', {
+                        'success': True,
+                        'context': context,
+                        'conversation_id': conversation.id if conversation else None,
+                        'metadata': {
+                            'provider': metadata.get('router_provider_used'),
+                            'response_time_ms': metadata.get('router_response_time_ms'),
+                            'time_to_first_token_ms': metadata.get('router_time_to_first_token_ms')
+                        }
+                    })
+                
+                else:
+                    if conversation:
+                        db.session.rollback()
+                    yield _sse_event('error', {
+                        'success': False,
+                        'error': 'AI service temporarily unavailable',
+                        'details': event.get('error')
+                    })
+        
+        except Exception as e:
+            logger.error(f"Help assistant stream error: {e}")
+            if conversation:
+                db.session.rollback()
+            yield _sse_event('error', {
+                'success': False,
+                'error': 'Help service temporarily unavailable'
+            })
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Disable proxy buffering so tokens arrive immediately
+        }
+    )
+
+
 @help_bp.route('/conversations')
 @login_required
 def get_conversations():
@@ -248,6 +331,62 @@ def _get_or_create_conversation(user_id: int, context: str, page_url: str) -> He
     return conversation
 
 
+def _build_help_messages(conversation, context: str, page_url: str, query: str) -> list:
+    """Build the chat messages for a help query: system prompt, recent history, query"""
+    # Build system prompt based on context
+    system_prompt = _build_help_system_prompt(context, page_url)
+    
+    # Get conversation history for authenticated users
+    messages = [{"role": "system", "content": system_prompt}]
+    
+    if conversation:
+        # Add recent conversation history
+        recent_messages = HelpMessage.query.filter_by(
+            conversation_id=conversation.id
+        ).order_by(HelpMessage.created_date.desc()).limit(HELP_HISTORY_MESSAGES).all()
+        
+        # Add messages in chronological order
+        for msg in reversed(recent_messages):
+            messages.append({
+                "role": msg.role,
+                "content": msg.content
+            })
+    
+    # Add current query
+    messages.append({"role": "user", "content": query})
+    return messages
+
+
+def _save_help_exchange(conversation: HelpConversation, query: str, response: str, metadata: dict):
+    """Save a user query and the assistant response to a conversation"""
+    # Save user message
+    user_message = HelpMessage(
+        conversation_id=conversation.id,
+        role='user',
+        content=query
+    )
+    db.session.add(user_message)
+    
+    # Save assistant response
+    assistant_message = HelpMessage(
+        conversation_id=conversation.id,
+        role='assistant',
+        content=response,
+        ai_provider=metadata.get('router_provider_used'),
+        processing_time_ms=metadata.get('router_response_time_ms')
+    )
+    db.session.add(assistant_message)
+    
+    # Update conversation timestamp
+    conversation.updated_date = datetime.now()
+    db.session.commit()
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 def _build_help_system_prompt(context: str, page_url: str) -> str:
     """Build contextual system prompt for help assistant"""
     base_prompt = """You are a helpful AI assistant for VirtualBackroom.ai, a regulatory compliance platform for medical device companies. 
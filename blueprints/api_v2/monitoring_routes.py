@@ -2,11 +2,13 @@
 Monitoring routes for API v2
 Provides health checks, status monitoring, and AI provider information
 """
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify, request
 import logging
+import os
 from datetime import datetime
 
 from utils.ai_router import get_ai_router
+from utils.prometheus_metrics import PROMETHEUS_CONTENT_TYPE
 
 logger = logging.getLogger(__name__)
 
@@ -47,13 +49,15 @@ def providers_status():
 
 @monitoring_bp.route('/fallbacks')
 def fallback_events():
-    """Get recent fallback events"""
+    """Get fallback counts per provider pair and error class, and the latest events"""
     try:
         ai_router = get_ai_router()
-        events = ai_router.get_fallback_events(limit=50)
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        events = ai_router.get_fallback_events(limit=limit)
         
         return jsonify({
             'success': True,
+            'fallbacks': ai_router.get_fallback_summary(),
             'fallback_events': events,
             'count': len(events),
             'timestamp': datetime.now().isoformat()
@@ -68,6 +72,48 @@ def fallback_events():
         }), 500
 
 
+@monitoring_bp.route('/cache')
+def cache_stats():
+    """Get response cache hit/miss statistics"""
+    try:
+        ai_router = get_ai_router()
+        
+        return jsonify({
+            'success': True,
+            'cache': ai_router.get_cache_status(),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Cache stats error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
+@monitoring_bp.route('/rate-limits')
+def rate_limits():
+    """Get per-provider rate limit budgets, queue depths and queue wait times"""
+    try:
+        ai_router = get_ai_router()
+        
+        return jsonify({
+            'success': True,
+            'rate_limits': ai_router.get_rate_limit_status(),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Rate limit stats error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
 @monitoring_bp.route('/stats')
 def provider_stats():
     """Get usage statistics for all providers"""
@@ -83,7 +129,17 @@ def provider_stats():
                 'total_providers': health_status['total_providers'],
                 'available_providers': health_status['available_providers'],
                 'overall_success_rate': health_status['overall_success_rate'],
-                'total_requests': health_status['total_requests']
+                'total_requests': health_status['total_requests'],
+                'open_circuits': health_status['open_circuits'],
+                'effective_chain': health_status['effective_chain'],
+                'latency_slos': health_status['latency_slos'],
+                'latency_slo_breaches': health_status['latency_slo_breaches'],
+                'hedging': health_status['hedging'],
+                'response_cache': health_status['response_cache'],
+                'embedding_coalescing': health_status['embedding_coalescing'],
+                'embedding_store': health_status['embedding_store'],
+                'http_transport': health_status['http_transport'],
+                'shared_stats': health_status['shared_stats']
             },
             'providers': {}
         }
@@ -97,12 +153,24 @@ def provider_stats():
                 'total_requests': status['stats']['total_requests'],
                 'successful_requests': status['stats']['successful_requests'],
                 'failed_requests': status['stats']['failed_requests'],
-                'average_response_time': status['stats']['average_response_time_ms']
+                'fallbacks': status['stats']['fallbacks'],
+                'average_response_time': status['stats']['average_response_time_ms'],
+                'circuit_state': status['circuit_state'],
+                'health_score': status['health_score'],
+                'latency_ms': status['latency'],
+                'time_to_first_token_ms': status['time_to_first_token'],
+                'latency_by_operation_ms': status['operations'],
+                'throughput': status['throughput'],
+                'rate_limit': status['rate_limit']
             }
         
+        # This worker's view above; every worker's merged below
+        stats['workers'] = ai_router.get_shared_stats()
+        
         return jsonify({
             'success': True,
             'stats': stats,
+            'worker_pid': os.getpid(),
             'timestamp': datetime.now().isoformat()
         })
         
@@ -115,6 +183,18 @@ def provider_stats():
         }), 500
 
 
+@monitoring_bp.route('/metrics')
+def prometheus_metrics():
+    """Get AI router metrics in the Prometheus text exposition format"""
+    try:
+        ai_router = get_ai_router()
+        return Response(ai_router.get_prometheus_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+        
+    except Exception as e:
+        logger.error(f"Prometheus metrics error: {e}")
+        return Response(f"# metrics unavailable: {e}\n", status=500, content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @monitoring_bp.route('/system/info')
 def system_info():
     """Get comprehensive system information"""
@@ -38,6 +38,7 @@ class AIProviderSettings(BaseSettings):
     openai_api_key: Optional[str] = Field(None, env="AI_PROVIDERS_OPENAI_API_KEY")
     anthropic_api_key: Optional[str] = Field(None, env="AI_PROVIDERS_ANTHROPIC_API_KEY")
     perplexity_api_key: Optional[str] = Field(None, env="AI_PROVIDERS_PERPLEXITY_API_KEY")
+    local_embedding_dimensions: int = Field(384, env="AI_PROVIDERS_LOCAL_EMBEDDING_DIMENSIONS")
     
     class Config:
         env_prefix = "AI_PROVIDERS_"
@@ -49,6 +50,73 @@ class AIProviderSettings(BaseSettings):
             self.fallback_chain = [s.strip() for s in self.fallback_chain.split(",")]
 
 
+class AIRouterSettings(BaseSettings):
+    """AI router resilience configuration"""
+    health_routing_enabled: bool = Field(True, env="AI_ROUTER_HEALTH_ROUTING_ENABLED")
+    breaker_failure_rate_threshold: float = Field(50.0, env="AI_ROUTER_BREAKER_FAILURE_RATE_THRESHOLD")
+    breaker_slow_call_threshold_ms: int = Field(15000, env="AI_ROUTER_BREAKER_SLOW_CALL_THRESHOLD_MS")
+    breaker_slow_call_rate_threshold: float = Field(80.0, env="AI_ROUTER_BREAKER_SLOW_CALL_RATE_THRESHOLD")
+    breaker_window_seconds: int = Field(60, env="AI_ROUTER_BREAKER_WINDOW_SECONDS")
+    breaker_minimum_calls: int = Field(5, env="AI_ROUTER_BREAKER_MINIMUM_CALLS")
+    breaker_open_duration_seconds: int = Field(30, env="AI_ROUTER_BREAKER_OPEN_DURATION_SECONDS")
+    breaker_half_open_max_calls: int = Field(1, env="AI_ROUTER_BREAKER_HALF_OPEN_MAX_CALLS")
+    hedging_enabled: bool = Field(True, env="AI_ROUTER_HEDGING_ENABLED")
+    hedge_percentile: float = Field(95.0, env="AI_ROUTER_HEDGE_PERCENTILE")
+    hedge_min_samples: int = Field(20, env="AI_ROUTER_HEDGE_MIN_SAMPLES")
+    hedge_default_delay_ms: int = Field(3000, env="AI_ROUTER_HEDGE_DEFAULT_DELAY_MS")
+    hedge_min_delay_ms: int = Field(100, env="AI_ROUTER_HEDGE_MIN_DELAY_MS")
+    hedge_max_ratio: float = Field(0.1, env="AI_ROUTER_HEDGE_MAX_RATIO")
+    hedge_max_burst: float = Field(10.0, env="AI_ROUTER_HEDGE_MAX_BURST")
+    cache_enabled: bool = Field(True, env="AI_ROUTER_CACHE_ENABLED")
+    cache_backend: str = Field("memory", env="AI_ROUTER_CACHE_BACKEND")  # memory or redis
+    cache_ttl_seconds: int = Field(3600, env="AI_ROUTER_CACHE_TTL_SECONDS")
+    cache_max_entries: int = Field(1000, env="AI_ROUTER_CACHE_MAX_ENTRIES")
+    cache_max_bytes: int = Field(50 * 1024 * 1024, env="AI_ROUTER_CACHE_MAX_BYTES")
+    cache_semantic_enabled: bool = Field(False, env="AI_ROUTER_CACHE_SEMANTIC_ENABLED")
+    cache_semantic_threshold: float = Field(0.95, env="AI_ROUTER_CACHE_SEMANTIC_THRESHOLD")
+    cache_semantic_max_entries: int = Field(2000, env="AI_ROUTER_CACHE_SEMANTIC_MAX_ENTRIES")
+    cache_embedding_provider: str = Field("", env="AI_ROUTER_CACHE_EMBEDDING_PROVIDER")
+    single_flight_enabled: bool = Field(True, env="AI_ROUTER_SINGLE_FLIGHT_ENABLED")
+    embedding_batch_concurrency: int = Field(4, env="AI_ROUTER_EMBEDDING_BATCH_CONCURRENCY")
+    embedding_coalesce_window_ms: float = Field(5.0, env="AI_ROUTER_EMBEDDING_COALESCE_WINDOW_MS")  # 0 disables
+    embedding_coalesce_max_batch: int = Field(256, env="AI_ROUTER_EMBEDDING_COALESCE_MAX_BATCH")
+    embedding_store_enabled: bool = Field(True, env="AI_ROUTER_EMBEDDING_STORE_ENABLED")
+    embedding_store_path: str = Field("instance/embeddings", env="AI_ROUTER_EMBEDDING_STORE_PATH")
+    embedding_store_dtype: str = Field("float32", env="AI_ROUTER_EMBEDDING_STORE_DTYPE")  # float32 or float16
+    token_budget_enabled: bool = Field(True, env="AI_ROUTER_TOKEN_BUDGET_ENABLED")
+    min_completion_tokens: int = Field(256, env="AI_ROUTER_MIN_COMPLETION_TOKENS")
+    latency_slo_window: str = Field("5m", env="AI_ROUTER_LATENCY_SLO_WINDOW")  # 1m, 5m or 1h
+    latency_slo_p99_ms: int = Field(30000, env="AI_ROUTER_LATENCY_SLO_P99_MS")
+    ttft_slo_p99_ms: int = Field(5000, env="AI_ROUTER_TTFT_SLO_P99_MS")
+    latency_slo_min_samples: int = Field(20, env="AI_ROUTER_LATENCY_SLO_MIN_SAMPLES")
+    rate_limiting_enabled: bool = Field(True, env="AI_ROUTER_RATE_LIMITING_ENABLED")
+    rate_limits: str = Field("", env="AI_ROUTER_RATE_LIMITS")  # e.g. "openai=500/30000/32,perplexity=20//4"
+    rate_limit_max_wait_ms: int = Field(5000, env="AI_ROUTER_RATE_LIMIT_MAX_WAIT_MS")
+    priority_weights: str = Field("interactive=8,standard=3,batch=1", env="AI_ROUTER_PRIORITY_WEIGHTS")
+    interactive_reserved_fraction: float = Field(0.25, env="AI_ROUTER_INTERACTIVE_RESERVED_FRACTION")
+    batch_shed_queue_wait_ms: int = Field(2000, env="AI_ROUTER_BATCH_SHED_QUEUE_WAIT_MS")  # 0 disables
+    routing_policy_enabled: bool = Field(True, env="AI_ROUTER_ROUTING_POLICY_ENABLED")
+    routing_policy_rules: str = Field("", env="AI_ROUTER_ROUTING_POLICY_RULES")  # JSON file or inline JSON; empty: built-in rules
+    routing_policy_min_samples: int = Field(20, env="AI_ROUTER_ROUTING_POLICY_MIN_SAMPLES")
+    routing_policy_log_path: str = Field("", env="AI_ROUTER_ROUTING_POLICY_LOG_PATH")  # JSON lines for offline replay
+    routing_policy_log_max_bytes: int = Field(10 * 1024 * 1024, env="AI_ROUTER_ROUTING_POLICY_LOG_MAX_BYTES")
+    http2_enabled: bool = Field(True, env="AI_ROUTER_HTTP2_ENABLED")  # used when the h2 package is installed
+    http_pool_sizes: str = Field("", env="AI_ROUTER_HTTP_POOL_SIZES")  # e.g. "api.openai.com=64/32"
+    http_connect_timeout_seconds: float = Field(10.0, env="AI_ROUTER_HTTP_CONNECT_TIMEOUT_SECONDS")
+    http_keepalive_expiry_seconds: float = Field(90.0, env="AI_ROUTER_HTTP_KEEPALIVE_EXPIRY_SECONDS")
+    fallback_event_capacity: int = Field(1024, env="AI_ROUTER_FALLBACK_EVENT_CAPACITY")
+    fallback_event_log_path: str = Field("", env="AI_ROUTER_FALLBACK_EVENT_LOG_PATH")  # "" disables the log
+    fallback_event_log_max_bytes: int = Field(10 * 1024 * 1024, env="AI_ROUTER_FALLBACK_EVENT_LOG_MAX_BYTES")
+    shared_stats_backend: str = Field("", env="AI_ROUTER_SHARED_STATS_BACKEND")  # "", shm (one host) or redis
+    shared_stats_segment: str = Field("vb_ai_router_stats", env="AI_ROUTER_SHARED_STATS_SEGMENT")
+    shared_stats_slots: int = Field(32, env="AI_ROUTER_SHARED_STATS_SLOTS")  # max workers per host
+    shared_stats_publish_interval_seconds: float = Field(2.0, env="AI_ROUTER_SHARED_STATS_PUBLISH_INTERVAL_SECONDS")
+    shared_stats_stale_seconds: float = Field(30.0, env="AI_ROUTER_SHARED_STATS_STALE_SECONDS")
+    
+    class Config:
+        env_prefix = "AI_ROUTER_"
+
+
 class FirebaseSettings(BaseSettings):
     """Firebase configuration"""
     api_key: Optional[str] = Field(None, env="FIREBASE_API_KEY")
@@ -93,6 +161,7 @@ class Config:
         self.security = SecuritySettings()
         self.database = DatabaseSettings()
         self.ai_providers = AIProviderSettings()
+        self.ai_router = AIRouterSettings()
         self.firebase = FirebaseSettings()
         self.aws = AWSSettings()
         self.celery = CelerySettings()
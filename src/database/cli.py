@@ -592,5 +592,42 @@ def backup_audit_trail(
     
     asyncio.run(_backup_audit())
 
+@app.command()
+def analysis_worker(
+    workers: int = typer.Option(4, "--workers", help="Analyses run concurrently"),
+    per_organization: int = typer.Option(2, "--per-organization", help="Slots one organization may hold at once")
+):
+    """
+    Run the analysis job engine with the gap-analysis runner until interrupted.
+    Web processes don't run an engine, so PENDING analyses are only processed
+    while at least one worker is running; they are picked up on its next poll.
+    """
+    import signal
+    from src.services.analysis_jobs import start_analysis_engine, stop_analysis_engine
+    from src.services.gap_analysis import run_gap_analysis
+    
+    async def _run_worker():
+        health = await check_database_health()
+        if health["status"] != "healthy":
+            console.print(f"[bold red]✗ Database unavailable: {health.get('error')}[/bold red]")
+            raise typer.Exit(1)
+        
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        
+        await start_analysis_engine(
+            run_gap_analysis, max_workers=workers, max_jobs_per_organization=per_organization
+        )
+        console.print(f"[bold green]✓ Analysis worker running with {workers} slots (Ctrl+C to stop)[/bold green]")
+        try:
+            await stop.wait()
+        finally:
+            console.print("[blue]Stopping analysis worker; running jobs get 30s to finish...[/blue]")
+            await stop_analysis_engine()
+    
+    asyncio.run(_run_worker())
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+Full-text search for regulatory requirements
+Weighted tsvector (title A, keywords B, requirement text C) with a GIN index
+
+Revision ID: 002_requirement_fulltext
+Revises: 001_initial_schema
+Create Date: 2025-01-20 10:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers
+revision = '002_requirement_fulltext'
+down_revision = '001_initial_schema'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    """Add generated search_vector column and GIN index to regulatory_requirements"""
+
+    # Generated column keeps the document in sync on every insert/update
+    # without triggers; to_tsvector with an explicit config is immutable
+    op.execute("""
+        ALTER TABLE regulatory_requirements
+        ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(keywords::text, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(requirement_text, '')), 'C')
+        ) STORED;
+    """)
+
+    op.create_index(
+        'ix_req_search_vector',
+        'regulatory_requirements',
+        ['search_vector'],
+        postgresql_using='gin'
+    )
+
+def downgrade() -> None:
+    """Drop full-text search column and index"""
+
+    op.drop_index('ix_req_search_vector', table_name='regulatory_requirements')
+    op.drop_column('regulatory_requirements', 'search_vector')
@@ -0,0 +1,63 @@
+"""
+Checkpointed map-phase results of map-reduce gap analysis
+One row per analyzed document chunk, so failed analyses resume
+
+Revision ID: 003_analysis_chunk_results
+Revises: 002_requirement_fulltext
+Create Date: 2025-01-27 10:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers
+revision = '003_analysis_chunk_results'
+down_revision = '002_requirement_fulltext'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    """Create analysis_chunk_results with tenant isolation"""
+    
+    op.create_table('analysis_chunk_results',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('analysis_id', postgresql.UUID(as_uuid=True), nullable=False),
+        
+        # Chunk identification
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('chunk_hash', sa.String(64), nullable=False),
+        sa.Column('page_start', sa.Integer()),
+        sa.Column('page_end', sa.Integer()),
+        
+        # Map inputs and output
+        sa.Column('requirement_ids', sa.JSON(), nullable=False),
+        sa.Column('findings', sa.JSON(), nullable=False),
+        sa.Column('prompt_template_version', sa.String(50), nullable=False),
+        sa.Column('ai_model', sa.String(100)),
+        
+        sa.Column('created_at', sa.DateTime(timezone=True)),
+        
+        # Foreign keys
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], name='fk_chunk_result_organization'),
+        sa.ForeignKeyConstraint(['analysis_id'], ['analyses.id'], name='fk_chunk_result_analysis', ondelete='CASCADE'),
+        
+        # Unique constraints
+        sa.UniqueConstraint('analysis_id', 'chunk_hash', name='uq_analysis_chunk'),
+    )
+    
+    op.create_index('ix_chunk_result_analysis', 'analysis_chunk_results', ['analysis_id'])
+    
+    op.execute("ALTER TABLE analysis_chunk_results ENABLE ROW LEVEL SECURITY;")
+    op.execute("""
+        CREATE POLICY chunk_result_tenant_isolation ON analysis_chunk_results
+            FOR ALL
+            TO application_role
+            USING (organization_id = current_setting('app.current_organization_id', true)::uuid);
+    """)
+
+def downgrade() -> None:
+    """Drop analysis_chunk_results"""
+    
+    op.drop_table('analysis_chunk_results')
@@ -0,0 +1,26 @@
+"""
+Incremental re-analysis support for analysis_chunk_results
+Looks up an organization's earlier chunk results by content hash
+
+Revision ID: 004_chunk_result_anchors
+Revises: 003_analysis_chunk_results
+Create Date: 2025-02-03 10:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers
+revision = '004_chunk_result_anchors'
+down_revision = '003_analysis_chunk_results'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    """Add an index for looking up chunk results by content"""
+    
+    op.create_index('ix_chunk_result_org_hash', 'analysis_chunk_results', ['organization_id', 'chunk_hash'])
+
+def downgrade() -> None:
+    """Drop the lookup index"""
+    
+    op.drop_index('ix_chunk_result_org_hash', table_name='analysis_chunk_results')
@@ -0,0 +1,65 @@
+"""
+Per-organization content-defined chunk store
+Identical sections across an organization's documents are stored, embedded
+and analyzed once
+
+Revision ID: 005_organization_chunk_store
+Revises: 004_chunk_result_anchors
+Create Date: 2025-02-10 10:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers
+revision = '005_organization_chunk_store'
+down_revision = '004_chunk_result_anchors'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    """Create organization_chunks and document_chunks"""
+    
+    op.create_table('organization_chunks',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('chunk_hash', sa.String(64), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('token_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True)),
+        
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], name='fk_org_chunk_organization'),
+        sa.UniqueConstraint('organization_id', 'chunk_hash', name='uq_organization_chunk'),
+    )
+    
+    op.create_table('document_chunks',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('chunk_hash', sa.String(64), nullable=False),
+        sa.Column('page_start', sa.Integer()),
+        sa.Column('page_end', sa.Integer()),
+        
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], name='fk_doc_chunk_organization'),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], name='fk_doc_chunk_document', ondelete='CASCADE'),
+        sa.UniqueConstraint('document_id', 'chunk_index', name='uq_document_chunk_position'),
+    )
+    
+    op.create_index('ix_document_chunk_org_hash', 'document_chunks', ['organization_id', 'chunk_hash'])
+    
+    for table, policy in [('organization_chunks', 'org_chunk_tenant_isolation'), ('document_chunks', 'doc_chunk_tenant_isolation')]:
+        op.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;")
+        op.execute(f"""
+            CREATE POLICY {policy} ON {table}
+                FOR ALL
+                TO application_role
+                USING (organization_id = current_setting('app.current_organization_id', true)::uuid);
+        """)
+
+def downgrade() -> None:
+    """Drop the chunk store"""
+    
+    op.drop_table('document_chunks')
+    op.drop_table('organization_chunks')
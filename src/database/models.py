@@ -9,11 +9,11 @@ from enum import Enum as PyEnum
 from sqlalchemy import (
     Column, String, DateTime, Text, Boolean, Integer, 
     ForeignKey, UniqueConstraint, Index, JSON, LargeBinary,
-    event, CheckConstraint, func
+    event, CheckConstraint, func, Computed
 )
-from sqlalchemy.dialects.postgresql import UUID, ENUM
+from sqlalchemy.dialects.postgresql import UUID, ENUM, TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy.orm import relationship, Session, deferred
 import uuid
 
 Base = declarative_base()
@@ -260,6 +260,7 @@ class Document(Base):
     creator = relationship("User", foreign_keys=[created_by], back_populates="created_documents")
     approver = relationship("User", foreign_keys=[approved_by])
     analyses = relationship("Analysis", back_populates="document", cascade="all, delete-orphan")
+    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
     
     __table_args__ = (
         Index('ix_doc_org_type', 'organization_id', 'document_type'),
@@ -270,6 +271,46 @@ class Document(Base):
         UniqueConstraint('s3_bucket', 's3_key', name='uq_s3_location'),
     )
 
+class OrganizationChunk(Base):
+    """
+    Content-addressed store of an organization's document text.
+    Each distinct content-defined chunk is stored once however many documents
+    contain it; DocumentChunk rows record where it occurs.
+    """
+    __tablename__ = "organization_chunks"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False)
+    chunk_hash = Column(String(64), nullable=False)   # SHA-256 of the normalized chunk text
+    text = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        UniqueConstraint('organization_id', 'chunk_hash', name='uq_organization_chunk'),
+    )
+
+class DocumentChunk(Base):
+    """Occurrence of a stored chunk in a document, in document order"""
+    __tablename__ = "document_chunks"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    chunk_index = Column(Integer, nullable=False)
+    chunk_hash = Column(String(64), nullable=False)
+    page_start = Column(Integer)
+    page_end = Column(Integer)
+    
+    # Relationships
+    document = relationship("Document", back_populates="chunks")
+    
+    __table_args__ = (
+        Index('ix_document_chunk_org_hash', 'organization_id', 'chunk_hash'),
+        UniqueConstraint('document_id', 'chunk_index', name='uq_document_chunk_position'),
+    )
+
 class Analysis(Base):
     """
     Analysis job and results model.
@@ -325,6 +366,7 @@ class Analysis(Base):
     organization = relationship("Organization", back_populates="analyses")
     document = relationship("Document", back_populates="analyses")
     creator = relationship("User", foreign_keys=[created_by], back_populates="created_analyses")
+    chunk_results = relationship("AnalysisChunkResult", back_populates="analysis", cascade="all, delete-orphan")
     
     __table_args__ = (
         Index('ix_analysis_org_status', 'organization_id', 'status'),
@@ -335,6 +377,41 @@ class Analysis(Base):
         UniqueConstraint('document_id', 'regulatory_standard', name='uq_document_standard_analysis'),
     )
 
+class AnalysisChunkResult(Base):
+    """
+    Map-phase result of a gap analysis: one document chunk checked against
+    its retrieved regulatory clauses. Committed as each chunk finishes, so an
+    interrupted analysis resumes from the chunks it has not covered yet.
+    """
+    __tablename__ = "analysis_chunk_results"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False)
+    analysis_id = Column(UUID(as_uuid=True), ForeignKey("analyses.id", ondelete="CASCADE"), nullable=False)
+    
+    # Chunk identification
+    chunk_index = Column(Integer, nullable=False)
+    chunk_hash = Column(String(64), nullable=False)   # SHA-256 of the normalized chunk text
+    page_start = Column(Integer)
+    page_end = Column(Integer)
+    
+    # Map inputs and output
+    requirement_ids = Column(JSON, nullable=False)    # Clauses the chunk was checked against
+    findings = Column(JSON, nullable=False)           # Per-clause findings returned by the model
+    prompt_template_version = Column(String(50), nullable=False)
+    ai_model = Column(String(100))
+    
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    
+    # Relationships
+    analysis = relationship("Analysis", back_populates="chunk_results")
+    
+    __table_args__ = (
+        Index('ix_chunk_result_analysis', 'analysis_id'),
+        Index('ix_chunk_result_org_hash', 'organization_id', 'chunk_hash'),
+        UniqueConstraint('analysis_id', 'chunk_hash', name='uq_analysis_chunk'),
+    )
+
 # ============================================================================
 # AUDIT TRAIL MODEL (21 CFR Part 11 Compliance)
 # ============================================================================
@@ -429,6 +506,18 @@ class RegulatoryRequirement(Base):
     subcategory = Column(String(100))
     keywords = Column(JSON)                 # Searchable keywords for matching
     
+    # Weighted full-text document (title A, keywords B, text C), a generated
+    # column maintained by PostgreSQL; must match migration 002
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(title,'')),'A') || "
+            "setweight(to_tsvector('english', coalesce(keywords::text,'')),'B') || "
+            "setweight(to_tsvector('english', coalesce(requirement_text,'')),'C')",
+            persisted=True
+        )
+    ))
+    
     # Relationships and references
     related_requirements = Column(JSON)     # IDs of related requirements
     superseded_by = Column(UUID(as_uuid=True), ForeignKey("regulatory_requirements.id"))
@@ -447,6 +536,7 @@ class RegulatoryRequirement(Base):
         Index('ix_req_standard_section', 'standard', 'section_number'),
         Index('ix_req_current', 'is_current'),
         Index('ix_req_category', 'category', 'subcategory'),
+        Index('ix_req_search_vector', 'search_vector', postgresql_using='gin'),
         UniqueConstraint('standard', 'section_number', name='uq_standard_section'),
     )
 
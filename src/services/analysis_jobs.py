@@ -0,0 +1,620 @@
+"""
+Asynchronous job engine for document analyses.
+Claims PENDING analyses from the database, runs them on a bounded worker pool
+with per-organization fairness, and retries or recovers failed work.
+"""
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Analysis, AnalysisStatus
+from .database_services import AnalysisService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_JOBS_PER_ORGANIZATION = 2
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BASE_DELAY_SECONDS = 30.0
+DEFAULT_RETRY_MAX_DELAY_SECONDS = 900.0
+# A PROCESSING job whose heartbeat is older than this is assumed orphaned by a crash
+DEFAULT_STALE_AFTER_SECONDS = 600.0
+DEFAULT_POLL_INTERVAL_SECONDS = 5.0
+# Minimum time between progress writes for one running analysis
+DEFAULT_PROGRESS_INTERVAL_SECONDS = 5.0
+# Organizations considered per claim; the oldest waiting work is scanned first
+ORGANIZATION_SCAN_LIMIT = 256
+
+# runner(session, analysis, report_progress) -> findings dict for update_analysis_status
+AnalysisRunner = Callable[[AsyncSession, Analysis, Callable[..., None]], Awaitable[Dict[str, Any]]]
+
+
+class PermanentAnalysisError(Exception):
+    """Raised by an analysis runner for failures that retrying cannot fix"""
+
+
+def progress_entry(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Progress as persisted in detailed_findings['progress']"""
+    return {'fraction': round(state['progress'], 4), 'stage': state['stage']}
+
+
+class _ProgressWriter:
+    """
+    Persists a running analysis's progress through update_analysis_status.
+
+    Runners report progress synchronously and often; writes go through a
+    separate session (the runner owns its own) at most once per
+    ``interval`` seconds. At most one write is in flight, and reports that
+    arrive meanwhile are folded into the next write, which carries the
+    latest fraction and stage.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        analysis: Analysis,
+        state: Dict[str, Any],
+        interval: float
+    ):
+        self.session_factory = session_factory
+        self.analysis_id = analysis.id
+        self.organization_id = analysis.organization_id
+        self.user_id = analysis.created_by
+        self.state = state
+        self.interval = interval
+        self.written_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    def report(self):
+        """Schedule a write of the current progress"""
+        if self._task is not None and not self._task.done():
+            self._dirty = True
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Drop any pending write; the final status write supersedes it"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            wait = self.interval - (time.monotonic() - self.written_at)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._dirty = False
+            self.written_at = time.monotonic()
+            try:
+                async with self.session_factory() as session:
+                    service = AnalysisService(session, self.organization_id, self.user_id)
+                    await service.update_analysis_status(
+                        self.analysis_id, AnalysisStatus.PROCESSING, progress=progress_entry(self.state)
+                    )
+            except Exception as e:
+                logger.warning(f"Could not record progress of analysis {self.analysis_id}: {e}")
+            if not self._dirty:
+                return
+
+
+class LocalAnalysisBroker:
+    """
+    In-process wake-up channel between job producers and the engine.
+
+    The database stays the source of truth (the engine claims work with
+    row locks); the broker only saves workers from waiting out a poll
+    interval when new work arrives. ``publish`` is safe to call from any
+    thread.
+    """
+
+    def __init__(self):
+        self._event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach to the engine's event loop"""
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def publish(self, analysis_id: Optional[uuid.UUID] = None):
+        """Signal that analyses may be waiting"""
+        self.published += 1
+        if self._loop is None or self._event is None:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._event.set()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a publish (or the timeout); returns whether one arrived"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+
+class AnalysisJobEngine:
+    """
+    Database-backed analysis worker pool.
+
+    A dispatcher claims PENDING analyses with ``SELECT ... FOR UPDATE SKIP
+    LOCKED`` (so any number of engines, in any number of processes, never
+    claim the same row) and runs each on one of ``max_workers`` slots.
+    Claims rotate between organizations: the organization with the fewest
+    jobs in flight (then the one served least recently) goes first, and no
+    organization holds more than ``max_jobs_per_organization`` slots, so one
+    tenant's bulk upload can't starve everyone else.
+
+    Status changes go through AnalysisService.update_analysis_status, so
+    every transition is audited; so does progress reported by the runner
+    (throttled to one write per ``progress_interval_seconds``), so the API
+    and other workers can see it. Failures are retried with exponential
+    backoff until ``retry_count`` reaches ``max_retries``; runners raise
+    PermanentAnalysisError to fail immediately. Running jobs heartbeat their
+    row's updated_at; jobs left PROCESSING with a stale heartbeat (a crashed
+    worker) are requeued. A job whose row is no longer PROCESSING (e.g. the
+    user cancelled it) is stopped at the next heartbeat.
+    """
+
+    def __init__(
+        self,
+        runner: AnalysisRunner,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        broker: Optional[LocalAnalysisBroker] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_jobs_per_organization: int = DEFAULT_MAX_JOBS_PER_ORGANIZATION,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_base_delay_seconds: float = DEFAULT_RETRY_BASE_DELAY_SECONDS,
+        retry_max_delay_seconds: float = DEFAULT_RETRY_MAX_DELAY_SECONDS,
+        stale_after_seconds: float = DEFAULT_STALE_AFTER_SECONDS,
+        poll_interval_seconds: float = DEFAULT_POLL_INTERVAL_SECONDS,
+        progress_interval_seconds: float = DEFAULT_PROGRESS_INTERVAL_SECONDS
+    ):
+        """
+        Initialize the engine
+
+        Args:
+            runner: Coroutine function (session, analysis, report_progress) -> findings
+            session_factory: Async session factory (defaults to AsyncSessionLocal)
+            broker: Wake-up channel (defaults to a LocalAnalysisBroker)
+            max_workers: Analyses run concurrently
+            max_jobs_per_organization: Slots one organization may hold at once
+            max_retries: Attempts after the first before an analysis is FAILED
+            retry_base_delay_seconds: Backoff before the first retry (doubles each time)
+            retry_max_delay_seconds: Backoff ceiling
+            stale_after_seconds: Heartbeat age after which PROCESSING jobs are recovered
+            poll_interval_seconds: Database poll interval when the broker is quiet
+            progress_interval_seconds: Minimum time between progress writes per job
+        """
+        if session_factory is None:
+            from ..database.config import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+
+        self.runner = runner
+        self.session_factory = session_factory
+        self.broker = broker or LocalAnalysisBroker()
+        self.max_workers = max_workers
+        self.max_jobs_per_organization = max_jobs_per_organization
+        self.max_retries = max_retries
+        self.retry_base_delay_seconds = retry_base_delay_seconds
+        self.retry_max_delay_seconds = retry_max_delay_seconds
+        self.stale_after_seconds = stale_after_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.progress_interval_seconds = progress_interval_seconds
+
+        self._running: Dict[uuid.UUID, Dict[str, Any]] = {}
+        self._tasks: Dict[uuid.UUID, asyncio.Task] = {}
+        self._in_flight: Dict[uuid.UUID, int] = {}
+        self._last_served: Dict[uuid.UUID, float] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._stopping = False
+        self._last_recovery = 0.0
+        self._stats = {'claimed': 0, 'completed': 0, 'retried': 0, 'failed': 0, 'recovered': 0, 'lost': 0}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """Recover orphaned jobs and start dispatching"""
+        if self._dispatcher is not None:
+            return
+        self._stopping = False
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self.broker.bind(asyncio.get_running_loop())
+        await self.recover_stale_jobs()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        logger.info(f"Analysis job engine started with {self.max_workers} workers")
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Stop claiming work and wait for running jobs
+
+        Jobs still running after ``timeout`` are cancelled and put back to
+        PENDING without using up a retry.
+        """
+        self._stopping = True
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+        tasks = list(self._tasks.values())
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info("Analysis job engine stopped")
+
+    def notify(self, analysis_id: Optional[uuid.UUID] = None):
+        """Wake the dispatcher because an analysis was queued"""
+        self.broker.publish(analysis_id)
+
+    # ------------------------------------------------------------------
+    # Dispatching
+    # ------------------------------------------------------------------
+
+    async def _dispatch_loop(self):
+        while not self._stopping:
+            try:
+                if time.monotonic() - self._last_recovery >= self.stale_after_seconds / 2:
+                    await self.recover_stale_jobs()
+
+                await self._slots.acquire()
+                claimed = None
+                try:
+                    if not self._stopping:
+                        claimed = await self._claim_next()
+                finally:
+                    if claimed is None:
+                        self._slots.release()
+
+                if claimed is not None:
+                    self._start_job(*claimed)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analysis dispatcher error: {e}")
+
+            if not self._stopping:
+                await self.broker.wait(self.poll_interval_seconds)
+
+    async def run_once(self) -> Optional[uuid.UUID]:
+        """
+        Claim and run a single analysis to completion (for tests and CLIs)
+
+        Returns:
+            The analysis id processed, or None if nothing was due
+        """
+        claimed = await self._claim_next()
+        if claimed is None:
+            return None
+        analysis_id, organization_id = claimed
+        self._in_flight[organization_id] = self._in_flight.get(organization_id, 0) + 1
+        try:
+            await self._execute(analysis_id, organization_id)
+        finally:
+            self._in_flight[organization_id] -= 1
+        return analysis_id
+
+    def _start_job(self, analysis_id: uuid.UUID, organization_id: uuid.UUID):
+        self._in_flight[organization_id] = self._in_flight.get(organization_id, 0) + 1
+
+        async def job():
+            try:
+                await self._execute(analysis_id, organization_id)
+            finally:
+                self._in_flight[organization_id] -= 1
+                self._tasks.pop(analysis_id, None)
+                self._slots.release()
+                # A slot (or the organization's quota) just freed up
+                self.broker.publish()
+
+        self._tasks[analysis_id] = asyncio.create_task(job())
+
+    def _retry_delay(self, retry_count: int) -> float:
+        return min(self.retry_max_delay_seconds, self.retry_base_delay_seconds * 2 ** max(0, retry_count - 1))
+
+    def _due_condition(self, now: datetime):
+        """PENDING analyses that are new or whose retry backoff has elapsed"""
+        conditions = [Analysis.retry_count.is_(None), Analysis.retry_count == 0]
+        for retry_count in range(1, self.max_retries + 1):
+            conditions.append(and_(
+                Analysis.retry_count == retry_count,
+                Analysis.updated_at <= now - timedelta(seconds=self._retry_delay(retry_count))
+            ))
+        return and_(Analysis.status == AnalysisStatus.PENDING, or_(*conditions))
+
+    async def _claim_next(self) -> Optional[Tuple[uuid.UUID, uuid.UUID]]:
+        """Atomically move the fairest due analysis to PROCESSING"""
+        now = datetime.now(timezone.utc)
+        due = self._due_condition(now)
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Analysis.organization_id)
+                .where(due)
+                .group_by(Analysis.organization_id)
+                .order_by(func.min(Analysis.created_at))
+                .limit(ORGANIZATION_SCAN_LIMIT)
+            )
+            organizations = [
+                organization_id for organization_id in result.scalars().all()
+                if self._in_flight.get(organization_id, 0) < self.max_jobs_per_organization
+            ]
+            # Stable sort keeps oldest-waiting order among equally served organizations
+            organizations.sort(key=lambda organization_id: (
+                self._in_flight.get(organization_id, 0),
+                self._last_served.get(organization_id, 0.0)
+            ))
+
+            for organization_id in organizations:
+                result = await session.execute(
+                    select(Analysis)
+                    .where(due, Analysis.organization_id == organization_id)
+                    .order_by(Analysis.created_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                analysis = result.scalar_one_or_none()
+                if analysis is None:
+                    continue
+
+                # Claimed under the row lock; _execute audits the PENDING -> PROCESSING transition
+                analysis.status = AnalysisStatus.PROCESSING
+                analysis.updated_at = now
+                await session.commit()
+
+                self._last_served[organization_id] = time.monotonic()
+                self._stats['claimed'] += 1
+                return analysis.id, organization_id
+
+        return None
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    async def _execute(self, analysis_id: uuid.UUID, organization_id: uuid.UUID):
+        """Run one claimed analysis and record its outcome"""
+        state = {
+            'organization_id': str(organization_id),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'progress': 0.0,
+            'stage': 'starting',
+            'lost': False
+        }
+        self._running[analysis_id] = state
+        progress_writer: Optional[_ProgressWriter] = None
+
+        def report_progress(fraction: float, stage: Optional[str] = None):
+            state['progress'] = max(0.0, min(1.0, float(fraction)))
+            if stage:
+                state['stage'] = stage
+            if progress_writer is not None:
+                progress_writer.report()
+
+        try:
+            async with self.session_factory() as session:
+                analysis = await session.get(Analysis, analysis_id)
+                service = AnalysisService(session, analysis.organization_id, analysis.created_by)
+                # _claim_next already set PROCESSING; this audits the claim and
+                # records started_at and the first progress
+                await service.update_analysis_status(
+                    analysis_id, AnalysisStatus.PROCESSING, progress=progress_entry(state),
+                    previous_status=AnalysisStatus.PENDING
+                )
+                progress_writer = _ProgressWriter(
+                    self.session_factory, analysis, state, self.progress_interval_seconds
+                )
+
+                run_task = asyncio.create_task(self.runner(session, analysis, report_progress))
+                heartbeat = asyncio.create_task(self._heartbeat(analysis_id, run_task, state))
+                try:
+                    findings = await run_task
+                    error = None
+                except asyncio.CancelledError:
+                    if not state['lost']:
+                        raise
+                    findings, error = None, None
+                except Exception as e:
+                    findings, error = None, e
+                finally:
+                    heartbeat.cancel()
+                    await asyncio.gather(heartbeat, return_exceptions=True)
+                    await progress_writer.close()
+                    progress_writer = None
+
+                if state['lost']:
+                    self._stats['lost'] += 1
+                    logger.info(f"Analysis {analysis_id} is no longer ours to process; stopped")
+                    return
+
+                if error is None:
+                    report_progress(1.0, 'completed')
+                    await service.update_analysis_status(analysis_id, AnalysisStatus.COMPLETED, findings=findings)
+                    self._stats['completed'] += 1
+                    logger.info(f"Analysis {analysis_id} completed")
+                else:
+                    # Discard whatever the runner left half-done before recording the failure
+                    await session.rollback()
+                    await session.refresh(analysis)
+                    await self._record_failure(service, analysis, error)
+
+        except asyncio.CancelledError:
+            # Engine shutdown: hand the job back without using up a retry
+            await self._release(analysis_id)
+            raise
+        except Exception as e:
+            logger.error(f"Analysis {analysis_id} could not be processed: {e}")
+        finally:
+            if progress_writer is not None:
+                await progress_writer.close()
+            self._running.pop(analysis_id, None)
+
+    async def _record_failure(self, service: AnalysisService, analysis: Analysis, error: Exception):
+        """Requeue with backoff, or fail permanently"""
+        attempts = (analysis.retry_count or 0) + 1
+        message = f"{type(error).__name__}: {error}"
+
+        if isinstance(error, PermanentAnalysisError) or attempts > self.max_retries:
+            await service.update_analysis_status(analysis.id, AnalysisStatus.FAILED, error_message=message)
+            self._stats['failed'] += 1
+            logger.error(f"Analysis {analysis.id} failed after {attempts} attempt(s): {message}")
+        else:
+            # update_analysis_status increments retry_count, which gates the backoff
+            await service.update_analysis_status(analysis.id, AnalysisStatus.PENDING, error_message=message)
+            self._stats['retried'] += 1
+            logger.warning(
+                f"Analysis {analysis.id} attempt {attempts} failed ({message}); "
+                f"retrying in {self._retry_delay(attempts):.0f}s"
+            )
+
+    async def _heartbeat(self, analysis_id: uuid.UUID, run_task: asyncio.Task, state: Dict[str, Any]):
+        """Keep the claim fresh; stop the runner if the row stopped being PROCESSING"""
+        interval = max(1.0, self.stale_after_seconds / 3)
+        # Jitter so many jobs started together don't heartbeat in lockstep
+        await asyncio.sleep(interval * random.uniform(0.5, 1.0))
+        while not run_task.done():
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    update(Analysis)
+                    .where(Analysis.id == analysis_id, Analysis.status == AnalysisStatus.PROCESSING)
+                    .values(updated_at=datetime.now(timezone.utc))
+                )
+                await session.commit()
+            if result.rowcount == 0:
+                state['lost'] = True
+                run_task.cancel()
+                return
+            await asyncio.sleep(interval)
+
+    async def _release(self, analysis_id: uuid.UUID):
+        """Put an interrupted job back in the queue"""
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(Analysis)
+                    .where(Analysis.id == analysis_id, Analysis.status == AnalysisStatus.PROCESSING)
+                    .with_for_update()
+                )
+                analysis = result.scalar_one_or_none()
+                if analysis is None:
+                    return
+                # No error message, so the release doesn't use up a retry
+                service = AnalysisService(session, analysis.organization_id, analysis.created_by)
+                await service.update_analysis_status(analysis_id, AnalysisStatus.PENDING)
+        except Exception as e:
+            logger.error(f"Could not release analysis {analysis_id}: {e}")
+
+    async def recover_stale_jobs(self) -> int:
+        """
+        Requeue PROCESSING analyses whose worker stopped heartbeating.
+        Each recovery counts as a failed attempt, so a job that keeps
+        crashing its worker eventually ends up FAILED.
+
+        Returns:
+            Number of analyses recovered
+        """
+        self._last_recovery = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after_seconds)
+        recovered = 0
+
+        while True:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(Analysis)
+                    .where(
+                        Analysis.status == AnalysisStatus.PROCESSING,
+                        Analysis.updated_at < cutoff,
+                        Analysis.id.notin_(list(self._running)) if self._running else true()
+                    )
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                analysis = result.scalar_one_or_none()
+                if analysis is None:
+                    break
+
+                service = AnalysisService(session, analysis.organization_id, analysis.created_by)
+                await self._record_failure(
+                    service, analysis, RuntimeError("worker stopped while processing; recovered")
+                )
+                recovered += 1
+
+        if recovered:
+            self._stats['recovered'] += recovered
+            logger.warning(f"Recovered {recovered} orphaned analysis job(s)")
+        return recovered
+
+    # ------------------------------------------------------------------
+    # Monitoring
+    # ------------------------------------------------------------------
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get pool occupancy, per-job progress and counters"""
+        return {
+            'running': self._dispatcher is not None and not self._stopping,
+            'max_workers': self.max_workers,
+            'max_jobs_per_organization': self.max_jobs_per_organization,
+            'active_jobs': len(self._running),
+            'jobs': {str(analysis_id): dict(state) for analysis_id, state in self._running.items()},
+            'in_flight_by_organization': {
+                str(organization_id): count for organization_id, count in self._in_flight.items() if count
+            },
+            'broker_messages': self.broker.published,
+            **self._stats
+        }
+
+
+# ============================================================================
+# PROCESS-WIDE ENGINE
+# ============================================================================
+
+_analysis_engine: Optional[AnalysisJobEngine] = None
+
+
+async def start_analysis_engine(runner: AnalysisRunner, **options) -> AnalysisJobEngine:
+    """Create and start the process-wide engine (see AnalysisJobEngine for options)"""
+    global _analysis_engine
+
+    if _analysis_engine is None:
+        _analysis_engine = AnalysisJobEngine(runner, **options)
+        await _analysis_engine.start()
+    return _analysis_engine
+
+
+async def stop_analysis_engine(timeout: float = 30.0):
+    """Stop the process-wide engine"""
+    global _analysis_engine
+
+    if _analysis_engine is not None:
+        await _analysis_engine.stop(timeout)
+        _analysis_engine = None
+
+
+def get_analysis_engine() -> Optional[AnalysisJobEngine]:
+    """Get the process-wide engine, if one has been started"""
+    return _analysis_engine
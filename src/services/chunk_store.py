@@ -0,0 +1,184 @@
+"""
+Per-organization content-defined chunk store.
+Documents are split with content_defined_chunks and each distinct chunk is
+stored once per organization, so sections shared across documents (SOP
+boilerplate such as scope, definitions and references) keep one copy of
+their text, one embedding and one set of per-clause map results.
+"""
+
+import logging
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import AnalysisChunkResult, DocumentChunk, OrganizationChunk
+from utils.document_ingestion import Chunk
+from utils.embedding_store import text_hash
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkStoreService:
+    """Service for an organization's deduplicated document chunks"""
+
+    def __init__(self, session: AsyncSession, organization_id: uuid.UUID):
+        self.session = session
+        self.organization_id = organization_id
+
+    async def get_document_chunks(self, document_id: uuid.UUID) -> Optional[List[Chunk]]:
+        """Stored chunks of a document in order, or None if it hasn't been chunked"""
+        result = await self.session.execute(
+            select(DocumentChunk, OrganizationChunk)
+            .join(
+                OrganizationChunk,
+                (OrganizationChunk.organization_id == DocumentChunk.organization_id) &
+                (OrganizationChunk.chunk_hash == DocumentChunk.chunk_hash)
+            )
+            .where(
+                DocumentChunk.organization_id == self.organization_id,
+                DocumentChunk.document_id == document_id
+            )
+            .order_by(DocumentChunk.chunk_index)
+        )
+        rows = result.all()
+        if not rows:
+            return None
+        return [
+            Chunk(
+                index=occurrence.chunk_index,
+                text=stored.text,
+                token_count=stored.token_count,
+                page_start=occurrence.page_start,
+                page_end=occurrence.page_end
+            )
+            for occurrence, stored in rows
+        ]
+
+    async def register_document_chunks(self, document_id: uuid.UUID, chunks: List[Chunk]) -> Dict[str, int]:
+        """
+        Record a document's chunks, storing the text of chunks the organization doesn't have yet
+
+        Concurrent registrations of the same chunk are safe: existing rows are
+        left untouched. Returns counts of chunks and of newly stored texts.
+        """
+        if not chunks:
+            return {'chunks': 0, 'new_chunks': 0}
+
+        texts = {text_hash(chunk.text): chunk for chunk in chunks}
+        existing = await self.session.execute(
+            select(OrganizationChunk.chunk_hash).where(
+                OrganizationChunk.organization_id == self.organization_id,
+                OrganizationChunk.chunk_hash.in_(list(texts))
+            )
+        )
+        known = set(existing.scalars().all())
+        new_rows = [
+            {
+                'id': uuid.uuid4(),
+                'organization_id': self.organization_id,
+                'chunk_hash': chunk_hash,
+                'text': chunk.text,
+                'token_count': chunk.token_count
+            }
+            for chunk_hash, chunk in texts.items() if chunk_hash not in known
+        ]
+        if new_rows:
+            await self.session.execute(
+                self._insert_ignore(OrganizationChunk, ['organization_id', 'chunk_hash']).values(new_rows)
+            )
+
+        await self.session.execute(
+            self._insert_ignore(DocumentChunk, ['document_id', 'chunk_index']).values([
+                {
+                    'id': uuid.uuid4(),
+                    'organization_id': self.organization_id,
+                    'document_id': document_id,
+                    'chunk_index': chunk.index,
+                    'chunk_hash': text_hash(chunk.text),
+                    'page_start': chunk.page_start,
+                    'page_end': chunk.page_end
+                }
+                for chunk in chunks
+            ])
+        )
+        await self.session.commit()
+
+        logger.info(f"Document {document_id}: {len(chunks)} chunks, {len(new_rows)} new to organization {self.organization_id}")
+        return {'chunks': len(chunks), 'new_chunks': len(new_rows)}
+
+    async def get_cached_findings(
+        self,
+        chunk_hashes: Iterable[str],
+        prompt_version: str
+    ) -> Dict[Tuple[str, str], Tuple[Dict[str, Any], Optional[str]]]:
+        """
+        Per-clause map results already computed for these chunks in any of the organization's analyses
+
+        Returns:
+            (chunk_hash, requirement_id) -> (finding, model), newest result first wins
+        """
+        chunk_hashes = list(set(chunk_hashes))
+        if not chunk_hashes:
+            return {}
+
+        result = await self.session.execute(
+            select(AnalysisChunkResult)
+            .where(
+                AnalysisChunkResult.organization_id == self.organization_id,
+                AnalysisChunkResult.chunk_hash.in_(chunk_hashes),
+                AnalysisChunkResult.prompt_template_version == prompt_version
+            )
+            .order_by(AnalysisChunkResult.created_at.desc())
+        )
+
+        cached: Dict[Tuple[str, str], Tuple[Dict[str, Any], Optional[str]]] = {}
+        for row in result.scalars().all():
+            by_requirement = {finding['requirement_id']: finding for finding in row.findings}
+            # A clause the chunk was checked against but got no finding for is not_applicable
+            for requirement_id in row.requirement_ids:
+                cached.setdefault((row.chunk_hash, requirement_id), (by_requirement.get(requirement_id), row.ai_model))
+        return cached
+
+    async def get_dedupe_stats(self) -> Dict[str, Any]:
+        """How much document text the organization stores once instead of repeatedly"""
+        occurrences = await self.session.execute(
+            select(func.count(DocumentChunk.id), func.coalesce(func.sum(OrganizationChunk.token_count), 0))
+            .join(
+                OrganizationChunk,
+                (OrganizationChunk.organization_id == DocumentChunk.organization_id) &
+                (OrganizationChunk.chunk_hash == DocumentChunk.chunk_hash)
+            )
+            .where(DocumentChunk.organization_id == self.organization_id)
+        )
+        chunk_occurrences, total_tokens = occurrences.one()
+
+        # Only chunks still referenced by a document (deleting a document leaves its texts behind)
+        referenced = (
+            select(DocumentChunk.chunk_hash)
+            .where(DocumentChunk.organization_id == self.organization_id)
+            .distinct()
+            .subquery()
+        )
+        unique = await self.session.execute(
+            select(func.count(OrganizationChunk.id), func.coalesce(func.sum(OrganizationChunk.token_count), 0))
+            .join(referenced, referenced.c.chunk_hash == OrganizationChunk.chunk_hash)
+            .where(OrganizationChunk.organization_id == self.organization_id)
+        )
+        unique_chunks, unique_tokens = unique.one()
+
+        return {
+            'chunk_occurrences': chunk_occurrences,
+            'unique_chunks': unique_chunks,
+            'total_tokens': total_tokens,
+            'unique_tokens': unique_tokens,
+            # Share of document text that didn't need its own extraction, embedding or analysis
+            'dedupe_ratio': round(1 - unique_tokens / total_tokens, 4) if total_tokens else 0.0
+        }
+
+    def _insert_ignore(self, model, conflict_columns: List[str]):
+        """INSERT ... ON CONFLICT DO NOTHING for the session's dialect"""
+        dialect = postgresql if self.session.bind.dialect.name == 'postgresql' else sqlite
+        return dialect.insert(model).on_conflict_do_nothing(index_elements=conflict_columns)
@@ -8,6 +8,7 @@ from datetime import datetime, timezone
 import uuid
 import hashlib
 import logging
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete, func, and_, or_
 from sqlalchemy.orm import selectinload
@@ -19,9 +20,16 @@ from ..database.models import (
     RegulatoryStandard, OrganizationType
 )
 from ..database.config import AuditableSession, TenantQueryBuilder
+from .chunk_store import ChunkStoreService
+from .requirement_index import get_requirement_index, requirement_embedding_text
+from .requirement_fulltext import get_fulltext_index, highlight_snippet
+from utils.async_ai_router import get_async_ai_router
 
 logger = logging.getLogger(__name__)
 
+# How often (seconds) semantic search checks for requirement changes made by other processes
+REQUIREMENT_INDEX_SYNC_INTERVAL = 30.0
+
 # ============================================================================
 # ORGANIZATION SERVICE (TENANT MANAGEMENT)
 # ============================================================================
@@ -510,7 +518,7 @@ class AnalysisService:
     ) -> Analysis:
         """
         Create a new analysis job and queue it for processing.
-        This method creates the database record; actual AI processing is handled by Celery worker.
+        This method creates the database record; actual AI processing is handled by the analysis job engine.
         """
         # Validate document exists and belongs to organization
         document = await self.query_builder.get_tenant_object(Document, document_id)
@@ -555,9 +563,12 @@ class AnalysisService:
         
         await self.session.commit()
         
-        # TODO: Queue analysis job with Celery worker
-        # from .tasks.analysis_tasks import run_gap_analysis
-        # run_gap_analysis.delay(str(analysis.id))
+        # Wake the job engine if one runs in this process; otherwise any
+        # engine picks the PENDING row up on its next poll
+        from .analysis_jobs import get_analysis_engine
+        engine = get_analysis_engine()
+        if engine is not None:
+            engine.notify(analysis.id)
         
         logger.info(f"Analysis job created: {analysis.id}")
         return analysis
@@ -567,16 +578,27 @@ class AnalysisService:
         analysis_id: uuid.UUID,
         status: AnalysisStatus,
         findings: Optional[Dict[str, Any]] = None,
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        progress: Optional[Dict[str, Any]] = None,
+        previous_status: Optional[AnalysisStatus] = None
     ) -> Analysis:
         """
-        Update analysis status and results (typically called by Celery worker).
+        Update analysis status and results (typically called by the analysis job engine).
+        Progress ({'fraction', 'stage'}) is kept under detailed_findings['progress']
+        until the findings replace it, and is only recorded while the analysis is
+        PROCESSING, so a late progress write can't revive a requeued or cancelled job.
+        Progress-only writes are not audited. previous_status is the status before
+        a change already applied outside this method (the job engine's claim), so
+        that transition is audited here.
         """
         analysis = await self.query_builder.get_tenant_object(Analysis, analysis_id)
         if not analysis:
             raise ValueError(f"Analysis {analysis_id} not found")
         
-        old_status = analysis.status
+        if progress is not None and analysis.status != AnalysisStatus.PROCESSING:
+            return analysis
+        
+        old_status = previous_status or analysis.status
         analysis.status = status
         analysis.updated_at = datetime.now(timezone.utc)
         
@@ -596,23 +618,30 @@ class AnalysisService:
             analysis.identified_gaps = findings.get('gaps', [])
             analysis.recommendations = findings.get('recommendations', [])
             analysis.citations = findings.get('citations', [])
+        elif progress is not None:
+            # Reassigned, not mutated, so the JSON column is flagged dirty
+            analysis.detailed_findings = {
+                **(analysis.detailed_findings or {}),
+                'progress': {**progress, 'updated_at': analysis.updated_at.isoformat()}
+            }
         
         if error_message:
             analysis.error_message = error_message
             analysis.retry_count = (analysis.retry_count or 0) + 1
         
-        # Create audit record for status change
-        await self.auditable_session.audit_update(
-            analysis,
-            "status",
-            old_status.value,
-            status.value,
-            additional_metadata={
-                "processing_time_seconds": analysis.processing_time_seconds,
-                "confidence_score": analysis.confidence_score,
-                "error_occurred": bool(error_message)
-            }
-        )
+        if progress is None or old_status != status:
+            # Create audit record for status change
+            await self.auditable_session.audit_update(
+                analysis,
+                "status",
+                old_status.value,
+                status.value,
+                additional_metadata={
+                    "processing_time_seconds": analysis.processing_time_seconds,
+                    "confidence_score": analysis.confidence_score,
+                    "error_occurred": bool(error_message)
+                }
+            )
         
         await self.session.commit()
         return analysis
@@ -842,7 +871,24 @@ class RegulatoryKnowledgeService:
         category: Optional[str] = None,
         limit: int = 50
     ) -> List[RegulatoryRequirement]:
-        """Search regulatory requirements with filtering"""
+        """
+        Search regulatory requirements with filtering.
+        With keywords, every keyword must match and results are ranked by
+        full-text relevance (see search_requirements_fulltext).
+        """
+        
+        # A double quote inside a keyword would end its phrase early
+        keywords = [keyword.replace('"', ' ').strip() for keyword in keywords or []]
+        keywords = [keyword for keyword in keywords if keyword]
+        if keywords:
+            # Quoted so multi-word keywords match as phrases
+            matches = await self.search_requirements_fulltext(
+                " ".join(f'"{keyword}"' for keyword in keywords),
+                limit=limit,
+                standard=standard,
+                category=category
+            )
+            return [requirement for requirement, _, _ in matches]
         
         query = select(RegulatoryRequirement).where(RegulatoryRequirement.is_current == True)
         
@@ -852,19 +898,6 @@ class RegulatoryKnowledgeService:
         if category:
             query = query.where(RegulatoryRequirement.category == category)
         
-        if keywords:
-            # Simple keyword search in text fields
-            keyword_conditions = []
-            for keyword in keywords:
-                keyword_conditions.append(
-                    or_(
-                        RegulatoryRequirement.title.ilike(f"%{keyword}%"),
-                        RegulatoryRequirement.requirement_text.ilike(f"%{keyword}%"),
-                        RegulatoryRequirement.keywords.contains([keyword])
-                    )
-                )
-            query = query.where(and_(*keyword_conditions))
-        
         query = query.order_by(RegulatoryRequirement.standard, RegulatoryRequirement.section_number).limit(limit)
         
         result = await self.session.execute(query)
@@ -886,6 +919,294 @@ class RegulatoryKnowledgeService:
         )
         
         return result.scalar_one_or_none()
+    
+    async def search_requirements_fulltext(
+        self,
+        query: str,
+        limit: int = 20,
+        standard: Optional[RegulatoryStandard] = None,
+        category: Optional[str] = None,
+        current_only: bool = True
+    ) -> List[Tuple[RegulatoryRequirement, float, str]]:
+        """
+        Keyword search ranked by relevance, with highlighted snippets.
+        PostgreSQL uses the weighted search_vector column and its GIN index;
+        other databases use the in-process BM25 index.
+        Returns (requirement, rank, snippet) tuples, best first; matched
+        terms in snippets are wrapped in <mark> tags.
+        """
+        if self.session.get_bind().dialect.name != 'postgresql':
+            return await self._search_requirements_bm25(query, limit, standard, category, current_only)
+        
+        tsquery = func.websearch_to_tsquery('english', query)
+        rank = func.ts_rank_cd(RegulatoryRequirement.search_vector, tsquery)
+        snippet = func.ts_headline(
+            'english',
+            RegulatoryRequirement.requirement_text,
+            tsquery,
+            'StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2'
+        )
+        
+        statement = select(RegulatoryRequirement, rank.label('rank'), snippet.label('snippet')).where(
+            RegulatoryRequirement.search_vector.op('@@')(tsquery)
+        )
+        if current_only:
+            statement = statement.where(RegulatoryRequirement.is_current == True)
+        if standard:
+            statement = statement.where(RegulatoryRequirement.standard == standard)
+        if category:
+            statement = statement.where(RegulatoryRequirement.category == category)
+        
+        result = await self.session.execute(statement.order_by(rank.desc()).limit(limit))
+        return [(requirement, float(score), text) for requirement, score, text in result.all()]
+    
+    async def _search_requirements_bm25(
+        self,
+        query: str,
+        limit: int,
+        standard: Optional[RegulatoryStandard],
+        category: Optional[str],
+        current_only: bool
+    ) -> List[Tuple[RegulatoryRequirement, float, str]]:
+        """Full-text search against the in-process BM25 index"""
+        index = get_fulltext_index()
+        await self.sync_fulltext_index()
+        
+        hits, terms = index.search(
+            query,
+            k=limit,
+            standard=standard.value if standard else None,
+            category=category,
+            current_only=current_only
+        )
+        if not hits:
+            return []
+        
+        requirements = await self._load_requirements([requirement_id for requirement_id, _ in hits])
+        return [
+            (requirements[requirement_id], score, highlight_snippet(requirements[requirement_id].requirement_text, terms))
+            for requirement_id, score in hits
+            if requirement_id in requirements
+        ]
+    
+    async def search_requirements_semantic(
+        self,
+        query: str,
+        k: int = 10,
+        standard: Optional[RegulatoryStandard] = None,
+        category: Optional[str] = None,
+        current_only: bool = True
+    ) -> List[Tuple[RegulatoryRequirement, float]]:
+        """
+        Find the requirements most similar in meaning to free text.
+        Used to retrieve relevant clauses for retrieval-augmented analysis.
+        Returns (requirement, cosine similarity) pairs, best first.
+        """
+        index = get_requirement_index()
+        await self.sync_requirement_index()
+        if index.size == 0:
+            return []
+        
+        success, query_embedding, metadata = await get_async_ai_router().generate_embedding(query)
+        if not success:
+            logger.warning(f"Semantic requirement search unavailable: {metadata.get('error')}")
+            return []
+        if metadata.get('router_embedding_model') != index.embedding_space:
+            # Vectors from different models aren't comparable
+            logger.warning(
+                f"Query embedded by '{metadata.get('router_embedding_model')}' but requirement index "
+                f"uses '{index.embedding_space}'; skipping semantic search"
+            )
+            return []
+        
+        hits = index.search(
+            query_embedding,
+            k=k,
+            standard=standard.value if standard else None,
+            category=category,
+            current_only=current_only
+        )
+        if not hits:
+            return []
+        
+        requirements = await self._load_requirements([requirement_id for requirement_id, _ in hits])
+        return [
+            (requirements[requirement_id], score)
+            for requirement_id, score in hits
+            if requirement_id in requirements
+        ]
+    
+    async def retrieve_requirements_for_passages(
+        self,
+        passages: List[str],
+        k: int = 8,
+        standard: Optional[RegulatoryStandard] = None,
+        current_only: bool = True
+    ) -> List[List[Tuple[RegulatoryRequirement, float]]]:
+        """
+        Retrieve the clauses relevant to each of many document passages.
+        Passages are embedded in one batch and searched in the semantic
+        index; when embeddings are unavailable or from another model, each
+        passage is ranked against the BM25 index on any-term match instead.
+        Returns one list of (requirement, score) pairs per passage, best first.
+        """
+        if not passages:
+            return []
+
+        hits: Optional[List[List[Tuple[str, float]]]] = None
+        index = get_requirement_index()
+        await self.sync_requirement_index()
+        if index.size:
+            success, embeddings, metadata = await get_async_ai_router().generate_embeddings(passages)
+            if success and metadata.get('router_embedding_model') == index.embedding_space:
+                hits = [
+                    index.search(
+                        embedding,
+                        k=k,
+                        standard=standard.value if standard else None,
+                        current_only=current_only
+                    )
+                    for embedding in embeddings
+                ]
+            else:
+                logger.warning("Semantic clause retrieval unavailable; falling back to keyword ranking")
+
+        if hits is None:
+            fulltext_index = get_fulltext_index()
+            await self.sync_fulltext_index()
+            hits = [
+                fulltext_index.search(
+                    passage,
+                    k=k,
+                    standard=standard.value if standard else None,
+                    current_only=current_only,
+                    match_all=False
+                )[0]
+                for passage in passages
+            ]
+
+        requirements = await self._load_requirements(
+            list({requirement_id for passage_hits in hits for requirement_id, _ in passage_hits})
+        )
+        return [
+            [(requirements[requirement_id], score) for requirement_id, score in passage_hits if requirement_id in requirements]
+            for passage_hits in hits
+        ]
+
+    async def sync_requirement_index(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Bring the semantic index up to date with the requirements table.
+        The first call embeds every requirement; later calls only re-embed
+        what changed (see _changed_requirements). Unchanged text is served by
+        the router's embedding store.
+        """
+        index = get_requirement_index()
+        requirements, check_watermark = await self._changed_requirements(index, force)
+        
+        if requirements:
+            success, embeddings, metadata = await get_async_ai_router().generate_embeddings(
+                [requirement_embedding_text(requirement) for requirement in requirements]
+            )
+            if not success:
+                logger.warning(f"Could not embed requirements for semantic index: {metadata.get('error')}")
+                # Retry on the next sync
+                index.mark_stale(str(requirement.id) for requirement in requirements)
+                return index.get_status()
+            
+            embedding_space = metadata.get('router_embedding_model')
+            if index.built and embedding_space != index.embedding_space:
+                logger.warning(
+                    f"Requirement embeddings moved from '{index.embedding_space}' to "
+                    f"'{embedding_space}'; rebuilding semantic index"
+                )
+                index.reset()
+                return await self.sync_requirement_index(force=True)
+            
+            index.upsert(
+                (
+                    (
+                        str(requirement.id),
+                        embedding,
+                        requirement.standard.value if requirement.standard else None,
+                        requirement.category,
+                        requirement.is_current
+                    )
+                    for requirement, embedding in zip(requirements, embeddings)
+                ),
+                embedding_space
+            )
+        
+        await self._finish_index_sync(index, requirements, check_watermark)
+        return index.get_status()
+    
+    async def sync_fulltext_index(self, force: bool = False) -> Dict[str, Any]:
+        """Bring the in-process BM25 index up to date with the requirements table"""
+        index = get_fulltext_index()
+        requirements, check_watermark = await self._changed_requirements(index, force)
+        if requirements:
+            index.upsert(requirements)
+        await self._finish_index_sync(index, requirements, check_watermark)
+        return index.get_status()
+    
+    async def _changed_requirements(self, index, force: bool) -> Tuple[List[RegulatoryRequirement], bool]:
+        """
+        Requirements an in-process index has to (re)process.
+        
+        An unbuilt index gets every requirement. After that, requirements
+        written through this process are queued by session event listeners,
+        and every REQUIREMENT_INDEX_SYNC_INTERVAL seconds (or when forced) an
+        updated_at watermark catches writes from other processes. Queued
+        deletes are applied here. Returns (requirements, watermark checked).
+        """
+        stale, removed = index.take_pending()
+        check_watermark = (
+            force or not index.built or
+            time.monotonic() - index.last_sync >= REQUIREMENT_INDEX_SYNC_INTERVAL
+        )
+        
+        if removed:
+            index.remove(removed)
+        
+        if not index.built:
+            query = select(RegulatoryRequirement)
+        else:
+            conditions = []
+            if stale:
+                conditions.append(RegulatoryRequirement.id.in_([uuid.UUID(requirement_id) for requirement_id in stale]))
+            if check_watermark and index.watermark is not None:
+                conditions.append(RegulatoryRequirement.updated_at > index.watermark)
+            if not conditions:
+                return [], check_watermark
+            query = select(RegulatoryRequirement).where(or_(*conditions))
+        
+        result = await self.session.execute(query)
+        return result.scalars().all(), check_watermark
+    
+    async def _finish_index_sync(self, index, requirements: List[RegulatoryRequirement], check_watermark: bool):
+        """Advance an index's watermark and reconcile deletes made by other processes"""
+        updated = [requirement.updated_at for requirement in requirements if requirement.updated_at]
+        if updated:
+            index.watermark = max(updated + ([index.watermark] if index.watermark else []))
+        
+        if check_watermark:
+            if index.built:
+                # Deletes leave no updated_at trail; reconcile ids when the counts disagree
+                count = await self.session.execute(select(func.count(RegulatoryRequirement.id)))
+                if count.scalar() != index.size:
+                    ids = await self.session.execute(select(RegulatoryRequirement.id))
+                    index.remove(index.ids() - {str(requirement_id) for requirement_id in ids.scalars().all()})
+            index.last_sync = time.monotonic()
+        
+        index.built = True
+    
+    async def _load_requirements(self, requirement_ids: List[str]) -> Dict[str, RegulatoryRequirement]:
+        """Fetch requirements by id (as strings) in one query"""
+        result = await self.session.execute(
+            select(RegulatoryRequirement).where(
+                RegulatoryRequirement.id.in_([uuid.UUID(requirement_id) for requirement_id in requirement_ids])
+            )
+        )
+        return {str(requirement.id): requirement for requirement in result.scalars().all()}
 
 # ============================================================================
 # UTILITY FUNCTIONS
@@ -945,8 +1266,12 @@ async def get_organization_usage_stats(
         )
     )
     
+    # Document text shared between the organization's documents is stored and analyzed once
+    chunk_dedupe = await ChunkStoreService(session, organization_id).get_dedupe_stats()
+    
     return {
         "active_users": user_count.scalar(),
         "monthly_analyses": analysis_count.scalar(),
-        "storage_bytes": storage_usage.scalar()
+        "storage_bytes": storage_usage.scalar(),
+        "chunk_dedupe": chunk_dedupe
     }
\ No newline at end of file
@@ -0,0 +1,812 @@
+"""
+Map-reduce gap analysis of regulatory documents.
+Checks each document chunk against only the clauses retrieved for it, running
+chunks concurrently through the AI router, then merges the per-chunk findings
+into the Analysis gaps, recommendations and citations.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Analysis, AnalysisChunkResult, AnalysisStatus, Document, RegulatoryRequirement
+from .analysis_jobs import PermanentAnalysisError
+from .chunk_store import ChunkStoreService
+from .database_services import RegulatoryKnowledgeService
+from utils.async_ai_router import LAST_RESORT_PROVIDERS, get_async_ai_router
+from utils.rate_limiter import PRIORITY_BATCH
+from utils.document_ingestion import Chunk, content_defined_chunks, extract_pages
+from utils.embedding_store import text_hash
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT_VERSION = "gap-map-v1"
+# Average content-defined chunk size. Larger chunks mean fewer LLM calls, smaller
+# ones let more shared boilerplate sections dedupe across documents
+MAP_CHUNK_TOKENS = 1000
+CLAUSES_PER_CHUNK = 8
+# Chunks of at most half the chunk size are packed into shared map calls, up to
+# this many chunks and distinct clauses per call (excerpts up to one chunk size)
+MAP_PACK_MAX_CHUNKS = 4
+MAP_PACK_MAX_CLAUSES = 2 * CLAUSES_PER_CHUNK
+# Requirement text beyond this is cut from map prompts
+MAX_CLAUSE_CHARS = 1200
+MAP_MAX_TOKENS = 1500
+MAP_TEMPERATURE = 0.1
+# Concurrent map calls per provider; providers not listed use DEFAULT_PROVIDER_CONCURRENCY
+PROVIDER_CONCURRENCY = {'openai': 8, 'anthropic': 4, 'gemini': 8, 'perplexity': 2}
+DEFAULT_PROVIDER_CONCURRENCY = 4
+# Batch map calls may wait this long for a provider's rate limit before trying the next one
+MAP_QUEUE_TIMEOUT_SECONDS = 60.0
+# Routing policy workload of map calls: a high-context model within a per-call cost cap
+MAP_WORKLOAD = 'gap_analysis'
+# Map results are committed after this many chunks or seconds, whichever comes first
+CHECKPOINT_BATCH = 8
+CHECKPOINT_INTERVAL_SECONDS = 5.0
+MAX_DESCRIPTIONS_PER_CLAUSE = 3
+# Descriptions sharing this fraction of their words are treated as duplicates
+DUPLICATE_SIMILARITY = 0.8
+
+STATUSES = ('addressed', 'partial', 'gap', 'not_applicable')
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+MAP_SYSTEM_PROMPT = (
+    "You are a regulatory compliance auditor performing a gap analysis of a quality "
+    "system document. You are given one excerpt of the document and the regulatory "
+    "clauses most relevant to it. For every clause, judge only from the excerpt whether "
+    "the document addresses it. Respond with JSON only, in the form "
+    '{"findings": [{"clause": "C1", "status": "addressed|partial|gap|not_applicable", '
+    '"severity": "low|medium|high|critical", "confidence": 0-100, "finding": "...", '
+    '"evidence": "short quote from the excerpt or empty", "recommendation": "..."}]}. '
+    "Use not_applicable when the excerpt does not deal with the clause's subject at all."
+)
+
+MAP_PACKED_SYSTEM_PROMPT = (
+    "You are a regulatory compliance auditor performing a gap analysis of a quality "
+    "system document. You are given several short, separate excerpts of the document "
+    "(E1, E2, ...), each with the regulatory clauses to check it against. Judge every "
+    "excerpt on its own, only from its own text, against each of its clauses. Respond "
+    'with JSON only, in the form {"findings": [{"excerpt": "E1", "clause": "C1", '
+    '"status": "addressed|partial|gap|not_applicable", "severity": "low|medium|high|critical", '
+    '"confidence": 0-100, "finding": "...", "evidence": "short quote from the excerpt or empty", '
+    '"recommendation": "..."}]}. '
+    "Use not_applicable when the excerpt does not deal with the clause's subject at all."
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+@dataclass
+class MapTask:
+    """One distinct chunk and the clauses it is checked against"""
+    chunk: Chunk
+    chunk_hash: str
+    requirements: List[RegulatoryRequirement]
+
+
+class ProviderConcurrencyLimiter:
+    """Caps in-flight map calls per provider so one analysis can't monopolize a provider's rate limit"""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default_limit: int = DEFAULT_PROVIDER_CONCURRENCY):
+        self.limits = dict(PROVIDER_CONCURRENCY if limits is None else limits)
+        self.default_limit = default_limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Counter = Counter()
+
+    def slot(self, provider: str) -> "_ProviderSlot":
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limits.get(provider, self.default_limit))
+            self._semaphores[provider] = semaphore
+        return _ProviderSlot(self, provider, semaphore)
+
+    def get_status(self) -> Dict[str, Dict[str, int]]:
+        return {
+            provider: {'in_flight': self._in_flight[provider], 'limit': self.limits.get(provider, self.default_limit)}
+            for provider in self._semaphores
+        }
+
+
+class _ProviderSlot:
+    def __init__(self, limiter: ProviderConcurrencyLimiter, provider: str, semaphore: asyncio.Semaphore):
+        self.limiter = limiter
+        self.provider = provider
+        self.semaphore = semaphore
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        self.limiter._in_flight[self.provider] += 1
+
+    async def __aexit__(self, *exc_info):
+        self.limiter._in_flight[self.provider] -= 1
+        self.semaphore.release()
+
+
+async def download_document(document: Document) -> Tuple[str, bool]:
+    """Fetch a document's file from S3 into a temporary file"""
+    try:
+        import boto3
+    except ImportError:
+        raise PermanentAnalysisError("boto3 is required to fetch documents from S3")
+
+    suffix = os.path.splitext(document.original_filename or document.filename or "")[1]
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    os.close(handle)
+
+    def fetch():
+        boto3.client("s3").download_file(document.s3_bucket, document.s3_key, path)
+
+    try:
+        await asyncio.to_thread(fetch)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path, True
+
+
+def _load_findings_json(content: str) -> Optional[List[Any]]:
+    """The findings list of a map response; None when it isn't usable JSON"""
+    text = _JSON_FENCE_RE.sub("", (content or "").strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        payload = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get("findings"), list):
+        return None
+    return [item for item in payload["findings"] if isinstance(item, dict)]
+
+
+def _parse_finding(item: Dict[str, Any], clause_labels: Dict[str, RegulatoryRequirement]) -> Optional[Dict[str, Any]]:
+    requirement = clause_labels.get(str(item.get("clause", "")).strip())
+    status = str(item.get("status", "")).strip().lower()
+    if requirement is None or status not in STATUSES:
+        return None
+    severity = str(item.get("severity", "medium")).strip().lower()
+    try:
+        confidence = max(0, min(100, int(item.get("confidence", 70))))
+    except (TypeError, ValueError):
+        confidence = 70
+    return {
+        'requirement_id': str(requirement.id),
+        'status': status,
+        'severity': severity if severity in SEVERITY_RANK else 'medium',
+        'confidence': confidence,
+        'finding': str(item.get("finding") or "").strip(),
+        'evidence': str(item.get("evidence") or "").strip(),
+        'recommendation': str(item.get("recommendation") or "").strip()
+    }
+
+
+def _parse_map_response(content: str, clause_labels: Dict[str, RegulatoryRequirement]) -> Optional[List[Dict[str, Any]]]:
+    """Validate a map response; None when it isn't usable JSON"""
+    items = _load_findings_json(content)
+    if items is None:
+        return None
+    return [finding for finding in (_parse_finding(item, clause_labels) for item in items) if finding]
+
+
+def _parse_packed_response(
+    content: str,
+    excerpt_labels: Dict[str, Dict[str, RegulatoryRequirement]]
+) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """Validate a packed map response into findings per excerpt; None when it isn't usable JSON"""
+    items = _load_findings_json(content)
+    if items is None:
+        return None
+    findings: Dict[str, List[Dict[str, Any]]] = {excerpt: [] for excerpt in excerpt_labels}
+    for item in items:
+        excerpt = str(item.get("excerpt", "")).strip()
+        if excerpt not in excerpt_labels:
+            continue
+        # Only the clauses listed for this excerpt count
+        finding = _parse_finding(item, excerpt_labels[excerpt])
+        if finding:
+            findings[excerpt].append(finding)
+    return findings
+
+
+def _format_clauses(labels: Dict[str, RegulatoryRequirement]) -> str:
+    return "\n\n".join(
+        f"[{label}] {requirement.standard.value if requirement.standard else ''} {requirement.section_number} "
+        f"{requirement.title}\n{(requirement.requirement_text or '')[:MAX_CLAUSE_CHARS]}"
+        for label, requirement in labels.items()
+    )
+
+
+def _format_pages(chunk: Chunk) -> str:
+    return f"page {chunk.page_start}" if chunk.page_start == chunk.page_end else f"pages {chunk.page_start}-{chunk.page_end}"
+
+
+def _words(text: str) -> frozenset:
+    return frozenset(_WORD_RE.findall(text.casefold()))
+
+
+def _add_distinct(texts: List[str], seen: List[frozenset], text: str, limit: Optional[int] = None) -> bool:
+    """Append text unless it is empty, a near-duplicate, or the list is full"""
+    if not text or (limit is not None and len(texts) >= limit):
+        return False
+    words = _words(text)
+    for other in seen:
+        union = len(words | other)
+        if union and len(words & other) / union >= DUPLICATE_SIMILARITY:
+            return False
+    texts.append(text)
+    seen.append(words)
+    return True
+
+
+def reduce_findings(
+    chunk_results: List[Tuple[Chunk, List[Dict[str, Any]]]],
+    requirements: Dict[str, RegulatoryRequirement],
+    standard_name: str
+) -> Dict[str, Any]:
+    """
+    Merge per-chunk findings into per-clause results
+
+    A clause counts as addressed if any chunk addresses it, otherwise as
+    partially addressed if any chunk partly does, otherwise as a gap. Each
+    clause keeps its worst severity and a few distinct descriptions;
+    recommendations are deduplicated across clauses.
+
+    Args:
+        chunk_results: (chunk, findings) per analyzed chunk
+        requirements: Requirements referenced by the findings, by id
+        standard_name: Standard name for the summary
+
+    Returns:
+        Findings dict for AnalysisService.update_analysis_status
+    """
+    by_clause: Dict[str, List[Tuple[Chunk, Dict[str, Any]]]] = defaultdict(list)
+    for chunk, findings in chunk_results:
+        for finding in findings:
+            if finding['requirement_id'] in requirements:
+                by_clause[finding['requirement_id']].append((chunk, finding))
+
+    clauses = []
+    for requirement_id, items in by_clause.items():
+        requirement = requirements[requirement_id]
+        statuses = {finding['status'] for _, finding in items}
+        status = next((candidate for candidate in STATUSES if candidate in statuses), 'not_applicable')
+        relevant = [(chunk, finding) for chunk, finding in items if finding['status'] == status]
+
+        descriptions: List[str] = []
+        seen: List[frozenset] = []
+        evidence = {}
+        for chunk, finding in relevant:
+            _add_distinct(descriptions, seen, finding['finding'], MAX_DESCRIPTIONS_PER_CLAUSE)
+            location = (chunk.page_start, chunk.page_end, finding['evidence'])
+            evidence.setdefault(location, {'page_start': chunk.page_start, 'page_end': chunk.page_end, 'quote': finding['evidence']})
+        # Quoted evidence first, then bare page references
+        evidence = sorted(evidence.values(), key=lambda item: (not item['quote'], item['page_start']))
+
+        clauses.append({
+            'requirement_id': requirement_id,
+            'standard': requirement.standard.value if requirement.standard else None,
+            'section_number': requirement.section_number,
+            'title': requirement.title,
+            'status': status,
+            'severity': max((finding['severity'] for _, finding in relevant), key=SEVERITY_RANK.get),
+            'confidence': round(sum(finding['confidence'] for _, finding in relevant) / len(relevant)),
+            'descriptions': descriptions,
+            'evidence': evidence[:MAX_DESCRIPTIONS_PER_CLAUSE],
+            'recommendations': [finding['recommendation'] for _, finding in relevant if finding['recommendation']],
+            'chunks_checked': len(items)
+        })
+
+    clauses.sort(key=lambda clause: (-SEVERITY_RANK[clause['severity']], clause['section_number']))
+    gap_clauses = [clause for clause in clauses if clause['status'] in ('gap', 'partial')]
+
+    gaps = [
+        {
+            'requirement_id': clause['requirement_id'],
+            'section_number': clause['section_number'],
+            'title': clause['title'],
+            'status': clause['status'],
+            'severity': clause['severity'],
+            'description': " ".join(clause['descriptions']),
+            'evidence': clause['evidence']
+        }
+        for clause in gap_clauses
+    ]
+
+    recommendations: List[Dict[str, Any]] = []
+    seen_recommendations: List[frozenset] = []
+    texts: List[str] = []
+    for clause in gap_clauses:
+        for text in clause['recommendations']:
+            if _add_distinct(texts, seen_recommendations, text):
+                recommendations.append({'recommendation': text, 'priority': clause['severity'], 'sections': [clause['section_number']]})
+            else:
+                # Same advice for another clause: cite it on the existing entry
+                words = _words(text)
+                for entry, entry_words in zip(recommendations, seen_recommendations):
+                    union = len(words | entry_words)
+                    if union and len(words & entry_words) / union >= DUPLICATE_SIMILARITY:
+                        if clause['section_number'] not in entry['sections']:
+                            entry['sections'].append(clause['section_number'])
+                        break
+
+    citations = [
+        {
+            'requirement_id': clause['requirement_id'],
+            'standard': clause['standard'],
+            'section_number': clause['section_number'],
+            'title': clause['title'],
+            'status': clause['status'],
+            'pages': sorted({page for item in clause['evidence'] for page in (item['page_start'], item['page_end'])})
+        }
+        for clause in clauses if clause['status'] != 'not_applicable'
+    ]
+
+    counts = Counter(clause['status'] for clause in clauses)
+    risk_level = max((clause['severity'] for clause in gap_clauses), key=SEVERITY_RANK.get, default='low')
+    judged = [clause for clause in clauses if clause['status'] != 'not_applicable']
+    summary = (
+        f"{len(judged)} {standard_name} clauses checked across {len(chunk_results)} document sections: "
+        f"{counts['gap']} gaps, {counts['partial']} partially addressed, {counts['addressed']} addressed. "
+        f"Overall risk: {risk_level}."
+    )
+
+    return {
+        'summary': summary,
+        'detailed_findings': {'clauses': clauses},
+        'confidence_score': round(sum(clause['confidence'] for clause in judged) / len(judged)) if judged else None,
+        'risk_level': risk_level,
+        'gaps': gaps,
+        'recommendations': recommendations,
+        'citations': citations
+    }
+
+
+class GapAnalysisEngine:
+    """
+    Map-reduce gap analysis runner for the analysis job engine.
+
+    Map: the document is chunked, relevant clauses are retrieved for every
+    chunk in one batch, and each distinct chunk is checked against its
+    clauses by an LLM call; small neighbouring chunks share one call. Calls
+    run concurrently, capped per provider, and fall through the router's
+    provider order on failure. Every map result is checkpointed in
+    analysis_chunk_results, so a retried analysis only maps the chunks it
+    has not finished.
+
+    Documents are chunked by content (see content_defined_chunks) into the
+    organization's chunk store, so a section that appears in several
+    documents, or survives unchanged into a new version, is one chunk. Map
+    results are cached per (chunk, clause) across the organization: a chunk
+    whose retrieved clauses all have cached results is not mapped again.
+
+    Reduce: findings are merged per clause (see reduce_findings).
+    """
+
+    def __init__(
+        self,
+        router=None,
+        document_loader=None,
+        limiter: Optional[ProviderConcurrencyLimiter] = None,
+        chunk_tokens: int = MAP_CHUNK_TOKENS,
+        clauses_per_chunk: int = CLAUSES_PER_CHUNK
+    ):
+        """
+        Initialize the engine
+
+        Args:
+            router: AsyncAIRouter (defaults to the global router)
+            document_loader: Coroutine function document -> (local path, delete afterwards);
+                             defaults to downloading from S3
+            limiter: Per-provider concurrency caps
+            chunk_tokens: Average estimated tokens per map chunk
+            clauses_per_chunk: Clauses retrieved per chunk
+        """
+        self.router = router
+        self.document_loader = document_loader or download_document
+        self.limiter = limiter or ProviderConcurrencyLimiter()
+        self.chunk_tokens = chunk_tokens
+        self.clauses_per_chunk = clauses_per_chunk
+
+    async def __call__(self, session: AsyncSession, analysis: Analysis, report_progress: Callable[..., None]) -> Dict[str, Any]:
+        """Run one analysis (AnalysisRunner interface)"""
+        router = self.router or get_async_ai_router()
+        document = await session.get(Document, analysis.document_id)
+        if document is None:
+            raise PermanentAnalysisError(f"Document {analysis.document_id} not found")
+
+        # Reported as a diff against the previous version's analysis
+        previous = await self._find_previous_analysis(session, analysis, document)
+        previous_hashes = set()
+        if previous is not None:
+            rows = await session.execute(
+                select(AnalysisChunkResult.chunk_hash).where(AnalysisChunkResult.analysis_id == previous.id)
+            )
+            previous_hashes = set(rows.scalars().all())
+
+        report_progress(0.02, 'extracting')
+        chunk_store = ChunkStoreService(session, analysis.organization_id)
+        chunks = await self._chunk_document(chunk_store, document)
+        if not chunks:
+            raise PermanentAnalysisError(f"No text could be extracted from document {document.id}")
+
+        report_progress(0.1, 'retrieving')
+        knowledge = RegulatoryKnowledgeService(session)
+        retrieved = await knowledge.retrieve_requirements_for_passages(
+            [chunk.text for chunk in chunks], k=self.clauses_per_chunk, standard=analysis.regulatory_standard
+        )
+
+        # Identical chunks (repeated boilerplate) are mapped once
+        tasks: Dict[str, MapTask] = {}
+        chunk_hashes = []
+        for chunk, hits in zip(chunks, retrieved):
+            chunk_hash = text_hash(chunk.text)
+            chunk_hashes.append(chunk_hash)
+            if chunk_hash not in tasks and hits:
+                tasks[chunk_hash] = MapTask(chunk, chunk_hash, [requirement for requirement, _ in hits])
+
+        results = await self._load_checkpoints(session, analysis)
+        resumed = sum(1 for chunk_hash in tasks if chunk_hash in results)
+        if resumed:
+            logger.info(f"Analysis {analysis.id}: resuming with {resumed}/{len(tasks)} chunks already mapped")
+        reused = await self._reuse_cached_results(session, analysis, chunk_store, tasks, results)
+        pending = [task for chunk_hash, task in tasks.items() if chunk_hash not in results]
+
+        providers_used = await self._map(
+            session, analysis, pending, results, router, report_progress, len(tasks) - len(pending), len(tasks)
+        )
+
+        report_progress(0.95, 'reducing')
+        requirement_ids = {finding['requirement_id'] for row in results.values() for finding in row.findings}
+        requirements = await self._load_requirements(session, requirement_ids)
+        chunk_results = [
+            (chunk, results[chunk_hash].findings)
+            for chunk, chunk_hash in zip(chunks, chunk_hashes)
+            if chunk_hash in results
+        ]
+        findings = reduce_findings(chunk_results, requirements, analysis.regulatory_standard.value)
+        findings['detailed_findings']['map'] = {
+            'chunks': len(chunks),
+            'mapped_chunks': len(tasks),
+            'resumed_chunks': resumed,
+            'reused_chunks': reused,
+            'providers': dict(providers_used)
+        }
+        if previous is not None:
+            current_hashes = set(chunk_hashes)
+            findings['detailed_findings']['map']['diff'] = {
+                'previous_analysis_id': str(previous.id),
+                'previous_document_id': str(previous.document_id),
+                'unchanged_chunks': sum(1 for chunk_hash in tasks if chunk_hash in previous_hashes),
+                'changed_or_new_chunks': sum(1 for chunk_hash in tasks if chunk_hash not in previous_hashes),
+                'removed_chunks': sum(1 for chunk_hash in previous_hashes if chunk_hash not in current_hashes)
+            }
+
+        analysis.prompt_template_version = MAP_PROMPT_VERSION
+        if providers_used:
+            analysis.ai_model = providers_used.most_common(1)[0][0]
+        return findings
+
+    async def _chunk_document(self, chunk_store: ChunkStoreService, document: Document) -> List[Chunk]:
+        """The document's chunks from the chunk store, extracting and registering them on first use"""
+        chunks = await chunk_store.get_document_chunks(document.id)
+        if chunks is not None:
+            return chunks
+
+        path, delete_after = await self.document_loader(document)
+        try:
+            chunks = await asyncio.to_thread(lambda: list(content_defined_chunks(
+                extract_pages(path, document.mime_type, content_hash=document.content_hash),
+                self.chunk_tokens
+            )))
+        finally:
+            if delete_after:
+                os.unlink(path)
+        await chunk_store.register_document_chunks(document.id, chunks)
+        return chunks
+
+    @staticmethod
+    async def _load_requirements(session: AsyncSession, requirement_ids) -> Dict[str, RegulatoryRequirement]:
+        if not requirement_ids:
+            return {}
+        result = await session.execute(
+            select(RegulatoryRequirement).where(
+                RegulatoryRequirement.id.in_([uuid.UUID(requirement_id) for requirement_id in requirement_ids])
+            )
+        )
+        return {str(requirement.id): requirement for requirement in result.scalars().all()}
+
+    async def _find_previous_analysis(self, session: AsyncSession, analysis: Analysis, document: Document) -> Optional[Analysis]:
+        """
+        Latest completed analysis, against the same standard and prompt, of an
+        earlier version of this document: an older upload in the same
+        organization with the same original filename (or title)
+        """
+        same_document = Document.original_filename == document.original_filename
+        if document.title:
+            same_document = or_(same_document, Document.title == document.title)
+
+        result = await session.execute(
+            select(Analysis)
+            .join(Document, Analysis.document_id == Document.id)
+            .where(
+                Document.organization_id == document.organization_id,
+                Document.id != document.id,
+                Document.created_at < document.created_at,
+                same_document,
+                Analysis.regulatory_standard == analysis.regulatory_standard,
+                Analysis.status == AnalysisStatus.COMPLETED,
+                Analysis.prompt_template_version == MAP_PROMPT_VERSION
+            )
+            .order_by(Document.created_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def _reuse_cached_results(
+        self,
+        session: AsyncSession,
+        analysis: Analysis,
+        chunk_store: ChunkStoreService,
+        tasks: Dict[str, MapTask],
+        results: Dict[str, AnalysisChunkResult]
+    ) -> int:
+        """
+        Build map results from the organization's cached per-clause results
+
+        A chunk is reused when every clause retrieved for it has already been
+        checked against identical text, in this document or any other, with
+        the current prompt. Returns the number of chunks reused.
+        """
+        candidates = [chunk_hash for chunk_hash in tasks if chunk_hash not in results]
+        cached = await chunk_store.get_cached_findings(candidates, MAP_PROMPT_VERSION)
+        reused = 0
+        for chunk_hash in candidates:
+            task = tasks[chunk_hash]
+            hits = [cached.get((chunk_hash, str(requirement.id))) for requirement in task.requirements]
+            if not all(hits):
+                continue
+
+            models = Counter(model for _, model in hits if model)
+            row = self._chunk_result(
+                analysis, task,
+                [finding for finding, _ in hits if finding is not None],
+                models.most_common(1)[0][0] if models else None
+            )
+            session.add(row)
+            results[chunk_hash] = row
+            reused += 1
+
+        if reused:
+            await session.commit()
+            logger.info(f"Analysis {analysis.id}: reused cached results for {reused}/{len(tasks)} chunks")
+        return reused
+
+    @staticmethod
+    def _chunk_result(analysis: Analysis, task: MapTask, findings: List[Dict[str, Any]], model: Optional[str]) -> AnalysisChunkResult:
+        return AnalysisChunkResult(
+            organization_id=analysis.organization_id,
+            analysis_id=analysis.id,
+            chunk_index=task.chunk.index,
+            chunk_hash=task.chunk_hash,
+            page_start=task.chunk.page_start,
+            page_end=task.chunk.page_end,
+            requirement_ids=[str(requirement.id) for requirement in task.requirements],
+            findings=findings,
+            prompt_template_version=MAP_PROMPT_VERSION,
+            ai_model=model
+        )
+
+    async def _load_checkpoints(self, session: AsyncSession, analysis: Analysis) -> Dict[str, AnalysisChunkResult]:
+        """Map results saved by earlier attempts; results from an older prompt are discarded"""
+        await session.execute(
+            delete(AnalysisChunkResult).where(
+                AnalysisChunkResult.analysis_id == analysis.id,
+                AnalysisChunkResult.prompt_template_version != MAP_PROMPT_VERSION
+            )
+        )
+        result = await session.execute(
+            select(AnalysisChunkResult).where(AnalysisChunkResult.analysis_id == analysis.id)
+        )
+        return {row.chunk_hash: row for row in result.scalars().all()}
+
+    async def _map(
+        self,
+        session: AsyncSession,
+        analysis: Analysis,
+        pending: List[MapTask],
+        results: Dict[str, AnalysisChunkResult],
+        router,
+        report_progress: Callable[..., None],
+        done: int,
+        total: int
+    ) -> Counter:
+        """Map pending chunks concurrently, checkpointing results as they arrive"""
+        providers = [provider for provider in router.get_provider_order() if provider not in LAST_RESORT_PROVIDERS]
+        if not providers:
+            raise RuntimeError("No AI providers available for gap analysis")
+
+        providers_used = Counter(row.ai_model for row in results.values() if row.ai_model)
+        failures = []
+        unsaved = 0
+        last_checkpoint = time.monotonic()
+        failed_chunks = 0
+
+        async def run(pack: List[MapTask]):
+            try:
+                return pack, await self._map_pack(pack, providers, router), None
+            except Exception as e:
+                return pack, None, e
+
+        running = [asyncio.create_task(run(pack)) for pack in self._pack_tasks(pending)]
+
+        try:
+            for next_done in asyncio.as_completed(running):
+                pack, mapped, error = await next_done
+                if error is not None:
+                    failures.append(error)
+                    failed_chunks += len(pack)
+                    continue
+
+                pack_findings, model = mapped
+                for task, findings in zip(pack, pack_findings):
+                    row = self._chunk_result(analysis, task, findings, model)
+                    session.add(row)
+                    results[task.chunk_hash] = row
+                providers_used[model] += len(pack)
+                unsaved += len(pack)
+                done += len(pack)
+                report_progress(0.1 + 0.85 * done / max(total, 1), 'mapping')
+
+                if unsaved >= CHECKPOINT_BATCH or time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS:
+                    await session.commit()
+                    unsaved = 0
+                    last_checkpoint = time.monotonic()
+        finally:
+            for task in running:
+                task.cancel()
+            if unsaved:
+                # Keep finished chunks even when the analysis is being stopped or failed
+                await session.commit()
+
+        if failures:
+            raise RuntimeError(
+                f"{failed_chunks} of {len(pending)} chunks could not be analyzed "
+                f"({len(results)} checkpointed); last error: {failures[-1]}"
+            )
+        return providers_used
+
+    def _pack_tasks(self, pending: List[MapTask]) -> List[List[MapTask]]:
+        """
+        Group small neighbouring chunks into shared map calls
+
+        Chunks are packed in document order while the pack stays within one
+        chunk size of excerpt text, MAP_PACK_MAX_CHUNKS chunks and
+        MAP_PACK_MAX_CLAUSES distinct clauses (neighbouring chunks mostly
+        retrieve the same clauses, so a pack costs little more than one chunk).
+        """
+        packs: List[List[MapTask]] = []
+        current: List[MapTask] = []
+        current_tokens = 0
+        current_clauses: set = set()
+
+        for task in pending:
+            if task.chunk.token_count > self.chunk_tokens // 2:
+                packs.append([task])
+                continue
+            clauses = current_clauses | {requirement.id for requirement in task.requirements}
+            if current and (
+                len(current) >= MAP_PACK_MAX_CHUNKS or
+                current_tokens + task.chunk.token_count > self.chunk_tokens or
+                len(clauses) > MAP_PACK_MAX_CLAUSES
+            ):
+                packs.append(current)
+                current, current_tokens = [], 0
+                clauses = {requirement.id for requirement in task.requirements}
+            current.append(task)
+            current_tokens += task.chunk.token_count
+            current_clauses = clauses
+
+        if current:
+            packs.append(current)
+        return packs
+
+    async def _map_pack(
+        self,
+        pack: List[MapTask],
+        providers: List[str],
+        router
+    ) -> Tuple[List[List[Dict[str, Any]]], str]:
+        """Check a pack of chunks against their clauses, trying providers in order; returns (findings per chunk, model)"""
+        if len(pack) == 1:
+            task = pack[0]
+            labels = {f"C{number}": requirement for number, requirement in enumerate(task.requirements, 1)}
+            messages = [
+                {'role': 'system', 'content': MAP_SYSTEM_PROMPT},
+                {'role': 'user', 'content': (
+                    f"Regulatory clauses:\n\n{_format_clauses(labels)}\n\n"
+                    f"Document excerpt ({_format_pages(task.chunk)}):\n\n{task.chunk.text}"
+                )}
+            ]
+
+            def parse(content: str) -> Optional[List[List[Dict[str, Any]]]]:
+                findings = _parse_map_response(content, labels)
+                return None if findings is None else [findings]
+        else:
+            # One clause list shared by all excerpts; each excerpt names the clauses it is checked against
+            labels = {}
+            label_of = {}
+            for task in pack:
+                for requirement in task.requirements:
+                    if requirement.id not in label_of:
+                        label_of[requirement.id] = f"C{len(labels) + 1}"
+                        labels[label_of[requirement.id]] = requirement
+            excerpt_labels = {
+                f"E{number}": {label_of[requirement.id]: requirement for requirement in task.requirements}
+                for number, task in enumerate(pack, 1)
+            }
+            excerpts = "\n\n".join(
+                f"[{excerpt}] ({_format_pages(task.chunk)}; check clauses {', '.join(excerpt_labels[excerpt])}):\n\n{task.chunk.text}"
+                for excerpt, task in zip(excerpt_labels, pack)
+            )
+            messages = [
+                {'role': 'system', 'content': MAP_PACKED_SYSTEM_PROMPT},
+                {'role': 'user', 'content': f"Regulatory clauses:\n\n{_format_clauses(labels)}\n\nDocument excerpts:\n\n{excerpts}"}
+            ]
+
+            def parse(content: str) -> Optional[List[List[Dict[str, Any]]]]:
+                findings = _parse_packed_response(content, excerpt_labels)
+                return None if findings is None else [findings[excerpt] for excerpt in excerpt_labels]
+
+        chunk_indexes = ", ".join(str(task.chunk.index) for task in pack)
+        last_error = "no providers"
+        for provider in providers:
+            async with self.limiter.slot(provider):
+                success, content, metadata = await router.generate_chat_completion(
+                    messages, provider=provider, use_fallback=False,
+                    max_tokens=MAP_MAX_TOKENS * len(pack), temperature=MAP_TEMPERATURE,
+                    queue_timeout=MAP_QUEUE_TIMEOUT_SECONDS,
+                    # Yields to interactive traffic and is shed when it queues too long
+                    priority=PRIORITY_BATCH,
+                    workload=MAP_WORKLOAD
+                )
+            if not success:
+                last_error = f"{provider}: {content}"
+                continue
+            findings = parse(content)
+            if findings is None:
+                last_error = f"{provider}: response was not valid findings JSON"
+                logger.warning(f"Unusable map response from '{provider}' for chunks {chunk_indexes}")
+                continue
+            return findings, metadata.get('model') or provider
+
+        raise RuntimeError(f"Chunks {chunk_indexes} failed on every provider ({last_error})")
+
+
+# Global gap analysis engine instance
+_gap_analysis_engine: Optional[GapAnalysisEngine] = None
+
+
+def get_gap_analysis_engine() -> GapAnalysisEngine:
+    """Get the process-wide gap analysis engine"""
+    global _gap_analysis_engine
+
+    if _gap_analysis_engine is None:
+        _gap_analysis_engine = GapAnalysisEngine()
+    return _gap_analysis_engine
+
+
+async def run_gap_analysis(session: AsyncSession, analysis: Analysis, report_progress: Callable[..., None]) -> Dict[str, Any]:
+    """AnalysisRunner for start_analysis_engine: map-reduce gap analysis with the global engine"""
+    return await get_gap_analysis_engine()(session, analysis, report_progress)
@@ -0,0 +1,352 @@
+"""
+In-process BM25 full-text index over RegulatoryRequirement for SQLite and tests.
+Mirrors the weighted PostgreSQL tsvector search used in production.
+"""
+
+import html
+import logging
+import math
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..database.models import RegulatoryRequirement
+
+logger = logging.getLogger(__name__)
+
+# Field weights, in the same order of importance as the tsvector weights (A, B, C)
+TITLE_WEIGHT = 3.0
+KEYWORDS_WEIGHT = 2.0
+TEXT_WEIGHT = 1.0
+
+# Standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SNIPPET_WORDS = 30
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+
+# Keeps section numbers such as "820.30" together
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+_WORD_RE = re.compile(r"\S+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or shall
+should that the their this to was were which will with
+""".split())
+
+
+def _stem(token: str) -> str:
+    """Very light English stemming (plurals only) so 'controls' matches 'control'"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split, drop stopwords and stem"""
+    return [_stem(token) for token in _TOKEN_RE.findall((text or "").lower()) if token not in STOPWORDS]
+
+
+def highlight_snippet(text: str, terms: Iterable[str], max_words: int = SNIPPET_WORDS) -> str:
+    """
+    Pick the window of ``max_words`` words with the most query terms and wrap
+    the matches in <mark> tags (the same markers ts_headline is configured with).
+    Text outside the markers is HTML-escaped.
+    """
+    terms = set(terms)
+    words = _WORD_RE.findall(text or "")
+    if not words:
+        return ""
+
+    matches = [any(token in terms for token in tokenize(word)) for word in words]
+    running = [0]
+    for matched in matches:
+        running.append(running[-1] + matched)
+    best_start = max(
+        range(max(1, len(words) - max_words + 1)),
+        key=lambda start: running[min(start + max_words, len(words))] - running[start]
+    )
+
+    window = []
+    for word, matched in zip(words[best_start:best_start + max_words], matches[best_start:best_start + max_words]):
+        word = html.escape(word)
+        window.append(f"{HIGHLIGHT_START}{word}{HIGHLIGHT_STOP}" if matched else word)
+
+    snippet = " ".join(window)
+    if best_start > 0:
+        snippet = "... " + snippet
+    if best_start + max_words < len(words):
+        snippet += " ..."
+    return snippet
+
+
+class RequirementFullTextIndex:
+    """
+    BM25 inverted index over requirement title, keywords and text.
+
+    Term frequencies are field-weighted (title > keywords > text) before BM25
+    saturation, so a title hit outranks a body hit like tsvector weights do.
+    Postings are per-term dicts compiled lazily into NumPy arrays, which makes
+    scoring a handful of vectorized operations per query term. All query terms
+    must match (the same AND semantics as websearch_to_tsquery). Updates are
+    incremental: rows are replaced in place and freed rows are reused.
+    """
+
+    def __init__(self):
+        # Incremental-sync bookkeeping used by RegulatoryKnowledgeService
+        self.built = False
+        self.watermark = None
+        self.last_sync = 0.0
+
+        self._lock = threading.RLock()
+        self._stale: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._reset_storage()
+
+    def reset(self):
+        """Drop every document"""
+        with self._lock:
+            self._reset_storage()
+            self.built = False
+            self.watermark = None
+
+    def upsert(self, requirements: Iterable[RegulatoryRequirement]):
+        """Index or re-index requirements"""
+        with self._lock:
+            for requirement in requirements:
+                requirement_id = str(requirement.id)
+                row = self._rows.get(requirement_id)
+                if row is None:
+                    row = self._allocate_row(requirement_id)
+                else:
+                    self._drop_terms(row)
+
+                frequencies: Dict[str, float] = {}
+                for weight, text in (
+                    (TITLE_WEIGHT, requirement.title),
+                    (KEYWORDS_WEIGHT, " ".join(str(keyword) for keyword in requirement.keywords or [])),
+                    (TEXT_WEIGHT, requirement.requirement_text)
+                ):
+                    for token in tokenize(text):
+                        frequencies[token] = frequencies.get(token, 0.0) + weight
+
+                for token, frequency in frequencies.items():
+                    self._postings.setdefault(token, {})[row] = frequency
+                    self._compiled.pop(token, None)
+                self._row_terms[row] = frequencies
+                self._lengths[row] = sum(frequencies.values())
+                self._total_length += self._lengths[row]
+                self._standard[row] = self._code(
+                    self._standard_codes, requirement.standard.value if requirement.standard else None
+                )
+                self._category[row] = self._code(self._category_codes, requirement.category)
+                self._current[row] = bool(requirement.is_current)
+                self._alive[row] = True
+
+    def remove(self, requirement_ids: Iterable[str]):
+        """Remove documents; their rows are reused by later inserts"""
+        with self._lock:
+            for requirement_id in requirement_ids:
+                row = self._rows.pop(requirement_id, None)
+                if row is None:
+                    continue
+                self._drop_terms(row)
+                self._alive[row] = False
+                self._ids[row] = None
+                self._free_rows.append(row)
+
+    def mark_stale(self, requirement_ids: Iterable[str]):
+        """Queue requirements for re-indexing on the next sync"""
+        with self._lock:
+            for requirement_id in requirement_ids:
+                self._stale.add(requirement_id)
+                self._removed.discard(requirement_id)
+
+    def mark_removed(self, requirement_ids: Iterable[str]):
+        """Queue requirements for removal on the next sync"""
+        with self._lock:
+            for requirement_id in requirement_ids:
+                self._removed.add(requirement_id)
+                self._stale.discard(requirement_id)
+
+    def take_pending(self) -> Tuple[Set[str], Set[str]]:
+        """Pop the (stale, removed) requirement ids queued since the last sync"""
+        with self._lock:
+            stale, removed = self._stale, self._removed
+            self._stale, self._removed = set(), set()
+            return stale, removed
+
+    @property
+    def size(self) -> int:
+        return len(self._rows)
+
+    def ids(self) -> Set[str]:
+        with self._lock:
+            return set(self._rows)
+
+    def search(
+        self,
+        query: str,
+        k: int = 20,
+        standard: Optional[str] = None,
+        category: Optional[str] = None,
+        current_only: bool = True,
+        match_all: bool = True
+    ) -> Tuple[List[Tuple[str, float]], List[str]]:
+        """
+        Rank requirements matching the query terms by BM25
+
+        Args:
+            query: Free-text query
+            k: Number of results
+            standard: Only requirements of this standard
+            category: Only requirements in this category
+            current_only: Skip superseded requirements
+            match_all: Require every term (False ranks any match, e.g. for
+                       passage-length queries)
+
+        Returns:
+            ((requirement_id, score) pairs best first, normalized query terms)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if not terms or self.size == 0 or k <= 0:
+                return [], terms
+
+            count = len(self._ids)
+            average_length = self._total_length / self.size
+            scores = np.zeros(count, dtype=np.float32)
+            matched = np.zeros(count, dtype=np.int32)
+            for term in terms:
+                postings = self._compile(term)
+                if postings is None:
+                    if match_all:
+                        return [], terms
+                    continue
+                docs, frequencies = postings
+                idf = math.log(1.0 + (self.size - docs.size + 0.5) / (docs.size + 0.5))
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._lengths[docs] / average_length)
+                scores[docs] += idf * frequencies * (BM25_K1 + 1.0) / (frequencies + norm)
+                matched[docs] += 1
+
+            mask = (matched == len(terms) if match_all else matched > 0) & self._alive[:count]
+            if standard is not None:
+                mask &= self._standard[:count] == self._standard_codes.get(standard, -2)
+            if category is not None:
+                mask &= self._category[:count] == self._category_codes.get(category, -2)
+            if current_only:
+                mask &= self._current[:count]
+
+            candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                return [], terms
+            candidate_scores = scores[candidates]
+            top = min(k, candidates.size)
+            best = np.argpartition(-candidate_scores, top - 1)[:top]
+            best = best[np.argsort(-candidate_scores[best])]
+            return [(self._ids[candidates[i]], float(candidate_scores[i])) for i in best], terms
+
+    def get_status(self):
+        """Get index size for monitoring"""
+        with self._lock:
+            return {
+                'documents': self.size,
+                'terms': len(self._postings),
+                'pending_updates': len(self._stale) + len(self._removed),
+                'built': self.built
+            }
+
+    # ------------------------------------------------------------------
+    # Internals (lock held)
+    # ------------------------------------------------------------------
+
+    def _reset_storage(self):
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._row_terms: Dict[int, Dict[str, float]] = {}
+        self._total_length = 0.0
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._standard = np.zeros(0, dtype=np.int32)
+        self._category = np.zeros(0, dtype=np.int32)
+        self._current = np.zeros(0, dtype=bool)
+        self._alive = np.zeros(0, dtype=bool)
+        self._standard_codes: Dict[Optional[str], int] = {}
+        self._category_codes: Dict[Optional[str], int] = {}
+
+    @staticmethod
+    def _code(codes: Dict[Optional[str], int], value: Optional[str]) -> int:
+        return codes.setdefault(value, len(codes))
+
+    def _allocate_row(self, requirement_id: str) -> int:
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._ids[row] = requirement_id
+        else:
+            row = len(self._ids)
+            self._ids.append(requirement_id)
+            if row >= self._lengths.shape[0]:
+                capacity = max(16, self._lengths.shape[0] * 2)
+                self._lengths = _grow(self._lengths, capacity)
+                self._standard = _grow(self._standard, capacity)
+                self._category = _grow(self._category, capacity)
+                self._current = _grow(self._current, capacity)
+                self._alive = _grow(self._alive, capacity)
+        self._rows[requirement_id] = row
+        return row
+
+    def _drop_terms(self, row: int):
+        for token in self._row_terms.pop(row, {}):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self._postings[token]
+            self._compiled.pop(token, None)
+        self._total_length -= float(self._lengths[row])
+        self._lengths[row] = 0.0
+
+    def _compile(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Postings of one term as (rows, weighted frequencies) arrays"""
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            compiled = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+
+def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+_fulltext_index: Optional[RequirementFullTextIndex] = None
+_fulltext_index_lock = threading.Lock()
+
+
+def get_fulltext_index() -> RequirementFullTextIndex:
+    """Get the process-wide full-text index (singleton pattern)"""
+    global _fulltext_index
+
+    if _fulltext_index is None:
+        with _fulltext_index_lock:
+            if _fulltext_index is None:
+                from .requirement_index import track_requirement_changes
+                _fulltext_index = RequirementFullTextIndex()
+                track_requirement_changes(_fulltext_index)
+    return _fulltext_index
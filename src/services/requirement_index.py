@@ -0,0 +1,398 @@
+"""
+In-process vector index over RegulatoryRequirement text for retrieval-augmented analysis.
+Exact NumPy search for small corpora, inverted-file (IVF) search for large ones.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..database.models import RegulatoryRequirement
+
+logger = logging.getLogger(__name__)
+
+# Corpora up to this size are searched exactly; above it an IVF index is trained
+EXACT_SEARCH_MAX_ROWS = 5000
+# Minimum inverted lists probed per query; at least a tenth of the lists are always probed
+IVF_MIN_NPROBE = 8
+# Retrain the IVF centroids once the corpus has grown by this factor since training
+IVF_RETRAIN_GROWTH = 2.0
+# Compact the matrix once this fraction of rows are tombstones
+COMPACT_TOMBSTONE_RATIO = 0.25
+
+
+def requirement_embedding_text(requirement: RegulatoryRequirement) -> str:
+    """Text embedded for a requirement: title, body and keywords"""
+    parts = [requirement.title or "", requirement.requirement_text or ""]
+    if requirement.keywords:
+        parts.append("Keywords: " + ", ".join(str(keyword) for keyword in requirement.keywords))
+    return "\n".join(part for part in parts if part)
+
+
+class RequirementVectorIndex:
+    """
+    Cosine-similarity index over requirement embeddings with metadata filters.
+
+    Vectors are L2-normalized rows of one float32 matrix; standard, category
+    and is_current live in parallel arrays so filters are a vectorized mask.
+    Up to ``exact_max_rows`` rows every query is an exact matrix-vector
+    product. Beyond that, spherical k-means centroids partition the rows and
+    a query only scores the ``nprobe`` closest partitions, a tenth of them by
+    default, falling back to an exact scan when filters leave too few
+    candidates there.
+
+    Updates are incremental: ``upsert`` overwrites or appends rows and assigns
+    them to the nearest existing centroid, ``remove`` tombstones them. The
+    centroids are retrained only when the corpus has doubled.
+    """
+
+    def __init__(
+        self,
+        exact_max_rows: int = EXACT_SEARCH_MAX_ROWS,
+        nprobe: Optional[int] = None,
+        seed: int = 0
+    ):
+        self.exact_max_rows = exact_max_rows
+        self.nprobe = nprobe
+        self.seed = seed
+        self.embedding_space: Optional[str] = None
+        self.dimensions: Optional[int] = None
+        # Incremental-sync bookkeeping used by RegulatoryKnowledgeService
+        self.built = False
+        self.watermark = None
+        self.last_sync = 0.0
+
+        self._lock = threading.RLock()
+        self._stale: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._reset_storage()
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+
+    def reset(self):
+        """Drop every vector (e.g. after the embedding model changed)"""
+        with self._lock:
+            self._reset_storage()
+            self.embedding_space = None
+            self.dimensions = None
+            self.built = False
+            self.watermark = None
+
+    def upsert(self, items: Iterable[Tuple[str, List[float], Optional[str], Optional[str], bool]], embedding_space: str):
+        """
+        Insert or replace rows
+
+        Args:
+            items: (requirement_id, embedding, standard, category, is_current) tuples
+            embedding_space: Identifier of the model that produced the embeddings
+        """
+        items = list(items)
+        if not items:
+            return
+
+        vectors = _normalize(np.asarray([item[1] for item in items], dtype=np.float32))
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                self.embedding_space = embedding_space
+                self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+            elif embedding_space != self.embedding_space or vectors.shape[1] != self.dimensions:
+                raise ValueError(
+                    f"Embedding space '{embedding_space}' ({vectors.shape[1]} dims) does not match "
+                    f"index '{self.embedding_space}' ({self.dimensions} dims)"
+                )
+
+            for (requirement_id, _, standard, category, is_current), vector in zip(items, vectors):
+                row = self._rows.get(requirement_id)
+                if row is None:
+                    row = self._append_row(requirement_id)
+                self._vectors[row] = vector
+                self._standard[row] = self._code(self._standard_codes, standard)
+                self._category[row] = self._code(self._category_codes, category)
+                self._current[row] = bool(is_current)
+                self._alive[row] = True
+
+            if self._centroids is not None:
+                rows = np.fromiter((self._rows[item[0]] for item in items), dtype=np.int64, count=len(items))
+                self._assignments[rows] = np.argmax(vectors @ self._centroids.T, axis=1)
+
+            live = self.size
+            if live > self.exact_max_rows and (
+                self._centroids is None or live > self._trained_rows * IVF_RETRAIN_GROWTH
+            ):
+                self._train_ivf()
+
+    def remove(self, requirement_ids: Iterable[str]):
+        """Tombstone rows; the matrix is compacted once enough have accumulated"""
+        with self._lock:
+            for requirement_id in requirement_ids:
+                row = self._rows.pop(requirement_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    self._ids[row] = None
+            if self._count and (self._count - self.size) / self._count > COMPACT_TOMBSTONE_RATIO:
+                self._compact()
+
+    def mark_stale(self, requirement_ids: Iterable[str]):
+        """Queue requirements for re-embedding on the next sync"""
+        with self._lock:
+            for requirement_id in requirement_ids:
+                self._stale.add(requirement_id)
+                self._removed.discard(requirement_id)
+
+    def mark_removed(self, requirement_ids: Iterable[str]):
+        """Queue requirements for removal on the next sync"""
+        with self._lock:
+            for requirement_id in requirement_ids:
+                self._removed.add(requirement_id)
+                self._stale.discard(requirement_id)
+
+    def take_pending(self) -> Tuple[Set[str], Set[str]]:
+        """Pop the (stale, removed) requirement ids queued since the last sync"""
+        with self._lock:
+            stale, removed = self._stale, self._removed
+            self._stale, self._removed = set(), set()
+            return stale, removed
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    @property
+    def size(self) -> int:
+        return len(self._rows)
+
+    def ids(self) -> Set[str]:
+        with self._lock:
+            return set(self._rows)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int = 10,
+        standard: Optional[str] = None,
+        category: Optional[str] = None,
+        current_only: bool = True
+    ) -> List[Tuple[str, float]]:
+        """
+        Find the k most similar requirements
+
+        Args:
+            query_embedding: Query vector from the index's embedding space
+            k: Number of results
+            standard: Only requirements of this standard
+            category: Only requirements in this category
+            current_only: Skip superseded requirements
+
+        Returns:
+            (requirement_id, cosine similarity) pairs, best first
+        """
+        query = _normalize(np.asarray([query_embedding], dtype=np.float32))[0]
+        with self._lock:
+            if self.size == 0 or k <= 0:
+                return []
+            if query.shape[0] != self.dimensions:
+                raise ValueError(f"Query has {query.shape[0]} dimensions, index has {self.dimensions}")
+
+            count = self._count
+            mask = self._alive[:count].copy()
+            if standard is not None:
+                mask &= self._standard[:count] == self._standard_codes.get(standard, -2)
+            if category is not None:
+                mask &= self._category[:count] == self._category_codes.get(category, -2)
+            if current_only:
+                mask &= self._current[:count]
+
+            candidates = None
+            if self._centroids is not None and np.count_nonzero(mask) > self.exact_max_rows:
+                probes = np.argsort(-(self._centroids @ query))[:self._nprobe()]
+                probe_mask = mask & np.isin(self._assignments[:count], probes)
+                if np.count_nonzero(probe_mask) >= k:
+                    candidates = np.flatnonzero(probe_mask)
+            if candidates is None:
+                candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                return []
+
+            scores = self._vectors[candidates] @ query
+            top = min(k, candidates.size)
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            return [(self._ids[candidates[i]], float(scores[i])) for i in best]
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get index shape and mode for monitoring"""
+        with self._lock:
+            return {
+                'vectors': self.size,
+                'tombstones': self._count - self.size,
+                'dimensions': self.dimensions,
+                'embedding_space': self.embedding_space,
+                'mode': 'ivf' if self._centroids is not None else 'exact',
+                'ivf_lists': 0 if self._centroids is None else len(self._centroids),
+                'nprobe': self._nprobe() if self._centroids is not None else None,
+                'pending_updates': len(self._stale) + len(self._removed),
+                'built': self.built
+            }
+
+    # ------------------------------------------------------------------
+    # Internals (lock held)
+    # ------------------------------------------------------------------
+
+    def _reset_storage(self):
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._count = 0
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._standard = np.zeros(0, dtype=np.int32)
+        self._category = np.zeros(0, dtype=np.int32)
+        self._current = np.zeros(0, dtype=bool)
+        self._alive = np.zeros(0, dtype=bool)
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._standard_codes: Dict[Optional[str], int] = {}
+        self._category_codes: Dict[Optional[str], int] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_rows = 0
+
+    def _nprobe(self) -> int:
+        if self.nprobe:
+            return self.nprobe
+        return max(IVF_MIN_NPROBE, len(self._centroids) // 10)
+
+    @staticmethod
+    def _code(codes: Dict[Optional[str], int], value: Optional[str]) -> int:
+        return codes.setdefault(value, len(codes))
+
+    def _append_row(self, requirement_id: str) -> int:
+        row = self._count
+        if row >= self._vectors.shape[0]:
+            capacity = max(16, self._vectors.shape[0] * 2)
+            self._vectors = _grow(self._vectors, capacity)
+            self._standard = _grow(self._standard, capacity)
+            self._category = _grow(self._category, capacity)
+            self._current = _grow(self._current, capacity)
+            self._alive = _grow(self._alive, capacity)
+            self._assignments = _grow(self._assignments, capacity)
+        self._ids.append(requirement_id)
+        self._rows[requirement_id] = row
+        self._count += 1
+        return row
+
+    def _compact(self):
+        """Drop tombstoned rows"""
+        keep = np.flatnonzero(self._alive[:self._count])
+        self._vectors = self._vectors[keep].copy()
+        self._standard = self._standard[keep].copy()
+        self._category = self._category[keep].copy()
+        self._current = self._current[keep].copy()
+        self._alive = self._alive[keep].copy()
+        self._assignments = self._assignments[keep].copy()
+        self._ids = [self._ids[row] for row in keep]
+        self._rows = {requirement_id: row for row, requirement_id in enumerate(self._ids)}
+        self._count = len(self._ids)
+
+    def _train_ivf(self, iterations: int = 10):
+        """Spherical k-means over (a sample of) live rows, then assign every row"""
+        live = np.flatnonzero(self._alive[:self._count])
+        n_lists = max(1, int(np.sqrt(live.size)))
+        rng = np.random.default_rng(self.seed)
+        sample = live if live.size <= n_lists * 64 else rng.choice(live, n_lists * 64, replace=False)
+        data = self._vectors[sample]
+
+        centroids = data[rng.choice(data.shape[0], n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            empty = ~sums.any(axis=1)
+            # Re-seed empty lists with random points so no centroid goes dead
+            sums[empty] = data[rng.choice(data.shape[0], int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        self._centroids = centroids
+        self._assignments[:self._count] = np.argmax(self._vectors[:self._count] @ centroids.T, axis=1)
+        self._trained_rows = live.size
+        logger.info(f"Trained requirement IVF index: {n_lists} lists over {live.size} vectors")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+# ============================================================================
+# PROCESS-WIDE INDEX AND CHANGE TRACKING
+# ============================================================================
+
+_requirement_index: Optional[RequirementVectorIndex] = None
+_requirement_index_lock = threading.Lock()
+# Process-wide indexes notified of committed requirement changes
+_tracked_indexes: List[Any] = []
+
+
+def track_requirement_changes(index: Any):
+    """Register an index (anything with mark_stale/mark_removed) for change notifications"""
+    _tracked_indexes.append(index)
+
+
+def get_requirement_index() -> RequirementVectorIndex:
+    """Get the process-wide requirement index (singleton pattern)"""
+    global _requirement_index
+
+    if _requirement_index is None:
+        with _requirement_index_lock:
+            if _requirement_index is None:
+                _requirement_index = RequirementVectorIndex()
+                track_requirement_changes(_requirement_index)
+    return _requirement_index
+
+
+def setup_index_listeners():
+    """
+    Track RegulatoryRequirement writes so the index is refreshed incrementally.
+
+    Changed ids are collected per flush and handed to the index only when the
+    transaction commits; rolled-back changes are discarded. Writes made by
+    other processes are picked up by the updated_at watermark check in
+    RegulatoryKnowledgeService's index sync.
+    """
+
+    @event.listens_for(Session, 'after_flush')
+    def collect_requirement_changes(session, flush_context):
+        changes = session.info.setdefault('requirement_index_changes', {'upserted': set(), 'removed': set()})
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, RegulatoryRequirement) and obj.id is not None:
+                changes['upserted'].add(str(obj.id))
+        for obj in session.deleted:
+            if isinstance(obj, RegulatoryRequirement) and obj.id is not None:
+                changes['removed'].add(str(obj.id))
+                changes['upserted'].discard(str(obj.id))
+
+    @event.listens_for(Session, 'after_commit')
+    def publish_requirement_changes(session):
+        changes = session.info.pop('requirement_index_changes', None)
+        if changes:
+            for index in _tracked_indexes:
+                index.mark_stale(changes['upserted'])
+                index.mark_removed(changes['removed'])
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def discard_requirement_changes(session, previous_transaction):
+        session.info.pop('requirement_index_changes', None)
+
+
+# Initialize change tracking
+setup_index_listeners()
@@ -4,29 +4,134 @@ Provides integration with Anthropic's Claude models
 """
 import os
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator, AsyncIterator
 
 try:
-    from anthropic import Anthropic
+    from anthropic import Anthropic, AsyncAnthropic
     ANTHROPIC_AVAILABLE = True
 except ImportError:
     ANTHROPIC_AVAILABLE = False
 
 from .base import BaseAIClient
+from .async_base import AsyncBaseAIClient
+from ..rate_limiter import rate_limit_from_error
+from ..http_transport import create_async_http_client, get_http_client
 
 logger = logging.getLogger(__name__)
 
+ANTHROPIC_API_HOST = "api.anthropic.com"
+
+
+def _build_messages_request(
+    messages: List[Dict[str, str]],
+    max_tokens: Optional[int],
+    temperature: float,
+    model: str,
+    **kwargs
+) -> Dict[str, Any]:
+    """Convert OpenAI-style messages into messages.create parameters"""
+    # Convert messages to Claude format
+    system_message = ""
+    claude_messages = []
+    
+    for message in messages:
+        role = message.get('role', 'user')
+        content = message.get('content', '')
+        
+        if role == 'system':
+            system_message = content
+        elif role in ['user', 'assistant']:
+            claude_messages.append({
+                "role": role,
+                "content": content
+            })
+    
+    # Prepare request parameters
+    request_params = {
+        "model": model,
+        "messages": claude_messages,
+        "max_tokens": max_tokens or 2048,
+        "temperature": temperature,
+    }
+    
+    # Add system message if present
+    if system_message:
+        request_params["system"] = system_message
+    
+    # Add any additional parameters
+    request_params.update(kwargs)
+    return request_params
+
+
+def _parse_messages_response(response, model: str) -> Tuple[bool, str, Dict[str, Any]]:
+    """Extract content and metadata from a messages.create response"""
+    if response.content and len(response.content) > 0:
+        # Claude returns content as a list of content blocks
+        content = ""
+        for content_block in response.content:
+            if hasattr(content_block, 'text'):
+                content += content_block.text
+        
+        metadata = {
+            "model": response.model,
+            "stop_reason": response.stop_reason,
+            "input_tokens": response.usage.input_tokens if response.usage else 0,
+            "output_tokens": response.usage.output_tokens if response.usage else 0,
+            "response_id": response.id,
+        }
+        
+        return True, content, metadata
+    
+    return False, "No response generated", {"model": model}
+
+
+def _apply_stream_event(event, metadata: Dict[str, Any]) -> str:
+    """Record metadata from a streamed messages event and return its text delta"""
+    event_type = getattr(event, "type", None)
+    
+    if event_type == "message_start":
+        message = event.message
+        metadata["model"] = message.model
+        metadata["response_id"] = message.id
+        metadata["input_tokens"] = message.usage.input_tokens if message.usage else 0
+    elif event_type == "content_block_delta":
+        return getattr(event.delta, "text", "") or ""
+    elif event_type == "message_delta":
+        metadata["stop_reason"] = getattr(event.delta, "stop_reason", None)
+        usage = getattr(event, "usage", None)
+        metadata["output_tokens"] = usage.output_tokens if usage else 0
+    
+    return ""
+
+
+def _friendly_error(error: Exception) -> str:
+    """Map common Anthropic errors to user-facing messages"""
+    error_msg = str(error)
+    
+    if "rate_limit" in error_msg.lower():
+        error_msg = "Rate limit exceeded. Please try again later."
+    elif "insufficient_quota" in error_msg.lower():
+        error_msg = "API quota exceeded. Please check your Anthropic billing."
+    elif "invalid_api_key" in error_msg.lower():
+        error_msg = "Invalid API key. Please check your Anthropic configuration."
+    elif "overloaded" in error_msg.lower():
+        error_msg = "Service temporarily overloaded. Please try again."
+    
+    return error_msg
+
 
 class AnthropicClient(BaseAIClient):
     """Anthropic Claude API client implementation"""
     
+    default_chat_model = "claude-3-sonnet-20240229"
+    
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("AI_PROVIDERS_ANTHROPIC_API_KEY")
         self.client = None
         
         if self.api_key and ANTHROPIC_AVAILABLE:
             try:
-                self.client = Anthropic(api_key=self.api_key)
+                self.client = Anthropic(api_key=self.api_key, http_client=get_http_client(ANTHROPIC_API_HOST))
                 logger.info("Anthropic client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Anthropic client: {e}")
@@ -67,80 +172,58 @@ class AnthropicClient(BaseAIClient):
             return False, "Anthropic client not available", {}
         
         try:
-            # Convert messages to Claude format
-            system_message = ""
-            claude_messages = []
-            
-            for message in messages:
-                role = message.get('role', 'user')
-                content = message.get('content', '')
-                
-                if role == 'system':
-                    system_message = content
-                elif role in ['user', 'assistant']:
-                    claude_messages.append({
-                        "role": role,
-                        "content": content
-                    })
-            
-            # Prepare request parameters
-            request_params = {
-                "model": model,
-                "messages": claude_messages,
-                "max_tokens": max_tokens or 2048,
-                "temperature": temperature,
-            }
-            
-            # Add system message if present
-            if system_message:
-                request_params["system"] = system_message
-            
-            # Add any additional parameters
-            request_params.update(kwargs)
+            request_params = _build_messages_request(messages, max_tokens, temperature, model, **kwargs)
             
             # Make API call
             response = self.client.messages.create(**request_params)
-            
-            # Extract response content
-            if response.content and len(response.content) > 0:
-                # Claude returns content as a list of content blocks
-                content = ""
-                for content_block in response.content:
-                    if hasattr(content_block, 'text'):
-                        content += content_block.text
-                
-                # Extract metadata
-                metadata = {
-                    "model": response.model,
-                    "stop_reason": response.stop_reason,
-                    "input_tokens": response.usage.input_tokens if response.usage else 0,
-                    "output_tokens": response.usage.output_tokens if response.usage else 0,
-                    "response_id": response.id,
-                }
-                
-                return True, content, metadata
-            else:
-                return False, "No response generated", {"model": model}
+            return _parse_messages_response(response, model)
                 
         except Exception as e:
             logger.error(f"Anthropic API error: {e}")
-            error_msg = str(e)
-            
-            # Handle specific Anthropic errors
-            if "rate_limit" in error_msg.lower():
-                error_msg = "Rate limit exceeded. Please try again later."
-            elif "insufficient_quota" in error_msg.lower():
-                error_msg = "API quota exceeded. Please check your Anthropic billing."
-            elif "invalid_api_key" in error_msg.lower():
-                error_msg = "Invalid API key. Please check your Anthropic configuration."
-            elif "overloaded" in error_msg.lower():
-                error_msg = "Service temporarily overloaded. Please try again."
-            
-            return False, f"Anthropic API error: {error_msg}", {
+            return False, f"Anthropic API error: {_friendly_error(e)}", {
                 "model": model, 
-                "error": str(e)
+                "error": str(e),
+                "rate_limit": rate_limit_from_error(e)
             }
     
+    def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "claude-3-sonnet-20240229",
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the Anthropic Claude API token by token
+        
+        Yields:
+            Stream events (see BaseAIClient.stream_chat_completion)
+        """
+        if not self.is_available():
+            yield {"type": "error", "error": "Anthropic client not available", "metadata": {}}
+            return
+        
+        metadata = {"model": model}
+        try:
+            request_params = _build_messages_request(messages, max_tokens, temperature, model, **kwargs)
+            stream = self.client.messages.create(stream=True, **request_params)
+            try:
+                for event in stream:
+                    content = _apply_stream_event(event, metadata)
+                    if content:
+                        yield {"type": "token", "content": content}
+            finally:
+                # Release the HTTP connection even if the consumer stops early
+                stream.response.close()
+            yield {"type": "done", "metadata": metadata}
+                
+        except Exception as e:
+            logger.error(f"Anthropic streaming API error: {e}")
+            metadata["error"] = str(e)
+            metadata["rate_limit"] = rate_limit_from_error(e)
+            yield {"type": "error", "error": f"Anthropic API error: {_friendly_error(e)}", "metadata": metadata}
+    
     def generate_embedding(
         self, 
         text: str, 
@@ -162,7 +245,7 @@ class AnthropicClient(BaseAIClient):
     
     def get_supported_features(self) -> List[str]:
         """Get supported features for Claude"""
-        return ['chat_completion']  # No embedding support
+        return ['chat_completion', 'streaming']  # No embedding support
     
     def get_available_models(self) -> List[str]:
         """Get available Claude models"""
@@ -173,4 +256,136 @@ class AnthropicClient(BaseAIClient):
             "claude-2.1",
             "claude-2.0",
             "claude-instant-1.2"
-        ]
\ No newline at end of file
+        ]
+
+
+class AsyncAnthropicClient(AsyncBaseAIClient):
+    """Anthropic Claude API client implementation on the asyncio SDK client"""
+    
+    default_chat_model = "claude-3-sonnet-20240229"
+    
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("AI_PROVIDERS_ANTHROPIC_API_KEY")
+        self.client = None
+        
+        if self.api_key and ANTHROPIC_AVAILABLE:
+            try:
+                self.client = AsyncAnthropic(
+                    api_key=self.api_key,
+                    http_client=create_async_http_client(ANTHROPIC_API_HOST)
+                )
+                logger.info("Async Anthropic client initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize async Anthropic client: {e}")
+                self.client = None
+        elif not ANTHROPIC_AVAILABLE:
+            logger.warning("Anthropic library not available")
+    
+    def is_available(self) -> bool:
+        """Check if Anthropic client is properly configured and available"""
+        return (
+            ANTHROPIC_AVAILABLE and 
+            self.api_key is not None and 
+            self.client is not None
+        )
+    
+    async def generate_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "claude-3-sonnet-20240229",
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Generate chat completion using Anthropic Claude API
+        
+        Args:
+            messages: List of message dictionaries
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            model: Claude model to use
+            **kwargs: Additional parameters
+            
+        Returns:
+            Tuple of (success, content, metadata)
+        """
+        if not self.is_available():
+            return False, "Anthropic client not available", {}
+        
+        try:
+            request_params = _build_messages_request(messages, max_tokens, temperature, model, **kwargs)
+            response = await self.client.messages.create(**request_params)
+            return _parse_messages_response(response, model)
+                
+        except Exception as e:
+            logger.error(f"Anthropic API error: {e}")
+            return False, f"Anthropic API error: {_friendly_error(e)}", {
+                "model": model, 
+                "error": str(e),
+                "rate_limit": rate_limit_from_error(e)
+            }
+    
+    async def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "claude-3-sonnet-20240229",
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the Anthropic Claude API token by token
+        
+        Yields:
+            Stream events (see AsyncBaseAIClient.stream_chat_completion)
+        """
+        if not self.is_available():
+            yield {"type": "error", "error": "Anthropic client not available", "metadata": {}}
+            return
+        
+        metadata = {"model": model}
+        try:
+            request_params = _build_messages_request(messages, max_tokens, temperature, model, **kwargs)
+            stream = await self.client.messages.create(stream=True, **request_params)
+            try:
+                async for event in stream:
+                    content = _apply_stream_event(event, metadata)
+                    if content:
+                        yield {"type": "token", "content": content}
+            finally:
+                # Release the HTTP connection even if the consumer stops early
+                await stream.response.aclose()
+            yield {"type": "done", "metadata": metadata}
+                
+        except Exception as e:
+            logger.error(f"Anthropic streaming API error: {e}")
+            metadata["error"] = str(e)
+            metadata["rate_limit"] = rate_limit_from_error(e)
+            yield {"type": "error", "error": f"Anthropic API error: {_friendly_error(e)}", "metadata": metadata}
+    
+    async def generate_embedding(
+        self, 
+        text: str, 
+        **kwargs
+    ) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """
+        Generate embeddings using Anthropic API
+        Note: Claude doesn't provide embedding APIs, so this returns an error
+        """
+        if not self.is_available():
+            return False, [], {"error": "Anthropic client not available"}
+        
+        return False, [], {
+            "error": "Embeddings not supported by Anthropic provider",
+            "model": "claude"
+        }
+    
+    async def aclose(self):
+        """Close the underlying HTTP connection pool"""
+        if self.client is not None:
+            await self.client.close()
+    
+    def get_supported_features(self) -> List[str]:
+        """Get supported features for Claude"""
+        return ['chat_completion', 'streaming']  # No embedding support
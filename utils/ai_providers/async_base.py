@@ -0,0 +1,219 @@
+"""
+Abstract base class for asyncio AI providers
+Defines the non-blocking contract used by the AsyncAIRouter
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from typing import List, Tuple, Dict, Any, Optional, AsyncIterator
+
+from .base import BaseAIClient
+
+
+class AsyncBaseAIClient(ABC):
+    """
+    Abstract base class defining the asyncio contract for all AI providers.
+    Mirrors BaseAIClient so sync and async providers are interchangeable
+    from the router's point of view; only the I/O methods are coroutines.
+    """
+
+    # Upper bounds for one generate_embeddings request (see BaseAIClient)
+    max_embedding_batch_size: int = 1
+    max_embedding_batch_tokens: int = 8191
+    default_embedding_model: Optional[str] = None
+    default_chat_model: Optional[str] = None
+
+    @abstractmethod
+    def is_available(self) -> bool:
+        """
+        Check if the AI provider is available and properly configured.
+
+        Returns:
+            bool: True if provider is ready to use, False otherwise
+        """
+        pass
+
+    @abstractmethod
+    async def generate_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Generate a chat completion response without blocking the event loop.
+
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            max_tokens: Maximum tokens to generate (optional)
+            temperature: Sampling temperature (0.0 to 2.0)
+            **kwargs: Additional provider-specific parameters
+
+        Returns:
+            Tuple containing:
+            - success (bool): Whether the request was successful
+            - content (str): Generated response or error message
+            - metadata (dict): Additional information (tokens used, model, etc.)
+        """
+        pass
+
+    @abstractmethod
+    async def generate_embedding(
+        self,
+        text: str,
+        **kwargs
+    ) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """
+        Generate vector embeddings for the given text without blocking the event loop.
+
+        Args:
+            text: Input text to generate embeddings for
+            **kwargs: Additional provider-specific parameters
+
+        Returns:
+            Tuple containing:
+            - success (bool): Whether the request was successful
+            - embedding (List[float]): Vector embedding or empty list on failure
+            - metadata (dict): Additional information (model, dimensions, etc.)
+        """
+        pass
+
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        **kwargs
+    ) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
+        """
+        Generate vector embeddings for several texts in one request.
+        The default embeds the texts concurrently with generate_embedding;
+        see BaseAIClient.generate_embeddings for the return contract.
+        """
+        results = await asyncio.gather(*(self.generate_embedding(text, **kwargs) for text in texts))
+        for success, _, metadata in results:
+            if not success:
+                return False, [], metadata
+        return True, [embedding for _, embedding, _ in results], results[-1][2] if results else {}
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion as it is generated.
+        Yields the same events as BaseAIClient.stream_chat_completion; the
+        default yields the full completion as a single token event.
+        """
+        success, content, metadata = await self.generate_chat_completion(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **kwargs
+        )
+        if not success:
+            yield {'type': 'error', 'error': content, 'metadata': metadata}
+            return
+        if content:
+            yield {'type': 'token', 'content': content}
+        yield {'type': 'done', 'metadata': metadata}
+
+    async def aclose(self):
+        """Release network resources held by the client"""
+        pass
+
+    def get_provider_name(self) -> str:
+        """Get the name of this AI provider"""
+        return self.__class__.__name__.replace('Async', '').replace('Client', '').lower()
+
+    def get_supported_features(self) -> List[str]:
+        """Get list of supported features for this provider"""
+        return ['chat_completion', 'embedding']
+
+
+class SyncClientAdapter(AsyncBaseAIClient):
+    """
+    Runs a synchronous BaseAIClient in a worker thread.
+    Used for providers (or environments) without a native asyncio transport,
+    so they can still take part in async routing.
+    """
+
+    def __init__(self, client: BaseAIClient):
+        self.client = client
+        self.max_embedding_batch_size = client.max_embedding_batch_size
+        self.max_embedding_batch_tokens = client.max_embedding_batch_tokens
+        self.default_embedding_model = client.default_embedding_model
+        self.default_chat_model = client.default_chat_model
+
+    def is_available(self) -> bool:
+        """Delegate availability to the wrapped client"""
+        return self.client.is_available()
+
+    async def generate_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """Run the wrapped client's chat completion in a thread"""
+        return await asyncio.to_thread(
+            self.client.generate_chat_completion,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **kwargs
+        )
+
+    async def generate_embedding(
+        self,
+        text: str,
+        **kwargs
+    ) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """Run the wrapped client's embedding call in a thread"""
+        return await asyncio.to_thread(self.client.generate_embedding, text=text, **kwargs)
+
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        **kwargs
+    ) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
+        """Run the wrapped client's batch embedding call in a thread"""
+        return await asyncio.to_thread(self.client.generate_embeddings, texts, **kwargs)
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Pull events from the wrapped client's stream one at a time in a thread"""
+        stream = self.client.stream_chat_completion(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **kwargs
+        )
+        try:
+            while True:
+                event = await asyncio.to_thread(next, stream, None)
+                if event is None:
+                    return
+                yield event
+        finally:
+            try:
+                stream.close()
+            except ValueError:
+                # Cancelled while a worker thread is still inside next(); the
+                # generator is finalized once that step returns
+                pass
+
+    def get_provider_name(self) -> str:
+        """Get the wrapped provider's name"""
+        return self.client.get_provider_name()
+
+    def get_supported_features(self) -> List[str]:
+        """Get the wrapped provider's supported features"""
+        return self.client.get_supported_features()
@@ -3,7 +3,7 @@ Abstract base class for AI providers
 Defines the contract that all AI provider implementations must follow
 """
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Iterator
 
 
 class BaseAIClient(ABC):
@@ -12,6 +12,15 @@ class BaseAIClient(ABC):
     This ensures consistent interfaces across different AI services.
     """
     
+    # Upper bounds for one generate_embeddings request; providers with a
+    # native batch endpoint raise these to their API limits
+    max_embedding_batch_size: int = 1
+    max_embedding_batch_tokens: int = 8191
+    # Model used by generate_embedding when none is passed (names the embedding space)
+    default_embedding_model: Optional[str] = None
+    # Model used by generate_chat_completion when none is passed (sizes the token budget)
+    default_chat_model: Optional[str] = None
+    
     @abstractmethod
     def is_available(self) -> bool:
         """
@@ -68,6 +77,74 @@ class BaseAIClient(ABC):
         """
         pass
     
+    def generate_embeddings(
+        self, 
+        texts: List[str], 
+        **kwargs
+    ) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
+        """
+        Generate vector embeddings for several texts in one request.
+        
+        Providers with a batch endpoint override this; the default embeds the
+        texts one at a time and fails as soon as one of them fails.
+        
+        Args:
+            texts: Input texts (at most max_embedding_batch_size of them)
+            **kwargs: Additional provider-specific parameters
+            
+        Returns:
+            Tuple containing:
+            - success (bool): Whether every text was embedded
+            - embeddings (List[List[float]]): One vector per input, in input order
+            - metadata (dict): Additional information (model, dimensions, etc.)
+        """
+        embeddings = []
+        metadata: Dict[str, Any] = {}
+        for text in texts:
+            success, embedding, metadata = self.generate_embedding(text, **kwargs)
+            if not success:
+                return False, [], metadata
+            embeddings.append(embedding)
+        return True, embeddings, metadata
+    
+    def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a chat completion as it is generated.
+        
+        Providers with native streaming override this; the default yields the
+        full completion as a single token event.
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            max_tokens: Maximum tokens to generate (optional)
+            temperature: Sampling temperature (0.0 to 2.0)
+            **kwargs: Additional provider-specific parameters
+            
+        Yields:
+            Event dictionaries:
+            - {'type': 'token', 'content': str} for each generated text delta
+            - {'type': 'done', 'metadata': dict} once the completion has finished
+            - {'type': 'error', 'error': str, 'metadata': dict} if generation failed
+        """
+        success, content, metadata = self.generate_chat_completion(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **kwargs
+        )
+        if not success:
+            yield {'type': 'error', 'error': content, 'metadata': metadata}
+            return
+        if content:
+            yield {'type': 'token', 'content': content}
+        yield {'type': 'done', 'metadata': metadata}
+    
     def get_provider_name(self) -> str:
         """Get the name of this AI provider"""
         return self.__class__.__name__.replace('Client', '').lower()
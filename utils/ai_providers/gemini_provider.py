@@ -4,7 +4,7 @@ Provides integration with Google's Gemini API for chat completions and embedding
 """
 import os
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator, AsyncIterator
 
 try:
     import google.generativeai as genai
@@ -14,13 +14,105 @@ except ImportError:
     GEMINI_AVAILABLE = False
 
 from .base import BaseAIClient
+from .async_base import AsyncBaseAIClient
 
 logger = logging.getLogger(__name__)
 
 
+def _format_messages_for_gemini(messages: List[Dict[str, str]]) -> str:
+    """
+    Convert OpenAI-style messages to Gemini prompt format
+    
+    Args:
+        messages: List of message dictionaries with 'role' and 'content'
+        
+    Returns:
+        Formatted prompt string
+    """
+    formatted_parts = []
+    
+    for message in messages:
+        role = message.get('role', 'user')
+        content = message.get('content', '')
+        
+        if role == 'system':
+            formatted_parts.append(f"System Instructions: {content}")
+        elif role == 'user':
+            formatted_parts.append(f"User: {content}")
+        elif role == 'assistant':
+            formatted_parts.append(f"Assistant: {content}")
+    
+    return "\n\n".join(formatted_parts)
+
+
+def _build_generation_options(max_tokens: Optional[int], temperature: float) -> Dict[str, Any]:
+    """Build generation and safety settings for generate_content"""
+    # Configure generation settings
+    generation_config = genai.types.GenerationConfig(
+        temperature=temperature,
+        max_output_tokens=max_tokens or 2048,
+    )
+    
+    # Configure safety settings to be less restrictive for regulatory content
+    safety_settings = {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    }
+    
+    return {
+        "generation_config": generation_config,
+        "safety_settings": safety_settings
+    }
+
+
+def _parse_generate_response(response) -> Tuple[bool, str, Dict[str, Any]]:
+    """Extract content and metadata from a generate_content response"""
+    # Check if response was blocked
+    if not response.candidates:
+        return False, "Response was blocked by safety filters", {
+            "model": "gemini-pro",
+            "error": "safety_filter"
+        }
+    
+    candidate = response.candidates[0]
+    if hasattr(candidate, 'content') and candidate.content.parts:
+        content = candidate.content.parts[0].text
+        
+        metadata = {
+            "model": "gemini-pro",
+            "finish_reason": getattr(candidate, 'finish_reason', None),
+            "safety_ratings": getattr(candidate, 'safety_ratings', []),
+            "prompt_tokens": getattr(response, 'usage_metadata', {}).get('prompt_token_count', 0),
+            "completion_tokens": getattr(response, 'usage_metadata', {}).get('candidates_token_count', 0),
+        }
+        
+        return True, content, metadata
+    
+    return False, "No content generated", {"model": "gemini-pro"}
+
+
+def _apply_stream_chunk(chunk, metadata: Dict[str, Any]) -> str:
+    """Record metadata from a streamed generate_content chunk and return its text"""
+    if not chunk.candidates:
+        return ""
+    
+    candidate = chunk.candidates[0]
+    finish_reason = getattr(candidate, 'finish_reason', None)
+    if finish_reason:
+        metadata["finish_reason"] = finish_reason
+    
+    if hasattr(candidate, 'content') and candidate.content.parts:
+        return "".join(getattr(part, 'text', '') for part in candidate.content.parts)
+    return ""
+
+
 class GeminiClient(BaseAIClient):
     """Google Gemini AI client implementation"""
     
+    default_chat_model = "gemini-pro"
+    
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("AI_PROVIDERS_GEMINI_API_KEY")
         self.model = None
@@ -71,55 +163,59 @@ class GeminiClient(BaseAIClient):
             # Gemini expects a single prompt, so we'll combine messages
             formatted_prompt = self._format_messages_for_gemini(messages)
             
-            # Configure generation settings
-            generation_config = genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens or 2048,
-            )
-            
-            # Configure safety settings to be less restrictive for regulatory content
-            safety_settings = {
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            }
-            
             # Generate response
             response = self.model.generate_content(
                 formatted_prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings
+                **_build_generation_options(max_tokens, temperature)
             )
-            
-            # Check if response was blocked
-            if not response.candidates:
-                return False, "Response was blocked by safety filters", {
-                    "model": "gemini-pro",
-                    "error": "safety_filter"
-                }
-            
-            candidate = response.candidates[0]
-            if hasattr(candidate, 'content') and candidate.content.parts:
-                content = candidate.content.parts[0].text
-                
-                # Extract metadata
-                metadata = {
-                    "model": "gemini-pro",
-                    "finish_reason": getattr(candidate, 'finish_reason', None),
-                    "safety_ratings": getattr(candidate, 'safety_ratings', []),
-                    "prompt_tokens": getattr(response, 'usage_metadata', {}).get('prompt_token_count', 0),
-                    "completion_tokens": getattr(response, 'usage_metadata', {}).get('candidates_token_count', 0),
-                }
-                
-                return True, content, metadata
-            else:
-                return False, "No content generated", {"model": "gemini-pro"}
+            return _parse_generate_response(response)
                 
         except Exception as e:
             logger.error(f"Gemini API error: {e}")
             return False, f"Gemini API error: {str(e)}", {"model": "gemini-pro", "error": str(e)}
     
+    def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the Gemini API chunk by chunk
+        
+        Yields:
+            Stream events (see BaseAIClient.stream_chat_completion)
+        """
+        if not self.is_available():
+            yield {"type": "error", "error": "Gemini client not available", "metadata": {}}
+            return
+        
+        metadata = {"model": "gemini-pro"}
+        try:
+            response = self.model.generate_content(
+                _format_messages_for_gemini(messages),
+                stream=True,
+                **_build_generation_options(max_tokens, temperature)
+            )
+            produced = False
+            for chunk in response:
+                content = _apply_stream_chunk(chunk, metadata)
+                if content:
+                    produced = True
+                    yield {"type": "token", "content": content}
+            
+            if not produced:
+                metadata["error"] = "safety_filter"
+                yield {"type": "error", "error": "Response was blocked by safety filters", "metadata": metadata}
+                return
+            yield {"type": "done", "metadata": metadata}
+                
+        except Exception as e:
+            logger.error(f"Gemini streaming API error: {e}")
+            metadata["error"] = str(e)
+            yield {"type": "error", "error": f"Gemini API error: {str(e)}", "metadata": metadata}
+    
     def generate_embedding(
         self, 
         text: str, 
@@ -142,30 +238,134 @@ class GeminiClient(BaseAIClient):
         }
     
     def _format_messages_for_gemini(self, messages: List[Dict[str, str]]) -> str:
+        """Convert OpenAI-style messages to Gemini prompt format"""
+        return _format_messages_for_gemini(messages)
+    
+    def get_supported_features(self) -> List[str]:
+        """Get supported features for Gemini"""
+        return ['chat_completion', 'streaming']  # Embedding support to be added later
+
+
+class AsyncGeminiClient(AsyncBaseAIClient):
+    """Google Gemini AI client implementation using the SDK's async generation API"""
+    
+    default_chat_model = "gemini-pro"
+    
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("AI_PROVIDERS_GEMINI_API_KEY")
+        self.model = None
+        
+        if self.api_key and GEMINI_AVAILABLE:
+            try:
+                genai.configure(api_key=self.api_key)
+                self.model = genai.GenerativeModel('gemini-pro')
+                logger.info("Async Gemini client initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize async Gemini client: {e}")
+                self.model = None
+        elif not GEMINI_AVAILABLE:
+            logger.warning("Google GenerativeAI library not available")
+    
+    def is_available(self) -> bool:
+        """Check if Gemini client is properly configured and available"""
+        return (
+            GEMINI_AVAILABLE and 
+            self.api_key is not None and 
+            self.model is not None
+        )
+    
+    async def generate_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
         """
-        Convert OpenAI-style messages to Gemini prompt format
+        Generate chat completion using Gemini API
         
         Args:
-            messages: List of message dictionaries with 'role' and 'content'
+            messages: List of message dictionaries
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            **kwargs: Additional parameters
             
         Returns:
-            Formatted prompt string
+            Tuple of (success, content, metadata)
+        """
+        if not self.is_available():
+            return False, "Gemini client not available", {}
+        
+        try:
+            response = await self.model.generate_content_async(
+                _format_messages_for_gemini(messages),
+                **_build_generation_options(max_tokens, temperature)
+            )
+            return _parse_generate_response(response)
+                
+        except Exception as e:
+            logger.error(f"Gemini API error: {e}")
+            return False, f"Gemini API error: {str(e)}", {"model": "gemini-pro", "error": str(e)}
+    
+    async def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the Gemini API chunk by chunk
+        
+        Yields:
+            Stream events (see AsyncBaseAIClient.stream_chat_completion)
         """
-        formatted_parts = []
+        if not self.is_available():
+            yield {"type": "error", "error": "Gemini client not available", "metadata": {}}
+            return
         
-        for message in messages:
-            role = message.get('role', 'user')
-            content = message.get('content', '')
+        metadata = {"model": "gemini-pro"}
+        try:
+            response = await self.model.generate_content_async(
+                _format_messages_for_gemini(messages),
+                stream=True,
+                **_build_generation_options(max_tokens, temperature)
+            )
+            produced = False
+            async for chunk in response:
+                content = _apply_stream_chunk(chunk, metadata)
+                if content:
+                    produced = True
+                    yield {"type": "token", "content": content}
             
-            if role == 'system':
-                formatted_parts.append(f"System Instructions: {content}")
-            elif role == 'user':
-                formatted_parts.append(f"User: {content}")
-            elif role == 'assistant':
-                formatted_parts.append(f"Assistant: {content}")
+            if not produced:
+                metadata["error"] = "safety_filter"
+                yield {"type": "error", "error": "Response was blocked by safety filters", "metadata": metadata}
+                return
+            yield {"type": "done", "metadata": metadata}
+                
+        except Exception as e:
+            logger.error(f"Gemini streaming API error: {e}")
+            metadata["error"] = str(e)
+            yield {"type": "error", "error": f"Gemini API error: {str(e)}", "metadata": metadata}
+    
+    async def generate_embedding(
+        self, 
+        text: str, 
+        **kwargs
+    ) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """
+        Generate embeddings using Gemini API
+        Note: Gemini embeddings are not implemented yet (see GeminiClient)
+        """
+        if not self.is_available():
+            return False, [], {"error": "Gemini client not available"}
         
-        return "\n\n".join(formatted_parts)
+        return False, [], {
+            "error": "Embeddings not supported by Gemini provider",
+            "model": "gemini-pro"
+        }
     
     def get_supported_features(self) -> List[str]:
         """Get supported features for Gemini"""
-        return ['chat_completion']  # Embedding support to be added later
\ No newline at end of file
+        return ['chat_completion', 'streaming']  # Embedding support to be added later
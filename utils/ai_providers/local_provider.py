@@ -2,10 +2,14 @@
 Local Fallback Provider Implementation
 Provides fallback responses when all external providers fail
 """
+import asyncio
+import os
 import logging
 from typing import List, Dict, Any, Tuple, Optional
 
 from .base import BaseAIClient
+from .async_base import AsyncBaseAIClient
+from ..local_embedding import DEFAULT_DIMENSIONS, get_local_embedder
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +20,18 @@ class LocalFallbackClient(BaseAIClient):
     This ensures the application never fails silently.
     """
     
-    def __init__(self):
+    # Embeddings are computed in-process, so batches are only bounded to keep memory in check
+    max_embedding_batch_size = 1000
+    max_embedding_batch_tokens = 1000000
+    
+    def __init__(self, embedding_dimensions: Optional[int] = None):
+        if embedding_dimensions is None:
+            embedding_dimensions = int(
+                os.getenv("AI_PROVIDERS_LOCAL_EMBEDDING_DIMENSIONS", DEFAULT_DIMENSIONS)
+            )
+        self.embedder = get_local_embedder(embedding_dimensions)
+        # Part of the embedding store namespace, so vectors of another size are never mixed in
+        self.default_embedding_model = self.embedder.model_name
         logger.info("Local fallback client initialized")
     
     def is_available(self) -> bool:
@@ -72,20 +87,49 @@ class LocalFallbackClient(BaseAIClient):
         **kwargs
     ) -> Tuple[bool, List[float], Dict[str, Any]]:
         """
-        Generate a dummy embedding vector
-        Note: This is not useful for actual semantic operations
+        Generate an embedding vector in-process from hashed n-gram features
+        
+        Args:
+            text: Input text
+            **kwargs: Ignored for local embeddings
+            
+        Returns:
+            Tuple of (success, embedding, metadata)
+        """
+        success, embeddings, metadata = self.generate_embeddings([text], **kwargs)
+        return success, embeddings[0] if success else [], metadata
+    
+    def generate_embeddings(
+        self, 
+        texts: List[str], 
+        **kwargs
+    ) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
         """
-        # Generate a dummy embedding of standard size (1536 dimensions like OpenAI)
-        dummy_embedding = [0.0] * 1536
+        Generate embedding vectors for several texts in one vectorized pass
+        
+        Vectors are only comparable with other vectors of the same model
+        (see default_embedding_model), not with a remote provider's.
+        
+        Args:
+            texts: Input texts
+            **kwargs: Ignored for local embeddings
+            
+        Returns:
+            Tuple of (success, embeddings, metadata)
+        """
+        try:
+            embeddings = self.embedder.embed(texts).tolist()
+        except Exception as e:
+            logger.error(f"Local embedding error: {e}")
+            return False, [], {"model": self.default_embedding_model, "provider": "local", "error": str(e)}
         
         metadata = {
-            "model": "local-fallback-embedding",
-            "provider": "local", 
-            "dimensions": 1536,
-            "warning": "This is a dummy embedding and should not be used for production"
+            "model": self.default_embedding_model,
+            "provider": "local",
+            "dimensions": self.embedder.dimensions,
+            "prompt_tokens": sum(self.embedder.count_tokens(text) for text in texts),
         }
-        
-        return True, dummy_embedding, metadata
+        return True, embeddings, metadata
     
     def _analyze_conversation_context(self, messages: List[Dict[str, str]]) -> str:
         """
@@ -183,8 +227,68 @@ class LocalFallbackClient(BaseAIClient):
     
     def get_supported_features(self) -> List[str]:
         """Get supported features for local fallback"""
-        return ['chat_completion', 'embedding']  # Basic support for both
+        return ['chat_completion', 'embedding']
+    
+    def get_provider_name(self) -> str:
+        """Get provider name"""
+        return "local_fallback"
+
+
+class AsyncLocalFallbackClient(AsyncBaseAIClient):
+    """
+    Asyncio variant of the local fallback client.
+    Responses are generated in-process; only multi-text embedding batches
+    are offloaded to a thread.
+    """
+    
+    max_embedding_batch_size = LocalFallbackClient.max_embedding_batch_size
+    max_embedding_batch_tokens = LocalFallbackClient.max_embedding_batch_tokens
+    
+    def __init__(self, embedding_dimensions: Optional[int] = None):
+        self._client = LocalFallbackClient(embedding_dimensions)
+        self.default_embedding_model = self._client.default_embedding_model
+    
+    def is_available(self) -> bool:
+        """Local fallback is always available"""
+        return True
+    
+    async def generate_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """Generate a generic fallback response"""
+        return self._client.generate_chat_completion(
+            messages, max_tokens=max_tokens, temperature=temperature, **kwargs
+        )
+    
+    async def generate_embedding(
+        self, 
+        text: str, 
+        **kwargs
+    ) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """Generate a local embedding vector"""
+        return self._client.generate_embedding(text, **kwargs)
+    
+    async def generate_embeddings(
+        self, 
+        texts: List[str], 
+        **kwargs
+    ) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
+        """
+        Generate local embedding vectors for several texts.
+        Large batches are CPU-bound, so they run in a worker thread.
+        """
+        if len(texts) > 1:
+            return await asyncio.to_thread(self._client.generate_embeddings, texts, **kwargs)
+        return self._client.generate_embeddings(texts, **kwargs)
+    
+    def get_supported_features(self) -> List[str]:
+        """Get supported features for local fallback"""
+        return self._client.get_supported_features()
     
     def get_provider_name(self) -> str:
         """Get provider name"""
-        return "local_fallback"
\ No newline at end of file
+        return self._client.get_provider_name()
@@ -4,29 +4,146 @@ Provides integration with OpenAI's GPT models and embeddings
 """
 import os
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator, AsyncIterator
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
 
 from .base import BaseAIClient
+from .async_base import AsyncBaseAIClient
+from ..rate_limiter import parse_rate_limit_headers, rate_limit_from_error
+from ..http_transport import create_async_http_client, get_http_client
 
 logger = logging.getLogger(__name__)
 
+# Embeddings API limits per request: number of inputs and total input tokens
+OPENAI_EMBEDDING_MAX_BATCH_SIZE = 2048
+OPENAI_EMBEDDING_MAX_BATCH_TOKENS = 300000
+OPENAI_API_HOST = "api.openai.com"
+
+
+def _build_chat_request(
+    messages: List[Dict[str, str]],
+    max_tokens: Optional[int],
+    temperature: float,
+    model: str,
+    **kwargs
+) -> Dict[str, Any]:
+    """Build chat.completions.create parameters"""
+    request_params = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+    }
+    
+    if max_tokens:
+        request_params["max_tokens"] = max_tokens
+    
+    # Add any additional parameters
+    request_params.update(kwargs)
+    return request_params
+
+
+def _parse_chat_response(response, model: str) -> Tuple[bool, str, Dict[str, Any]]:
+    """Extract content and metadata from a chat completion response"""
+    if response.choices and response.choices[0].message:
+        content = response.choices[0].message.content or ""
+        
+        metadata = {
+            "model": response.model,
+            "finish_reason": response.choices[0].finish_reason,
+            "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
+            "completion_tokens": response.usage.completion_tokens if response.usage else 0,
+            "total_tokens": response.usage.total_tokens if response.usage else 0,
+            "response_id": response.id,
+        }
+        
+        return True, content, metadata
+    
+    return False, "No response generated", {"model": model}
+
+
+def _apply_stream_chunk(chunk, metadata: Dict[str, Any]) -> str:
+    """Record metadata from a streamed chat completion chunk and return its text delta"""
+    metadata["model"] = getattr(chunk, "model", None) or metadata.get("model")
+    metadata["response_id"] = getattr(chunk, "id", None) or metadata.get("response_id")
+    
+    if not chunk.choices:
+        return ""
+    
+    choice = chunk.choices[0]
+    if choice.finish_reason:
+        metadata["finish_reason"] = choice.finish_reason
+    return (choice.delta.content if choice.delta else None) or ""
+
+
+def _parse_embedding_response(response, model: str) -> Tuple[bool, List[float], Dict[str, Any]]:
+    """Extract the embedding vector and metadata from an embeddings response"""
+    if response.data and len(response.data) > 0:
+        embedding = response.data[0].embedding
+        
+        metadata = {
+            "model": response.model,
+            "dimensions": len(embedding),
+            "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
+            "total_tokens": response.usage.total_tokens if response.usage else 0,
+        }
+        
+        return True, embedding, metadata
+    
+    return False, [], {"model": model, "error": "No embedding generated"}
+
+
+def _parse_embeddings_response(response, model: str, expected: int) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
+    """Extract embedding vectors, in input order, from a batched embeddings response"""
+    if response.data and len(response.data) == expected:
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        
+        metadata = {
+            "model": response.model,
+            "dimensions": len(embeddings[0]),
+            "batch_size": expected,
+            "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
+            "total_tokens": response.usage.total_tokens if response.usage else 0,
+        }
+        
+        return True, embeddings, metadata
+    
+    return False, [], {"model": model, "error": "Embedding count does not match input count"}
+
+
+def _friendly_error(error: Exception, include_auth: bool = True) -> str:
+    """Map common OpenAI errors to user-facing messages"""
+    error_msg = str(error)
+    
+    if "rate limit" in error_msg.lower():
+        error_msg = "Rate limit exceeded. Please try again later."
+    elif "insufficient quota" in error_msg.lower():
+        error_msg = "API quota exceeded. Please check your OpenAI billing."
+    elif include_auth and "invalid api key" in error_msg.lower():
+        error_msg = "Invalid API key. Please check your OpenAI configuration."
+    
+    return error_msg
+
 
 class OpenAIClient(BaseAIClient):
     """OpenAI API client implementation"""
     
+    max_embedding_batch_size = OPENAI_EMBEDDING_MAX_BATCH_SIZE
+    max_embedding_batch_tokens = OPENAI_EMBEDDING_MAX_BATCH_TOKENS
+    default_embedding_model = "text-embedding-3-small"
+    default_chat_model = "gpt-4"
+    
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("AI_PROVIDERS_OPENAI_API_KEY")
         self.client = None
         
         if self.api_key and OPENAI_AVAILABLE:
             try:
-                self.client = OpenAI(api_key=self.api_key)
+                self.client = OpenAI(api_key=self.api_key, http_client=get_http_client(OPENAI_API_HOST))
                 logger.info("OpenAI client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize OpenAI client: {e}")
@@ -67,57 +184,58 @@ class OpenAIClient(BaseAIClient):
             return False, "OpenAI client not available", {}
         
         try:
-            # Prepare request parameters
-            request_params = {
-                "model": model,
-                "messages": messages,
-                "temperature": temperature,
-            }
-            
-            if max_tokens:
-                request_params["max_tokens"] = max_tokens
-            
-            # Add any additional parameters
-            request_params.update(kwargs)
+            request_params = _build_chat_request(messages, max_tokens, temperature, model, **kwargs)
             
             # Make API call
             response = self.client.chat.completions.create(**request_params)
-            
-            # Extract response content
-            if response.choices and response.choices[0].message:
-                content = response.choices[0].message.content or ""
-                
-                # Extract metadata
-                metadata = {
-                    "model": response.model,
-                    "finish_reason": response.choices[0].finish_reason,
-                    "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
-                    "completion_tokens": response.usage.completion_tokens if response.usage else 0,
-                    "total_tokens": response.usage.total_tokens if response.usage else 0,
-                    "response_id": response.id,
-                }
-                
-                return True, content, metadata
-            else:
-                return False, "No response generated", {"model": model}
+            return _parse_chat_response(response, model)
                 
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
-            error_msg = str(e)
-            
-            # Handle specific OpenAI errors
-            if "rate limit" in error_msg.lower():
-                error_msg = "Rate limit exceeded. Please try again later."
-            elif "insufficient quota" in error_msg.lower():
-                error_msg = "API quota exceeded. Please check your OpenAI billing."
-            elif "invalid api key" in error_msg.lower():
-                error_msg = "Invalid API key. Please check your OpenAI configuration."
-            
-            return False, f"OpenAI API error: {error_msg}", {
+            return False, f"OpenAI API error: {_friendly_error(e)}", {
                 "model": model, 
-                "error": str(e)
+                "error": str(e),
+                "rate_limit": rate_limit_from_error(e)
             }
     
+    def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "gpt-4",
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the OpenAI API token by token
+        
+        Yields:
+            Stream events (see BaseAIClient.stream_chat_completion)
+        """
+        if not self.is_available():
+            yield {"type": "error", "error": "OpenAI client not available", "metadata": {}}
+            return
+        
+        metadata = {"model": model}
+        try:
+            request_params = _build_chat_request(messages, max_tokens, temperature, model, **kwargs)
+            stream = self.client.chat.completions.create(stream=True, **request_params)
+            try:
+                for chunk in stream:
+                    content = _apply_stream_chunk(chunk, metadata)
+                    if content:
+                        yield {"type": "token", "content": content}
+            finally:
+                # Release the HTTP connection even if the consumer stops early
+                stream.response.close()
+            yield {"type": "done", "metadata": metadata}
+                
+        except Exception as e:
+            logger.error(f"OpenAI streaming API error: {e}")
+            metadata["error"] = str(e)
+            metadata["rate_limit"] = rate_limit_from_error(e)
+            yield {"type": "error", "error": f"OpenAI API error: {_friendly_error(e)}", "metadata": metadata}
+    
     def generate_embedding(
         self, 
         text: str,
@@ -145,39 +263,55 @@ class OpenAIClient(BaseAIClient):
                 input=text,
                 **kwargs
             )
-            
-            # Extract embedding vector
-            if response.data and len(response.data) > 0:
-                embedding = response.data[0].embedding
-                
-                metadata = {
-                    "model": response.model,
-                    "dimensions": len(embedding),
-                    "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
-                    "total_tokens": response.usage.total_tokens if response.usage else 0,
-                }
-                
-                return True, embedding, metadata
-            else:
-                return False, [], {"model": model, "error": "No embedding generated"}
+            return _parse_embedding_response(response, model)
                 
         except Exception as e:
             logger.error(f"OpenAI Embedding API error: {e}")
-            error_msg = str(e)
-            
-            if "rate limit" in error_msg.lower():
-                error_msg = "Rate limit exceeded. Please try again later."
-            elif "insufficient quota" in error_msg.lower():
-                error_msg = "API quota exceeded. Please check your OpenAI billing."
+            return False, [], {
+                "model": model, 
+                "error": _friendly_error(e, include_auth=False),
+                "rate_limit": rate_limit_from_error(e)
+            }
+    
+    def generate_embeddings(
+        self, 
+        texts: List[str],
+        model: str = "text-embedding-3-small",
+        **kwargs
+    ) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
+        """
+        Generate embeddings for several texts in one OpenAI API request
+        
+        Args:
+            texts: Input texts (at most OPENAI_EMBEDDING_MAX_BATCH_SIZE)
+            model: Embedding model to use
+            **kwargs: Additional parameters
             
+        Returns:
+            Tuple of (success, embedding_vectors, metadata)
+        """
+        if not self.is_available():
+            return False, [], {"error": "OpenAI client not available"}
+        
+        try:
+            response = self.client.embeddings.create(
+                model=model,
+                input=texts,
+                **kwargs
+            )
+            return _parse_embeddings_response(response, model, len(texts))
+                
+        except Exception as e:
+            logger.error(f"OpenAI Embedding API error: {e}")
             return False, [], {
                 "model": model, 
-                "error": error_msg
+                "error": _friendly_error(e, include_auth=False),
+                "rate_limit": rate_limit_from_error(e)
             }
     
     def get_supported_features(self) -> List[str]:
         """Get supported features for OpenAI"""
-        return ['chat_completion', 'embedding']
+        return ['chat_completion', 'embedding', 'streaming']
     
     def get_available_models(self) -> Dict[str, List[str]]:
         """Get available models for different tasks"""
@@ -193,4 +327,199 @@ class OpenAIClient(BaseAIClient):
                 "text-embedding-3-large", 
                 "text-embedding-ada-002"
             ]
-        }
\ No newline at end of file
+        }
+
+
+class AsyncOpenAIClient(AsyncBaseAIClient):
+    """OpenAI API client implementation on the asyncio SDK client"""
+    
+    max_embedding_batch_size = OPENAI_EMBEDDING_MAX_BATCH_SIZE
+    max_embedding_batch_tokens = OPENAI_EMBEDDING_MAX_BATCH_TOKENS
+    default_embedding_model = "text-embedding-3-small"
+    default_chat_model = "gpt-4"
+    
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("AI_PROVIDERS_OPENAI_API_KEY")
+        self.client = None
+        
+        if self.api_key and OPENAI_AVAILABLE:
+            try:
+                self.client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    http_client=create_async_http_client(OPENAI_API_HOST)
+                )
+                logger.info("Async OpenAI client initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize async OpenAI client: {e}")
+                self.client = None
+        elif not OPENAI_AVAILABLE:
+            logger.warning("OpenAI library not available")
+    
+    def is_available(self) -> bool:
+        """Check if OpenAI client is properly configured and available"""
+        return (
+            OPENAI_AVAILABLE and 
+            self.api_key is not None and 
+            self.client is not None
+        )
+    
+    async def generate_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "gpt-4",
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Generate chat completion using OpenAI API
+        
+        Args:
+            messages: List of message dictionaries
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            model: OpenAI model to use
+            **kwargs: Additional parameters
+            
+        Returns:
+            Tuple of (success, content, metadata)
+        """
+        if not self.is_available():
+            return False, "OpenAI client not available", {}
+        
+        try:
+            request_params = _build_chat_request(messages, max_tokens, temperature, model, **kwargs)
+            # Raw response: the rate-limit headers feed the router's limiter
+            raw = await self.client.chat.completions.with_raw_response.create(**request_params)
+            success, content, metadata = _parse_chat_response(raw.parse(), model)
+            metadata["rate_limit"] = parse_rate_limit_headers(raw.headers)
+            return success, content, metadata
+                
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            return False, f"OpenAI API error: {_friendly_error(e)}", {
+                "model": model, 
+                "error": str(e),
+                "rate_limit": rate_limit_from_error(e)
+            }
+    
+    async def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "gpt-4",
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the OpenAI API token by token
+        
+        Yields:
+            Stream events (see AsyncBaseAIClient.stream_chat_completion)
+        """
+        if not self.is_available():
+            yield {"type": "error", "error": "OpenAI client not available", "metadata": {}}
+            return
+        
+        metadata = {"model": model}
+        try:
+            request_params = _build_chat_request(messages, max_tokens, temperature, model, **kwargs)
+            stream = await self.client.chat.completions.create(stream=True, **request_params)
+            try:
+                async for chunk in stream:
+                    content = _apply_stream_chunk(chunk, metadata)
+                    if content:
+                        yield {"type": "token", "content": content}
+            finally:
+                # Release the HTTP connection even if the consumer stops early
+                await stream.response.aclose()
+            yield {"type": "done", "metadata": metadata}
+                
+        except Exception as e:
+            logger.error(f"OpenAI streaming API error: {e}")
+            metadata["error"] = str(e)
+            metadata["rate_limit"] = rate_limit_from_error(e)
+            yield {"type": "error", "error": f"OpenAI API error: {_friendly_error(e)}", "metadata": metadata}
+    
+    async def generate_embedding(
+        self, 
+        text: str,
+        model: str = "text-embedding-3-small",
+        **kwargs
+    ) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """
+        Generate embeddings using OpenAI API
+        
+        Args:
+            text: Input text to embed
+            model: Embedding model to use
+            **kwargs: Additional parameters
+            
+        Returns:
+            Tuple of (success, embedding_vector, metadata)
+        """
+        if not self.is_available():
+            return False, [], {"error": "OpenAI client not available"}
+        
+        try:
+            response = await self.client.embeddings.create(
+                model=model,
+                input=text,
+                **kwargs
+            )
+            return _parse_embedding_response(response, model)
+                
+        except Exception as e:
+            logger.error(f"OpenAI Embedding API error: {e}")
+            return False, [], {
+                "model": model, 
+                "error": _friendly_error(e, include_auth=False),
+                "rate_limit": rate_limit_from_error(e)
+            }
+    
+    async def generate_embeddings(
+        self, 
+        texts: List[str],
+        model: str = "text-embedding-3-small",
+        **kwargs
+    ) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
+        """
+        Generate embeddings for several texts in one OpenAI API request
+        
+        Args:
+            texts: Input texts (at most OPENAI_EMBEDDING_MAX_BATCH_SIZE)
+            model: Embedding model to use
+            **kwargs: Additional parameters
+            
+        Returns:
+            Tuple of (success, embedding_vectors, metadata)
+        """
+        if not self.is_available():
+            return False, [], {"error": "OpenAI client not available"}
+        
+        try:
+            raw = await self.client.embeddings.with_raw_response.create(
+                model=model,
+                input=texts,
+                **kwargs
+            )
+            success, embeddings, metadata = _parse_embeddings_response(raw.parse(), model, len(texts))
+            metadata["rate_limit"] = parse_rate_limit_headers(raw.headers)
+            return success, embeddings, metadata
+                
+        except Exception as e:
+            logger.error(f"OpenAI Embedding API error: {e}")
+            return False, [], {
+                "model": model, 
+                "error": _friendly_error(e, include_auth=False),
+                "rate_limit": rate_limit_from_error(e)
+            }
+    
+    async def aclose(self):
+        """Close the underlying HTTP connection pool"""
+        if self.client is not None:
+            await self.client.close()
+    
+    def get_supported_features(self) -> List[str]:
+        """Get supported features for OpenAI"""
+        return ['chat_completion', 'embedding', 'streaming']
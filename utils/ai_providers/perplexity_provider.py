@@ -3,19 +3,132 @@ Perplexity AI Provider Implementation
 Provides integration with Perplexity's AI models for search and citations
 """
 import os
+import json
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator, AsyncIterator
 
 try:
-    import requests
-    REQUESTS_AVAILABLE = True
+    import httpx
+    HTTPX_AVAILABLE = True
 except ImportError:
-    REQUESTS_AVAILABLE = False
+    HTTPX_AVAILABLE = False
 
 from .base import BaseAIClient
+from .async_base import AsyncBaseAIClient
+from ..rate_limiter import parse_rate_limit_headers
+from ..http_transport import create_async_http_client, get_http_client
 
 logger = logging.getLogger(__name__)
 
+PERPLEXITY_BASE_URL = "https://api.perplexity.ai"
+
+
+def _build_headers(api_key: str) -> Dict[str, str]:
+    """Build request headers for the Perplexity API"""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "User-Agent": "VirtualBackroom-AI/1.0"
+    }
+
+
+def _build_payload(
+    messages: List[Dict[str, str]],
+    max_tokens: Optional[int],
+    temperature: float,
+    model: str,
+    **kwargs
+) -> Dict[str, Any]:
+    """Build the chat/completions request payload"""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+    }
+    
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+    
+    # Add any additional parameters
+    payload.update(kwargs)
+    return payload
+
+
+def _parse_response(status_code: int, json_loader, model: str, headers=None) -> Tuple[bool, str, Dict[str, Any]]:
+    """
+    Parse a chat/completions HTTP response
+    
+    Args:
+        status_code: HTTP status code
+        json_loader: Callable returning the decoded JSON body
+        model: Requested model (used when the response omits it)
+        headers: Response headers, for rate-limit state
+    """
+    # Check response status
+    if status_code != 200:
+        error_msg = f"API request failed with status {status_code}"
+        try:
+            error_data = json_loader()
+            if 'error' in error_data:
+                error_msg = error_data['error'].get('message', error_msg)
+        except Exception:
+            pass
+        
+        return False, f"Perplexity API error: {error_msg}", {
+            "model": model,
+            "status_code": status_code,
+            "rate_limit": parse_rate_limit_headers(headers, status_code)
+        }
+    
+    data = json_loader()
+    
+    if 'choices' in data and len(data['choices']) > 0:
+        choice = data['choices'][0]
+        content = choice.get('message', {}).get('content', '')
+        
+        metadata = {
+            "model": data.get('model', model),
+            "finish_reason": choice.get('finish_reason'),
+            "usage": data.get('usage', {}),
+            "citations": data.get('citations', []),  # Perplexity provides citations
+            "rate_limit": parse_rate_limit_headers(headers),
+        }
+        
+        return True, content, metadata
+    
+    return False, "No response generated", {"model": model}
+
+
+def _apply_stream_line(line: str, metadata: Dict[str, Any]) -> str:
+    """
+    Parse one Server-Sent Events line of a streamed chat/completions response
+    
+    Records model, finish reason, usage and citations in metadata and returns
+    the text delta carried by the line (empty for keep-alives and [DONE]).
+    """
+    if not line or not line.startswith("data:"):
+        return ""
+    
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return ""
+    
+    chunk = json.loads(data)
+    metadata["model"] = chunk.get('model', metadata.get("model"))
+    if chunk.get('usage'):
+        metadata["usage"] = chunk['usage']
+    if chunk.get('citations'):
+        metadata["citations"] = chunk['citations']
+    
+    choices = chunk.get('choices') or []
+    if not choices:
+        return ""
+    
+    choice = choices[0]
+    if choice.get('finish_reason'):
+        metadata["finish_reason"] = choice['finish_reason']
+    return (choice.get('delta') or {}).get('content') or ""
+
 
 class PerplexityClient(BaseAIClient):
     """
@@ -23,13 +136,18 @@ class PerplexityClient(BaseAIClient):
     Uses Perplexity's API for specialized search and citation tasks
     """
     
+    default_chat_model = "pplx-7b-online"
+    
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("AI_PROVIDERS_PERPLEXITY_API_KEY")
-        self.base_url = "https://api.perplexity.ai"
+        self.base_url = PERPLEXITY_BASE_URL
+        self.client = None
         
-        if not REQUESTS_AVAILABLE:
-            logger.warning("Requests library not available for Perplexity client")
+        if not HTTPX_AVAILABLE:
+            logger.warning("httpx library not available for Perplexity client")
         elif self.api_key:
+            # Shared keep-alive pool: no new TCP/TLS handshake per request
+            self.client = get_http_client(self.base_url)
             logger.info("Perplexity client initialized successfully")
         else:
             logger.warning("Perplexity API key not found")
@@ -37,8 +155,9 @@ class PerplexityClient(BaseAIClient):
     def is_available(self) -> bool:
         """Check if Perplexity client is properly configured and available"""
         return (
-            REQUESTS_AVAILABLE and 
-            self.api_key is not None
+            HTTPX_AVAILABLE and 
+            self.api_key is not None and
+            self.client is not None
         )
     
     def generate_chat_completion(
@@ -66,74 +185,20 @@ class PerplexityClient(BaseAIClient):
             return False, "Perplexity client not available", {}
         
         try:
-            # Prepare headers
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "User-Agent": "VirtualBackroom-AI/1.0"
-            }
-            
-            # Prepare request payload
-            payload = {
-                "model": model,
-                "messages": messages,
-                "temperature": temperature,
-            }
-            
-            if max_tokens:
-                payload["max_tokens"] = max_tokens
-            
-            # Add any additional parameters
-            payload.update(kwargs)
-            
             # Make API request
-            response = requests.post(
+            response = self.client.post(
                 f"{self.base_url}/chat/completions",
-                json=payload,
-                headers=headers,
-                timeout=60
+                json=_build_payload(messages, max_tokens, temperature, model, **kwargs),
+                headers=_build_headers(self.api_key)
             )
-            
-            # Check response status
-            if response.status_code != 200:
-                error_msg = f"API request failed with status {response.status_code}"
-                try:
-                    error_data = response.json()
-                    if 'error' in error_data:
-                        error_msg = error_data['error'].get('message', error_msg)
-                except:
-                    pass
-                
-                return False, f"Perplexity API error: {error_msg}", {
-                    "model": model,
-                    "status_code": response.status_code
-                }
-            
-            # Parse response
-            data = response.json()
-            
-            if 'choices' in data and len(data['choices']) > 0:
-                choice = data['choices'][0]
-                content = choice.get('message', {}).get('content', '')
+            return _parse_response(response.status_code, response.json, model, response.headers)
                 
-                # Extract metadata
-                metadata = {
-                    "model": data.get('model', model),
-                    "finish_reason": choice.get('finish_reason'),
-                    "usage": data.get('usage', {}),
-                    "citations": data.get('citations', []),  # Perplexity provides citations
-                }
-                
-                return True, content, metadata
-            else:
-                return False, "No response generated", {"model": model}
-                
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             return False, "Request timeout - Perplexity API is taking too long to respond", {
                 "model": model, 
                 "error": "timeout"
             }
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Perplexity API request error: {e}")
             return False, f"Network error: {str(e)}", {
                 "model": model, 
@@ -146,6 +211,58 @@ class PerplexityClient(BaseAIClient):
                 "error": str(e)
             }
     
+    def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "pplx-7b-online",
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the Perplexity API token by token
+        
+        Yields:
+            Stream events (see BaseAIClient.stream_chat_completion)
+        """
+        if not self.is_available():
+            yield {"type": "error", "error": "Perplexity client not available", "metadata": {}}
+            return
+        
+        metadata = {"model": model, "citations": []}
+        try:
+            payload = _build_payload(messages, max_tokens, temperature, model, stream=True, **kwargs)
+            with self.client.stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                headers=_build_headers(self.api_key)
+            ) as response:
+                if response.status_code != 200:
+                    response.read()
+                    _, error_msg, error_metadata = _parse_response(response.status_code, response.json, model, response.headers)
+                    yield {"type": "error", "error": error_msg, "metadata": error_metadata}
+                    return
+                
+                for line in response.iter_lines():
+                    content = _apply_stream_line(line, metadata)
+                    if content:
+                        yield {"type": "token", "content": content}
+            
+            yield {"type": "done", "metadata": metadata}
+                
+        except httpx.TimeoutException:
+            metadata["error"] = "timeout"
+            yield {"type": "error", "error": "Request timeout - Perplexity API is taking too long to respond", "metadata": metadata}
+        except httpx.HTTPError as e:
+            logger.error(f"Perplexity API request error: {e}")
+            metadata["error"] = str(e)
+            yield {"type": "error", "error": f"Network error: {str(e)}", "metadata": metadata}
+        except Exception as e:
+            logger.error(f"Perplexity streaming API error: {e}")
+            metadata["error"] = str(e)
+            yield {"type": "error", "error": f"Perplexity API error: {str(e)}", "metadata": metadata}
+    
     def generate_embedding(
         self, 
         text: str, 
@@ -198,7 +315,7 @@ class PerplexityClient(BaseAIClient):
     
     def get_supported_features(self) -> List[str]:
         """Get supported features for Perplexity"""
-        return ['chat_completion', 'search_with_citations']
+        return ['chat_completion', 'streaming', 'search_with_citations']
     
     def get_available_models(self) -> List[str]:
         """Get available Perplexity models"""
@@ -210,4 +327,190 @@ class PerplexityClient(BaseAIClient):
             "codellama-34b-instruct",
             "llama-2-70b-chat",
             "mistral-7b-instruct"
-        ]
\ No newline at end of file
+        ]
+
+
+class AsyncPerplexityClient(AsyncBaseAIClient):
+    """
+    Perplexity AI client implementation on an httpx.AsyncClient
+    Keeps one connection pool per client instead of a new connection per request
+    """
+    
+    default_chat_model = "pplx-7b-online"
+    
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("AI_PROVIDERS_PERPLEXITY_API_KEY")
+        self.base_url = PERPLEXITY_BASE_URL
+        self.client = None
+        
+        if not HTTPX_AVAILABLE:
+            logger.warning("httpx library not available for async Perplexity client")
+        elif self.api_key:
+            self.client = create_async_http_client(
+                self.base_url,
+                base_url=self.base_url,
+                headers=_build_headers(self.api_key)
+            )
+            logger.info("Async Perplexity client initialized successfully")
+        else:
+            logger.warning("Perplexity API key not found")
+    
+    def is_available(self) -> bool:
+        """Check if Perplexity client is properly configured and available"""
+        return (
+            HTTPX_AVAILABLE and 
+            self.api_key is not None and
+            self.client is not None
+        )
+    
+    async def generate_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "pplx-7b-online",
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Generate chat completion using Perplexity API
+        
+        Args:
+            messages: List of message dictionaries
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            model: Perplexity model to use
+            **kwargs: Additional parameters
+            
+        Returns:
+            Tuple of (success, content, metadata)
+        """
+        if not self.is_available():
+            return False, "Perplexity client not available", {}
+        
+        try:
+            response = await self.client.post(
+                "/chat/completions",
+                json=_build_payload(messages, max_tokens, temperature, model, **kwargs)
+            )
+            return _parse_response(response.status_code, response.json, model, response.headers)
+                
+        except httpx.TimeoutException:
+            return False, "Request timeout - Perplexity API is taking too long to respond", {
+                "model": model, 
+                "error": "timeout"
+            }
+        except httpx.HTTPError as e:
+            logger.error(f"Perplexity API request error: {e}")
+            return False, f"Network error: {str(e)}", {
+                "model": model, 
+                "error": str(e)
+            }
+        except Exception as e:
+            logger.error(f"Perplexity API error: {e}")
+            return False, f"Perplexity API error: {str(e)}", {
+                "model": model, 
+                "error": str(e)
+            }
+    
+    async def stream_chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        model: str = "pplx-7b-online",
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the Perplexity API token by token
+        
+        Yields:
+            Stream events (see AsyncBaseAIClient.stream_chat_completion)
+        """
+        if not self.is_available():
+            yield {"type": "error", "error": "Perplexity client not available", "metadata": {}}
+            return
+        
+        metadata = {"model": model, "citations": []}
+        try:
+            payload = _build_payload(messages, max_tokens, temperature, model, stream=True, **kwargs)
+            async with self.client.stream("POST", "/chat/completions", json=payload) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    _, error_msg, error_metadata = _parse_response(response.status_code, response.json, model, response.headers)
+                    yield {"type": "error", "error": error_msg, "metadata": error_metadata}
+                    return
+                
+                async for line in response.aiter_lines():
+                    content = _apply_stream_line(line, metadata)
+                    if content:
+                        yield {"type": "token", "content": content}
+            
+            yield {"type": "done", "metadata": metadata}
+                
+        except httpx.TimeoutException:
+            metadata["error"] = "timeout"
+            yield {"type": "error", "error": "Request timeout - Perplexity API is taking too long to respond", "metadata": metadata}
+        except httpx.HTTPError as e:
+            logger.error(f"Perplexity API request error: {e}")
+            metadata["error"] = str(e)
+            yield {"type": "error", "error": f"Network error: {str(e)}", "metadata": metadata}
+        except Exception as e:
+            logger.error(f"Perplexity streaming API error: {e}")
+            metadata["error"] = str(e)
+            yield {"type": "error", "error": f"Perplexity API error: {str(e)}", "metadata": metadata}
+    
+    async def generate_embedding(
+        self, 
+        text: str, 
+        **kwargs
+    ) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """
+        Generate embeddings using Perplexity API
+        Note: Perplexity may not support embeddings - this is a placeholder
+        """
+        if not self.is_available():
+            return False, [], {"error": "Perplexity client not available"}
+        
+        return False, [], {
+            "error": "Embeddings may not be supported by Perplexity provider",
+            "model": "perplexity"
+        }
+    
+    async def search_with_citations(
+        self, 
+        query: str,
+        model: str = "pplx-7b-online",
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Specialized method for search queries with citations
+        
+        Args:
+            query: Search query
+            model: Perplexity model to use
+            **kwargs: Additional parameters
+            
+        Returns:
+            Tuple of (success, response_with_citations, metadata)
+        """
+        messages = [
+            {
+                "role": "user", 
+                "content": f"Please provide detailed information about: {query}. Include citations and sources."
+            }
+        ]
+        
+        return await self.generate_chat_completion(
+            messages=messages,
+            model=model,
+            **kwargs
+        )
+    
+    async def aclose(self):
+        """Close the underlying HTTP connection pool"""
+        if self.client is not None:
+            await self.client.aclose()
+    
+    def get_supported_features(self) -> List[str]:
+        """Get supported features for Perplexity"""
+        return ['chat_completion', 'streaming', 'search_with_citations']
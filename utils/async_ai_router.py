@@ -0,0 +1,1628 @@
+"""
+Async AI Router - asyncio orchestration core for all AI providers
+Manages fallback chains, circuit breakers, hedging and stats without blocking threads
+"""
+import os
+import asyncio
+import logging
+import socket
+import threading
+import time
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator, Awaitable, Callable
+from collections import defaultdict, deque
+
+from .circuit_breaker import CircuitBreaker, CircuitState
+from .hedging import HedgeBudget
+from .fallback_events import FallbackEventStore
+from .latency_histogram import ThroughputCounter, WindowedLatencyHistogram
+from .response_cache import ResponseCache, InMemoryCacheBackend, RedisCacheBackend
+from .single_flight import SingleFlight
+from .embedding_batching import EmbeddingCoalescer, pack_embedding_batches
+from .embedding_store import EmbeddingStore
+from .token_budget import (
+    MIN_COMPLETION_TOKENS, PromptFit, fit_prompt, get_model_limits, get_token_estimator, reported_usage
+)
+from .rate_limiter import (
+    DEFAULT_COMPLETION_ESTIMATE, PRIORITY_BATCH, PRIORITY_CLASSES, PRIORITY_STANDARD, ProviderRateLimiter,
+    RateLimitTimeout, parse_priority_weights, parse_rate_limits, usage_tokens
+)
+from .http_transport import configure_http_transport, get_http_transport_status
+from .routing_policy import (
+    ModelObservations, RouteDecision, RouteRequest, RoutingPolicy, TrafficLog, load_policy_rules
+)
+from .prometheus_metrics import render_router_metrics
+from .shared_stats import (
+    LATENCY_OPERATIONS, RedisStatsBackend, SharedMemoryStatsBackend, SharedStats, merge_snapshots
+)
+from .ai_providers.async_base import AsyncBaseAIClient, SyncClientAdapter
+from .ai_providers.gemini_provider import GeminiClient, AsyncGeminiClient
+from .ai_providers.openai_provider import OpenAIClient, AsyncOpenAIClient
+from .ai_providers.anthropic_provider import AnthropicClient, AsyncAnthropicClient
+from .ai_providers.perplexity_provider import PerplexityClient, AsyncPerplexityClient
+from .ai_providers.local_provider import AsyncLocalFallbackClient
+
+logger = logging.getLogger(__name__)
+
+
+# Providers that only make sense as a last resort and are never promoted by health scoring
+LAST_RESORT_PROVIDERS = ('local',)
+
+# Health score floors for routing tiers: healthy providers keep their configured
+# order, degraded and unhealthy ones are moved behind them
+HEALTHY_SCORE = 0.8
+DEGRADED_SCORE = 0.5
+
+# Providers tried for embeddings, in order (only OpenAI and local support embeddings currently)
+EMBEDDING_PROVIDERS = ['openai', 'local']
+
+# Bucket layout of the rate limiters' queue-wait histograms; summarizes their merged buckets
+_WAIT_LAYOUT = WindowedLatencyHistogram()
+
+
+class AsyncAIRouter:
+    """
+    Central asyncio AI router that manages multiple providers with fallback logic.
+    Every provider call is a coroutine, so one worker process can keep hundreds
+    of LLM requests in flight without dedicating a thread to each of them.
+
+    An instance must only be used from a single event loop: the provider SDK
+    clients bind their connection pools to the loop that first uses them.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the async AI router with configured providers
+
+        Args:
+            config: Configuration object with AI provider settings
+        """
+        self.config = config
+        self.providers: Dict[str, AsyncBaseAIClient] = {}
+        self.provider_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            'total_requests': 0,
+            'successful_requests': 0,
+            'failed_requests': 0,
+            'average_response_time_ms': 0,
+            'fallbacks': 0
+        })
+        self.fallback_events = FallbackEventStore(
+            capacity=max(1, self._get_setting('fallback_event_capacity', 1024)),
+            log_path=self._get_setting('fallback_event_log_path', '') or None,
+            log_max_bytes=self._get_setting('fallback_event_log_max_bytes', 10 * 1024 * 1024)
+        )
+        # Windowed latency per (provider, operation); operations are chat, stream
+        # (whole stream), stream_ttft (time to first token) and embedding
+        self.latency_histograms: Dict[Tuple[str, str], WindowedLatencyHistogram] = defaultdict(WindowedLatencyHistogram)
+        self.token_throughput: Dict[str, ThroughputCounter] = defaultdict(ThroughputCounter)
+        # Stats are written on the event loop but may be read from other threads
+        self._stats_lock = threading.RLock()
+
+        # Get fallback chain from config or environment
+        if config and hasattr(config, 'ai_providers'):
+            self.default_provider = config.ai_providers.default_provider
+            self.fallback_chain = config.ai_providers.fallback_chain
+        else:
+            self.default_provider = os.getenv("AI_PROVIDERS_DEFAULT_PROVIDER", "gemini")
+            chain_str = os.getenv("AI_PROVIDERS_FALLBACK_CHAIN", "gemini,openai,anthropic,perplexity,local")
+            self.fallback_chain = [s.strip() for s in chain_str.split(",")]
+
+        # Health-based routing: reorder the chain by recent provider health
+        self.health_routing_enabled = self._get_setting('health_routing_enabled', True)
+
+        # Hedged requests: speculative backup calls for latency-sensitive callers
+        self.hedging_enabled = self._get_setting('hedging_enabled', True)
+        self.hedge_percentile = self._get_setting('hedge_percentile', 95.0)
+        self.hedge_min_samples = self._get_setting('hedge_min_samples', 20)
+        self.hedge_default_delay_ms = self._get_setting('hedge_default_delay_ms', 3000)
+        self.hedge_min_delay_ms = self._get_setting('hedge_min_delay_ms', 100)
+        self.hedge_budget = HedgeBudget(
+            max_hedge_ratio=self._get_setting('hedge_max_ratio', 0.1),
+            max_burst=self._get_setting('hedge_max_burst', 10.0)
+        )
+
+        # Response cache: exact and (optionally) semantic reuse of chat completions
+        self.cache_embedding_provider = self._get_setting('cache_embedding_provider', '') or None
+        self.response_cache = self._build_response_cache()
+
+        # Single flight: identical concurrent requests share one provider call
+        self.single_flight = SingleFlight() if self._get_setting('single_flight_enabled', True) else None
+
+        # Embedding batching: concurrent batches per call, and coalescing of single-text calls
+        self.embedding_batch_concurrency = max(1, self._get_setting('embedding_batch_concurrency', 4))
+        coalesce_window_ms = self._get_setting('embedding_coalesce_window_ms', 5.0)
+        self.embedding_coalescer = None
+        if coalesce_window_ms > 0:
+            self.embedding_coalescer = EmbeddingCoalescer(
+                self.generate_embeddings,
+                window_ms=coalesce_window_ms,
+                max_batch_size=self._get_setting('embedding_coalesce_max_batch', 256)
+            )
+
+        # Persistent embedding store: identical text is only embedded once per model
+        self.embedding_store = None
+        if self._get_setting('embedding_store_enabled', True):
+            try:
+                self.embedding_store = EmbeddingStore(
+                    self._get_setting('embedding_store_path', 'instance/embeddings'),
+                    dtype=self._get_setting('embedding_store_dtype', 'float32')
+                )
+            except (OSError, ValueError) as e:
+                logger.warning(f"Embedding store disabled: {e}")
+
+        # Latency SLOs: p99 over latency_slo_window, checked by get_health_status
+        self.latency_slo_window = self._get_setting('latency_slo_window', '5m')
+        self.latency_slo_p99_ms = self._get_setting('latency_slo_p99_ms', 30000)
+        self.ttft_slo_p99_ms = self._get_setting('ttft_slo_p99_ms', 5000)
+        self.latency_slo_min_samples = self._get_setting('latency_slo_min_samples', 20)
+
+        # Token budgeting: prompts are counted against each provider's context window before sending
+        self.token_budget_enabled = self._get_setting('token_budget_enabled', True)
+        self.min_completion_tokens = self._get_setting('min_completion_tokens', MIN_COMPLETION_TOKENS)
+
+        # Pooled keep-alive HTTP clients the providers are built on
+        configure_http_transport(
+            pool_sizes=self._get_setting('http_pool_sizes', ''),
+            http2=self._get_setting('http2_enabled', True),
+            connect_timeout=self._get_setting('http_connect_timeout_seconds', 10.0),
+            keepalive_expiry=self._get_setting('http_keepalive_expiry_seconds', 90.0)
+        )
+
+        # Initialize providers
+        self._initialize_providers()
+
+        # Per-provider request/token budgets and concurrency caps; calls queue up to a deadline,
+        # shared between priority classes by weighted fair queuing
+        self.rate_limiters: Dict[str, ProviderRateLimiter] = {}
+        if self._get_setting('rate_limiting_enabled', True):
+            rate_limits = parse_rate_limits(self._get_setting('rate_limits', ''))
+            priority_weights = parse_priority_weights(self._get_setting('priority_weights', ''))
+            for provider_name in self.providers:
+                requests_per_minute, tokens_per_minute, max_in_flight = rate_limits.get(provider_name, (None, None, None))
+                if requests_per_minute or tokens_per_minute or max_in_flight:
+                    self.rate_limiters[provider_name] = ProviderRateLimiter(
+                        provider_name,
+                        requests_per_minute=requests_per_minute,
+                        tokens_per_minute=tokens_per_minute,
+                        max_in_flight=max_in_flight,
+                        max_wait_seconds=self._get_setting('rate_limit_max_wait_ms', 5000) / 1000,
+                        priority_weights=priority_weights,
+                        interactive_reserve=self._get_setting('interactive_reserved_fraction', 0.25),
+                        shed_queue_wait_ms=self._get_setting('batch_shed_queue_wait_ms', 2000)
+                    )
+
+        # One circuit breaker per initialized provider
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {
+            provider_name: CircuitBreaker(
+                provider_name,
+                failure_rate_threshold=self._get_setting('breaker_failure_rate_threshold', 50.0),
+                slow_call_threshold_ms=self._get_setting('breaker_slow_call_threshold_ms', 15000),
+                slow_call_rate_threshold=self._get_setting('breaker_slow_call_rate_threshold', 80.0),
+                window_seconds=self._get_setting('breaker_window_seconds', 60),
+                minimum_calls=self._get_setting('breaker_minimum_calls', 5),
+                open_duration_seconds=self._get_setting('breaker_open_duration_seconds', 30),
+                half_open_max_calls=self._get_setting('breaker_half_open_max_calls', 1)
+            )
+            for provider_name in self.providers
+        }
+
+        # Stats shared with the other worker processes (None: this process only)
+        self.shared_stats = self._build_shared_stats()
+
+        # Routing policy: per-request (provider, model) choice from rules, cost, latency and errors
+        self.routing_policy = self._build_routing_policy()
+        traffic_log_path = self._get_setting('routing_policy_log_path', '')
+        self.traffic_log = None
+        if self.routing_policy is not None and traffic_log_path:
+            self.traffic_log = TrafficLog(
+                traffic_log_path, max_bytes=self._get_setting('routing_policy_log_max_bytes', 10 * 1024 * 1024)
+            )
+
+        logger.info(f"Async AI Router initialized with {len(self.providers)} providers")
+        logger.info(f"Default provider: {self.default_provider}")
+        logger.info(f"Fallback chain: {self.fallback_chain}")
+
+    def _initialize_providers(self):
+        """
+        Initialize all AI provider clients.
+        Native asyncio clients are preferred; if one is unavailable (e.g. its
+        async transport isn't installed) but the sync client works, the sync
+        client is run in a worker thread instead.
+        """
+        provider_classes = {
+            'gemini': (AsyncGeminiClient, GeminiClient),
+            'openai': (AsyncOpenAIClient, OpenAIClient),
+            'anthropic': (AsyncAnthropicClient, AnthropicClient),
+            'perplexity': (AsyncPerplexityClient, PerplexityClient),
+            'local': (AsyncLocalFallbackClient, None)
+        }
+        # Constructor options from config.ai_providers; without them clients read their env vars
+        provider_options: Dict[str, Dict[str, Any]] = {}
+        if self.config and hasattr(self.config, 'ai_providers'):
+            provider_options['local'] = {
+                'embedding_dimensions': self.config.ai_providers.local_embedding_dimensions
+            }
+
+        for provider_name, (async_class, sync_class) in provider_classes.items():
+            try:
+                client = async_class(**provider_options.get(provider_name, {}))
+
+                if not client.is_available() and sync_class is not None:
+                    sync_client = sync_class()
+                    if sync_client.is_available():
+                        client = SyncClientAdapter(sync_client)
+                        logger.info(f"Provider '{provider_name}' using threaded sync client")
+
+                if client.is_available():
+                    self.providers[provider_name] = client
+                    logger.info(f"Provider '{provider_name}' initialized and available")
+                else:
+                    logger.warning(f"Provider '{provider_name}' initialized but not available (missing config)")
+
+            except Exception as e:
+                logger.error(f"Failed to initialize provider '{provider_name}': {e}")
+
+    def _build_response_cache(self) -> Optional[ResponseCache]:
+        """Create the response cache with the configured backend, or None if disabled"""
+        if not self._get_setting('cache_enabled', True):
+            return None
+
+        backend = None
+        if self._get_setting('cache_backend', 'memory') == 'redis':
+            redis_url = getattr(self.config, 'redis_url', None) or os.getenv("REDIS_URL", "redis://localhost:6379")
+            try:
+                backend = RedisCacheBackend(redis_url)
+            except ImportError as e:
+                logger.warning(f"Redis response cache unavailable ({e}), using in-process cache")
+
+        if backend is None:
+            backend = InMemoryCacheBackend(
+                max_entries=self._get_setting('cache_max_entries', 1000),
+                max_bytes=self._get_setting('cache_max_bytes', 50 * 1024 * 1024)
+            )
+
+        return ResponseCache(
+            backend=backend,
+            ttl_seconds=self._get_setting('cache_ttl_seconds', 3600),
+            semantic_enabled=self._get_setting('cache_semantic_enabled', False),
+            semantic_threshold=self._get_setting('cache_semantic_threshold', 0.95),
+            semantic_max_entries=self._get_setting('cache_semantic_max_entries', 2000)
+        )
+
+    def _build_shared_stats(self) -> Optional[SharedStats]:
+        """Start publishing stats to the configured shared backend, or None if disabled"""
+        backend_name = self._get_setting('shared_stats_backend', '')
+        stale_seconds = self._get_setting('shared_stats_stale_seconds', 30.0)
+        try:
+            if backend_name == 'shm':
+                backend = SharedMemoryStatsBackend(
+                    self._get_setting('shared_stats_segment', 'vb_ai_router_stats'),
+                    slots=self._get_setting('shared_stats_slots', 32),
+                    stale_seconds=stale_seconds
+                )
+            elif backend_name == 'redis':
+                redis_url = getattr(self.config, 'redis_url', None) or os.getenv("REDIS_URL", "redis://localhost:6379")
+                backend = RedisStatsBackend(redis_url, stale_seconds=stale_seconds)
+            else:
+                return None
+        except (ImportError, OSError, ValueError) as e:
+            logger.warning(f"Shared stats unavailable ({e}), reporting this worker only")
+            return None
+
+        shared_stats = SharedStats(
+            backend,
+            self.get_stats_snapshot,
+            publish_interval_seconds=self._get_setting('shared_stats_publish_interval_seconds', 2.0),
+            window=self.latency_slo_window
+        )
+        shared_stats.start()
+        return shared_stats
+
+    def _build_routing_policy(self) -> Optional[RoutingPolicy]:
+        """Load the routing rules (None: policy routing disabled)"""
+        if not self._get_setting('routing_policy_enabled', True):
+            return None
+        try:
+            rules = load_policy_rules(self._get_setting('routing_policy_rules', ''))
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Invalid routing policy rules, using the built-in rules: {e}")
+            rules = load_policy_rules('')
+        observations = ModelObservations(min_latency_samples=self._get_setting('routing_policy_min_samples', 20))
+        return RoutingPolicy(rules, observations=observations)
+
+    def _get_setting(self, name: str, default: Any) -> Any:
+        """
+        Resolve a router setting from config.ai_router, then AI_ROUTER_<NAME> env var, then default
+
+        Args:
+            name: Setting name (snake_case)
+            default: Default value; its type is used to parse environment values
+
+        Returns:
+            Resolved setting value
+        """
+        router_settings = getattr(self.config, 'ai_router', None)
+        if router_settings is not None and hasattr(router_settings, name):
+            return getattr(router_settings, name)
+
+        value = os.getenv(f"AI_ROUTER_{name.upper()}")
+        if value is None:
+            return default
+        if isinstance(default, bool):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        try:
+            return type(default)(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid value for AI_ROUTER_{name.upper()}: {value!r}, using {default!r}")
+            return default
+
+    def get_provider_order(self, provider: Optional[str] = None, use_fallback: bool = True) -> List[str]:
+        """Providers a chat completion would try, in order (health-ranked)"""
+        return self._get_provider_order(provider, use_fallback, self.fallback_chain)
+
+    def _get_provider_order(self, provider: Optional[str], use_fallback: bool, chain: List[str]) -> List[str]:
+        """
+        Determine the order in which providers are tried
+
+        Args:
+            provider: Explicitly requested provider (always tried first)
+            use_fallback: Whether to append the rest of the chain
+            chain: Base provider chain
+
+        Returns:
+            Ordered list of available provider names
+        """
+        if provider and provider in self.providers:
+            provider_order = [provider]
+            if use_fallback:
+                remaining = [p for p in chain if p != provider and p in self.providers]
+                provider_order.extend(self._rank_providers(remaining))
+            return provider_order
+
+        return self._rank_providers([p for p in chain if p in self.providers])
+
+    def _rank_providers(self, providers: List[str]) -> List[str]:
+        """
+        Reorder providers by health tier while preserving configured order within a tier.
+        Last-resort providers always stay at the end of the chain.
+        """
+        if not self.health_routing_enabled:
+            return list(providers)
+
+        def tier(provider_name: str) -> int:
+            if provider_name in LAST_RESORT_PROVIDERS:
+                return 3
+            score = self.circuit_breakers[provider_name].health_score()
+            if score >= HEALTHY_SCORE:
+                return 0
+            if score >= DEGRADED_SCORE:
+                return 1
+            return 2
+
+        # sorted() is stable, so configured order is kept inside each tier
+        return sorted(providers, key=tier)
+
+    async def generate_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        provider: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        use_fallback: bool = True,
+        hedge: bool = False,
+        cache: bool = False,
+        trim_history: bool = False,
+        queue_timeout: Optional[float] = None,
+        dedupe: bool = False,
+        dedupe_timeout: Optional[float] = None,
+        priority: str = PRIORITY_STANDARD,
+        workload: Optional[str] = None,
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Generate chat completion with automatic fallback
+
+        Args:
+            messages: List of message dictionaries
+            provider: Specific provider to use (optional)
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            use_fallback: Whether to use fallback chain on failure
+            hedge: Launch the next provider in parallel if the first one is slower
+                than its usual latency percentile (latency-sensitive callers only)
+            cache: Serve repeated requests from the response cache (only for
+                callers whose answers don't depend on live or per-user data)
+            trim_history: Drop the oldest conversation turns for providers whose
+                context window can't hold the whole conversation
+            queue_timeout: Seconds a call may wait for a provider's rate limit
+                before moving on to the next provider (default: rate_limit_max_wait_ms)
+            dedupe: Share one provider call between identical concurrent requests
+                (same callers as ``cache``: answers must not be per-user)
+            dedupe_timeout: Seconds this caller waits for a shared call (None: no limit)
+            priority: Priority class in the providers' rate-limit queues
+                ('interactive', 'standard' or 'batch'; batch calls may be shed)
+            workload: Kind of request ('help', 'gap_analysis', ...) the routing
+                policy rules match on to pick provider and model
+            **kwargs: Additional provider-specific parameters
+
+        Returns:
+            Tuple of (success, content, metadata)
+        """
+        cache = cache and self.response_cache is not None
+        dedupe = dedupe and self.single_flight is not None
+        if not (cache or dedupe):
+            return await self._route_chat_completion(
+                messages, provider, max_tokens, temperature, use_fallback, hedge, trim_history, queue_timeout,
+                priority, workload, **kwargs
+            )
+
+        start_time = time.time()
+        # The workload selects the model, so answers for different workloads are kept apart
+        exact_key, namespace, query = ResponseCache.build_keys(
+            messages, temperature, max_tokens, provider, **({'workload': workload} if workload else {}), **kwargs
+        )
+
+        query_embedding = None
+        if cache:
+            async def embed_query() -> Optional[List[float]]:
+                success, embedding, _ = await self.generate_embedding(
+                    query, provider=self.cache_embedding_provider, priority=priority
+                )
+                return embedding if success else None
+
+            entry, query_embedding = await self.response_cache.get(exact_key, namespace, embed=embed_query)
+            if entry is not None:
+                metadata = dict(entry.get('metadata') or {})
+                metadata.update({
+                    'router_cache_hit': entry['cache_tier'],
+                    'router_response_time_ms': 0,
+                    'router_total_time_ms': int((time.time() - start_time) * 1000)
+                })
+                if 'cache_similarity' in entry:
+                    metadata['router_cache_similarity'] = entry['cache_similarity']
+                return True, entry['content'], metadata
+
+        async def route() -> Tuple[bool, str, Dict[str, Any]]:
+            success, content, metadata = await self._route_chat_completion(
+                messages, provider, max_tokens, temperature, use_fallback, hedge, trim_history, queue_timeout,
+                priority, workload, **kwargs
+            )
+            # Canned last-resort replies would outlive the outage that caused them
+            if cache and success and metadata.get('router_provider_used') not in LAST_RESORT_PROVIDERS:
+                await self.response_cache.set(exact_key, namespace, content, metadata, query_embedding)
+            return success, content, metadata
+
+        if dedupe:
+            # Routing options that change the answer are part of the key
+            success, content, metadata = await self._single_flight_call(
+                f"{exact_key}:{use_fallback}:{trim_history}:{priority}", route, dedupe_timeout, start_time
+            )
+        else:
+            success, content, metadata = await route()
+        if cache:
+            metadata['router_cache_hit'] = None
+        return success, content, metadata
+
+    async def _single_flight_call(
+        self,
+        key: str,
+        route: Callable[[], Awaitable[Tuple[bool, str, Dict[str, Any]]]],
+        timeout: Optional[float],
+        start_time: float
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """Run a routed completion, or wait for the identical one already in flight"""
+        try:
+            (success, content, metadata), shared = await self.single_flight.do(key, route, timeout)
+        except asyncio.TimeoutError:
+            return False, f"Timed out after {timeout}s waiting for an identical in-flight request", {
+                'error': 'timeout',
+                'router_deduplicated': True,
+                'router_total_time_ms': int((time.time() - start_time) * 1000)
+            }
+
+        # Every caller gets its own metadata; the shared call's dict stays untouched
+        metadata = dict(metadata)
+        metadata['router_deduplicated'] = shared
+        if shared:
+            metadata['router_total_time_ms'] = int((time.time() - start_time) * 1000)
+        return success, content, metadata
+
+    async def _route_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        provider: Optional[str],
+        max_tokens: Optional[int],
+        temperature: float,
+        use_fallback: bool,
+        hedge: bool,
+        trim_history: bool = False,
+        queue_timeout: Optional[float] = None,
+        priority: str = PRIORITY_STANDARD,
+        workload: Optional[str] = None,
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """Route a chat completion through the provider chain (no caching)"""
+        start_time = time.time()
+
+        # Determine provider order (policy- or health-ranked, requested provider first) and models
+        provider_order, decision = self._plan_route(
+            messages, provider, use_fallback, max_tokens, trim_history, priority, workload, kwargs
+        )
+
+        if not provider_order:
+            return False, "No AI providers available", {"error": "no_providers"}
+
+        if hedge and self.hedging_enabled and len(provider_order) > 1:
+            return await self._hedged_chat_completion(
+                provider_order, messages, max_tokens, temperature, start_time, trim_history, queue_timeout,
+                priority, decision, **kwargs
+            )
+
+        # Try providers in order, skipping any whose circuit is open or whose window is too small
+        last_error = "Unknown error"
+        providers_skipped = []
+        providers_too_small = []
+        providers_rate_limited = []
+        for index, current_provider in enumerate(provider_order):
+            provider_kwargs = self._provider_kwargs(current_provider, decision, kwargs)
+            fit = self._fit_prompt(current_provider, messages, max_tokens, trim_history, provider_kwargs)
+            if fit is None:
+                providers_too_small.append(current_provider)
+                continue
+
+            breaker = self.circuit_breakers[current_provider]
+            if not breaker.allow_request():
+                providers_skipped.append(current_provider)
+                logger.debug(f"Skipping provider '{current_provider}': circuit {breaker.state.value}")
+                continue
+
+            success, content, metadata, provider_response_time = await self._call_chat_provider(
+                current_provider, fit, temperature, queue_timeout, priority, decision, **provider_kwargs
+            )
+
+            if success:
+                metadata.update(self._router_metadata(
+                    current_provider, provider_order, providers_skipped, provider_response_time, start_time,
+                    fit, providers_too_small, providers_rate_limited, decision, provider_kwargs
+                ))
+                logger.debug(f"Chat completion successful with provider '{current_provider}'")
+                return True, content, metadata
+
+            # Failed - log and try next provider
+            if metadata.get('error') == 'rate_limited':
+                providers_rate_limited.append(current_provider)
+            last_error = content or f"Provider {current_provider} failed"
+            if index < len(provider_order) - 1:  # Not the last provider
+                self._log_fallback_event(current_provider, provider_order[index + 1], last_error, metadata.get('error'))
+                logger.warning(f"Provider '{current_provider}' failed: {last_error}. Trying next provider.")
+
+        return self._all_providers_failed(
+            provider_order, providers_skipped, last_error, start_time, providers_too_small, providers_rate_limited
+        )
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        provider: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        use_fallback: bool = True,
+        trim_history: bool = False,
+        queue_timeout: Optional[float] = None,
+        priority: str = PRIORITY_STANDARD,
+        workload: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion with fallback before the first token
+
+        A provider that fails before emitting any text is skipped exactly like
+        in generate_chat_completion. Once text has reached the caller the
+        stream is committed to that provider: a later failure ends the stream
+        with an error event rather than splicing in another provider's answer.
+
+        Args:
+            messages: List of message dictionaries
+            provider: Specific provider to use (optional)
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            use_fallback: Whether to use fallback chain on failure
+            trim_history: Drop the oldest conversation turns for providers whose
+                context window can't hold the whole conversation
+            queue_timeout: Seconds a call may wait for a provider's rate limit
+                before moving on to the next provider (default: rate_limit_max_wait_ms)
+            priority: Priority class in the providers' rate-limit queues
+            workload: Kind of request the routing policy rules match on
+            **kwargs: Additional provider-specific parameters
+
+        Yields:
+            Stream events ('token', then 'done' or 'error'); router metadata is
+            attached to the final event
+        """
+        start_time = time.time()
+
+        provider_order, decision = self._plan_route(
+            messages, provider, use_fallback, max_tokens, trim_history, priority, workload, kwargs
+        )
+
+        if not provider_order:
+            yield {'type': 'error', 'error': "No AI providers available", 'metadata': {"error": "no_providers"}}
+            return
+
+        last_error = "Unknown error"
+        providers_skipped = []
+        providers_too_small = []
+        providers_rate_limited = []
+        for index, current_provider in enumerate(provider_order):
+            provider_kwargs = self._provider_kwargs(current_provider, decision, kwargs)
+            fit = self._fit_prompt(current_provider, messages, max_tokens, trim_history, provider_kwargs)
+            if fit is None:
+                providers_too_small.append(current_provider)
+                continue
+
+            breaker = self.circuit_breakers[current_provider]
+            if not breaker.allow_request():
+                providers_skipped.append(current_provider)
+                logger.debug(f"Skipping provider '{current_provider}': circuit {breaker.state.value}")
+                continue
+
+            permit = None
+            limiter = self.rate_limiters.get(current_provider)
+            if limiter is not None:
+                try:
+                    permit = await limiter.acquire(self._estimate_call_tokens(fit), queue_timeout, priority)
+                except RateLimitTimeout as e:
+                    breaker.release()
+                    providers_rate_limited.append(current_provider)
+                    last_error = str(e)
+                    if index < len(provider_order) - 1:
+                        self._log_fallback_event(current_provider, provider_order[index + 1], last_error)
+                    continue
+                except (asyncio.CancelledError, GeneratorExit):
+                    breaker.release()
+                    raise
+
+            with self._stats_lock:
+                self.provider_stats[current_provider]['total_requests'] += 1
+
+            provider_start_time = time.time()
+            first_token_ms = None
+            final_metadata: Dict[str, Any] = {}
+            error = None
+            stream = self.providers[current_provider].stream_chat_completion(
+                messages=fit.messages,
+                max_tokens=fit.max_tokens,
+                temperature=temperature,
+                **provider_kwargs
+            )
+            try:
+                async for event in stream:
+                    if event['type'] == 'token':
+                        if first_token_ms is None:
+                            first_token_ms = int((time.time() - provider_start_time) * 1000)
+                            self.latency_histograms[(current_provider, 'stream_ttft')].record(first_token_ms)
+                        yield event
+                    elif event['type'] == 'done':
+                        final_metadata = event.get('metadata') or {}
+                        break
+                    else:
+                        final_metadata = event.get('metadata') or {}
+                        error = event.get('error') or f"Provider {current_provider} failed"
+                        break
+            except (asyncio.CancelledError, GeneratorExit):
+                # The caller went away mid-stream: not the provider's fault
+                breaker.release()
+                raise
+            except Exception as e:
+                logger.error(f"Exception while streaming from provider '{current_provider}': {e}")
+                error = str(e)
+            finally:
+                await stream.aclose()
+                if permit is not None:
+                    permit.release(usage_tokens(final_metadata), final_metadata.get('rate_limit'))
+
+            response_time_ms = int((time.time() - provider_start_time) * 1000)
+            self._record_model_outcome(
+                current_provider, provider_kwargs, error is None, response_time_ms, final_metadata, decision
+            )
+            router_metadata = self._router_metadata(
+                current_provider, provider_order, providers_skipped, response_time_ms, start_time,
+                fit, providers_too_small, providers_rate_limited, decision, provider_kwargs
+            )
+            router_metadata['router_time_to_first_token_ms'] = first_token_ms
+
+            if error is None:
+                with self._stats_lock:
+                    self.provider_stats[current_provider]['successful_requests'] += 1
+                # Judge stream health by time-to-first-token; total duration grows with answer length
+                breaker.record_success(first_token_ms if first_token_ms is not None else response_time_ms)
+                self.latency_histograms[(current_provider, 'stream')].record(response_time_ms)
+                self._record_throughput(current_provider, final_metadata)
+                final_metadata.update(router_metadata)
+                yield {'type': 'done', 'metadata': final_metadata}
+                return
+
+            with self._stats_lock:
+                self.provider_stats[current_provider]['failed_requests'] += 1
+            breaker.record_failure(response_time_ms)
+
+            if first_token_ms is not None:
+                logger.warning(f"Provider '{current_provider}' failed mid-stream: {error}")
+                final_metadata.update(router_metadata)
+                final_metadata['router_partial_response'] = True
+                yield {'type': 'error', 'error': error, 'metadata': final_metadata}
+                return
+
+            last_error = error
+            if index < len(provider_order) - 1:  # Not the last provider
+                self._log_fallback_event(current_provider, provider_order[index + 1], last_error)
+                logger.warning(f"Provider '{current_provider}' failed: {last_error}. Trying next provider.")
+
+        _, error_message, metadata = self._all_providers_failed(
+            provider_order, providers_skipped, last_error, start_time, providers_too_small, providers_rate_limited
+        )
+        yield {'type': 'error', 'error': error_message, 'metadata': metadata}
+
+    async def _hedged_chat_completion(
+        self,
+        provider_order: List[str],
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int],
+        temperature: float,
+        start_time: float,
+        trim_history: bool = False,
+        queue_timeout: Optional[float] = None,
+        priority: str = PRIORITY_STANDARD,
+        decision: Optional[RouteDecision] = None,
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Chat completion with a speculative backup request.
+
+        The first provider is called as a task. If it has not answered within
+        its hedge delay (a latency percentile from its histogram) and the hedge
+        budget allows it, the next provider is launched concurrently and the
+        first successful answer wins; the losing call is cancelled. Failures
+        fall through the chain exactly like the sequential path.
+        """
+        self.hedge_budget.record_request()
+
+        remaining = deque(provider_order)
+        pending: Dict[asyncio.Task, str] = {}
+        fits: Dict[str, PromptFit] = {}
+        call_kwargs: Dict[str, Dict[str, Any]] = {}
+        providers_skipped: List[str] = []
+        providers_too_small: List[str] = []
+        providers_rate_limited: List[str] = []
+        last_error = "Unknown error"
+        hedged_provider = None
+        hedge_delay_ms = None
+
+        def launch_next() -> Optional[str]:
+            while remaining:
+                candidate = remaining.popleft()
+                provider_kwargs = self._provider_kwargs(candidate, decision, kwargs)
+                fit = self._fit_prompt(candidate, messages, max_tokens, trim_history, provider_kwargs)
+                if fit is None:
+                    providers_too_small.append(candidate)
+                    continue
+                if self.circuit_breakers[candidate].allow_request():
+                    fits[candidate] = fit
+                    call_kwargs[candidate] = provider_kwargs
+                    task = asyncio.create_task(self._call_chat_provider(
+                        candidate, fit, temperature, queue_timeout, priority, decision, **provider_kwargs
+                    ))
+                    pending[task] = candidate
+                    return candidate
+                providers_skipped.append(candidate)
+                logger.debug(f"Skipping provider '{candidate}': circuit open")
+            return None
+
+        primary = launch_next()
+        if primary:
+            hedge_delay_ms = self._get_hedge_delay_ms(primary)
+
+        try:
+            while pending:
+                # Only one hedge per request, and only while there is someone left to hedge to
+                hedge_armed = hedged_provider is None and hedge_delay_ms is not None and remaining
+                done, _ = await asyncio.wait(
+                    list(pending),
+                    timeout=hedge_delay_ms / 1000 if hedge_armed else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # Hedge timer fired before any provider answered
+                    hedge_delay_ms = None
+                    if self.hedge_budget.try_acquire():
+                        hedged_provider = launch_next()
+                        if hedged_provider:
+                            logger.info(f"Hedging slow request to '{primary}' with '{hedged_provider}'")
+                    else:
+                        logger.debug("Hedge budget exhausted, waiting on primary provider")
+                    continue
+
+                for task in done:
+                    current_provider = pending.pop(task)
+                    success, content, metadata, provider_response_time = task.result()
+
+                    if success:
+                        metadata.update(self._router_metadata(
+                            current_provider, provider_order, providers_skipped, provider_response_time, start_time,
+                            fits[current_provider], providers_too_small, providers_rate_limited,
+                            decision, call_kwargs[current_provider]
+                        ))
+                        metadata.update({
+                            'router_hedged': hedged_provider is not None,
+                            'router_hedge_won': hedged_provider is not None and current_provider == hedged_provider
+                        })
+                        return True, content, metadata
+
+                    if metadata.get('error') == 'rate_limited':
+                        providers_rate_limited.append(current_provider)
+                    last_error = content or f"Provider {current_provider} failed"
+                    if not pending:
+                        next_provider = launch_next()
+                        if next_provider:
+                            self._log_fallback_event(current_provider, next_provider, last_error, metadata.get('error'))
+                            logger.warning(f"Provider '{current_provider}' failed: {last_error}. Trying next provider.")
+                            primary = next_provider
+                            if hedged_provider is None:
+                                hedge_delay_ms = self._get_hedge_delay_ms(next_provider)
+        finally:
+            # Cancel the losing request (or everything, if the caller was cancelled)
+            for task in pending:
+                task.cancel()
+
+        return self._all_providers_failed(
+            provider_order, providers_skipped, last_error, start_time, providers_too_small, providers_rate_limited
+        )
+
+    async def _call_chat_provider(
+        self,
+        provider_name: str,
+        fit: PromptFit,
+        temperature: float,
+        queue_timeout: Optional[float] = None,
+        priority: str = PRIORITY_STANDARD,
+        decision: Optional[RouteDecision] = None,
+        **kwargs
+    ) -> Tuple[bool, str, Dict[str, Any], int]:
+        """
+        Call a single provider and record stats, breaker outcome and latency
+
+        The call first waits for the provider's rate limiter. Time spent
+        queued is not part of the provider's latency, and a call that can't
+        be admitted before its deadline fails with error 'rate_limited'
+        without touching the provider's stats or circuit breaker.
+
+        Returns:
+            Tuple of (success, content, metadata, response_time_ms)
+        """
+        client = self.providers[provider_name]
+        permit = None
+        limiter = self.rate_limiters.get(provider_name)
+        if limiter is not None:
+            try:
+                permit = await limiter.acquire(self._estimate_call_tokens(fit), queue_timeout, priority)
+            except RateLimitTimeout as e:
+                self.circuit_breakers[provider_name].release()
+                return False, str(e), {'error': 'rate_limited'}, 0
+            except asyncio.CancelledError:
+                self.circuit_breakers[provider_name].release()
+                raise
+
+        with self._stats_lock:
+            self.provider_stats[provider_name]['total_requests'] += 1
+
+        provider_start_time = time.time()
+        metadata: Dict[str, Any] = {}
+        try:
+            success, content, metadata = await client.generate_chat_completion(
+                messages=fit.messages,
+                max_tokens=fit.max_tokens,
+                temperature=temperature,
+                **kwargs
+            )
+        except asyncio.CancelledError:
+            # Cancelled by the caller (e.g. a losing hedge): not the provider's fault
+            self.circuit_breakers[provider_name].release()
+            raise
+        except Exception as e:
+            logger.error(f"Exception with provider '{provider_name}': {e}")
+            success, content, metadata = False, str(e), {'error': str(e)}
+        finally:
+            if permit is not None:
+                permit.release(usage_tokens(metadata), metadata.get('rate_limit'))
+
+        response_time_ms = int((time.time() - provider_start_time) * 1000)
+        self._record_outcome(provider_name, success, response_time_ms)
+        self._record_model_outcome(provider_name, kwargs, success, response_time_ms, metadata, decision)
+        if success:
+            self._record_throughput(provider_name, metadata)
+        return success, content, metadata, response_time_ms
+
+    def _record_outcome(self, provider_name: str, success: bool, response_time_ms: int, operation: str = 'chat'):
+        """Update request stats, circuit breaker and the operation's latency histogram for one provider call"""
+        breaker = self.circuit_breakers[provider_name]
+        with self._stats_lock:
+            if success:
+                self.provider_stats[provider_name]['successful_requests'] += 1
+                self._update_average_response_time(provider_name, response_time_ms)
+            else:
+                self.provider_stats[provider_name]['failed_requests'] += 1
+
+        if success:
+            breaker.record_success(response_time_ms)
+            self.latency_histograms[(provider_name, operation)].record(response_time_ms)
+        else:
+            breaker.record_failure(response_time_ms)
+
+    def _record_throughput(self, provider_name: str, metadata: Dict[str, Any]):
+        """Count a successful call and the tokens its provider reported"""
+        prompt_tokens, completion_tokens = reported_usage(metadata) or (0, 0)
+        self.token_throughput[provider_name].add(
+            requests=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+
+    def _router_metadata(
+        self,
+        provider_used: str,
+        provider_order: List[str],
+        providers_skipped: List[str],
+        response_time_ms: int,
+        start_time: float,
+        fit: Optional[PromptFit] = None,
+        providers_too_small: Optional[List[str]] = None,
+        providers_rate_limited: Optional[List[str]] = None,
+        decision: Optional[RouteDecision] = None,
+        provider_kwargs: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Build the router section of response metadata"""
+        metadata = {
+            'router_provider_used': provider_used,
+            'router_response_time_ms': response_time_ms,
+            'router_fallback_used': provider_used != provider_order[0],
+            'router_providers_skipped': list(providers_skipped),
+            'router_providers_too_small': list(providers_too_small or []),
+            'router_providers_rate_limited': list(providers_rate_limited or []),
+            'router_total_time_ms': int((time.time() - start_time) * 1000)
+        }
+        if fit is not None:
+            metadata.update({
+                'router_prompt_tokens_estimate': fit.prompt_tokens,
+                'router_max_tokens': fit.max_tokens,
+                'router_history_trimmed': fit.trimmed_messages
+            })
+        if decision is not None:
+            model = self._model_for(provider_used, provider_kwargs or {})
+            metadata['router_model'] = model
+            metadata['router_policy'] = decision.explain(provider_used, model)
+        return metadata
+
+    def _plan_route(
+        self,
+        messages: List[Dict[str, str]],
+        provider: Optional[str],
+        use_fallback: bool,
+        max_tokens: Optional[int],
+        trim_history: bool,
+        priority: str,
+        workload: Optional[str],
+        kwargs: Dict[str, Any]
+    ) -> Tuple[List[str], Optional[RouteDecision]]:
+        """
+        Provider order and routing policy decision for a chat request
+
+        Providers the policy ranked come first, best model first, then the
+        rest of the health-ranked chain with default models; a requested
+        provider stays first and last-resort providers stay last. Without a
+        policy, or when the caller names a model, the chain order is kept.
+        """
+        provider_order = self._get_provider_order(provider, use_fallback, self.fallback_chain)
+        if self.routing_policy is None or not provider_order:
+            return provider_order, None
+
+        estimator = get_token_estimator(provider_order[0])
+        prompt_tokens = sum(estimator.count_message(message) for message in messages) + estimator.tokens_per_reply
+        request = RouteRequest(workload, priority, prompt_tokens, max_tokens, trim_history)
+        if kwargs.get('model'):
+            return provider_order, RouteDecision(request, None, "model set by caller")
+
+        ranked = [name for name in provider_order if name not in LAST_RESORT_PROVIDERS]
+        unavailable = {}
+        for name in ranked:
+            if not self.providers[name].is_available():
+                unavailable[name] = "provider not available"
+            elif self.circuit_breakers[name].state == CircuitState.OPEN:
+                unavailable[name] = "circuit open"
+        decision = self.routing_policy.decide(
+            request, ranked, {name: self.providers[name].default_chat_model for name in ranked}, unavailable
+        )
+
+        preferred = decision.provider_order()
+        order = preferred + [name for name in provider_order if name not in preferred]
+        if provider in self.providers:
+            order = [provider] + [name for name in order if name != provider]
+        return order, decision
+
+    def _provider_kwargs(self, provider_name: str, decision: Optional[RouteDecision], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Call parameters for one provider, with the model the policy chose for it"""
+        model = decision.models.get(provider_name) if decision is not None else None
+        if not model or model == self.providers[provider_name].default_chat_model:
+            return kwargs
+        return {**kwargs, 'model': model}
+
+    def _model_for(self, provider_name: str, kwargs: Dict[str, Any]) -> Optional[str]:
+        """Chat model a provider call uses"""
+        return kwargs.get('model') or self.providers[provider_name].default_chat_model
+
+    def _record_model_outcome(
+        self,
+        provider_name: str,
+        kwargs: Dict[str, Any],
+        success: bool,
+        response_time_ms: int,
+        metadata: Dict[str, Any],
+        decision: Optional[RouteDecision]
+    ):
+        """Feed a chat call's outcome to the routing policy and the traffic log"""
+        if self.routing_policy is None:
+            return
+        model = self._model_for(provider_name, kwargs)
+        self.routing_policy.record_attempt(provider_name, model, success, response_time_ms)
+        if self.traffic_log is not None and decision is not None:
+            self.traffic_log.write(decision, provider_name, model, success, response_time_ms, metadata)
+
+    def _all_providers_failed(
+        self,
+        provider_order: List[str],
+        providers_skipped: List[str],
+        last_error: str,
+        start_time: float,
+        providers_too_small: Optional[List[str]] = None,
+        providers_rate_limited: Optional[List[str]] = None
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """Build the failure result once every provider has failed or been skipped"""
+        total_time = int((time.time() - start_time) * 1000)
+        providers_too_small = list(providers_too_small or [])
+        providers_rate_limited = list(providers_rate_limited or [])
+        error = 'all_providers_failed'
+        if len(providers_too_small) == len(provider_order):
+            error = 'prompt_too_large'
+            last_error = "Prompt exceeds the context window of every available provider"
+        elif len(providers_skipped) == len(provider_order):
+            last_error = "All provider circuits are open"
+        elif len(providers_skipped) + len(providers_too_small) == len(provider_order):
+            last_error = "No provider with a closed circuit has a context window large enough for the prompt"
+        elif providers_rate_limited and (
+            len(providers_skipped) + len(providers_too_small) + len(providers_rate_limited) == len(provider_order)
+        ):
+            error = 'rate_limited'
+            last_error = "Every available provider is at its rate limit"
+        logger.error(f"All providers failed. Last error: {last_error}")
+
+        return False, f"All AI providers failed. Last error: {last_error}", {
+            'error': error,
+            'last_error': last_error,
+            'providers_tried': [p for p in provider_order if p not in providers_skipped and p not in providers_too_small],
+            'providers_skipped': list(providers_skipped),
+            'providers_too_small': providers_too_small,
+            'providers_rate_limited': providers_rate_limited,
+            'router_total_time_ms': total_time
+        }
+
+    def _fit_prompt(
+        self,
+        provider_name: str,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int],
+        trim_history: bool,
+        kwargs: Dict[str, Any]
+    ) -> Optional[PromptFit]:
+        """
+        Size a prompt for one provider before it is sent
+
+        Returns None when the prompt can't fit the provider model's context
+        window, so the provider is skipped without a network round trip.
+        """
+        client = self.providers[provider_name]
+        estimator = get_token_estimator(provider_name)
+        limits = None
+        if self.token_budget_enabled:
+            limits = get_model_limits(kwargs.get('model') or client.default_chat_model)
+
+        fit = fit_prompt(messages, limits, estimator, max_tokens, trim_history, self.min_completion_tokens)
+        if fit is None:
+            logger.info(f"Skipping provider '{provider_name}': prompt does not fit its context window")
+        elif fit.trimmed_messages:
+            logger.debug(f"Trimmed {fit.trimmed_messages} history messages for provider '{provider_name}'")
+        return fit
+
+    def _estimate_call_tokens(self, fit: PromptFit) -> int:
+        """Tokens charged to a provider's rate limit before the call (corrected from usage afterwards)"""
+        return fit.prompt_tokens + (fit.max_tokens or DEFAULT_COMPLETION_ESTIMATE)
+
+    def _get_hedge_delay_ms(self, provider_name: str) -> int:
+        """
+        Pick how long to wait for a provider before hedging
+        Uses the configured latency percentile once enough samples exist.
+        """
+        histogram = self.latency_histograms[(provider_name, 'chat')]
+        delay_ms = self.hedge_default_delay_ms
+        if histogram.count >= self.hedge_min_samples:
+            delay_ms = histogram.percentile(self.hedge_percentile) or delay_ms
+        return max(self.hedge_min_delay_ms, delay_ms)
+
+    async def generate_embedding(
+        self,
+        text: str,
+        provider: Optional[str] = None,
+        use_fallback: bool = True,
+        priority: str = PRIORITY_STANDARD,
+        **kwargs
+    ) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """
+        Generate embeddings with automatic fallback
+        Concurrent calls with the same options are coalesced into one batched
+        upstream request when embedding coalescing is enabled.
+
+        Args:
+            text: Text to embed
+            provider: Specific provider to use
+            use_fallback: Whether to use fallback chain
+            priority: Priority class in the provider's rate-limit queue
+            **kwargs: Additional parameters
+
+        Returns:
+            Tuple of (success, embedding, metadata)
+        """
+        if self.embedding_coalescer is not None:
+            # Priority is one of the options, so only calls of the same class share a batch
+            return await self.embedding_coalescer.embed(
+                text, provider=provider, use_fallback=use_fallback, priority=priority, **kwargs
+            )
+
+        success, embeddings, metadata = await self.generate_embeddings(
+            [text], provider=provider, use_fallback=use_fallback, priority=priority, **kwargs
+        )
+        return success, embeddings[0] if success else [], metadata
+
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        provider: Optional[str] = None,
+        use_fallback: bool = True,
+        priority: str = PRIORITY_STANDARD,
+        **kwargs
+    ) -> Tuple[bool, List[List[float]], Dict[str, Any]]:
+        """
+        Generate embeddings for many texts with automatic fallback
+
+        Texts already in the embedding store for the provider's model are
+        served from it. The rest are packed into batches within the
+        provider's input-count and token limits, batches run concurrently (at
+        most embedding_batch_concurrency at a time) and results are returned
+        in input order. All texts are embedded by the same provider: if any
+        batch fails the whole call moves to the next provider, so vectors
+        from different embedding spaces are never mixed.
+
+        Args:
+            texts: Texts to embed
+            provider: Specific provider to use
+            use_fallback: Whether to use fallback chain
+            priority: Priority class in the provider's rate-limit queue
+            **kwargs: Additional parameters
+
+        Returns:
+            Tuple of (success, embeddings, metadata)
+        """
+        if not texts:
+            return True, [], {'batches': 0}
+
+        provider_order = self._get_provider_order(provider, use_fallback, EMBEDDING_PROVIDERS)
+
+        if not provider_order:
+            return False, [], {"error": "no_embedding_providers"}
+
+        # Try providers in order, skipping any whose circuit is open
+        for current_provider in provider_order:
+            client = self.providers[current_provider]
+            model_key = f"{current_provider}/{kwargs.get('model') or client.default_embedding_model or 'default'}"
+
+            # Stored vectors don't need the provider, even if its circuit is open
+            stored = [None] * len(texts)
+            if self.embedding_store is not None:
+                stored = self.embedding_store.get_many(model_key, texts)
+            missing = [index for index, vector in enumerate(stored) if vector is None]
+            if not missing:
+                return True, stored, {
+                    'model': model_key,
+                    'batch_size': len(texts),
+                    'batches': 0,
+                    'router_provider_used': current_provider,
+                    'router_embedding_model': model_key,
+                    'router_store_hits': len(texts)
+                }
+
+            breaker = self.circuit_breakers[current_provider]
+            if not breaker.allow_request():
+                logger.debug(f"Skipping embedding provider '{current_provider}': circuit {breaker.state.value}")
+                continue
+
+            # Each distinct text is sent upstream once
+            missing_texts = list(dict.fromkeys(texts[index] for index in missing))
+            batches = pack_embedding_batches(
+                missing_texts, client.max_embedding_batch_size, client.max_embedding_batch_tokens
+            )
+            semaphore = asyncio.Semaphore(self.embedding_batch_concurrency)
+
+            limiter = self.rate_limiters.get(current_provider)
+            estimator = get_token_estimator(current_provider)
+
+            async def run_batch(start: int, end: int):
+                async with semaphore:
+                    permit = None
+                    if limiter is not None:
+                        batch_tokens = sum(estimator.count_text(text) for text in missing_texts[start:end])
+                        try:
+                            permit = await limiter.acquire(batch_tokens, priority=priority)
+                        except RateLimitTimeout as e:
+                            return False, [], {'error': str(e), 'rate_limited': True}
+                    metadata: Dict[str, Any] = {}
+                    try:
+                        success, embeddings, metadata = await client.generate_embeddings(
+                            missing_texts[start:end], **kwargs
+                        )
+                        return success, embeddings, metadata
+                    finally:
+                        if permit is not None:
+                            permit.release(usage_tokens(metadata), metadata.get('rate_limit'))
+
+            with self._stats_lock:
+                self.provider_stats[current_provider]['total_requests'] += 1
+
+            provider_start_time = time.time()
+            try:
+                results = await asyncio.gather(*(run_batch(start, end) for start, end in batches))
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                logger.error(f"Exception with embedding provider '{current_provider}': {e}")
+                results = [(False, [], {'error': str(e)})]
+
+            provider_response_time = int((time.time() - provider_start_time) * 1000)
+            success = all(result[0] for result in results)
+            self._record_outcome(current_provider, success, provider_response_time, operation='embedding')
+
+            if success:
+                new_embeddings = [embedding for _, batch_embeddings, _ in results for embedding in batch_embeddings]
+                by_text = dict(zip(missing_texts, new_embeddings))
+                embeddings = list(stored)
+                for index in missing:
+                    embeddings[index] = by_text[texts[index]]
+                if self.embedding_store is not None:
+                    await asyncio.to_thread(self.embedding_store.put_many, model_key, missing_texts, new_embeddings)
+
+                metadata = dict(results[0][2])
+                metadata.update({
+                    'batch_size': len(texts),
+                    'batches': len(batches),
+                    'prompt_tokens': sum(result[2].get('prompt_tokens', 0) for result in results),
+                    'router_provider_used': current_provider,
+                    'router_embedding_model': model_key,
+                    'router_response_time_ms': provider_response_time,
+                    'router_store_hits': len(texts) - len(missing)
+                })
+                self._record_throughput(current_provider, metadata)
+                return True, embeddings, metadata
+
+            if current_provider != provider_order[-1]:
+                failed = next(result[2] for result in results if not result[0])
+                logger.warning(f"Embedding provider '{current_provider}' failed: {failed.get('error')}. Trying next.")
+
+        return False, [], {"error": "all_embedding_providers_failed", "providers_tried": provider_order}
+
+    def get_provider_status(self) -> Dict[str, Dict[str, Any]]:
+        """Get status of all providers"""
+        status = {}
+
+        for provider_name, client in self.providers.items():
+            with self._stats_lock:
+                stats = dict(self.provider_stats[provider_name])
+
+            breaker_status = self.circuit_breakers[provider_name].get_status()
+
+            status[provider_name] = {
+                'available': client.is_available(),
+                'supported_features': client.get_supported_features(),
+                'stats': stats,
+                'success_rate': (
+                    stats['successful_requests'] / max(stats['total_requests'], 1) * 100
+                ),
+                'circuit_state': breaker_status['state'],
+                'health_score': breaker_status['health_score'],
+                'circuit_breaker': breaker_status,
+                'latency': self.latency_histograms[(provider_name, 'chat')].get_window_summaries(),
+                'time_to_first_token': self.latency_histograms[(provider_name, 'stream_ttft')].get_window_summaries(),
+                'operations': {
+                    operation: histogram.get_window_summaries()
+                    for (name, operation), histogram in list(self.latency_histograms.items())
+                    if name == provider_name
+                },
+                'throughput': self.token_throughput[provider_name].get_window_summaries(),
+                'rate_limit': (
+                    self.rate_limiters[provider_name].get_status() if provider_name in self.rate_limiters else None
+                )
+            }
+
+        return status
+
+    def get_fallback_events(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get recent fallback events"""
+        return self.fallback_events.recent(limit)
+
+    def get_fallback_summary(self) -> Dict[str, Any]:
+        """Get fallback counts per (failed provider -> next provider, error class) over each window"""
+        return self.fallback_events.get_summary()
+
+    def get_health_status(self) -> Dict[str, Any]:
+        """Get overall health status of the AI router"""
+        total_providers = len(self.providers)
+        available_providers = sum(1 for client in self.providers.values() if client.is_available())
+
+        # Calculate overall statistics
+        with self._stats_lock:
+            total_requests = sum(stats['total_requests'] for stats in self.provider_stats.values())
+            total_successful = sum(stats['successful_requests'] for stats in self.provider_stats.values())
+
+        overall_success_rate = (total_successful / max(total_requests, 1)) * 100
+
+        open_circuits = [
+            name for name, breaker in self.circuit_breakers.items()
+            if breaker.state == CircuitState.OPEN
+        ]
+        remote_providers = [name for name in self.providers if name not in LAST_RESORT_PROVIDERS]
+        effective_chain = self._rank_providers([p for p in self.fallback_chain if p in self.providers])
+        latency_slos = self.get_latency_slo_status()
+        slo_breaches = [name for name, slo in latency_slos.items() if not slo['met']]
+
+        health_status = "healthy"
+        if available_providers == 0:
+            health_status = "critical"
+        elif available_providers <= total_providers / 2:
+            health_status = "degraded"
+        elif overall_success_rate < 90:
+            health_status = "degraded"
+        elif remote_providers and all(name in open_circuits for name in remote_providers):
+            health_status = "degraded"
+        elif effective_chain and effective_chain[0] in slo_breaches:
+            # The provider taking the traffic is missing its latency SLO
+            health_status = "degraded"
+
+        return {
+            'status': health_status,
+            'total_providers': total_providers,
+            'available_providers': available_providers,
+            'default_provider': self.default_provider,
+            'fallback_chain': self.fallback_chain,
+            'overall_success_rate': overall_success_rate,
+            'total_requests': total_requests,
+            'recent_fallbacks': self.fallback_events.window_count(),
+            'open_circuits': open_circuits,
+            'hedging': self.hedge_budget.get_status(),
+            'effective_chain': effective_chain,
+            'latency_slos': latency_slos,
+            'latency_slo_breaches': slo_breaches,
+            'response_cache': self.get_cache_status(),
+            'single_flight': self.single_flight.get_status() if self.single_flight else {'enabled': False},
+            'embedding_coalescing': (
+                self.embedding_coalescer.get_status() if self.embedding_coalescer else {'enabled': False}
+            ),
+            'embedding_store': (
+                self.embedding_store.get_status() if self.embedding_store else {'enabled': False}
+            ),
+            'rate_limits': self.get_rate_limit_status(),
+            'priority_classes': self.get_priority_status(),
+            'http_transport': get_http_transport_status(),
+            'shared_stats': self.shared_stats.get_status() if self.shared_stats else {'enabled': False},
+            'routing_policy': self.get_routing_policy_status()
+        }
+
+    def get_routing_policy_status(self) -> Dict[str, Any]:
+        """Get routing rules, decisions per rule and observed latency and errors per model"""
+        if self.routing_policy is None:
+            return {'enabled': False}
+        status = {'enabled': True, **self.routing_policy.get_status()}
+        status['traffic_log'] = self.traffic_log.get_status() if self.traffic_log else None
+        return status
+
+    def get_cache_status(self) -> Dict[str, Any]:
+        """Get response cache hit/miss ratios"""
+        if self.response_cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.response_cache.get_status()}
+
+    def get_latency_slo_status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Check each provider's p99 chat latency and time to first token against the SLOs
+        An SLO counts as met until the window holds latency_slo_min_samples calls.
+        """
+        window = self.latency_slo_window
+        status = {}
+        for provider_name in self.providers:
+            entry: Dict[str, Any] = {'window': window}
+            for label, operation, slo_ms in (
+                ('chat', 'chat', self.latency_slo_p99_ms),
+                ('time_to_first_token', 'stream_ttft', self.ttft_slo_p99_ms)
+            ):
+                histogram = self.latency_histograms.get((provider_name, operation))
+                samples = histogram.window_count(window) if histogram is not None else 0
+                p99_ms = histogram.percentile(99, window) if samples >= self.latency_slo_min_samples else None
+                entry[label] = {
+                    'p99_ms': p99_ms,
+                    'slo_ms': slo_ms,
+                    'samples': samples,
+                    'met': p99_ms is None or p99_ms <= slo_ms
+                }
+            entry['met'] = entry['chat']['met'] and entry['time_to_first_token']['met']
+            status[provider_name] = entry
+        return status
+
+    def get_rate_limit_status(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-provider rate limit budgets, queue depths and queue wait times"""
+        return {name: limiter.get_status() for name, limiter in self.rate_limiters.items()}
+
+    def get_priority_status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get queue depth, admissions, timeouts, shed calls and queue wait per
+        priority class, added up over all providers' rate limiters (waits over
+        the last minute)
+        """
+        statuses = {name: limiter.get_status() for name, limiter in self.rate_limiters.items()}
+        result = {}
+        for priority in PRIORITY_CLASSES:
+            entry: Dict[str, Any] = {'queue_depth': 0, 'max_queue_depth': 0, 'admitted': 0, 'timed_out': 0, 'shed': 0}
+            for status in statuses.values():
+                for field in entry:
+                    entry[field] += status['priority_classes'][priority][field]
+
+            counts, total, sum_ms, max_ms = None, 0, 0, 0
+            for limiter in self.rate_limiters.values():
+                window_counts, window_total, window_sum, window_max = (
+                    limiter.class_wait_histograms[priority].window_buckets('1m')
+                )
+                counts = window_counts if counts is None else [a + b for a, b in zip(counts, window_counts)]
+                total += window_total
+                sum_ms += window_sum
+                max_ms = max(max_ms, window_max)
+            entry['queue_wait'] = _WAIT_LAYOUT.summarize(counts, total, sum_ms, max_ms) if counts is not None else None
+            if priority == PRIORITY_BATCH:
+                entry['shedding_providers'] = [name for name, status in statuses.items() if status['shedding']]
+            result[priority] = entry
+        return result
+
+    def get_prometheus_metrics(self) -> str:
+        """Get router metrics in the Prometheus text exposition format"""
+        return render_router_metrics(self)
+
+    def get_stats_snapshot(self) -> Dict[str, Any]:
+        """
+        Get this worker's counters, breaker and rate limit state, and latency
+        buckets over the SLO window, in the form the shared stats backends store
+        """
+        with self._stats_lock:
+            provider_stats = {name: dict(self.provider_stats[name]) for name in self.providers}
+
+        providers = {}
+        latency = {}
+        for provider_name, stats in provider_stats.items():
+            breaker_status = self.circuit_breakers[provider_name].get_status()
+            totals = self.token_throughput[provider_name].totals() if provider_name in self.token_throughput else {}
+            limiter = self.rate_limiters.get(provider_name)
+            limiter_status = limiter.get_status() if limiter is not None else {}
+            providers[provider_name] = {
+                **stats,
+                'prompt_tokens': totals.get('prompt_tokens', 0),
+                'completion_tokens': totals.get('completion_tokens', 0),
+                'circuit_open': int(breaker_status['state'] == CircuitState.OPEN),
+                'health_score': breaker_status['health_score'],
+                'rate_limit_in_flight': limiter_status.get('in_flight', 0),
+                'rate_limit_queue_depth': limiter_status.get('queue_depth', 0),
+                'rate_limit_timed_out': limiter_status.get('timed_out', 0),
+                'rate_limit_throttled': limiter_status.get('throttled_responses', 0)
+            }
+
+            latency[provider_name] = {}
+            for operation in LATENCY_OPERATIONS:
+                histogram = self.latency_histograms.get((provider_name, operation))
+                if histogram is None:
+                    continue
+                counts, total, sum_ms, max_ms = histogram.window_buckets(self.latency_slo_window)
+                if total:
+                    latency[provider_name][operation] = {
+                        'buckets': [[index, count] for index, count in enumerate(counts) if count],
+                        'count': total,
+                        'sum_ms': sum_ms,
+                        'max_ms': max_ms
+                    }
+
+        return {
+            'worker': f"{socket.gethostname()}:{os.getpid()}",
+            'updated_at': time.time(),
+            'providers': providers,
+            'latency': latency
+        }
+
+    def get_shared_stats(self) -> Dict[str, Any]:
+        """
+        Get provider stats merged across every worker publishing to the shared
+        stats backend (just this worker when sharing is disabled)
+        """
+        if self.shared_stats is None:
+            merged = merge_snapshots([self.get_stats_snapshot()], self.latency_slo_window)
+            merged['backend'] = None
+            return merged
+        merged = self.shared_stats.read_merged()
+        merged['publisher'] = self.shared_stats.get_status()
+        return merged
+
+    async def aclose(self):
+        """Close provider connection pools, cache connections and the shared stats slot"""
+        if self.shared_stats is not None:
+            self.shared_stats.close()
+        if self.response_cache is not None:
+            await self.response_cache.aclose()
+        for provider_name, client in self.providers.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close provider '{provider_name}': {e}")
+        self.fallback_events.close()
+        if self.traffic_log is not None:
+            self.traffic_log.close()
+
+    def _log_fallback_event(self, failed_provider: str, next_provider: str, error: str, error_code: Optional[str] = None):
+        """Log a fallback event for monitoring"""
+        error_class = self.fallback_events.record(failed_provider, next_provider, error, error_code)
+        with self._stats_lock:
+            self.provider_stats[failed_provider]['fallbacks'] += 1
+        logger.info(f"Fallback: {failed_provider} -> {next_provider} [{error_class}] ({error[:100]})")
+
+    def _update_average_response_time(self, provider: str, response_time_ms: int):
+        """Update average response time for a provider (stats lock held)"""
+        stats = self.provider_stats[provider]
+        current_avg = stats['average_response_time_ms']
+        total_successful = stats['successful_requests']
+
+        if total_successful == 1:
+            stats['average_response_time_ms'] = response_time_ms
+        else:
+            # Calculate rolling average
+            stats['average_response_time_ms'] = int(
+                (current_avg * (total_successful - 1) + response_time_ms) / total_successful
+            )
+
+
+# Global async AI router instance
+_async_ai_router_instance = None
+
+
+def get_async_ai_router(config=None) -> AsyncAIRouter:
+    """
+    Get the global async AI router instance (singleton pattern)
+    For use from asyncio code such as the src/ service layer.
+
+    Args:
+        config: Configuration object (only used for first initialization)
+
+    Returns:
+        AsyncAIRouter instance
+    """
+    global _async_ai_router_instance
+
+    if _async_ai_router_instance is None:
+        _async_ai_router_instance = AsyncAIRouter(config)
+
+    return _async_ai_router_instance
@@ -0,0 +1,237 @@
+"""
+Circuit Breaker - Per-provider failure isolation for the AI router
+Tracks recent outcomes over a sliding window and short-circuits unhealthy providers
+"""
+import logging
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker states"""
+    CLOSED = "closed"        # Requests flow normally
+    OPEN = "open"            # Requests are rejected without calling the provider
+    HALF_OPEN = "half_open"  # A limited number of trial requests are allowed through
+
+
+class CircuitBreaker:
+    """
+    Sliding-window circuit breaker for a single AI provider.
+
+    The breaker opens when, over the last ``window_seconds``, either the failure
+    rate or the slow-call rate crosses its threshold (once ``minimum_calls``
+    outcomes have been observed). After ``open_duration_seconds`` it moves to
+    half-open and lets ``half_open_max_calls`` trial requests through; a
+    successful trial closes it again, a failed one re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 50.0,
+        slow_call_threshold_ms: int = 15000,
+        slow_call_rate_threshold: float = 80.0,
+        window_seconds: int = 60,
+        minimum_calls: int = 5,
+        open_duration_seconds: int = 30,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            name: Provider name this breaker protects
+            failure_rate_threshold: Failure percentage that opens the circuit
+            slow_call_threshold_ms: Response time above which a call counts as slow
+            slow_call_rate_threshold: Slow-call percentage that opens the circuit
+            window_seconds: Length of the sliding window
+            minimum_calls: Calls required in the window before rates are evaluated
+            open_duration_seconds: Time to stay open before allowing trial calls
+            half_open_max_calls: Concurrent trial calls allowed while half-open
+            clock: Monotonic time source (injectable for deterministic behaviour)
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold_ms = slow_call_threshold_ms
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.window_seconds = window_seconds
+        self.minimum_calls = minimum_calls
+        self.open_duration_seconds = open_duration_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._times_opened = 0
+        # (timestamp, success, response_time_ms)
+        self._window: Deque[Tuple[float, bool, int]] = deque()
+
+    @property
+    def state(self) -> CircuitState:
+        """Current state, applying the open -> half-open timeout transition"""
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a request may be sent to the provider.
+        Reserves a trial slot when the breaker is half-open.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.CLOSED:
+                return True
+            if state == CircuitState.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            return False
+
+    def record_success(self, response_time_ms: int):
+        """Record a successful provider call"""
+        with self._lock:
+            now = self._clock()
+            self._window.append((now, True, response_time_ms))
+            if self._current_state() == CircuitState.HALF_OPEN:
+                if response_time_ms >= self.slow_call_threshold_ms:
+                    self._transition(CircuitState.OPEN, now)
+                else:
+                    self._transition(CircuitState.CLOSED, now)
+            else:
+                self._evaluate(now)
+
+    def record_failure(self, response_time_ms: int = 0):
+        """Record a failed provider call"""
+        with self._lock:
+            now = self._clock()
+            self._window.append((now, False, response_time_ms))
+            if self._current_state() == CircuitState.HALF_OPEN:
+                self._transition(CircuitState.OPEN, now)
+            else:
+                self._evaluate(now)
+
+    def release(self):
+        """
+        Give back a half-open trial slot without recording an outcome.
+        Used when a call is cancelled by the caller (e.g. a losing hedged request).
+        """
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN and self._half_open_in_flight > 0:
+                self._half_open_in_flight -= 1
+
+    def health_score(self) -> float:
+        """
+        Score recent provider health between 0.0 and 1.0.
+        Weighs success rate (70%) and latency relative to the slow-call threshold (30%).
+        Providers without enough recent calls are treated as healthy.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.OPEN:
+                return 0.0
+
+            total, failures, _, average_ms = self._window_stats(self._clock())
+            if total < self.minimum_calls:
+                score = 1.0
+            else:
+                success_rate = (total - failures) / total
+                latency_factor = max(0.0, 1.0 - average_ms / max(self.slow_call_threshold_ms, 1))
+                score = 0.7 * success_rate + 0.3 * latency_factor
+
+            if state == CircuitState.HALF_OPEN:
+                score = min(score, 0.5)
+            return round(score, 3)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get breaker state and sliding-window statistics for monitoring"""
+        score = self.health_score()
+        with self._lock:
+            now = self._clock()
+            state = self._current_state()
+            total, failures, slow, average_ms = self._window_stats(now)
+            retry_in = 0.0
+            if state == CircuitState.OPEN:
+                retry_in = max(0.0, self._opened_at + self.open_duration_seconds - now)
+
+            return {
+                'state': state.value,
+                'health_score': score,
+                'window_seconds': self.window_seconds,
+                'window_calls': total,
+                'window_failure_rate': (failures / total * 100) if total else 0.0,
+                'window_slow_call_rate': (slow / total * 100) if total else 0.0,
+                'window_average_response_time_ms': int(average_ms),
+                'times_opened': self._times_opened,
+                'retry_in_seconds': round(retry_in, 1)
+            }
+
+    def reset(self):
+        """Force the breaker closed and clear its window"""
+        with self._lock:
+            self._window.clear()
+            self._transition(CircuitState.CLOSED, self._clock())
+
+    def _current_state(self) -> CircuitState:
+        """Return state, moving open -> half-open once the open duration has elapsed (lock held)"""
+        if self._state == CircuitState.OPEN:
+            if self._clock() - self._opened_at >= self.open_duration_seconds:
+                self._transition(CircuitState.HALF_OPEN, self._clock())
+        return self._state
+
+    def _evaluate(self, now: float):
+        """Open the circuit if window rates cross their thresholds (lock held)"""
+        if self._state != CircuitState.CLOSED:
+            return
+
+        total, failures, slow, _ = self._window_stats(now)
+        if total < self.minimum_calls:
+            return
+
+        failure_rate = failures / total * 100
+        slow_rate = slow / total * 100
+        if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+            logger.warning(
+                f"Circuit for provider '{self.name}' opened "
+                f"(failure rate {failure_rate:.0f}%, slow-call rate {slow_rate:.0f}% over {total} calls)"
+            )
+            self._transition(CircuitState.OPEN, now)
+
+    def _window_stats(self, now: float) -> Tuple[int, int, int, float]:
+        """Prune expired outcomes and return (total, failures, slow, average_ms) (lock held)"""
+        cutoff = now - self.window_seconds
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+        total = len(self._window)
+        if not total:
+            return 0, 0, 0, 0.0
+
+        failures = sum(1 for _, success, _ in self._window if not success)
+        slow = sum(1 for _, _, elapsed in self._window if elapsed >= self.slow_call_threshold_ms)
+        average_ms = sum(elapsed for _, _, elapsed in self._window) / total
+        return total, failures, slow, average_ms
+
+    def _transition(self, new_state: CircuitState, now: float):
+        """Move to a new state (lock held)"""
+        if new_state == self._state:
+            return
+
+        previous = self._state
+        self._state = new_state
+        self._half_open_in_flight = 0
+
+        if new_state == CircuitState.OPEN:
+            self._opened_at = now
+            self._times_opened += 1
+        elif new_state == CircuitState.CLOSED:
+            # Start from a clean window so pre-outage failures don't re-trip the breaker
+            self._window.clear()
+
+        logger.info(f"Circuit for provider '{self.name}': {previous.value} -> {new_state.value}")
@@ -0,0 +1,340 @@
+"""
+Document Ingestion - Streaming page extraction and content-defined chunking
+Turns uploaded PDF/DOCX/text files into a page stream and token-bounded chunks
+without loading the whole document
+"""
+import logging
+import mimetypes
+import random
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+try:
+    from pdf2image import convert_from_path
+    import pytesseract
+    OCR_AVAILABLE = True
+except ImportError:
+    OCR_AVAILABLE = False
+
+from .embedding_batching import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CHUNK_TOKENS = 512
+# Pages with less extractable text than this are treated as scanned images
+MIN_TEXT_CHARS_PER_PAGE = 20
+# Text and DOCX files without explicit page breaks are split into pages of about this size
+SYNTHETIC_PAGE_CHARS = 4000
+DEFAULT_OCR_DPI = 300
+# Content-defined chunking: a cut is considered at sentence ends once a chunk has
+# reached this fraction of its target size, and forced at this multiple of it
+CDC_MIN_FRACTION = 0.25
+CDC_MAX_MULTIPLE = 2.0
+# Rough sentence length, used to size the boundary probability to the target
+CDC_SENTENCE_TOKENS = 24
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+@dataclass
+class PageText:
+    """Text of one source page"""
+    page_number: int  # 1-based
+    text: str
+    source: str = "text"  # 'text' or 'ocr'
+
+
+@dataclass
+class Chunk:
+    """A token-bounded, overlapping window of document text"""
+    index: int
+    text: str
+    token_count: int
+    page_start: int
+    page_end: int
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'index': self.index,
+            'text': self.text,
+            'token_count': self.token_count,
+            'page_start': self.page_start,
+            'page_end': self.page_end,
+            **self.metadata
+        }
+
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+
+def detect_mime_type(path: str, mime_type: Optional[str] = None) -> str:
+    """Use the stored MIME type, falling back to the file extension"""
+    if mime_type:
+        return mime_type
+    guessed, _ = mimetypes.guess_type(path)
+    return guessed or "text/plain"
+
+
+def extract_pages(
+    path: str,
+    mime_type: Optional[str] = None,
+    ocr: Optional[Callable[[str, int], str]] = None,
+    content_hash: Optional[str] = None
+) -> Iterator[PageText]:
+    """
+    Yield a document's text one page at a time
+
+    Args:
+        path: File to read
+        mime_type: MIME type (guessed from the extension when omitted)
+        ocr: Callable (path, page_number) -> text for image-only PDF pages,
+             or an OCRPool to OCR them in parallel; defaults to the global
+             OCR pool when OCR libraries are installed
+        content_hash: SHA-256 of the file, used as the OCR cache key
+
+    Yields:
+        PageText per page, in order
+    """
+    mime_type = detect_mime_type(path, mime_type)
+    if mime_type == "application/pdf":
+        if ocr is None and OCR_AVAILABLE:
+            from .ocr_pool import get_ocr_pool
+            ocr = get_ocr_pool()
+        yield from _extract_pdf_pages(path, ocr, content_hash)
+    elif mime_type == DOCX_MIME_TYPE:
+        yield from _extract_docx_pages(path)
+    else:
+        yield from _extract_text_pages(path)
+
+
+def _extract_pdf_pages(path: str, ocr, content_hash: Optional[str] = None) -> Iterator[PageText]:
+    if not PYPDF_AVAILABLE:
+        raise RuntimeError("pypdf is required to ingest PDF documents")
+
+    # An OCR pool gets scanned pages submitted up to `lookahead` pages ahead of
+    # the page being yielded, so OCR overlaps text extraction and every worker
+    # stays busy; pages are still yielded in document order
+    submit = getattr(ocr, "submit", None)
+    lookahead = getattr(ocr, "lookahead", 1)
+    pending: "deque[Tuple[int, Any]]" = deque()
+
+    def ready() -> Iterator[PageText]:
+        while pending:
+            page_number, item = pending[0]
+            if isinstance(item, Future):
+                if not item.done() and len(pending) <= lookahead:
+                    return
+                item = PageText(page_number, item.result().text.strip(), source="ocr")
+            pending.popleft()
+            yield item
+
+    reader = PdfReader(path)
+    for page_index, page in enumerate(reader.pages):
+        page_number = page_index + 1
+        text = (page.extract_text() or "").strip()
+        if len(text) < MIN_TEXT_CHARS_PER_PAGE and _page_has_images(page):
+            if ocr is None:
+                logger.warning(f"{path} page {page_number} looks scanned but OCR is unavailable")
+            elif submit is not None:
+                pending.append((page_number, submit(path, page_number, ocr.choose_dpi(page), content_hash)))
+                yield from ready()
+                continue
+            else:
+                yield PageText(page_number, ocr(path, page_number).strip(), source="ocr")
+                continue
+        pending.append((page_number, PageText(page_number, text)))
+        yield from ready()
+
+    lookahead = 0
+    yield from ready()
+
+
+def _page_has_images(page) -> bool:
+    """Whether a PDF page draws any image XObjects"""
+    try:
+        resources = page.get("/Resources") or {}
+        xobjects = resources.get("/XObject") or {}
+        return any(xobject.get_object().get("/Subtype") == "/Image" for xobject in xobjects.values())
+    except Exception:
+        # Malformed resources: let OCR have a go rather than silently dropping the page
+        return True
+
+
+def ocr_pdf_page(path: str, page_number: int, dpi: int = DEFAULT_OCR_DPI) -> str:
+    """Rasterize one PDF page and OCR it"""
+    images = convert_from_path(path, dpi=dpi, first_page=page_number, last_page=page_number)
+    return "\n".join(pytesseract.image_to_string(image) for image in images)
+
+
+def _extract_docx_pages(path: str) -> Iterator[PageText]:
+    """Stream paragraphs out of word/document.xml, splitting at page breaks"""
+    page_number = 1
+    paragraphs: List[str] = []
+    size = 0
+
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document_xml:
+        for _, element in ElementTree.iterparse(document_xml, events=("end",)):
+            if element.tag != f"{_WORD_NS}p":
+                continue
+
+            texts = []
+            page_break = False
+            for node in element.iter():
+                if node.tag == f"{_WORD_NS}t" and node.text:
+                    texts.append(node.text)
+                elif node.tag == f"{_WORD_NS}tab":
+                    texts.append("\t")
+                elif node.tag == f"{_WORD_NS}br" and node.get(f"{_WORD_NS}type") == "page":
+                    page_break = True
+                elif node.tag == f"{_WORD_NS}lastRenderedPageBreak":
+                    page_break = True
+            # Free the parsed paragraph so large files stream in constant memory
+            element.clear()
+
+            if page_break and paragraphs:
+                yield PageText(page_number, "\n".join(paragraphs))
+                page_number += 1
+                paragraphs, size = [], 0
+
+            paragraph = "".join(texts).strip()
+            if paragraph:
+                paragraphs.append(paragraph)
+                size += len(paragraph)
+            if size >= SYNTHETIC_PAGE_CHARS:
+                yield PageText(page_number, "\n".join(paragraphs))
+                page_number += 1
+                paragraphs, size = [], 0
+
+    if paragraphs:
+        yield PageText(page_number, "\n".join(paragraphs))
+
+
+def _extract_text_pages(path: str) -> Iterator[PageText]:
+    """Read plain text line by line, splitting at form feeds or every ~SYNTHETIC_PAGE_CHARS"""
+    page_number = 1
+    lines: List[str] = []
+    size = 0
+
+    with open(path, "r", encoding="utf-8", errors="replace") as text_file:
+        for line in text_file:
+            pieces = line.split("\f")
+            for piece_index, piece in enumerate(pieces):
+                if piece_index > 0:
+                    yield PageText(page_number, "".join(lines).strip())
+                    page_number += 1
+                    lines, size = [], 0
+                lines.append(piece)
+                size += len(piece)
+            if size >= SYNTHETIC_PAGE_CHARS:
+                yield PageText(page_number, "".join(lines).strip())
+                page_number += 1
+                lines, size = [], 0
+
+    if lines and "".join(lines).strip():
+        yield PageText(page_number, "".join(lines).strip())
+
+
+# ============================================================================
+# CHUNKING
+# ============================================================================
+
+# Random 64-bit value per byte, fixed so boundaries are identical across processes and releases
+_GEAR = [random.Random(0x6A09E667).getrandbits(64) for _ in range(256)]
+_MASK64 = (1 << 64) - 1
+_GOLDEN64 = 0x9E3779B97F4A7C15
+
+
+def content_defined_chunks(
+    pages: Iterable[PageText],
+    target_tokens: int = DEFAULT_CHUNK_TOKENS
+) -> Iterator[Chunk]:
+    """
+    Split a page stream into chunks whose boundaries depend only on nearby content
+
+    A gear rolling hash runs over the words (each step shifts older words
+    further out, so it covers roughly the last 64). At a sentence end, once
+    the chunk holds CDC_MIN_FRACTION of ``target_tokens``, the chunk is cut
+    when the mixed hash falls in a 1-in-N bucket, N chosen so chunks average
+    about ``target_tokens``. A chunk reaching CDC_MAX_MULTIPLE of the target is
+    cut at its last sentence boundary.
+
+    Because a cut depends only on the text just before it, an edit changes at
+    most the chunks around it, and a section repeated in another document
+    (scope, definitions, references boilerplate) chunks identically wherever
+    it appears once the first boundary inside it is reached. Chunks do not
+    overlap, so identical text really does hash identically.
+
+    Args:
+        pages: Page stream
+        target_tokens: Average estimated tokens per chunk
+
+    Yields:
+        Chunk records in document order
+    """
+    min_tokens = int(target_tokens * CDC_MIN_FRACTION)
+    max_tokens = int(target_tokens * CDC_MAX_MULTIPLE)
+    divisor = max(2, (target_tokens - min_tokens) // CDC_SENTENCE_TOKENS)
+    window: List[Tuple[str, int, int]] = []  # (word, tokens, page)
+    window_tokens = 0
+    rolling = 0
+    index = 0
+
+    def emit(end: int) -> Chunk:
+        words = window[:end]
+        return Chunk(
+            index=index,
+            text=" ".join(word for word, _, _ in words),
+            token_count=sum(tokens for _, tokens, _ in words),
+            page_start=words[0][2],
+            page_end=words[-1][2]
+        )
+
+    for page in pages:
+        for word in page.text.split():
+            tokens = estimate_tokens(word)
+            window.append((word, tokens, page.page_number))
+            window_tokens += tokens
+            checksum = zlib.crc32(word.encode("utf-8"))
+            rolling = ((rolling << 1) + (_GEAR[checksum & 0xFF] ^ checksum)) & _MASK64
+
+            if window_tokens >= max_tokens:
+                end = _sentence_boundary(window)
+            elif (
+                window_tokens >= min_tokens and word.endswith((".", "?", "!", ":", ";")) and
+                (((rolling * _GOLDEN64) & _MASK64) >> 32) % divisor == 0
+            ):
+                end = len(window)
+            else:
+                continue
+
+            yield emit(end)
+            index += 1
+            window = window[end:]
+            window_tokens = sum(tokens for _, tokens, _ in window)
+
+    if window:
+        yield emit(len(window))
+
+
+def _sentence_boundary(window: List[Tuple[str, int, int]]) -> int:
+    """Cut after the last sentence-ending word in the window's final quarter, else at the end"""
+    floor = len(window) * 3 // 4
+    for position in range(len(window) - 1, floor, -1):
+        if window[position][0].endswith((".", "?", "!", ":", ";")):
+            return position + 1
+    return len(window)
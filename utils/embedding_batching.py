@@ -0,0 +1,170 @@
+"""
+Embedding Batching - Packing and request coalescing for embedding calls
+Turns many small embedding requests into few provider-sized batches
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Rough characters-per-token ratio for English prose; errs on the side of overestimating tokens
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for batch packing"""
+    return max(1, len(text or "") // CHARS_PER_TOKEN + 1)
+
+
+def pack_embedding_batches(texts: List[str], max_batch_size: int, max_batch_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Split texts into contiguous batches that respect a provider's limits
+
+    Batches are contiguous slices so results can be concatenated back in
+    input order. A single text larger than ``max_batch_tokens`` gets a batch
+    of its own (the provider decides whether to truncate or reject it).
+
+    Args:
+        texts: Texts to embed
+        max_batch_size: Maximum inputs per request
+        max_batch_tokens: Maximum estimated tokens per request
+
+    Returns:
+        List of (start, end) slice bounds
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    max_batch_size = max(1, max_batch_size)
+
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        batch_len = index - start
+        if batch_len and (batch_len >= max_batch_size or batch_tokens + tokens > max_batch_tokens):
+            batches.append((start, index))
+            start = index
+            batch_tokens = 0
+        batch_tokens += tokens
+
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+class EmbeddingCoalescer:
+    """
+    Micro-batcher that merges concurrent single-text embedding calls.
+
+    The first call for a given key opens a window of ``window_ms``; every call
+    with the same key arriving inside the window joins it, and the window is
+    flushed as one batched request when it closes or reaches
+    ``max_batch_size``. Each caller receives its own (success, embedding,
+    metadata) tuple. Calls only coalesce with others using identical routing
+    options, so results never mix providers or models.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[..., Awaitable[Tuple[bool, List[List[float]], Dict[str, Any]]]],
+        window_ms: float = 5.0,
+        max_batch_size: int = 256
+    ):
+        """
+        Initialize the coalescer
+
+        Args:
+            batch_fn: Coroutine function (texts, **options) -> (success, embeddings, metadata)
+            window_ms: How long to wait for more calls before flushing
+            max_batch_size: Flush immediately once this many calls are waiting
+        """
+        self.batch_fn = batch_fn
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        # key -> (options, [(text, future)], flush timer)
+        self._pending: Dict[Tuple, Tuple[Dict[str, Any], List[Tuple[str, asyncio.Future]], Optional[asyncio.TimerHandle]]] = {}
+        self._stats = {'calls': 0, 'batches': 0, 'largest_batch': 0}
+        # Running batches; referenced here so they aren't garbage-collected mid-flight
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str, **options) -> Tuple[bool, List[float], Dict[str, Any]]:
+        """
+        Embed one text, sharing an upstream request with concurrent callers
+
+        Args:
+            text: Text to embed
+            **options: Routing options passed through to batch_fn
+
+        Returns:
+            Tuple of (success, embedding, metadata)
+        """
+        loop = asyncio.get_running_loop()
+        key = tuple(sorted((name, repr(value)) for name, value in options.items()))
+        future = loop.create_future()
+        self._stats['calls'] += 1
+
+        if key not in self._pending:
+            timer = loop.call_later(self.window_ms / 1000, self._flush, key)
+            self._pending[key] = (options, [], timer)
+        self._pending[key][1].append((text, future))
+
+        if len(self._pending[key][1]) >= self.max_batch_size:
+            self._flush(key)
+
+        # Shield the shared batch from a single caller's cancellation
+        return await asyncio.shield(future)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get coalescing counters for monitoring"""
+        calls, batches = self._stats['calls'], self._stats['batches']
+        return {
+            'window_ms': self.window_ms,
+            'max_batch_size': self.max_batch_size,
+            'calls': calls,
+            'batches': batches,
+            'largest_batch': self._stats['largest_batch'],
+            'average_batch_size': round(calls / batches, 2) if batches else 0.0
+        }
+
+    def _flush(self, key: Tuple):
+        """Close a window and send its texts upstream"""
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return
+        options, waiters, timer = entry
+        if timer is not None:
+            timer.cancel()
+
+        self._stats['batches'] += 1
+        self._stats['largest_batch'] = max(self._stats['largest_batch'], len(waiters))
+        task = asyncio.ensure_future(self._run_batch(options, waiters))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, options: Dict[str, Any], waiters: List[Tuple[str, asyncio.Future]]):
+        """Run one upstream batch and resolve every waiter"""
+        texts = [text for text, _ in waiters]
+        try:
+            try:
+                success, embeddings, metadata = await self.batch_fn(texts, **options)
+            except Exception as e:
+                logger.error(f"Coalesced embedding batch failed: {e}")
+                success, embeddings, metadata = False, [], {'error': str(e)}
+
+            for index, (_, future) in enumerate(waiters):
+                if future.done():
+                    continue
+                item_metadata = dict(metadata)
+                item_metadata['router_coalesced_batch_size'] = len(waiters)
+                if success:
+                    future.set_result((True, embeddings[index], item_metadata))
+                else:
+                    future.set_result((False, [], item_metadata))
+        finally:
+            # Batch cancelled (or broke while resolving): no caller may be left waiting
+            for _, future in waiters:
+                if not future.done():
+                    future.cancel()
@@ -0,0 +1,275 @@
+"""
+Embedding Store - Persistent content-addressed cache of embedding vectors
+Keyed by (model namespace, SHA-256 of normalized text) so identical text is embedded once
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+DIGEST_SIZE = 32  # Raw SHA-256 digest bytes per key record
+SUPPORTED_DTYPES = ('float32', 'float16')
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_UNSAFE_PATH_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for hashing: Unicode NFC and collapsed whitespace (case is kept)"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 hex digest of normalized text (same convention as calculate_file_hash)"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class _Namespace:
+    """
+    Append-only vector file for one embedding model.
+
+    ``vectors.bin`` holds fixed-width rows and ``keys.bin`` the matching raw
+    SHA-256 digests. A key is appended only after its vector is written, so
+    the key file is the commit record: readers size the memory map from it
+    and never see a partially written row. Appends from several processes
+    are serialized with an flock on ``lock``.
+    """
+
+    def __init__(self, path: str, dtype: str):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.dimensions: Optional[int] = None
+        self._index: Dict[bytes, int] = {}
+        self._keys_read = 0
+        self._mmap: Optional[np.memmap] = None
+        self._mmap_rows = 0
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            self.dimensions = meta["dimensions"]
+            self.dtype = np.dtype(meta["dtype"])
+        self.refresh()
+
+    @property
+    def rows(self) -> int:
+        return len(self._index)
+
+    def refresh(self):
+        """Pick up rows appended by this or other processes"""
+        keys_path = os.path.join(self.path, "keys.bin")
+        if not os.path.exists(keys_path):
+            return
+        size = os.path.getsize(keys_path)
+        if size <= self._keys_read:
+            return
+
+        with open(keys_path, "rb") as keys_file:
+            keys_file.seek(self._keys_read)
+            data = keys_file.read(size - self._keys_read)
+
+        complete = len(data) - len(data) % DIGEST_SIZE
+        for offset in range(0, complete, DIGEST_SIZE):
+            digest = data[offset:offset + DIGEST_SIZE]
+            # First writer wins if two processes raced on the same text
+            self._index.setdefault(digest, self._keys_read // DIGEST_SIZE + offset // DIGEST_SIZE)
+        self._keys_read += complete
+
+    def get(self, digest: bytes) -> Optional[np.ndarray]:
+        """Read one vector through the memory map"""
+        row = self._index.get(digest)
+        if row is None:
+            return None
+        return self._matrix(row + 1)[row]
+
+    def put_many(self, items: List[tuple]):
+        """Append (digest, vector) pairs that aren't stored yet"""
+        lock_path = os.path.join(self.path, "lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                new_items = []
+                seen = set()
+                for digest, vector in items:
+                    if digest in self._index or digest in seen:
+                        continue
+                    seen.add(digest)
+                    new_items.append((digest, vector))
+                if not new_items:
+                    return
+
+                if self.dimensions is None:
+                    self.dimensions = len(new_items[0][1])
+                    with open(os.path.join(self.path, "meta.json"), "w") as meta_file:
+                        json.dump({"dimensions": self.dimensions, "dtype": self.dtype.name}, meta_file)
+
+                matrix = np.asarray([vector for _, vector in new_items], dtype=self.dtype)
+                if matrix.shape[1] != self.dimensions:
+                    logger.warning(
+                        f"Embedding store {self.path}: expected {self.dimensions} dimensions, "
+                        f"got {matrix.shape[1]}; not storing"
+                    )
+                    return
+
+                vectors_path = os.path.join(self.path, "vectors.bin")
+                with open(vectors_path, "ab") as vectors_file:
+                    # Rows are addressed by key count, so trim any torn write from a crashed writer
+                    expected_size = (self._keys_read // DIGEST_SIZE) * self.dimensions * self.dtype.itemsize
+                    if vectors_file.tell() != expected_size:
+                        vectors_file.truncate(expected_size)
+                        vectors_file.seek(expected_size)
+                    vectors_file.write(matrix.tobytes())
+                    vectors_file.flush()
+                    os.fsync(vectors_file.fileno())
+
+                with open(os.path.join(self.path, "keys.bin"), "ab") as keys_file:
+                    keys_file.write(b"".join(digest for digest, _ in new_items))
+
+                self.refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def size_bytes(self) -> int:
+        vectors_path = os.path.join(self.path, "vectors.bin")
+        return os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+
+    def _matrix(self, min_rows: int) -> np.ndarray:
+        """Memory-map the vector file, remapping when it has grown"""
+        if self._mmap is None or self._mmap_rows < min_rows:
+            rows = self._keys_read // DIGEST_SIZE
+            self._mmap = np.memmap(
+                os.path.join(self.path, "vectors.bin"),
+                dtype=self.dtype,
+                mode="r",
+                shape=(rows, self.dimensions)
+            )
+            self._mmap_rows = rows
+        return self._mmap
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed embedding cache shared by all workers on a host.
+
+    Each model gets its own namespace directory with append-only, memory-mapped
+    vector storage in float32 or float16 (half the disk and page cache, with
+    ~3 significant digits - plenty for cosine similarity). Vectors are never
+    updated in place: the same (model, normalized text) always maps to the
+    same embedding.
+    """
+
+    def __init__(self, directory: str, dtype: str = 'float32'):
+        """
+        Initialize the store
+
+        Args:
+            directory: Root directory for namespace files (created if missing)
+            dtype: Storage precision for new namespaces, 'float32' or 'float16'
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported embedding store dtype {dtype!r}; use one of {SUPPORTED_DTYPES}")
+        self.directory = directory
+        self.dtype = dtype
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up stored embeddings
+
+        Args:
+            model: Model namespace (e.g. 'openai/text-embedding-3-small')
+            texts: Texts to look up
+
+        Returns:
+            One vector (as a list of floats) or None per text, in input order
+        """
+        digests = [bytes.fromhex(text_hash(text)) for text in texts]
+        with self._lock:
+            namespace = self._namespace(model)
+            results = [namespace.get(digest) for digest in digests]
+            if any(result is None for result in results):
+                # Another worker may have stored them since our last look
+                namespace.refresh()
+                results = [
+                    result if result is not None else namespace.get(digest)
+                    for result, digest in zip(results, digests)
+                ]
+
+            hits = sum(1 for result in results if result is not None)
+            self._stats['hits'] += hits
+            self._stats['misses'] += len(results) - hits
+
+        return [result.astype(np.float32).tolist() if result is not None else None for result in results]
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """
+        Store embeddings for texts; all-zero vectors (placeholders) are skipped
+
+        Args:
+            model: Model namespace
+            texts: Embedded texts
+            embeddings: Their vectors, in the same order
+        """
+        items = [
+            (bytes.fromhex(text_hash(text)), embedding)
+            for text, embedding in zip(texts, embeddings)
+            if embedding and any(embedding)
+        ]
+        if not items:
+            return
+
+        with self._lock:
+            namespace = self._namespace(model)
+            before = namespace.rows
+            try:
+                namespace.put_many(items)
+            except OSError as e:
+                logger.warning(f"Failed to persist embeddings for '{model}': {e}")
+                return
+            self._stats['stored'] += namespace.rows - before
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get hit/miss counters and per-model sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            models = {
+                name: {
+                    'vectors': namespace.rows,
+                    'dimensions': namespace.dimensions,
+                    'dtype': namespace.dtype.name,
+                    'size_bytes': namespace.size_bytes()
+                }
+                for name, namespace in self._namespaces.items()
+            }
+        lookups = stats['hits'] + stats['misses']
+        return {
+            **stats,
+            'hit_ratio': (stats['hits'] / lookups) if lookups else 0.0,
+            'directory': self.directory,
+            'models': models
+        }
+
+    def _namespace(self, model: str) -> _Namespace:
+        """Open (or create) a model's namespace (lock held)"""
+        namespace = self._namespaces.get(model)
+        if namespace is None:
+            path = os.path.join(self.directory, _UNSAFE_PATH_RE.sub("_", model))
+            namespace = _Namespace(path, self.dtype)
+            self._namespaces[model] = namespace
+        return namespace
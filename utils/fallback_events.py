@@ -0,0 +1,295 @@
+"""
+Fallback Events - Fixed-memory store of provider fallback events
+Keeps recent events in an array-backed ring buffer and counts them per
+(failed provider -> next provider, error class) over sliding windows, with an
+optional append-only log on disk for the full history
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .latency_histogram import DEFAULT_WINDOW, METRIC_WINDOWS, WINDOW_SLICE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+# Error classes, tried in order against the provider's error code and message
+ERROR_CLASS_PATTERNS: List[Tuple[str, "re.Pattern"]] = [
+    ('rate_limited', re.compile(r"rate.?limit|\b429\b|too many requests|quota", re.I)),
+    ('timeout', re.compile(r"time.?out|timed out|deadline", re.I)),
+    ('context_length', re.compile(r"context.?(length|window)|too many tokens|maximum context", re.I)),
+    ('safety_filter', re.compile(r"safety|blocked|content.?filter", re.I)),
+    ('auth', re.compile(r"\b40[13]\b|unauthori[sz]ed|forbidden|api.?key|authenticat|permission", re.I)),
+    ('unavailable', re.compile(r"not available|unavailable|overloaded|\b50[23]\b|\b529\b|circuit", re.I)),
+    ('server_error', re.compile(r"\b5\d\d\b|internal server error|bad gateway", re.I)),
+    ('connection', re.compile(r"connect|network|\bdns\b|\bssl\b|\btls\b|reset by peer|broken pipe", re.I)),
+    ('bad_request', re.compile(r"\b4\d\d\b|bad request|invalid", re.I)),
+]
+OTHER_ERROR_CLASS = 'other'
+
+# Characters kept of an error message (error samples and the on-disk log)
+MAX_ERROR_CHARS = 300
+
+
+def classify_error(error: Optional[str], code: Optional[str] = None) -> str:
+    """Map a provider error code or message to a small, fixed set of error classes"""
+    for text in (code, error):
+        if not text:
+            continue
+        for error_class, pattern in ERROR_CLASS_PATTERNS:
+            if pattern.search(text):
+                return error_class
+    return OTHER_ERROR_CLASS
+
+
+class FallbackEventStore:
+    """
+    Fallback events in constant memory, however many fallbacks happen.
+
+    The most recent ``capacity`` events live in parallel numpy arrays
+    (monotonic timestamp plus interned provider and error-class codes) used as
+    a ring buffer. Counts per (failed provider, next provider, error class)
+    are kept per time slice for the METRIC_WINDOWS and as lifetime totals;
+    their size depends only on the number of providers and error classes.
+    Error messages are not stored per event: each error class keeps its
+    latest message, truncated, as a sample.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        log_path: Optional[str] = None,
+        log_max_bytes: int = 10 * 1024 * 1024,
+        slice_seconds: int = WINDOW_SLICE_SECONDS
+    ):
+        """
+        Initialize an empty store
+
+        Args:
+            capacity: Events kept in the ring buffer
+            log_path: Append every event as a JSON line to this file (None: no log)
+            log_max_bytes: Rotate the log to ``<log_path>.1`` beyond this size
+            slice_seconds: Time slice of the windowed counts
+        """
+        if capacity <= 0:
+            raise ValueError(f"Fallback event store capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.slice_seconds = slice_seconds
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._failed = np.zeros(capacity, dtype=np.uint16)
+        self._next = np.zeros(capacity, dtype=np.uint16)
+        self._error_classes = np.zeros(capacity, dtype=np.uint16)
+        self._position = 0   # Next slot to write
+        self._retained = 0
+        self._total = 0
+
+        self._codes: Dict[str, int] = {}
+        self._names: List[str] = []
+
+        self._max_slices = math.ceil(max(METRIC_WINDOWS.values()) / slice_seconds)
+        # Slices, oldest first: [slice_id, {(failed, next, error_class): count}]
+        self._slices: deque = deque()
+        self._totals: Dict[Tuple[int, int, int], int] = {}
+        self._last_seen: Dict[Tuple[int, int, int], float] = {}
+        self._error_samples: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self._log = None
+        self._log_bytes = 0
+        self._log_flushed_at = 0.0
+        self._log_errors = 0
+        if log_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+                self._log = open(log_path, "a", encoding="utf-8")
+                self._log_bytes = os.path.getsize(log_path)
+            except OSError as e:
+                logger.warning(f"Fallback event log disabled: {e}")
+
+    def __len__(self) -> int:
+        """Events currently retained in the ring buffer"""
+        return self._retained
+
+    @property
+    def total(self) -> int:
+        """Events recorded over the store's lifetime"""
+        return self._total
+
+    def record(self, failed_provider: str, next_provider: str, error: str, error_code: Optional[str] = None) -> str:
+        """
+        Record a fallback event
+
+        Args:
+            failed_provider: Provider that failed
+            next_provider: Provider tried next
+            error: Error message
+            error_code: Machine-readable error from the provider's metadata, if any
+
+        Returns:
+            The event's error class
+        """
+        error_class = classify_error(error, error_code)
+        now = time.monotonic()
+        slice_id = int(now // self.slice_seconds)
+        with self._lock:
+            key = (self._intern(failed_provider), self._intern(next_provider), self._intern(error_class))
+            position = self._position
+            self._timestamps[position] = now
+            self._failed[position], self._next[position], self._error_classes[position] = key
+            self._position = (position + 1) % self.capacity
+            self._retained = min(self._retained + 1, self.capacity)
+            self._total += 1
+
+            if not self._slices or self._slices[-1][0] < slice_id:
+                self._slices.append([slice_id, {}])
+                while self._slices[0][0] <= slice_id - self._max_slices:
+                    self._slices.popleft()
+            counts = self._slices[-1][1]
+            counts[key] = counts.get(key, 0) + 1
+            self._totals[key] = self._totals.get(key, 0) + 1
+            self._last_seen[key] = now
+            self._error_samples[key[2]] = (error or "")[:MAX_ERROR_CHARS]
+
+            if self._log is not None:
+                self._write_log(now, failed_provider, next_provider, error_class, error)
+        return error_class
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """The newest events, oldest first"""
+        with self._lock:
+            count = min(max(limit, 0), self._retained)
+            positions = [(self._position - count + offset) % self.capacity for offset in range(count)]
+            rows = [
+                (self._timestamps[i], self._failed[i], self._next[i], self._error_classes[i])
+                for i in positions
+            ]
+            names = list(self._names)
+        return [
+            {
+                'timestamp': self._wall_time(timestamp),
+                'failed_provider': names[failed],
+                'next_provider': names[next_code],
+                'error_class': names[error_class]
+            }
+            for timestamp, failed, next_code, error_class in rows
+        ]
+
+    def window_count(self, window: str = DEFAULT_WINDOW) -> int:
+        """Number of events in a window"""
+        return sum(entry['count'] for entry in self.aggregate(window))
+
+    def aggregate(self, window: Optional[str] = DEFAULT_WINDOW) -> List[Dict[str, Any]]:
+        """
+        Event counts per (failed provider, next provider, error class)
+
+        Args:
+            window: One of METRIC_WINDOWS, or None for lifetime totals
+
+        Returns:
+            Entries sorted by count, highest first
+        """
+        with self._lock:
+            if window is None:
+                counts = dict(self._totals)
+            else:
+                oldest = int(time.monotonic() // self.slice_seconds) - METRIC_WINDOWS[window] // self.slice_seconds
+                counts = {}
+                for slice_id, slice_counts in self._slices:
+                    if slice_id > oldest:
+                        for key, count in slice_counts.items():
+                            counts[key] = counts.get(key, 0) + count
+            last_seen = {key: self._last_seen[key] for key in counts}
+            names = list(self._names)
+
+        return [
+            {
+                'failed_provider': names[key[0]],
+                'next_provider': names[key[1]],
+                'error_class': names[key[2]],
+                'count': count,
+                'last_seen': self._wall_time(last_seen[key])
+            }
+            for key, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        ]
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Windowed and lifetime aggregates, with the latest message of each error class"""
+        with self._lock:
+            samples = {self._names[code]: message for code, message in self._error_samples.items()}
+        return {
+            'windows': {window: self.aggregate(window) for window in METRIC_WINDOWS},
+            'lifetime': self.aggregate(None),
+            'error_samples': samples,
+            **self.get_status()
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get buffer and log counters"""
+        return {
+            'capacity': self.capacity,
+            'retained': self._retained,
+            'total_events': self._total,
+            'log_path': self.log_path if self._log is not None else None,
+            'log_errors': self._log_errors
+        }
+
+    def close(self):
+        """Flush and close the on-disk log"""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _intern(self, name: str) -> int:
+        """Small integer code for a provider or error class name (lock held)"""
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self._names)
+            self._codes[name] = code
+            self._names.append(name)
+        return code
+
+    @staticmethod
+    def _wall_time(monotonic_timestamp: float) -> str:
+        """ISO wall-clock time of a monotonic timestamp"""
+        return datetime.fromtimestamp(time.time() - (time.monotonic() - monotonic_timestamp)).isoformat()
+
+    def _write_log(self, now: float, failed_provider: str, next_provider: str, error_class: str, error: str):
+        """Append an event to the log, flushing at most once a second (lock held)"""
+        try:
+            line = json.dumps({
+                'timestamp': datetime.now().isoformat(),
+                'failed_provider': failed_provider,
+                'next_provider': next_provider,
+                'error_class': error_class,
+                'error': (error or "")[:MAX_ERROR_CHARS]
+            }) + "\n"
+            self._log.write(line)
+            self._log_bytes += len(line)
+            if self._log_bytes > self.log_max_bytes:
+                self._log.close()
+                os.replace(self.log_path, self.log_path + ".1")
+                self._log = open(self.log_path, "a", encoding="utf-8")
+                self._log_bytes = 0
+            elif now - self._log_flushed_at >= 1.0:
+                self._log.flush()
+                self._log_flushed_at = now
+        except OSError as e:
+            self._log_errors += 1
+            logger.warning(f"Fallback event log disabled after write error: {e}")
+            try:
+                self._log.close()
+            except OSError:
+                pass
+            self._log = None
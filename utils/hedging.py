@@ -0,0 +1,67 @@
+"""
+Request Hedging - Cost controls for speculative provider requests
+Limits how often the AI router may launch a parallel backup request
+"""
+import threading
+from typing import Any, Dict
+
+
+class HedgeBudget:
+    """
+    Token-bucket budget that caps hedged requests to a fraction of traffic.
+
+    Every request eligible for hedging deposits ``max_hedge_ratio`` credits
+    (up to ``max_burst``) and every hedge spends one credit, so over time no
+    more than ``max_hedge_ratio`` of requests can trigger a second provider
+    call, even if a provider's latency suddenly spikes for everyone.
+    """
+
+    def __init__(self, max_hedge_ratio: float = 0.1, max_burst: float = 10.0, initial_credits: float = 1.0):
+        """
+        Initialize the hedge budget
+
+        Args:
+            max_hedge_ratio: Maximum fraction of requests that may be hedged (0.0 - 1.0)
+            max_burst: Maximum credits that can accumulate during quiet periods
+            initial_credits: Credits available before any traffic has been seen
+        """
+        self.max_hedge_ratio = max(0.0, min(max_hedge_ratio, 1.0))
+        self.max_burst = max_burst
+        self._credits = min(initial_credits, max_burst)
+        self._requests = 0
+        self._hedges = 0
+        self._denied = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        """Register a request that is eligible for hedging"""
+        with self._lock:
+            self._requests += 1
+            self._credits = min(self.max_burst, self._credits + self.max_hedge_ratio)
+
+    def try_acquire(self) -> bool:
+        """
+        Spend one credit for a hedge
+
+        Returns:
+            True if the hedge may be launched, False if the budget is exhausted
+        """
+        with self._lock:
+            if self._credits >= 1.0:
+                self._credits -= 1.0
+                self._hedges += 1
+                return True
+            self._denied += 1
+            return False
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get budget usage for monitoring"""
+        with self._lock:
+            return {
+                'max_hedge_ratio': self.max_hedge_ratio,
+                'available_credits': round(self._credits, 2),
+                'eligible_requests': self._requests,
+                'hedges_launched': self._hedges,
+                'hedges_denied': self._denied,
+                'hedge_rate': (self._hedges / self._requests) if self._requests else 0.0
+            }
@@ -0,0 +1,188 @@
+"""
+HTTP Transport - Pooled, keep-alive HTTP clients for the AI providers
+Connections (and their TLS sessions) are reused between provider calls, with
+pool sizes and timeouts tuned per API host
+"""
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Connection pool and timeout settings for one API host"""
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 90.0     # Idle seconds before a pooled connection is closed
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0        # Non-streamed completions send nothing until they finish
+    write_timeout: float = 30.0
+    pool_timeout: float = 30.0         # Wait for a free connection when the pool is full
+    http2: bool = True
+
+
+DEFAULT_POOL_SETTINGS = PoolSettings()
+
+# Per-host settings; hosts not listed use DEFAULT_POOL_SETTINGS
+HOST_POOL_SETTINGS: Dict[str, PoolSettings] = {
+    'api.openai.com': PoolSettings(max_connections=64, max_keepalive_connections=32),
+    'api.anthropic.com': PoolSettings(max_connections=16, max_keepalive_connections=8),
+    'api.perplexity.ai': PoolSettings(max_connections=8, max_keepalive_connections=4, read_timeout=60.0),
+}
+
+_clients: Dict[str, "httpx.Client"] = {}
+_clients_lock = threading.Lock()
+_async_clients_created: Dict[str, int] = {}
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).hostname or url
+
+
+def configure_http_transport(
+    pool_sizes: str = "",
+    http2: Optional[bool] = None,
+    connect_timeout: Optional[float] = None,
+    keepalive_expiry: Optional[float] = None
+):
+    """
+    Apply configuration to the host pool settings (clients created afterwards use it)
+
+    Args:
+        pool_sizes: Per-host overrides such as ``api.openai.com=64/32`` (max
+            connections / max keep-alive connections), comma-separated
+        http2: Enable or disable HTTP/2 for every host
+        connect_timeout: Connect timeout in seconds for every host
+        keepalive_expiry: Idle keep-alive expiry in seconds for every host
+    """
+    global DEFAULT_POOL_SETTINGS
+    changes: Dict[str, Any] = {}
+    if http2 is not None:
+        changes['http2'] = http2
+    if connect_timeout is not None:
+        changes['connect_timeout'] = connect_timeout
+    if keepalive_expiry is not None:
+        changes['keepalive_expiry'] = keepalive_expiry
+
+    DEFAULT_POOL_SETTINGS = replace(DEFAULT_POOL_SETTINGS, **changes)
+    for host, settings in HOST_POOL_SETTINGS.items():
+        HOST_POOL_SETTINGS[host] = replace(settings, **changes)
+
+    for entry in (pool_sizes or "").split(","):
+        if "=" not in entry:
+            continue
+        host, sizes = entry.split("=", 1)
+        host = host.strip()
+        try:
+            max_connections, _, max_keepalive = sizes.partition("/")
+            settings = replace(HOST_POOL_SETTINGS.get(host, DEFAULT_POOL_SETTINGS), max_connections=int(max_connections))
+            if max_keepalive.strip():
+                settings = replace(settings, max_keepalive_connections=int(max_keepalive))
+            HOST_POOL_SETTINGS[host] = settings
+        except ValueError:
+            logger.warning(f"Ignoring invalid HTTP pool size entry: {entry!r}")
+
+
+def get_pool_settings(url: str) -> PoolSettings:
+    """Pool settings for the host of a URL (or a bare host name)"""
+    return HOST_POOL_SETTINGS.get(_host(url), DEFAULT_POOL_SETTINGS)
+
+
+def _client_options(settings: PoolSettings) -> Dict[str, Any]:
+    return {
+        'limits': httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry
+        ),
+        'timeout': httpx.Timeout(
+            connect=settings.connect_timeout,
+            read=settings.read_timeout,
+            write=settings.write_timeout,
+            pool=settings.pool_timeout
+        ),
+        'http2': settings.http2 and HTTP2_AVAILABLE
+    }
+
+
+def create_http_client(url: str, **client_kwargs) -> "httpx.Client":
+    """Build a pooled sync client tuned for a host (prefer get_http_client, which shares it)"""
+    return httpx.Client(**{**_client_options(get_pool_settings(url)), **client_kwargs})
+
+
+def create_async_http_client(url: str, **client_kwargs) -> "httpx.AsyncClient":
+    """
+    Build a pooled asyncio client tuned for a host
+
+    Async connection pools belong to the event loop that opened their
+    connections, so each async provider client gets its own rather than a
+    process-wide one; it stays open for the provider client's lifetime.
+    """
+    host = _host(url)
+    with _clients_lock:
+        _async_clients_created[host] = _async_clients_created.get(host, 0) + 1
+    return httpx.AsyncClient(**{**_client_options(get_pool_settings(url)), **client_kwargs})
+
+
+def get_http_client(url: str) -> "httpx.Client":
+    """
+    Get the process-wide sync client for a host (created on first use)
+
+    The client carries no base URL or credentials, so every provider client
+    talking to the host shares its connection pool. httpx.Client is safe to
+    use from several threads.
+    """
+    host = _host(url)
+    client = _clients.get(host)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(host)
+            if client is None:
+                client = create_http_client(url)
+                _clients[host] = client
+                logger.info(f"Created pooled HTTP client for {host}")
+    return client
+
+
+def close_http_clients():
+    """Close the shared sync clients (they are recreated on next use)"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+def get_http_transport_status() -> Dict[str, Any]:
+    """Get pool settings and open clients per host for monitoring"""
+    with _clients_lock:
+        shared_hosts = sorted(_clients)
+        async_clients = dict(_async_clients_created)
+    hosts = {}
+    for host in sorted(set(HOST_POOL_SETTINGS) | set(shared_hosts) | set(async_clients)):
+        settings = get_pool_settings(host)
+        hosts[host] = {
+            'max_connections': settings.max_connections,
+            'max_keepalive_connections': settings.max_keepalive_connections,
+            'keepalive_expiry_seconds': settings.keepalive_expiry,
+            'http2': settings.http2 and HTTP2_AVAILABLE,
+            'shared_sync_client': host in shared_hosts,
+            'async_clients': async_clients.get(host, 0)
+        }
+    return {'http2_available': HTTP2_AVAILABLE, 'hosts': hosts}
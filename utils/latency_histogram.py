@@ -0,0 +1,318 @@
+"""
+Latency Histogram - Log-bucketed response time distribution
+Provides cheap percentile estimates for routing decisions and monitoring,
+over the process lifetime or over sliding time windows
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# Sliding windows reported by the windowed metrics, in seconds
+METRIC_WINDOWS = {'1m': 60, '5m': 300, '1h': 3600}
+DEFAULT_WINDOW = '5m'
+# Time slice the windowed metrics count in; windows are whole slices, so the
+# newest slice is partial and a window covers its length minus up to one slice
+WINDOW_SLICE_SECONDS = 10
+
+
+class LatencyHistogram:
+    """
+    Thread-safe histogram with logarithmically spaced buckets.
+
+    Bucket ``i`` covers latencies up to ``2 ** (i / buckets_per_octave)`` ms, so
+    every recorded value is reported with a relative error below
+    ``2 ** (1 / buckets_per_octave) - 1`` (~19% at the default resolution)
+    while using a fixed, small amount of memory regardless of call volume.
+    """
+
+    def __init__(self, max_value_ms: int = 600000, buckets_per_octave: int = 4):
+        """
+        Initialize an empty histogram
+
+        Args:
+            max_value_ms: Largest latency tracked precisely; larger values land in the last bucket
+            buckets_per_octave: Buckets per doubling of latency (higher = more precise)
+        """
+        self.buckets_per_octave = buckets_per_octave
+        self.max_value_ms = max_value_ms
+        self._bucket_count = self._bucket_index(max_value_ms) + 1
+        self._counts: List[int] = [0] * self._bucket_count
+        self._total = 0
+        self._sum_ms = 0
+        self._min_ms: Optional[int] = None
+        self._max_ms: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        """Number of recorded values"""
+        return self._total
+
+    @property
+    def bucket_count(self) -> int:
+        """Number of buckets"""
+        return self._bucket_count
+
+    def record(self, value_ms: int):
+        """Record a single latency value in milliseconds"""
+        value_ms = max(0, int(value_ms))
+        index = min(self._bucket_index(value_ms), self._bucket_count - 1)
+        with self._lock:
+            self._counts[index] += 1
+            self._total += 1
+            self._sum_ms += value_ms
+            self._min_ms = value_ms if self._min_ms is None else min(self._min_ms, value_ms)
+            self._max_ms = value_ms if self._max_ms is None else max(self._max_ms, value_ms)
+
+    def percentile(self, percentile: float) -> Optional[int]:
+        """
+        Estimate a latency percentile
+
+        Args:
+            percentile: Percentile between 0 and 100
+
+        Returns:
+            Upper bound of the bucket containing the percentile, or None if empty
+        """
+        with self._lock:
+            return self._percentile_of(self._counts, self._total, self._max_ms, percentile)
+
+    def get_summary(self) -> Dict[str, Optional[int]]:
+        """Get count, mean and common percentiles"""
+        summary = {
+            'count': self._total,
+            'mean_ms': int(self._sum_ms / self._total) if self._total else None,
+            'min_ms': self._min_ms,
+            'max_ms': self._max_ms,
+        }
+        for label, percentile in (('p50_ms', 50), ('p90_ms', 90), ('p95_ms', 95), ('p99_ms', 99)):
+            summary[label] = self.percentile(percentile)
+        return summary
+
+    def reset(self):
+        """Clear all recorded values"""
+        with self._lock:
+            self._counts = [0] * self._bucket_count
+            self._total = 0
+            self._sum_ms = 0
+            self._min_ms = None
+            self._max_ms = None
+
+    def _percentile_of(self, counts: List[int], total: int, max_ms: Optional[int], percentile: float) -> Optional[int]:
+        """Percentile of a bucket count array (lock held)"""
+        if not total:
+            return None
+
+        rank = max(1, math.ceil(total * percentile / 100))
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                # Never report beyond the largest value actually observed
+                return min(self._bucket_upper_bound(index), max_ms)
+        return max_ms
+
+    def _bucket_index(self, value_ms: int) -> int:
+        """Map a latency to its bucket index"""
+        if value_ms <= 1:
+            return 0
+        return math.ceil(math.log2(value_ms) * self.buckets_per_octave)
+
+    def _bucket_upper_bound(self, index: int) -> int:
+        """Largest latency represented by a bucket"""
+        return int(2 ** (index / self.buckets_per_octave))
+
+
+class WindowedLatencyHistogram(LatencyHistogram):
+    """
+    Log-bucketed histogram over sliding time windows.
+
+    Values are counted per time slice, and a window's distribution is the sum
+    of the slices it covers, so percentiles follow recent traffic instead of
+    the whole process lifetime. ``count``, ``percentile`` and ``get_summary``
+    cover a window (DEFAULT_WINDOW unless given); lifetime bucket counts are
+    kept for cumulative exports such as Prometheus histograms.
+    """
+
+    def __init__(
+        self,
+        max_value_ms: int = 600000,
+        buckets_per_octave: int = 8,
+        slice_seconds: int = WINDOW_SLICE_SECONDS,
+        max_window_seconds: int = max(METRIC_WINDOWS.values())
+    ):
+        """
+        Initialize an empty histogram
+
+        Args:
+            max_value_ms: Largest latency tracked precisely
+            buckets_per_octave: Buckets per doubling of latency (8 = under 10% error)
+            slice_seconds: Time slice length
+            max_window_seconds: Longest window that can be queried
+        """
+        super().__init__(max_value_ms, buckets_per_octave)
+        self.slice_seconds = slice_seconds
+        self._max_slices = math.ceil(max_window_seconds / slice_seconds)
+        # Slices, oldest first: [slice_id, bucket counts, count, sum_ms, max_ms]
+        self._slices: deque = deque()
+
+    def record(self, value_ms: int):
+        """Record a single latency value in milliseconds"""
+        value_ms = max(0, int(value_ms))
+        index = min(self._bucket_index(value_ms), self._bucket_count - 1)
+        slice_id = int(time.monotonic() // self.slice_seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._total += 1
+            self._sum_ms += value_ms
+            self._min_ms = value_ms if self._min_ms is None else min(self._min_ms, value_ms)
+            self._max_ms = value_ms if self._max_ms is None else max(self._max_ms, value_ms)
+
+            if not self._slices or self._slices[-1][0] < slice_id:
+                self._slices.append([slice_id, [0] * self._bucket_count, 0, 0, 0])
+                while self._slices[0][0] <= slice_id - self._max_slices:
+                    self._slices.popleft()
+            current = self._slices[-1]
+            current[1][index] += 1
+            current[2] += 1
+            current[3] += value_ms
+            current[4] = max(current[4], value_ms)
+
+    @property
+    def count(self) -> int:
+        """Number of values recorded in the default window"""
+        return self.window_count(DEFAULT_WINDOW)
+
+    def window_count(self, window: str = DEFAULT_WINDOW) -> int:
+        """Number of values recorded in a window"""
+        with self._lock:
+            return self._window(window)[1]
+
+    def percentile(self, percentile: float, window: str = DEFAULT_WINDOW) -> Optional[int]:
+        """Estimate a latency percentile over a window"""
+        with self._lock:
+            counts, total, _, max_ms = self._window(window)
+            return self._percentile_of(counts, total, max_ms, percentile)
+
+    def get_summary(self, window: str = DEFAULT_WINDOW) -> Dict[str, Optional[int]]:
+        """Get count, mean, max and p50/p90/p99/p99.9 over a window"""
+        with self._lock:
+            counts, total, sum_ms, max_ms = self._window(window)
+        return self.summarize(counts, total, sum_ms, max_ms)
+
+    def summarize(self, counts: List[int], total: int, sum_ms: int, max_ms: int) -> Dict[str, Optional[int]]:
+        """
+        Summary of bucket counts in this histogram's layout, e.g. window
+        buckets of several processes added together
+        """
+        summary = {
+            'count': total,
+            'mean_ms': int(sum_ms / total) if total else None,
+            'max_ms': max_ms if total else None,
+        }
+        for label, percentile in (('p50_ms', 50), ('p90_ms', 90), ('p99_ms', 99), ('p99_9_ms', 99.9)):
+            summary[label] = self._percentile_of(counts, total, max_ms, percentile)
+        return summary
+
+    def window_buckets(self, window: str = DEFAULT_WINDOW) -> Tuple[List[int], int, int, int]:
+        """Bucket counts, count, sum in ms and max in ms of a window"""
+        with self._lock:
+            return self._window(window)
+
+    def get_window_summaries(self) -> Dict[str, Dict[str, Optional[int]]]:
+        """Summaries for every window in METRIC_WINDOWS"""
+        return {window: self.get_summary(window) for window in METRIC_WINDOWS}
+
+    def cumulative_buckets(self, bounds_ms: List[int]) -> Tuple[List[int], int, int]:
+        """
+        Lifetime cumulative counts at the given upper bounds
+
+        Returns:
+            Tuple of (count of values <= each bound, total count, sum in ms)
+        """
+        with self._lock:
+            counts, total, sum_ms = list(self._counts), self._total, self._sum_ms
+        cumulative = []
+        seen = 0
+        index = 0
+        for bound in bounds_ms:
+            while index < len(counts) and self._bucket_upper_bound(index) <= bound:
+                seen += counts[index]
+                index += 1
+            cumulative.append(seen)
+        return cumulative, total, sum_ms
+
+    def reset(self):
+        """Clear all recorded values"""
+        with self._lock:
+            self._slices.clear()
+        super().reset()
+
+    def _window(self, window: str) -> Tuple[List[int], int, int, int]:
+        """Merged (bucket counts, count, sum_ms, max_ms) of a window's slices (lock held)"""
+        oldest = int(time.monotonic() // self.slice_seconds) - METRIC_WINDOWS[window] // self.slice_seconds
+        counts = [0] * self._bucket_count
+        total = sum_ms = max_ms = 0
+        for slice_id, slice_counts, slice_total, slice_sum, slice_max in self._slices:
+            if slice_id <= oldest:
+                continue
+            for index, bucket_count in enumerate(slice_counts):
+                if bucket_count:
+                    counts[index] += bucket_count
+            total += slice_total
+            sum_ms += slice_sum
+            max_ms = max(max_ms, slice_max)
+        return counts, total, sum_ms, max_ms
+
+
+class ThroughputCounter:
+    """
+    Named totals (requests, tokens) over sliding time windows, plus lifetime totals.
+    Uses the same time slices as WindowedLatencyHistogram.
+    """
+
+    def __init__(self, slice_seconds: int = WINDOW_SLICE_SECONDS, max_window_seconds: int = max(METRIC_WINDOWS.values())):
+        self.slice_seconds = slice_seconds
+        self._max_slices = math.ceil(max_window_seconds / slice_seconds)
+        self._slices: deque = deque()  # [slice_id, {name: amount}], oldest first
+        self._totals: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, **amounts: int):
+        """Add amounts to named counters"""
+        slice_id = int(time.monotonic() // self.slice_seconds)
+        with self._lock:
+            if not self._slices or self._slices[-1][0] < slice_id:
+                self._slices.append([slice_id, {}])
+                while self._slices[0][0] <= slice_id - self._max_slices:
+                    self._slices.popleft()
+            current = self._slices[-1][1]
+            for name, amount in amounts.items():
+                current[name] = current.get(name, 0) + amount
+                self._totals[name] = self._totals.get(name, 0) + amount
+
+    def totals(self) -> Dict[str, int]:
+        """Lifetime totals"""
+        with self._lock:
+            return dict(self._totals)
+
+    def get_summary(self, window: str = DEFAULT_WINDOW) -> Dict[str, Any]:
+        """Totals over a window, with per-second rates"""
+        window_seconds = METRIC_WINDOWS[window]
+        oldest = int(time.monotonic() // self.slice_seconds) - window_seconds // self.slice_seconds
+        sums: Dict[str, int] = {}
+        with self._lock:
+            for slice_id, amounts in self._slices:
+                if slice_id > oldest:
+                    for name, amount in amounts.items():
+                        sums[name] = sums.get(name, 0) + amount
+        summary: Dict[str, Any] = dict(sums)
+        for name, amount in sums.items():
+            summary[f'{name}_per_second'] = round(amount / window_seconds, 3)
+        return summary
+
+    def get_window_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """Summaries for every window in METRIC_WINDOWS"""
+        return {window: self.get_summary(window) for window in METRIC_WINDOWS}
@@ -0,0 +1,191 @@
+"""
+Local Embedding - Offline text embeddings from hashed n-gram features
+Gives the local fallback provider real, comparable vectors without a network
+call or model download, so semantic search keeps working during outages and
+in air-gapped deployments
+"""
+import hashlib
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+DEFAULT_DIMENSIONS = 384
+MODEL_VERSION = 1
+
+# Each feature is added to this many signed buckets (a sparse random projection);
+# more than one keeps hash collisions from dominating the similarity of short texts
+HASHES_PER_FEATURE = 2
+CHAR_NGRAM_RANGE = (3, 5)
+
+# Feature weights. Character n-grams let inflections ("audit", "audits", "auditing")
+# overlap; word bigrams reward shared phrases over shared vocabulary
+WORD_WEIGHT = 1.0
+CHAR_NGRAM_WEIGHT = 0.5
+BIGRAM_WEIGHT = 0.5
+# Stand-in for the IDF of very common words (see HashedNgramEmbedder)
+STOPWORD_WEIGHT = 0.1
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers him his how i if in into is it its itself just me more most my no nor not now of off on once only
+or other our ours out over own same she should so some such than that the their theirs them then there
+these they this those through to too under until up very was we were what when where which while who whom
+why will with would you your yours
+""".split())
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens after Unicode compatibility normalization"""
+    return _TOKEN_RE.findall(unicodedata.normalize("NFKC", text or "").lower())
+
+
+class HashedNgramEmbedder:
+    """
+    Deterministic text embeddings built with the hashing trick.
+
+    A text is a bag of weighted features: words (sublinear term frequency),
+    the character n-grams of each word, and adjacent word pairs. Every
+    feature is hashed (BLAKE2b, so vectors are stable across processes and
+    releases) into ``HASHES_PER_FEATURE`` signed buckets of a
+    ``dimensions``-wide vector, which is a sparse random projection of the
+    full n-gram space; rows are L2-normalized, so a dot product is the
+    cosine similarity.
+
+    There is no fitted vocabulary or corpus IDF: the same text must always
+    map to the same vector for stored vectors to stay valid, so common words
+    are down-weighted from a fixed stopword list instead. Per-word feature
+    vectors are cached, and a whole batch is accumulated with one
+    ``np.bincount``.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS, word_cache_size: int = 65536):
+        """
+        Initialize the embedder
+
+        Args:
+            dimensions: Output vector size
+            word_cache_size: Words whose hashed features are kept in memory
+        """
+        if dimensions < 2:
+            raise ValueError(f"Embedding dimensions must be at least 2, got {dimensions}")
+        self.dimensions = dimensions
+        self._word_features = lru_cache(maxsize=word_cache_size)(self._compute_word_features)
+
+    @property
+    def model_name(self) -> str:
+        """Model identifier; changes whenever the vectors it produces would"""
+        return f"local-hashed-ngram-v{MODEL_VERSION}-{self.dimensions}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of texts
+
+        Args:
+            texts: Input texts
+
+        Returns:
+            float32 matrix with one unit-length row per text (all zeros for
+            a text without word characters)
+        """
+        buckets: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        for row, text in enumerate(texts):
+            offset = row * self.dimensions
+            for row_buckets, row_values in self._text_features(tokenize(text)):
+                buckets.append(row_buckets + offset)
+                values.append(row_values)
+
+        size = len(texts) * self.dimensions
+        if buckets:
+            matrix = np.bincount(
+                np.concatenate(buckets), weights=np.concatenate(values), minlength=size
+            ).astype(np.float32)
+        else:
+            matrix = np.zeros(size, dtype=np.float32)
+        matrix = matrix.reshape(len(texts), self.dimensions)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def count_tokens(self, text: str) -> int:
+        """Number of word tokens the embedder sees in a text"""
+        return len(tokenize(text))
+
+    def _text_features(self, tokens: List[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(bucket, value) arrays of every feature of one tokenized text"""
+        features = []
+        for word, count in Counter(tokens).items():
+            word_buckets, word_values = self._word_features(word)
+            features.append((word_buckets, word_values * (1.0 + math.log(count))))
+
+        bigrams = Counter(zip(tokens, tokens[1:]))
+        if bigrams:
+            hashes = [self._hash(f"{first} {second}") for first, second in bigrams]
+            weights = [BIGRAM_WEIGHT * (1.0 + math.log(count)) for count in bigrams.values()]
+            features.append(self._project(hashes, weights))
+        return features
+
+    def _compute_word_features(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Hashed features of one word: the word itself plus its character n-grams"""
+        weight = STOPWORD_WEIGHT if word in STOPWORDS else WORD_WEIGHT
+        hashes = [self._hash(word)]
+        weights = [weight]
+
+        padded = f"<{word}>"
+        low, high = CHAR_NGRAM_RANGE
+        ngrams = {
+            padded[start:start + n]
+            for n in range(low, high + 1)
+            for start in range(len(padded) - n + 1)
+        }
+        ngrams.discard(padded)  # Short words: the whole padded word adds nothing over the word feature
+        if ngrams:
+            # The n-grams of a word share CHAR_NGRAM_WEIGHT, scaled like the word itself
+            ngram_weight = weight * CHAR_NGRAM_WEIGHT / math.sqrt(len(ngrams))
+            for ngram in sorted(ngrams):
+                hashes.append(self._hash("#" + ngram))
+                weights.append(ngram_weight)
+        return self._project(hashes, weights)
+
+    def _project(self, hashes: List[int], weights: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Spread weighted features over HASHES_PER_FEATURE signed buckets each"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        weights = np.asarray(weights, dtype=np.float64) / math.sqrt(HASHES_PER_FEATURE)
+        buckets = []
+        values = []
+        for k in range(HASHES_PER_FEATURE):
+            shifted = hashes >> np.uint64(24 * k)
+            buckets.append(((shifted & np.uint64(0xFFFFFF)) % np.uint64(self.dimensions)).astype(np.int64))
+            signs = ((hashes >> np.uint64(56 + k)) & np.uint64(1)).astype(np.float64) * 2.0 - 1.0
+            values.append(weights * signs)
+        return np.concatenate(buckets), np.concatenate(values)
+
+    @staticmethod
+    def _hash(feature: str) -> int:
+        """Stable 64-bit hash of a feature"""
+        return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+_embedders: Dict[int, HashedNgramEmbedder] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_local_embedder(dimensions: int = DEFAULT_DIMENSIONS) -> HashedNgramEmbedder:
+    """Get the shared embedder for a vector size (its word cache is process-wide)"""
+    with _embedders_lock:
+        embedder = _embedders.get(dimensions)
+        if embedder is None:
+            embedder = HashedNgramEmbedder(dimensions)
+            _embedders[dimensions] = embedder
+        return embedder
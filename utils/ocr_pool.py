@@ -0,0 +1,503 @@
+"""
+OCR Pool - Parallel, cached OCR of scanned PDF pages
+Fans pages out to a process pool, rasterizing each at the DPI it needs, and
+caches text per (document content hash, page number, DPI)
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from pdf2image import convert_from_path
+    import pytesseract
+    OCR_AVAILABLE = True
+except ImportError:
+    OCR_AVAILABLE = False
+
+from .document_ingestion import DEFAULT_OCR_DPI, MIN_TEXT_CHARS_PER_PAGE, PYPDF_AVAILABLE
+
+logger = logging.getLogger(__name__)
+
+
+MIN_OCR_DPI = 200
+MAX_OCR_DPI = 400
+DPI_STEP = 50
+DEFAULT_CACHE_PATH = "instance/ocr_cache.sqlite3"
+# Per-page timings kept for get_stats()
+RECENT_PAGES = 1000
+
+
+@dataclass
+class PageOCRResult:
+    """OCR text of one page with where the time went"""
+    page_number: int
+    dpi: int            # DPI chosen for the page (the cache key)
+    rendered_dpi: int   # DPI actually rasterized at (higher if the first pass was too sparse)
+    text: str
+    cached: bool = False
+    rasterize_ms: float = 0.0
+    ocr_ms: float = 0.0
+    wall_ms: float = 0.0
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity masks, e.g. in containers)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def file_content_hash(path: str) -> str:
+    """SHA-256 hex digest of a file, read in blocks (same convention as calculate_file_hash)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def native_image_dpi(page) -> Optional[float]:
+    """
+    Resolution of the largest image drawn on a pypdf page, assuming it fills the page
+
+    Scanned pages are one full-page image, so its pixel size over the page
+    size in inches is the scan resolution. Returns None without images.
+    """
+    try:
+        width_in = float(page.mediabox.width) / 72.0
+        height_in = float(page.mediabox.height) / 72.0
+        resources = page.get("/Resources") or {}
+        xobjects = resources.get("/XObject") or {}
+        best = None
+        for xobject in xobjects.values():
+            image = xobject.get_object()
+            if image.get("/Subtype") != "/Image":
+                continue
+            pixels_x, pixels_y = int(image.get("/Width", 0)), int(image.get("/Height", 0))
+            if best is None or pixels_x * pixels_y > best[0] * best[1]:
+                best = (pixels_x, pixels_y)
+    except Exception:
+        return None
+
+    if best is None or width_in <= 0 or height_in <= 0:
+        return None
+    return max(best[0] / width_in, best[1] / height_in)
+
+
+def choose_ocr_dpi(page=None, min_dpi: int = MIN_OCR_DPI, max_dpi: int = MAX_OCR_DPI,
+                   default_dpi: int = DEFAULT_OCR_DPI) -> int:
+    """
+    Pick the rasterization DPI for a scanned page
+
+    Rendering above the scan's own resolution only adds pixels for Tesseract to
+    chew through, while rendering far below it loses small print. The native
+    resolution is snapped to DPI_STEP (so near-identical scans share cache
+    keys) and clamped to [min_dpi, max_dpi]; pages without a measurable image
+    use default_dpi.
+    """
+    native = native_image_dpi(page) if page is not None else None
+    if native is None:
+        dpi = default_dpi
+    else:
+        dpi = int(round(native / DPI_STEP) * DPI_STEP)
+    return max(min_dpi, min(max_dpi, dpi))
+
+
+def _init_worker():
+    # Tesseract parallelizes internally with OpenMP; one thread per worker
+    # process avoids oversubscribing the cores the pool already fills
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page(path: str, page_number: int, dpi: int, max_dpi: int, language: str) -> Tuple[int, str, float, float]:
+    """
+    Worker body: rasterize and OCR one page, re-rendering at max_dpi if the text is too sparse
+
+    Returns:
+        (rendered_dpi, text, rasterize_ms, ocr_ms)
+    """
+    rasterize_ms = ocr_ms = 0.0
+    render_dpi = dpi
+    while True:
+        started = time.perf_counter()
+        images = convert_from_path(path, dpi=render_dpi, first_page=page_number, last_page=page_number,
+                                   grayscale=True, thread_count=1)
+        rasterized = time.perf_counter()
+        text = "\n".join(pytesseract.image_to_string(image, lang=language) for image in images).strip()
+        rasterize_ms += (rasterized - started) * 1000
+        ocr_ms += (time.perf_counter() - rasterized) * 1000
+
+        if len(text) >= MIN_TEXT_CHARS_PER_PAGE or render_dpi >= max_dpi:
+            return render_dpi, text, rasterize_ms, ocr_ms
+        render_dpi = max_dpi
+
+
+class OCRPageCache:
+    """
+    SQLite-backed OCR text cache keyed by (content hash, page number, DPI).
+
+    Shared by every process pointing at the same file; WAL mode lets
+    readers proceed while another process writes.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        """
+        Initialize the cache
+
+        Args:
+            path: SQLite database file (":memory:" for a process-local cache)
+        """
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        if path != ":memory:":
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_pages ("
+            " content_hash TEXT NOT NULL, page_number INTEGER NOT NULL, dpi INTEGER NOT NULL,"
+            " rendered_dpi INTEGER NOT NULL, text TEXT NOT NULL, ocr_ms REAL NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (content_hash, page_number, dpi))"
+        )
+        self._connection.commit()
+
+    def get(self, content_hash: str, page_number: int, dpi: int) -> Optional[Tuple[int, str]]:
+        """Get (rendered_dpi, text) for a page, or None"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT rendered_dpi, text FROM ocr_pages WHERE content_hash = ? AND page_number = ? AND dpi = ?",
+                (content_hash, page_number, dpi)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, content_hash: str, result: PageOCRResult):
+        """Store a page's OCR text"""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO ocr_pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, result.page_number, result.dpi, result.rendered_dpi, result.text,
+                 result.rasterize_ms + result.ocr_ms, time.time())
+            )
+            self._connection.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get entry count and stored OCR time for monitoring"""
+        with self._lock:
+            entries, documents, saved_ms = self._connection.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT content_hash), COALESCE(SUM(ocr_ms), 0) FROM ocr_pages"
+            ).fetchone()
+        return {'path': self.path, 'entries': entries, 'documents': documents, 'ocr_seconds_stored': round(saved_ms / 1000, 1)}
+
+
+class OCRPool:
+    """
+    Process pool that OCRs scanned PDF pages in parallel.
+
+    ``submit`` returns a Future per page, so page extraction (extract_pages) can keep
+    several pages in flight while it streams the rest of the document.
+    Results come back to the submitting process, which owns the cache;
+    identical pages submitted while one is already running share its Future.
+    The pool is sized to the available cores and started on first use.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        cache: Optional[OCRPageCache] = None,
+        min_dpi: int = MIN_OCR_DPI,
+        max_dpi: int = MAX_OCR_DPI,
+        language: str = "eng",
+        mp_context: Optional[str] = "spawn"
+    ):
+        """
+        Initialize the pool
+
+        Args:
+            max_workers: Worker processes (defaults to the available cores)
+            cache: Page cache (None disables caching)
+            min_dpi: Lowest rasterization DPI
+            max_dpi: Highest rasterization DPI, also used to retry sparse pages
+            language: Tesseract language
+            mp_context: multiprocessing start method; spawn avoids forking a
+                        process that already runs pipeline and server threads
+        """
+        self.max_workers = max_workers or available_cpus()
+        self.cache = cache
+        self.min_dpi = min_dpi
+        self.max_dpi = max_dpi
+        self.language = language
+        self.mp_context = mp_context
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Tuple[str, int, int], Future] = {}
+        self._hash_memo: Dict[Tuple[str, int, int], str] = {}
+        self._recent: deque = deque(maxlen=RECENT_PAGES)
+        self._stats = {'pages': 0, 'cache_hits': 0, 'escalations': 0, 'errors': 0,
+                       'rasterize_ms': 0.0, 'ocr_ms': 0.0}
+
+    @property
+    def lookahead(self) -> int:
+        """Pages a caller should keep submitted ahead to keep every worker busy"""
+        return self.max_workers * 2
+
+    def choose_dpi(self, page=None) -> int:
+        """Adaptive DPI for a pypdf page within this pool's bounds"""
+        return choose_ocr_dpi(page, self.min_dpi, self.max_dpi)
+
+    def content_hash(self, path: str) -> str:
+        """Content hash of a file, memoized by path, size and mtime"""
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._hash_memo.get(key)
+        if cached is None:
+            cached = file_content_hash(path)
+            with self._lock:
+                self._hash_memo[key] = cached
+        return cached
+
+    def submit(self, path: str, page_number: int, dpi: Optional[int] = None,
+               content_hash: Optional[str] = None) -> "Future[PageOCRResult]":
+        """
+        OCR one page in the background
+
+        Args:
+            path: PDF file
+            page_number: 1-based page number
+            dpi: Rasterization DPI (defaults to DEFAULT_OCR_DPI within bounds)
+            content_hash: SHA-256 of the file, when already known
+
+        Returns:
+            Future resolving to a PageOCRResult
+        """
+        dpi = dpi or self.choose_dpi()
+        content_hash = content_hash or self.content_hash(path)
+        key = (content_hash, page_number, dpi)
+        started = time.perf_counter()
+
+        if self.cache is not None:
+            hit = self.cache.get(*key)
+            if hit is not None:
+                result = PageOCRResult(page_number, dpi, hit[0], hit[1], cached=True,
+                                       wall_ms=(time.perf_counter() - started) * 1000)
+                self._record(result)
+                future: Future = Future()
+                future.set_result(result)
+                return future
+
+        with self._lock:
+            pending = self._in_flight.get(key)
+            if pending is not None:
+                return pending
+            if self._executor is None:
+                context = multiprocessing.get_context(self.mp_context) if self.mp_context else None
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context, initializer=_init_worker)
+            worker_future = self._executor.submit(_ocr_page, path, page_number, dpi, self.max_dpi, self.language)
+            future = Future()
+            self._in_flight[key] = future
+
+        def finish(done: Future):
+            with self._lock:
+                self._in_flight.pop(key, None)
+            try:
+                rendered_dpi, text, rasterize_ms, ocr_ms = done.result()
+            except BaseException as e:
+                with self._lock:
+                    self._stats['errors'] += 1
+                logger.error(f"OCR of {path} page {page_number} at {dpi} DPI failed: {e}")
+                future.set_exception(e)
+                return
+            result = PageOCRResult(page_number, dpi, rendered_dpi, text, rasterize_ms=rasterize_ms,
+                                   ocr_ms=ocr_ms, wall_ms=(time.perf_counter() - started) * 1000)
+            if self.cache is not None:
+                try:
+                    self.cache.put(content_hash, result)
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to cache OCR of {path} page {page_number}: {e}")
+            self._record(result)
+            logger.debug(f"OCR {path} p{page_number}: {dpi}->{rendered_dpi} DPI, "
+                         f"rasterize {rasterize_ms:.0f}ms, ocr {ocr_ms:.0f}ms")
+            future.set_result(result)
+
+        worker_future.add_done_callback(finish)
+        return future
+
+    def __call__(self, path: str, page_number: int) -> str:
+        """Synchronous (path, page_number) -> text, usable wherever a plain OCR callable is expected"""
+        return self.submit(path, page_number).result().text
+
+    def _record(self, result: PageOCRResult):
+        with self._lock:
+            self._stats['pages'] += 1
+            if result.cached:
+                self._stats['cache_hits'] += 1
+            elif result.rendered_dpi != result.dpi:
+                self._stats['escalations'] += 1
+            self._stats['rasterize_ms'] += result.rasterize_ms
+            self._stats['ocr_ms'] += result.ocr_ms
+            self._recent.append(result)
+
+    def recent_pages(self) -> List[Dict[str, Any]]:
+        """Per-page timings of the most recent pages (text omitted)"""
+        with self._lock:
+            return [{key: value for key, value in asdict(result).items() if key != 'text'} for result in self._recent]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get throughput, cache and timing statistics for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = len(self._in_flight)
+            walls = sorted(result.wall_ms for result in self._recent if not result.cached)
+        processed = stats['pages'] - stats['cache_hits']
+        stats.update({
+            'workers': self.max_workers,
+            'in_flight': in_flight,
+            'cache_hit_rate': stats['cache_hits'] / stats['pages'] if stats['pages'] else 0.0,
+            'avg_rasterize_ms': stats['rasterize_ms'] / processed if processed else 0.0,
+            'avg_ocr_ms': stats['ocr_ms'] / processed if processed else 0.0,
+            'p50_page_ms': walls[len(walls) // 2] if walls else 0.0,
+            'p95_page_ms': walls[min(len(walls) - 1, int(len(walls) * 0.95))] if walls else 0.0,
+            'cache': self.cache.get_stats() if self.cache is not None else None
+        })
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes (a later submit starts new ones)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# Global OCR pool instance
+_ocr_pool_instance = None
+
+
+def get_ocr_pool() -> OCRPool:
+    """Get the global OCR pool (singleton pattern)"""
+    global _ocr_pool_instance
+
+    if _ocr_pool_instance is None:
+        _ocr_pool_instance = OCRPool(cache=OCRPageCache())
+
+    return _ocr_pool_instance
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+def _scanned_pages(path: str, pool: OCRPool, all_pages: bool) -> List[Tuple[int, int]]:
+    """(page_number, adaptive DPI) of the pages extract_pages would OCR"""
+    from pypdf import PdfReader
+    from .document_ingestion import _page_has_images
+
+    pages = []
+    for page_index, page in enumerate(PdfReader(path).pages):
+        if all_pages or (len((page.extract_text() or "").strip()) < MIN_TEXT_CHARS_PER_PAGE and _page_has_images(page)):
+            pages.append((page_index + 1, pool.choose_dpi(page)))
+    return pages
+
+
+def benchmark(paths: List[str], workers: Optional[int] = None, passes: int = 2,
+              cache_path: Optional[str] = None, fixed_dpi: Optional[int] = None,
+              all_pages: bool = False, per_page: bool = False) -> Dict[str, Any]:
+    """
+    OCR the scanned pages of sample PDFs and report throughput
+
+    The first pass measures cold OCR; later passes show what the page cache
+    saves on re-analysis.
+
+    Args:
+        paths: PDF files or directories of PDFs
+        workers: Pool size (defaults to the available cores)
+        passes: Times to OCR the corpus
+        cache_path: Cache file (defaults to a throwaway in-memory cache)
+        fixed_dpi: Rasterize every page at this DPI instead of adaptively
+        all_pages: OCR every page, not only the ones without a text layer
+        per_page: Include per-page timings of the last pass
+
+    Returns:
+        Corpus size and per-pass wall time, pages/second and cache hits
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".pdf")))
+        else:
+            files.append(path)
+
+    pool = OCRPool(max_workers=workers, cache=OCRPageCache(cache_path or ":memory:"))
+    work = []
+    for path in files:
+        content_hash = pool.content_hash(path)
+        for page_number, dpi in _scanned_pages(path, pool, all_pages):
+            work.append((path, page_number, fixed_dpi or dpi, content_hash))
+
+    report = {'files': len(files), 'pages': len(work), 'workers': pool.max_workers, 'passes': []}
+    try:
+        for number in range(passes):
+            hits_before = pool.get_stats()['cache_hits']
+            started = time.perf_counter()
+            results = [future.result() for future in [pool.submit(path, page, dpi, content_hash)
+                                                     for path, page, dpi, content_hash in work]]
+            elapsed = time.perf_counter() - started
+            walls = sorted(result.wall_ms for result in results)
+            report['passes'].append({
+                'pass': number + 1,
+                'seconds': round(elapsed, 2),
+                'pages_per_second': round(len(results) / elapsed, 2) if elapsed else 0.0,
+                'cache_hits': pool.get_stats()['cache_hits'] - hits_before,
+                'p50_page_ms': round(walls[len(walls) // 2], 1) if walls else 0.0,
+                'max_page_ms': round(walls[-1], 1) if walls else 0.0,
+                'rasterize_ms': round(sum(result.rasterize_ms for result in results), 1),
+                'ocr_ms': round(sum(result.ocr_ms for result in results), 1)
+            })
+        if per_page:
+            report['pages_detail'] = [
+                {'file': item[0], **{key: value for key, value in asdict(result).items() if key != 'text'}}
+                for item, result in zip(work, results)
+            ]
+        report['dpi_histogram'] = {dpi: sum(1 for item in work if item[2] == dpi) for dpi in sorted({item[2] for item in work})}
+        report['escalations'] = pool.get_stats()['escalations']
+    finally:
+        pool.shutdown()
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    """python -m utils.ocr_pool SAMPLES... [--workers N] [--passes N] [--dpi N] [--all-pages] [--per-page]"""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Benchmark parallel OCR over a corpus of sample PDFs")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories of PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: available cores)")
+    parser.add_argument("--passes", type=int, default=2, help="Passes over the corpus; later passes hit the cache")
+    parser.add_argument("--cache", default=None, help="OCR cache file (default: in-memory)")
+    parser.add_argument("--dpi", type=int, default=None, help="Fixed DPI instead of adaptive")
+    parser.add_argument("--all-pages", action="store_true", help="OCR pages that already have a text layer too")
+    parser.add_argument("--per-page", action="store_true", help="Also print per-page timings of the last pass")
+    args = parser.parse_args(argv)
+
+    if not (OCR_AVAILABLE and PYPDF_AVAILABLE):
+        parser.error("pypdf, pdf2image and pytesseract are required")
+
+    report = benchmark(args.paths, args.workers, args.passes, args.cache, args.dpi, args.all_pages, args.per_page)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Prometheus Metrics - Text exposition of the AI router's metrics
+Renders request counters, latency histograms, token throughput and
+resilience gauges in the Prometheus text format (version 0.0.4)
+"""
+from typing import Any, Dict, List
+
+from .latency_histogram import METRIC_WINDOWS
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket bounds in ms: one per doubling from 8 ms to ~9 minutes
+LATENCY_BUCKETS_MS = [2 ** exponent for exponent in range(3, 20)]
+QUANTILES = (('0.5', 'p50_ms'), ('0.9', 'p90_ms'), ('0.99', 'p99_ms'), ('0.999', 'p99_9_ms'))
+
+
+def _escape(value: Any) -> str:
+    """Escape a label value (backslash, double quote, newline)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Exposition:
+    """Collects metric families and samples in exposition order"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, metric_type: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name: str, value: Any, **labels):
+        if value is not None:
+            text = str(value) if isinstance(value, int) else repr(float(value))
+            self.lines.append(f"{name}{_format_labels(labels)} {text}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_router_metrics(router) -> str:
+    """
+    Render an AsyncAIRouter's metrics for a Prometheus scrape
+
+    Histograms and counters are cumulative over the process lifetime, as
+    Prometheus expects; windowed percentiles and rates are exported as gauges
+    with a ``window`` label.
+    """
+    out = _Exposition()
+    with router._stats_lock:
+        provider_stats = {name: dict(stats) for name, stats in router.provider_stats.items()}
+
+    out.family("ai_router_requests_total", "counter", "Provider calls by outcome")
+    for provider, stats in sorted(provider_stats.items()):
+        out.sample("ai_router_requests_total", stats['successful_requests'], provider=provider, outcome="success")
+        out.sample("ai_router_requests_total", stats['failed_requests'], provider=provider, outcome="failure")
+
+    histograms = sorted(list(router.latency_histograms.items()))
+    out.family("ai_router_request_duration_seconds", "histogram", "Provider call latency by operation")
+    for (provider, operation), histogram in histograms:
+        cumulative, total, sum_ms = histogram.cumulative_buckets(LATENCY_BUCKETS_MS)
+        for bound_ms, count in zip(LATENCY_BUCKETS_MS, cumulative):
+            out.sample("ai_router_request_duration_seconds_bucket", count,
+                       provider=provider, operation=operation, le=f"{bound_ms / 1000:g}")
+        out.sample("ai_router_request_duration_seconds_bucket", total, provider=provider, operation=operation, le="+Inf")
+        out.sample("ai_router_request_duration_seconds_sum", sum_ms / 1000, provider=provider, operation=operation)
+        out.sample("ai_router_request_duration_seconds_count", total, provider=provider, operation=operation)
+
+    out.family("ai_router_request_duration_window_seconds", "gauge", "Latency percentiles over sliding windows")
+    for (provider, operation), histogram in histograms:
+        for window in METRIC_WINDOWS:
+            summary = histogram.get_summary(window)
+            for quantile, key in QUANTILES:
+                if summary[key] is not None:
+                    out.sample("ai_router_request_duration_window_seconds", summary[key] / 1000,
+                               provider=provider, operation=operation, window=window, quantile=quantile)
+
+    throughput = sorted(list(router.token_throughput.items()))
+    out.family("ai_router_tokens_total", "counter", "Tokens reported by providers")
+    for provider, counter in throughput:
+        totals = counter.totals()
+        out.sample("ai_router_tokens_total", totals.get('prompt_tokens', 0), provider=provider, kind="prompt")
+        out.sample("ai_router_tokens_total", totals.get('completion_tokens', 0), provider=provider, kind="completion")
+
+    out.family("ai_router_tokens_per_second", "gauge", "Token throughput over sliding windows")
+    for provider, counter in throughput:
+        for window in METRIC_WINDOWS:
+            summary = counter.get_summary(window)
+            rate = summary.get('prompt_tokens_per_second', 0) + summary.get('completion_tokens_per_second', 0)
+            out.sample("ai_router_tokens_per_second", rate, provider=provider, window=window)
+
+    breakers = {provider: breaker.get_status() for provider, breaker in sorted(router.circuit_breakers.items())}
+    out.family("ai_router_circuit_open", "gauge", "1 if the provider's circuit breaker is open")
+    for provider, status in breakers.items():
+        out.sample("ai_router_circuit_open", int(status['state'] == 'open'), provider=provider)
+    out.family("ai_router_health_score", "gauge", "Provider health score used for routing (0-100)")
+    for provider, status in breakers.items():
+        out.sample("ai_router_health_score", status['health_score'], provider=provider)
+
+    out.family("ai_router_latency_slo_met", "gauge", "1 if the provider meets its p99 latency SLOs")
+    for provider, slo in sorted(router.get_latency_slo_status().items()):
+        out.sample("ai_router_latency_slo_met", int(slo['met']), provider=provider)
+
+    rate_limits = sorted(router.get_rate_limit_status().items())
+    out.family("ai_router_rate_limit_queue_depth", "gauge", "Calls waiting for the provider's rate limit")
+    for provider, status in rate_limits:
+        out.sample("ai_router_rate_limit_queue_depth", status['queue_depth'], provider=provider)
+    out.family("ai_router_rate_limit_in_flight", "gauge", "Admitted calls in flight")
+    for provider, status in rate_limits:
+        out.sample("ai_router_rate_limit_in_flight", status['in_flight'], provider=provider)
+    out.family("ai_router_priority_queue_depth", "gauge", "Calls waiting for the provider's rate limit per priority class")
+    for provider, status in rate_limits:
+        for priority, entry in sorted(status['priority_classes'].items()):
+            out.sample("ai_router_priority_queue_depth", entry['queue_depth'], provider=provider, priority=priority)
+    out.family("ai_router_priority_shed_total", "counter", "Batch calls shed while higher classes queued too long")
+    for provider, status in rate_limits:
+        for priority, entry in sorted(status['priority_classes'].items()):
+            out.sample("ai_router_priority_shed_total", entry['shed'], provider=provider, priority=priority)
+
+    return out.render()
@@ -0,0 +1,579 @@
+"""
+Rate Limiter - Per-provider request, token and concurrency budgets
+Queues provider calls briefly instead of sending them into 429s, follows
+the limits providers report in their rate-limit response headers, and shares
+each provider between priority classes by weighted fair queuing
+"""
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from .latency_histogram import LatencyHistogram, WindowedLatencyHistogram
+from .token_budget import reported_usage
+
+logger = logging.getLogger(__name__)
+
+
+# Default limits per provider: (requests/min, tokens/min, max in flight); None = unlimited.
+# Providers report their real limits in response headers and the buckets follow them.
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[Optional[int], Optional[int], Optional[int]]] = {
+    'openai': (500, 30000, 32),
+    'anthropic': (50, 40000, 8),
+    'gemini': (60, None, 16),
+    'perplexity': (20, None, 4),
+}
+
+# Completion tokens charged up front when a call sets no max_tokens; corrected from usage afterwards
+DEFAULT_COMPLETION_ESTIMATE = 512
+# Pause after a 429 that carries no Retry-After or reset header
+DEFAULT_THROTTLE_SECONDS = 1.0
+
+# Priority classes: user-facing requests, everything else, and bulk background work
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_STANDARD = 'standard'
+PRIORITY_BATCH = 'batch'
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BATCH)
+# Share of admissions each class gets while all of them are queuing
+DEFAULT_PRIORITY_WEIGHTS: Dict[str, float] = {
+    PRIORITY_INTERACTIVE: 8.0,
+    PRIORITY_STANDARD: 3.0,
+    PRIORITY_BATCH: 1.0,
+}
+# Queue waits needed in the last minute before their p90 can trigger batch shedding
+SHED_MIN_SAMPLES = 10
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+class RateLimitTimeout(Exception):
+    """A call could not be admitted before its queue deadline"""
+
+
+class LoadShed(RateLimitTimeout):
+    """A batch call was refused because higher-priority calls are queuing too long"""
+
+
+def parse_priority_weights(spec: str) -> Dict[str, float]:
+    """
+    Parse priority class weights such as ``interactive=8,standard=3,batch=1``
+
+    Classes not mentioned keep their default weight; unknown classes and
+    non-positive weights are ignored.
+    """
+    weights = dict(DEFAULT_PRIORITY_WEIGHTS)
+    for entry in (spec or "").split(","):
+        if "=" not in entry:
+            continue
+        priority, value = (part.strip() for part in entry.split("=", 1))
+        try:
+            weight = float(value)
+        except ValueError:
+            weight = 0.0
+        if priority not in weights or weight <= 0:
+            logger.warning(f"Ignoring invalid priority weight entry: {entry!r}")
+            continue
+        weights[priority] = weight
+    return weights
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[Optional[int], Optional[int], Optional[int]]]:
+    """
+    Parse a rate-limit override such as ``openai=500/30000/32,perplexity=20//4``
+
+    Each provider takes requests/min, tokens/min and max in flight; empty or
+    zero fields mean unlimited. Providers not mentioned keep their defaults.
+    """
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for entry in (spec or "").split(","):
+        if "=" not in entry:
+            continue
+        provider, values = entry.split("=", 1)
+        fields = (values.split("/") + ["", "", ""])[:3]
+        try:
+            limits[provider.strip()] = tuple(int(field) if field.strip() and int(field) > 0 else None for field in fields)
+        except ValueError:
+            logger.warning(f"Ignoring invalid rate limit entry: {entry!r}")
+    return limits
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Seconds in an OpenAI reset duration ('1s', '6m0s', '20ms')"""
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds until a reset given as a duration, a number of seconds or an RFC 3339 time"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+    except ValueError:
+        return _parse_duration(value)
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_rate_limit_headers(headers: Optional[Mapping[str, str]], status_code: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Extract rate-limit state from provider response headers
+
+    Understands Retry-After (seconds or HTTP date), retry-after-ms, OpenAI's
+    x-ratelimit-* and Anthropic's anthropic-ratelimit-* headers.
+
+    Returns:
+        Dict with any of retry_after, limit/remaining/reset for requests and
+        tokens (resets in seconds), and limited (the call was rejected with 429)
+    """
+    info: Dict[str, Any] = {}
+    if status_code == 429:
+        info['limited'] = True
+    if not headers:
+        return info
+    headers = {key.lower(): value for key, value in headers.items()}
+
+    if headers.get('retry-after-ms'):
+        try:
+            info['retry_after'] = float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    elif headers.get('retry-after'):
+        retry_after = _parse_reset(headers['retry-after'])
+        if retry_after is None:
+            try:
+                retry_at = parsedate_to_datetime(headers['retry-after'])
+                retry_after = max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+        if retry_after is not None:
+            info['retry_after'] = retry_after
+
+    for kind in ('requests', 'tokens'):
+        for prefix, template in (('x-ratelimit-', '{field}-{kind}'), ('anthropic-ratelimit-', '{kind}-{field}')):
+            limit = _parse_int(headers.get(prefix + template.format(field='limit', kind=kind)))
+            remaining = _parse_int(headers.get(prefix + template.format(field='remaining', kind=kind)))
+            reset = _parse_reset(headers.get(prefix + template.format(field='reset', kind=kind)))
+            if limit is not None:
+                info[f'limit_{kind}'] = limit
+            if remaining is not None:
+                info[f'remaining_{kind}'] = remaining
+            if reset is not None:
+                info[f'reset_{kind}'] = reset
+    return info
+
+
+def rate_limit_from_error(error: Exception) -> Dict[str, Any]:
+    """Rate-limit state carried by an SDK status error (openai/anthropic APIStatusError)"""
+    response = getattr(error, 'response', None)
+    status_code = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    return parse_rate_limit_headers(getattr(response, 'headers', None), status_code)
+
+
+def usage_tokens(metadata: Dict[str, Any]) -> Optional[int]:
+    """Total tokens a provider reported for a call"""
+    usage = reported_usage(metadata)
+    return sum(usage) if usage else None
+
+
+class TokenBucket:
+    """Bucket refilled continuously at a per-minute rate, holding at most one minute's worth"""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = float(per_minute)
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` is available (amounts above capacity wait for a full bucket)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.per_minute
+
+    def take(self, amount: float, now: float):
+        """Spend units; the level may go negative when actual usage exceeds the estimate"""
+        self._refill(now)
+        self.level -= amount
+
+    def observe(self, limit: Optional[int], remaining: Optional[int], now: float):
+        """Follow the provider's reported per-minute limit and remaining units"""
+        self._refill(now)
+        if limit and limit != self.per_minute:
+            self.per_minute = self.capacity = float(limit)
+            self.level = min(self.level, self.capacity)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class _Waiter:
+    """A call queued in a limiter"""
+
+    __slots__ = ('priority', 'tokens', 'finish', 'deadline', 'enqueued', 'future')
+
+    def __init__(self, priority: str, tokens: int, finish: float, deadline: float, enqueued: float, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.finish = finish        # Virtual finish tag
+        self.deadline = deadline
+        self.enqueued = enqueued
+        self.future = future        # Resolved on admission, failed when it can't make its deadline
+
+
+class RateLimitPermit:
+    """Admission for one provider call; release it when the call ends"""
+
+    def __init__(self, limiter: "ProviderRateLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self._released = False
+
+    def release(self, used_tokens: Optional[int] = None, rate_limit: Optional[Dict[str, Any]] = None):
+        """
+        Free the in-flight slot
+
+        Args:
+            used_tokens: Actual tokens of the call, to correct the up-front estimate
+            rate_limit: parse_rate_limit_headers() output from the response
+        """
+        if self._released:
+            return
+        self._released = True
+        self.limiter._release(self, used_tokens, rate_limit)
+
+
+class ProviderRateLimiter:
+    """
+    Requests/min and tokens/min token buckets plus a max-in-flight cap for one provider.
+
+    Calls are queued per priority class and admitted by weighted fair
+    queuing: each waiter gets a virtual finish tag (self-clocked, one unit
+    of work divided by its class weight) and the class head with the lowest
+    tag goes next once both buckets can cover it and a slot is free, so
+    under contention the classes share admissions in proportion to their
+    weights and no class starves. A share of the slots and of both budgets
+    is reserved for interactive calls: other classes never dip into it,
+    and an interactive call can pass a head that is held back only by the
+    reservation.
+
+    A call that could not be admitted before its deadline fails fast with
+    RateLimitTimeout instead of being sent into a 429. New batch calls are
+    shed (LoadShed) while interactive or standard calls queue longer than
+    the shedding target. Rate-limit headers adjust the buckets (limit and
+    remaining), and Retry-After or a 429 pauses admission for the provider.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        max_wait_seconds: float = 5.0,
+        priority_weights: Optional[Dict[str, float]] = None,
+        interactive_reserve: float = 0.25,
+        shed_queue_wait_ms: int = 2000
+    ):
+        """
+        Initialize the limiter
+
+        Args:
+            provider: Provider name (for logs)
+            requests_per_minute: Request budget (None = unlimited)
+            tokens_per_minute: Prompt + completion token budget (None = unlimited)
+            max_in_flight: Concurrent calls (None = unlimited)
+            max_wait_seconds: Default queue deadline
+            priority_weights: Fair-queuing weight per priority class (default: DEFAULT_PRIORITY_WEIGHTS)
+            interactive_reserve: Fraction of slots and budgets held back for interactive calls
+            shed_queue_wait_ms: Shed batch calls while higher classes queue longer than this (0 = never)
+        """
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_in_flight = max_in_flight
+        self.max_wait_seconds = max_wait_seconds
+        self.weights = {**DEFAULT_PRIORITY_WEIGHTS, **(priority_weights or {})}
+        self.interactive_reserve = min(max(interactive_reserve, 0.0), 0.9)
+        # At least one slot stays usable by every class
+        self.reserved_slots = (
+            min(math.ceil(max_in_flight * self.interactive_reserve), max_in_flight - 1) if max_in_flight else 0
+        )
+        self.shed_queue_wait_ms = shed_queue_wait_ms
+        self._blocked_until = 0.0
+        self.wait_histogram = LatencyHistogram()
+        self._lock = threading.Lock()  # Bucket state and counters are read from other threads
+
+        # Fair queuing state: FIFO per class, virtual time = finish tag of the last admission
+        self._waiting: Dict[str, deque] = {priority: deque() for priority in PRIORITY_CLASSES}
+        self._virtual_time = 0.0
+        self._last_finish = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._in_flight = 0
+        self._admitted = 0
+        self._timed_out = 0
+        self._throttled = 0
+        self._class_stats = {
+            priority: {'admitted': 0, 'timed_out': 0, 'shed': 0, 'max_queue_depth': 0}
+            for priority in PRIORITY_CLASSES
+        }
+        self.class_wait_histograms = {priority: WindowedLatencyHistogram() for priority in PRIORITY_CLASSES}
+
+    async def acquire(self, tokens: int, timeout: Optional[float] = None, priority: str = PRIORITY_STANDARD) -> RateLimitPermit:
+        """
+        Wait for budget and a free slot
+
+        Args:
+            tokens: Estimated tokens of the call (prompt + max completion)
+            timeout: Queue deadline in seconds (default: max_wait_seconds)
+            priority: Priority class (one of PRIORITY_CLASSES)
+
+        Returns:
+            RateLimitPermit to release when the call ends
+
+        Raises:
+            RateLimitTimeout: The call can't be admitted before the deadline
+            LoadShed: A batch call arrived while higher classes are queuing too long
+        """
+        if priority not in self._waiting:
+            raise ValueError(f"Unknown priority class: {priority!r}")
+        self._loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        deadline = start + (self.max_wait_seconds if timeout is None else timeout)
+
+        with self._lock:
+            if priority == PRIORITY_BATCH and self._overloaded(start):
+                self._class_stats[priority]['shed'] += 1
+                raise LoadShed(
+                    f"Shedding batch call to '{self.provider}': higher-priority calls are queuing "
+                    f"longer than {self.shed_queue_wait_ms}ms"
+                )
+            finish = max(self._virtual_time, self._last_finish[priority]) + 1.0 / self.weights[priority]
+            self._last_finish[priority] = finish
+            waiter = _Waiter(priority, tokens, finish, deadline, start, self._loop.create_future())
+            queue = self._waiting[priority]
+            queue.append(waiter)
+            self._queue_depth += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+            stats = self._class_stats[priority]
+            stats['max_queue_depth'] = max(stats['max_queue_depth'], len(queue))
+
+        self._dispatch()
+        try:
+            await asyncio.wait({waiter.future}, timeout=max(deadline - time.monotonic(), 0.0))
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.future.done():
+            self._abandon(waiter)
+            with self._lock:
+                self._timed_out += 1
+                self._class_stats[priority]['timed_out'] += 1
+            raise RateLimitTimeout(f"'{self.provider}' had no free slot for a {priority} call before its deadline")
+        waiter.future.result()  # Raises when the dispatcher failed the call fast
+        return RateLimitPermit(self, tokens)
+
+    def _dispatch(self):
+        """Admit queued calls in fair-queuing order while budget and slots allow"""
+        now = time.monotonic()
+        wake: Optional[float] = None
+        with self._lock:
+            progressed = True
+            while progressed:
+                progressed = False
+                heads = sorted((queue[0] for queue in self._waiting.values() if queue), key=lambda waiter: waiter.finish)
+                for waiter in heads:
+                    reserve = 0.0 if waiter.priority == PRIORITY_INTERACTIVE else self.interactive_reserve
+                    wait = self._wait_time(waiter.tokens, now, reserve)
+                    if wait <= 0 and self._slot_free(waiter.priority):
+                        self._admit(waiter, now)
+                        progressed = True
+                        break
+                    if now + wait > waiter.deadline:
+                        self._fail(waiter, RateLimitTimeout(
+                            f"Rate limit for '{self.provider}' would delay the call {wait:.1f}s past its deadline"
+                        ))
+                        progressed = True
+                        break
+                    if wait > 0:
+                        wake = wait if wake is None else min(wake, wait)
+                    if reserve and self._wait_time(waiter.tokens, now, 0.0) <= 0 and self._slot_free(PRIORITY_INTERACTIVE):
+                        continue  # Held back only by the interactive reservation
+                    break  # Lower-tag head waits for budget or a slot; keep the order fair
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if wake is not None and self._loop is not None:
+            self._timer = self._loop.call_later(wake, self._dispatch)
+
+    def _admit(self, waiter: "_Waiter", now: float):
+        """Take budget and a slot for the head of a class queue (lock held)"""
+        self._waiting[waiter.priority].popleft()
+        self._queue_depth -= 1
+        self._take(waiter.tokens, now)
+        self._virtual_time = waiter.finish
+        self._in_flight += 1
+        self._admitted += 1
+        self._class_stats[waiter.priority]['admitted'] += 1
+        wait_ms = (now - waiter.enqueued) * 1000
+        self.wait_histogram.record(wait_ms)
+        self.class_wait_histograms[waiter.priority].record(wait_ms)
+        waiter.future.set_result(None)
+
+    def _fail(self, waiter: "_Waiter", error: Exception):
+        """Fail the head of a class queue fast (lock held)"""
+        self._waiting[waiter.priority].popleft()
+        self._queue_depth -= 1
+        self._timed_out += 1
+        self._class_stats[waiter.priority]['timed_out'] += 1
+        waiter.future.set_exception(error)
+
+    def _abandon(self, waiter: "_Waiter"):
+        """Withdraw a call whose caller stopped waiting, returning its slot if it got one"""
+        with self._lock:
+            if not waiter.future.done():
+                self._waiting[waiter.priority].remove(waiter)
+                self._queue_depth -= 1
+                waiter.future.cancel()
+            elif waiter.future.exception() is None:
+                self._in_flight -= 1
+                self._refund(waiter.tokens)
+        self._dispatch()
+
+    def _slot_free(self, priority: str) -> bool:
+        """Whether a call of this class may take an in-flight slot (lock held)"""
+        if not self.max_in_flight:
+            return True
+        limit = self.max_in_flight if priority == PRIORITY_INTERACTIVE else self.max_in_flight - self.reserved_slots
+        return self._in_flight < limit
+
+    def _overloaded(self, now: float) -> bool:
+        """Whether interactive or standard calls are queuing longer than the shedding target (lock held)"""
+        if not self.shed_queue_wait_ms:
+            return False
+        target = self.shed_queue_wait_ms / 1000
+        for priority in (PRIORITY_INTERACTIVE, PRIORITY_STANDARD):
+            queue = self._waiting[priority]
+            if queue and now - queue[0].enqueued > target:
+                return True
+            waits = self.class_wait_histograms[priority]
+            if waits.window_count('1m') >= SHED_MIN_SAMPLES and (waits.percentile(90, '1m') or 0) > self.shed_queue_wait_ms:
+                return True
+        return False
+
+    def _wait_time(self, tokens: int, now: float, reserve: float = 0.0) -> float:
+        """Seconds until the budgets cover a call, keeping ``reserve`` of each bucket untouched"""
+        wait = max(0.0, self._blocked_until - now)
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1 + reserve * self.requests.capacity, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens + reserve * self.tokens.capacity, now))
+        return wait
+
+    def _take(self, tokens: int, now: float):
+        if self.requests is not None:
+            self.requests.take(1, now)
+        if self.tokens is not None:
+            self.tokens.take(tokens, now)
+
+    def _refund(self, tokens: int):
+        now = time.monotonic()
+        if self.requests is not None:
+            self.requests.take(-1, now)
+        if self.tokens is not None:
+            self.tokens.take(-tokens, now)
+
+    def _release(self, permit: RateLimitPermit, used_tokens: Optional[int], rate_limit: Optional[Dict[str, Any]]):
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight -= 1
+            if self.tokens is not None and used_tokens is not None:
+                self.tokens.take(used_tokens - permit.tokens, now)
+            if rate_limit:
+                self._observe(rate_limit, now)
+        self._dispatch()
+
+    def _observe(self, info: Dict[str, Any], now: float):
+        """Adapt to a response's rate-limit state"""
+        if self.requests is not None:
+            self.requests.observe(info.get('limit_requests'), info.get('remaining_requests'), now)
+        if self.tokens is not None:
+            self.tokens.observe(info.get('limit_tokens'), info.get('remaining_tokens'), now)
+
+        pause = info.get('retry_after')
+        if info.get('limited'):
+            self._throttled += 1
+            if pause is None:
+                resets = [info[key] for key in ('reset_requests', 'reset_tokens') if info.get(key)]
+                pause = min(resets) if resets else DEFAULT_THROTTLE_SECONDS
+        if pause:
+            self._blocked_until = max(self._blocked_until, now + pause)
+            logger.warning(f"Provider '{self.provider}' rate limited; pausing new calls for {pause:.1f}s")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get budgets, queue depth and wait times for monitoring"""
+        now = time.monotonic()
+        with self._lock:
+            status = {
+                'requests_per_minute': self.requests.per_minute if self.requests else None,
+                'tokens_per_minute': self.tokens.per_minute if self.tokens else None,
+                'max_in_flight': self.max_in_flight,
+                'available_requests': round(max(self.requests.level, 0)) if self.requests else None,
+                'available_tokens': round(max(self.tokens.level, 0)) if self.tokens else None,
+                'in_flight': self._in_flight,
+                'queue_depth': self._queue_depth,
+                'max_queue_depth': self._max_queue_depth,
+                'admitted': self._admitted,
+                'timed_out': self._timed_out,
+                'throttled_responses': self._throttled,
+                'paused_for_ms': int(max(0.0, self._blocked_until - now) * 1000)
+            }
+            status['shedding'] = self._overloaded(now)
+            classes = {
+                priority: {
+                    'weight': self.weights[priority],
+                    'queue_depth': len(self._waiting[priority]),
+                    **self._class_stats[priority]
+                }
+                for priority in PRIORITY_CLASSES
+            }
+        status['queue_wait'] = self.wait_histogram.get_summary()
+        for priority, histogram in self.class_wait_histograms.items():
+            classes[priority]['queue_wait'] = histogram.get_summary('1m')
+        status.update({
+            'reserved_slots': self.reserved_slots,
+            'interactive_reserve': self.interactive_reserve,
+            'shed_queue_wait_ms': self.shed_queue_wait_ms,
+            'priority_classes': classes
+        })
+        return status
@@ -0,0 +1,451 @@
+"""
+Response Cache - Exact and semantic caching of chat completions
+Serves repeated help assistant questions without a provider round-trip
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import redis.asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize_text(text: str) -> str:
+    """Collapse whitespace so formatting differences don't defeat the cache"""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def _normalize_query(text: str) -> str:
+    """Normalize a user query: whitespace, case and trailing punctuation"""
+    return _normalize_text(text).casefold().rstrip("?!. ")
+
+
+class InMemoryCacheBackend:
+    """
+    Process-local LRU cache with per-entry TTL.
+    Bounded by entry count and total payload size; least recently used
+    entries are evicted first, expired entries are dropped on access.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 50 * 1024 * 1024):
+        """
+        Initialize the backend
+
+        Args:
+            max_entries: Maximum number of cached responses
+            max_bytes: Maximum total size of cached payloads
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at, payload)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._size_bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return a cached payload, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    async def set(self, key: str, payload: str, ttl_seconds: int):
+        """Store a payload, evicting least recently used entries as needed"""
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl_seconds, payload)
+            self._size_bytes += size
+            while len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._evictions += 1
+
+    async def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    async def aclose(self):
+        """Nothing to release for the in-process backend"""
+        pass
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get backend size and eviction counters"""
+        with self._lock:
+            return {
+                'backend': self.name,
+                'entries': len(self._entries),
+                'size_bytes': self._size_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self._evictions
+            }
+
+    def _remove(self, key: str):
+        """Remove an entry (lock held)"""
+        _, payload = self._entries.pop(key)
+        self._size_bytes -= len(payload)
+
+
+class RedisCacheBackend:
+    """
+    Redis-backed cache shared by every worker and host.
+    TTL is enforced by Redis key expiry; size-bounded eviction is delegated to
+    the server's maxmemory policy (allkeys-lru recommended).
+    """
+
+    name = "redis"
+
+    def __init__(self, redis_url: str, key_prefix: str = "vb:ai_cache:"):
+        """
+        Initialize the backend
+
+        Args:
+            redis_url: Redis connection URL
+            key_prefix: Namespace for cache keys
+        """
+        if not REDIS_AVAILABLE:
+            raise ImportError("redis package is required for the Redis cache backend")
+        self.key_prefix = key_prefix
+        self._client = redis_asyncio.from_url(redis_url, decode_responses=True)
+        self._errors = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return a cached payload, or None if missing or Redis is unreachable"""
+        try:
+            return await self._client.get(self.key_prefix + key)
+        except Exception as e:
+            self._errors += 1
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+
+    async def set(self, key: str, payload: str, ttl_seconds: int):
+        """Store a payload with expiry"""
+        try:
+            await self._client.set(self.key_prefix + key, payload, ex=ttl_seconds)
+        except Exception as e:
+            self._errors += 1
+            logger.warning(f"Response cache write failed: {e}")
+
+    async def clear(self):
+        """Drop all keys under this backend's prefix"""
+        async for key in self._client.scan_iter(match=self.key_prefix + "*"):
+            await self._client.delete(key)
+
+    async def aclose(self):
+        """Close the Redis connection pool"""
+        await self._client.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get backend counters"""
+        return {
+            'backend': self.name,
+            'key_prefix': self.key_prefix,
+            'errors': self._errors
+        }
+
+
+class SemanticIndex:
+    """
+    Bounded in-process index of query embeddings for near-duplicate lookup.
+
+    Entries are grouped by namespace (everything in the request except the
+    final user query), so a semantic match never crosses system prompts,
+    conversation histories or sampling settings. Each namespace holds a
+    normalized float32 matrix, making a lookup a single matrix-vector product.
+    """
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        # namespace -> (matrix of unit vectors, [(exact_key, expires_at)])
+        self._namespaces: Dict[str, Tuple[np.ndarray, List[Tuple[str, float]]]] = {}
+        self._insertion_order: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._insertion_order)
+
+    def search(self, namespace: str, embedding: List[float], threshold: float) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar cached query in a namespace
+
+        Returns:
+            Tuple of (exact_key, similarity) or None if nothing clears the threshold
+        """
+        vector = self._unit_vector(embedding)
+        if vector is None:
+            return None
+
+        with self._lock:
+            entry = self._namespaces.get(namespace)
+            if entry is None:
+                return None
+            matrix, keys = entry
+            if matrix.shape[1] != vector.shape[0]:
+                return None
+
+            similarities = matrix @ vector
+            now = time.monotonic()
+            for index in np.argsort(similarities)[::-1]:
+                similarity = float(similarities[index])
+                if similarity < threshold:
+                    return None
+                exact_key, expires_at = keys[index]
+                if expires_at > now:
+                    return exact_key, similarity
+            return None
+
+    def add(self, namespace: str, exact_key: str, embedding: List[float], ttl_seconds: int):
+        """Index a query embedding, evicting the oldest entries beyond the size bound"""
+        vector = self._unit_vector(embedding)
+        if vector is None:
+            return
+
+        with self._lock:
+            if (namespace, exact_key) in self._insertion_order:
+                return
+            matrix, keys = self._namespaces.get(namespace, (np.empty((0, vector.shape[0]), dtype=np.float32), []))
+            if matrix.shape[1] != vector.shape[0]:
+                # Embedding model changed; start the namespace over
+                self._drop_namespace(namespace)
+                matrix, keys = np.empty((0, vector.shape[0]), dtype=np.float32), []
+            self._namespaces[namespace] = (
+                np.vstack([matrix, vector[np.newaxis, :]]),
+                keys + [(exact_key, time.monotonic() + ttl_seconds)]
+            )
+            self._insertion_order[(namespace, exact_key)] = None
+
+            while len(self._insertion_order) > self.max_entries:
+                (old_namespace, old_key), _ = self._insertion_order.popitem(last=False)
+                self._remove(old_namespace, old_key)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._namespaces.clear()
+            self._insertion_order.clear()
+
+    def _remove(self, namespace: str, exact_key: str):
+        """Remove one entry (lock held)"""
+        matrix, keys = self._namespaces[namespace]
+        index = next(i for i, (key, _) in enumerate(keys) if key == exact_key)
+        if len(keys) == 1:
+            del self._namespaces[namespace]
+        else:
+            self._namespaces[namespace] = (np.delete(matrix, index, axis=0), keys[:index] + keys[index + 1:])
+
+    def _drop_namespace(self, namespace: str):
+        """Remove a whole namespace (lock held)"""
+        self._namespaces.pop(namespace, None)
+        for key in [k for k in self._insertion_order if k[0] == namespace]:
+            del self._insertion_order[key]
+
+    @staticmethod
+    def _unit_vector(embedding: List[float]) -> Optional[np.ndarray]:
+        """Normalize an embedding; zero or empty vectors can't be compared"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector)) if vector.size else 0.0
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+
+class ResponseCache:
+    """
+    Two-tier cache in front of chat completions.
+
+    The exact tier keys on a hash of the normalized request (every message,
+    temperature, max_tokens, provider and model options). The optional
+    semantic tier embeds the final user query and, within the same namespace,
+    reuses the response of a previous query whose cosine similarity is above
+    ``semantic_threshold``. Only successful responses are stored.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        ttl_seconds: int = 3600,
+        semantic_enabled: bool = False,
+        semantic_threshold: float = 0.95,
+        semantic_max_entries: int = 2000
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            backend: Storage backend (InMemoryCacheBackend by default)
+            ttl_seconds: Lifetime of cached responses
+            semantic_enabled: Whether to match queries by embedding similarity
+            semantic_threshold: Minimum cosine similarity for a semantic hit
+            semantic_max_entries: Size bound of the semantic index
+        """
+        self.backend = backend or InMemoryCacheBackend()
+        self.ttl_seconds = ttl_seconds
+        self.semantic_enabled = semantic_enabled
+        self.semantic_threshold = semantic_threshold
+        self.semantic_index = SemanticIndex(max_entries=semantic_max_entries)
+        self._stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0, 'stores': 0}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def build_keys(
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int],
+        provider: Optional[str] = None,
+        **kwargs
+    ) -> Tuple[str, str, str]:
+        """
+        Build cache keys for a chat request
+
+        Returns:
+            Tuple of (exact_key, semantic_namespace, normalized_query)
+        """
+        normalized = [
+            {'role': message.get('role', ''), 'content': _normalize_text(message.get('content', ''))}
+            for message in messages
+        ]
+        query = ''
+        if normalized and normalized[-1]['role'] == 'user':
+            query = _normalize_query(normalized[-1]['content'])
+
+        options = {
+            'temperature': round(float(temperature), 3),
+            'max_tokens': max_tokens,
+            'provider': provider,
+            'kwargs': {key: kwargs[key] for key in sorted(kwargs)}
+        }
+        context = json.dumps({'history': normalized[:-1], 'options': options}, sort_keys=True, default=str)
+        namespace = hashlib.sha256(context.encode('utf-8')).hexdigest()
+        exact_key = hashlib.sha256(f"{namespace}:{query}".encode('utf-8')).hexdigest()
+        return exact_key, namespace, query
+
+    async def get(
+        self,
+        exact_key: str,
+        namespace: str,
+        embed: Optional[Callable[[], Awaitable[Optional[List[float]]]]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        Look up a cached response
+
+        Args:
+            exact_key: Exact-tier key from build_keys
+            namespace: Semantic namespace from build_keys
+            embed: Coroutine factory returning the query embedding; only awaited
+                on an exact-tier miss when the semantic tier is enabled
+
+        Returns:
+            Tuple of (cached entry with 'content', 'metadata' and 'cache_tier' or None,
+            query embedding if one was computed so the caller can reuse it for set())
+        """
+        entry = await self._load(exact_key)
+        if entry is not None:
+            entry['cache_tier'] = 'exact'
+            self._count('exact_hits')
+            return entry, None
+
+        query_embedding = None
+        if self.semantic_enabled and embed is not None:
+            query_embedding = await embed()
+            match = None
+            if query_embedding:
+                match = self.semantic_index.search(namespace, query_embedding, self.semantic_threshold)
+            if match is not None:
+                matched_key, similarity = match
+                entry = await self._load(matched_key)
+                if entry is not None:
+                    entry['cache_tier'] = 'semantic'
+                    entry['cache_similarity'] = round(similarity, 4)
+                    self._count('semantic_hits')
+                    return entry, query_embedding
+
+        self._count('misses')
+        return None, query_embedding
+
+    async def set(
+        self,
+        exact_key: str,
+        namespace: str,
+        content: str,
+        metadata: Dict[str, Any],
+        query_embedding: Optional[List[float]] = None
+    ):
+        """Store a successful response in both tiers"""
+        payload = json.dumps({'content': content, 'metadata': metadata, 'cached_at': time.time()}, default=str)
+        await self.backend.set(exact_key, payload, self.ttl_seconds)
+        if self.semantic_enabled and query_embedding:
+            self.semantic_index.add(namespace, exact_key, query_embedding, self.ttl_seconds)
+        self._count('stores')
+
+    async def clear(self):
+        """Drop every cached response"""
+        await self.backend.clear()
+        self.semantic_index.clear()
+
+    async def aclose(self):
+        """Release backend connections"""
+        await self.backend.aclose()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get hit/miss ratios and backend status for monitoring"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        hits = stats['exact_hits'] + stats['semantic_hits']
+        lookups = hits + stats['misses']
+        return {
+            **stats,
+            'lookups': lookups,
+            'hit_ratio': (hits / lookups) if lookups else 0.0,
+            'exact_hit_ratio': (stats['exact_hits'] / lookups) if lookups else 0.0,
+            'semantic_hit_ratio': (stats['semantic_hits'] / lookups) if lookups else 0.0,
+            'ttl_seconds': self.ttl_seconds,
+            'semantic_enabled': self.semantic_enabled,
+            'semantic_threshold': self.semantic_threshold,
+            'semantic_entries': len(self.semantic_index),
+            **self.backend.get_status()
+        }
+
+    async def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Read and decode a backend entry"""
+        payload = await self.backend.get(key)
+        if payload is None:
+            return None
+        try:
+            return json.loads(payload)
+        except ValueError:
+            logger.warning("Discarding undecodable response cache entry")
+            return None
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
@@ -0,0 +1,600 @@
+"""
+Routing Policy - Per-request choice of provider and model
+Declarative rules match a request by workload, priority and prompt size and
+weigh per-token cost, observed latency, recent error rate and model quality
+to rank (provider, model) candidates; every decision carries its reasons
+"""
+import fnmatch
+import json
+import logging
+import math
+import os
+import threading
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .latency_histogram import DEFAULT_WINDOW, ThroughputCounter, WindowedLatencyHistogram
+from .token_budget import get_model_limits, reported_usage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """Price and expected behaviour of one chat model"""
+    input_cost_per_mtok: float    # USD per million prompt tokens
+    output_cost_per_mtok: float   # USD per million completion tokens
+    quality: int                  # 1 = small and fast, 2 = mid-size, 3 = largest
+    typical_latency_ms: int       # Prior for a ~500-token answer until latency is observed
+
+
+# List prices by model name; entries with wildcards match model families and
+# are tried in order after exact names
+MODEL_PROFILES: Dict[str, ModelProfile] = {
+    'gpt-4': ModelProfile(30.0, 60.0, 3, 8000),
+    'gpt-4-32k': ModelProfile(60.0, 120.0, 3, 10000),
+    'gpt-4-turbo*': ModelProfile(10.0, 30.0, 3, 6000),
+    'gpt-4o-mini*': ModelProfile(0.15, 0.6, 1, 2500),
+    'gpt-4o*': ModelProfile(5.0, 15.0, 3, 4000),
+    'gpt-3.5-turbo*': ModelProfile(0.5, 1.5, 1, 2000),
+    'claude-3-opus-20240229': ModelProfile(15.0, 75.0, 3, 10000),
+    'claude-3-sonnet-20240229': ModelProfile(3.0, 15.0, 2, 5000),
+    'claude-3-haiku-20240307': ModelProfile(0.25, 1.25, 1, 2000),
+    'gemini-pro': ModelProfile(0.5, 1.5, 2, 4000),
+    'pplx-7b-*': ModelProfile(0.2, 0.2, 1, 2000),
+    'pplx-70b-*': ModelProfile(1.0, 1.0, 2, 5000),
+}
+
+# Chat models the policy may pick per provider (the client's default model is always a candidate)
+PROVIDER_MODELS: Dict[str, Tuple[str, ...]] = {
+    'openai': ('gpt-4', 'gpt-4-turbo-preview', 'gpt-3.5-turbo'),
+    'anthropic': ('claude-3-haiku-20240307', 'claude-3-sonnet-20240229', 'claude-3-opus-20240229'),
+    'gemini': ('gemini-pro',),
+    'perplexity': ('pplx-7b-online', 'pplx-70b-online'),
+}
+
+# Rules tried in order; the first whose conditions match a request decides.
+# Requests no rule matches keep the fallback order and default models.
+DEFAULT_POLICY_RULES: List[Dict[str, Any]] = [
+    {
+        'name': 'short_help',
+        'workloads': ['help'],
+        'max_prompt_tokens': 4000,
+        'providers': ['openai', 'anthropic', 'gemini'],
+        'weights': {'cost': 1.0, 'latency': 1.0, 'errors': 2.0, 'quality': 0.25},
+    },
+    {
+        'name': 'help',
+        'workloads': ['help'],
+        'providers': ['openai', 'anthropic', 'gemini'],
+        'weights': {'cost': 0.5, 'latency': 1.0, 'errors': 2.0, 'quality': 0.5},
+    },
+    {
+        'name': 'gap_analysis',
+        'workloads': ['gap_analysis'],
+        'min_context_window': 100000,
+        'min_quality': 2,
+        'max_cost_per_call_usd': 0.50,
+        'weights': {'cost': 1.0, 'latency': 0.2, 'errors': 2.0, 'quality': 0.3},
+    },
+]
+
+SCORE_TERMS = ('cost', 'latency', 'errors', 'quality')
+# Completion tokens assumed for cost when a request sets no max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 512
+# Calls needed in the window before observed error rates count
+MIN_ERROR_SAMPLES = 5
+# Candidates shown in a decision's explanation
+EXPLAIN_CANDIDATES = 5
+
+
+def get_model_profile(model: Optional[str]) -> Optional[ModelProfile]:
+    """Profile of a model, or None if unknown"""
+    if not model:
+        return None
+    profile = MODEL_PROFILES.get(model)
+    if profile is not None:
+        return profile
+    for pattern, profile in MODEL_PROFILES.items():
+        if '*' in pattern and fnmatch.fnmatchcase(model, pattern):
+            return profile
+    return None
+
+
+def register_model_profile(model: str, profile: ModelProfile):
+    """Add or override a model profile (exact name or wildcard pattern)"""
+    MODEL_PROFILES[model] = profile
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """USD cost of a call at list price, or None for models without a profile"""
+    profile = get_model_profile(model)
+    if profile is None:
+        return None
+    return (prompt_tokens * profile.input_cost_per_mtok + completion_tokens * profile.output_cost_per_mtok) / 1e6
+
+
+@dataclass
+class PolicyRule:
+    """
+    One declarative routing rule
+
+    Empty match lists match anything. Candidates failing a constraint
+    (providers, models, min_context_window, min_quality,
+    max_cost_per_call_usd, max_error_rate) are excluded; the rest are
+    ranked by the weighted score.
+    """
+    name: str
+    workloads: Tuple[str, ...] = ()
+    priorities: Tuple[str, ...] = ()
+    min_prompt_tokens: Optional[int] = None
+    max_prompt_tokens: Optional[int] = None
+    providers: Tuple[str, ...] = ()
+    models: Tuple[str, ...] = ()              # Model names or wildcard patterns
+    min_context_window: Optional[int] = None
+    min_quality: Optional[int] = None
+    max_cost_per_call_usd: Optional[float] = None
+    max_error_rate: float = 0.5
+    weights: Dict[str, float] = field(default_factory=lambda: {'cost': 1.0, 'latency': 1.0, 'errors': 2.0, 'quality': 1.0})
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "PolicyRule":
+        """Build a rule from its JSON form"""
+        unknown = set(spec) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown fields in routing rule {spec.get('name')!r}: {sorted(unknown)}")
+        values = dict(spec)
+        for name in ('workloads', 'priorities', 'providers', 'models'):
+            values[name] = tuple(values.get(name) or ())
+        weights = {term: 0.0 for term in SCORE_TERMS}
+        for term, weight in (values.get('weights') or {}).items():
+            if term not in weights:
+                raise ValueError(f"Unknown score term {term!r} in routing rule {spec.get('name')!r}")
+            weights[term] = float(weight)
+        values['weights'] = weights
+        return cls(**values)
+
+    def matches(self, request: "RouteRequest") -> bool:
+        """Whether the rule applies to a request"""
+        if self.workloads and request.workload not in self.workloads:
+            return False
+        if self.priorities and request.priority not in self.priorities:
+            return False
+        if self.min_prompt_tokens is not None and request.prompt_tokens < self.min_prompt_tokens:
+            return False
+        if self.max_prompt_tokens is not None and request.prompt_tokens > self.max_prompt_tokens:
+            return False
+        return True
+
+    def allows_model(self, model: str) -> bool:
+        """Whether the rule's model list admits a model"""
+        return not self.models or any(fnmatch.fnmatchcase(model, pattern) for pattern in self.models)
+
+
+def load_policy_rules(spec: Optional[str]) -> List[PolicyRule]:
+    """
+    Load routing rules from a JSON file path or inline JSON (a list of rule
+    objects); empty means DEFAULT_POLICY_RULES
+    """
+    if not spec:
+        rules = DEFAULT_POLICY_RULES
+    elif spec.lstrip().startswith('['):
+        rules = json.loads(spec)
+    else:
+        with open(spec, encoding='utf-8') as f:
+            rules = json.load(f)
+    return [PolicyRule.from_dict(rule) for rule in rules]
+
+
+@dataclass
+class RouteRequest:
+    """What the policy knows about a request before it is sent"""
+    workload: Optional[str]
+    priority: str
+    prompt_tokens: int
+    max_tokens: Optional[int]
+    trim_history: bool = False
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+
+
+@dataclass
+class ModelObservation:
+    """Recent behaviour of one (provider, model)"""
+    latency_ms: Optional[int] = None   # p90 over the window, None until enough samples
+    error_rate: Optional[float] = None  # None until enough calls
+    calls: int = 0
+
+
+@dataclass
+class CandidateScore:
+    """A ranked (provider, model) and the inputs of its score"""
+    provider: str
+    model: str
+    estimated_cost_usd: float
+    latency_ms: int
+    latency_source: str            # 'observed' or 'typical'
+    error_rate: float
+    quality: int
+    score: float = 0.0
+    terms: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'provider': self.provider,
+            'model': self.model,
+            'score': round(self.score, 4),
+            'terms': {term: round(value, 4) for term, value in self.terms.items()},
+            'estimated_cost_usd': round(self.estimated_cost_usd, 6),
+            'latency_ms': self.latency_ms,
+            'latency_source': self.latency_source,
+            'error_rate': round(self.error_rate, 4),
+            'quality': self.quality
+        }
+
+
+@dataclass
+class RouteDecision:
+    """The policy's ranking for one request"""
+    request: RouteRequest
+    rule: Optional[str]
+    reason: str
+    candidates: List[CandidateScore] = field(default_factory=list)
+    excluded: List[Dict[str, str]] = field(default_factory=list)
+
+    @property
+    def models(self) -> Dict[str, str]:
+        """Best-ranked model per provider"""
+        models: Dict[str, str] = {}
+        for candidate in self.candidates:
+            models.setdefault(candidate.provider, candidate.model)
+        return models
+
+    def provider_order(self) -> List[str]:
+        """Providers in ranked order of their best model"""
+        return list(self.models)
+
+    def explain(self, provider_used: Optional[str] = None, model_used: Optional[str] = None) -> Dict[str, Any]:
+        """Decision summary for response metadata"""
+        return {
+            'rule': self.rule,
+            'reason': self.reason,
+            'workload': self.request.workload,
+            'prompt_tokens_estimate': self.request.prompt_tokens,
+            'chosen': (
+                {'provider': self.candidates[0].provider, 'model': self.candidates[0].model}
+                if self.candidates else None
+            ),
+            'provider_used': provider_used,
+            'model_used': model_used,
+            'candidates': [candidate.to_dict() for candidate in self.candidates[:EXPLAIN_CANDIDATES]],
+            'excluded': self.excluded
+        }
+
+
+class ModelObservations:
+    """Windowed latency and error counts per (provider, model)"""
+
+    def __init__(self, window: str = DEFAULT_WINDOW, min_latency_samples: int = 20):
+        self.window = window
+        self.min_latency_samples = min_latency_samples
+        self._latency: Dict[Tuple[str, str], WindowedLatencyHistogram] = {}
+        self._outcomes: Dict[Tuple[str, str], ThroughputCounter] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, success: bool, latency_ms: int):
+        """Record one call's outcome"""
+        key = (provider, model)
+        with self._lock:
+            if key not in self._outcomes:
+                self._latency[key] = WindowedLatencyHistogram()
+                self._outcomes[key] = ThroughputCounter()
+        self._outcomes[key].add(calls=1, failures=0 if success else 1)
+        if success:
+            self._latency[key].record(latency_ms)
+
+    def get(self, provider: str, model: str) -> ModelObservation:
+        """Recent p90 latency and error rate, once there are enough samples"""
+        key = (provider, model)
+        outcomes = self._outcomes.get(key)
+        if outcomes is None:
+            return ModelObservation()
+        counts = outcomes.get_summary(self.window)
+        calls = counts.get('calls', 0)
+        histogram = self._latency[key]
+        latency_ms = None
+        if histogram.window_count(self.window) >= self.min_latency_samples:
+            latency_ms = histogram.percentile(90, self.window)
+        error_rate = counts.get('failures', 0) / calls if calls >= MIN_ERROR_SAMPLES else None
+        return ModelObservation(latency_ms, error_rate, calls)
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """Observed calls, p90 latency and error rate per provider/model"""
+        with self._lock:
+            keys = list(self._outcomes)
+        status = {}
+        for provider, model in keys:
+            observation = self.get(provider, model)
+            status[f"{provider}/{model}"] = {
+                'calls': observation.calls,
+                'latency_p90_ms': observation.latency_ms,
+                'error_rate': observation.error_rate
+            }
+        return status
+
+
+class RoutingPolicy:
+    """
+    Ranks (provider, model) candidates for a request.
+
+    The first matching rule decides. Each candidate allowed by the rule gets
+    four terms in [0, 1] — per-call cost and latency (log-scaled between
+    the cheapest/fastest and dearest/slowest candidate), error rate, and
+    distance from the best quality tier — and the score is their weighted
+    sum, lowest first. Latency is the observed p90 once there are enough
+    samples and the model's typical latency before that.
+    """
+
+    def __init__(
+        self,
+        rules: List[PolicyRule],
+        provider_models: Optional[Dict[str, Tuple[str, ...]]] = None,
+        observations: Optional[ModelObservations] = None
+    ):
+        self.rules = rules
+        self.provider_models = provider_models if provider_models is not None else dict(PROVIDER_MODELS)
+        self.observations = observations or ModelObservations()
+        self._decisions: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def decide(
+        self,
+        request: RouteRequest,
+        providers: List[str],
+        default_models: Dict[str, Optional[str]],
+        unavailable: Optional[Dict[str, str]] = None,
+        observe: Optional[Callable[[str, str], ModelObservation]] = None
+    ) -> RouteDecision:
+        """
+        Rank candidates for a request
+
+        Args:
+            request: The request
+            providers: Providers to consider, in fallback order (ties keep this order)
+            default_models: Each provider's default chat model
+            unavailable: Providers to exclude, with the reason
+            observe: Observation source (default: this policy's live observations)
+
+        Returns:
+            RouteDecision; without a matching rule it has no candidates
+        """
+        rule = next((rule for rule in self.rules if rule.matches(request)), None)
+        if rule is None:
+            self._count(None)
+            return RouteDecision(request, None, "no rule matched; fallback order with default models")
+
+        observe = observe or self.observations.get
+        unavailable = unavailable or {}
+        completion_tokens = request.max_tokens or DEFAULT_COMPLETION_ESTIMATE
+        candidates: List[CandidateScore] = []
+        excluded: List[Dict[str, str]] = []
+
+        def exclude(provider: str, model: Optional[str], reason: str):
+            excluded.append({'provider': provider, 'model': model, 'reason': reason})
+
+        for provider in providers:
+            if rule.providers and provider not in rule.providers:
+                exclude(provider, None, "provider not allowed by rule")
+                continue
+            if provider in unavailable:
+                exclude(provider, None, unavailable[provider])
+                continue
+            models = list(self.provider_models.get(provider, ()))
+            default_model = default_models.get(provider)
+            if default_model and default_model not in models:
+                models.append(default_model)
+            for model in models:
+                reason = self._constraint_failure(rule, request, model, completion_tokens)
+                if reason:
+                    exclude(provider, model, reason)
+                    continue
+                profile = get_model_profile(model)
+                observation = observe(provider, model)
+                error_rate = observation.error_rate or 0.0
+                if error_rate > rule.max_error_rate:
+                    exclude(provider, model, f"error rate {error_rate:.0%} above {rule.max_error_rate:.0%}")
+                    continue
+                candidates.append(CandidateScore(
+                    provider=provider,
+                    model=model,
+                    estimated_cost_usd=estimate_cost(model, request.prompt_tokens, completion_tokens),
+                    latency_ms=observation.latency_ms or profile.typical_latency_ms,
+                    latency_source='observed' if observation.latency_ms else 'typical',
+                    error_rate=error_rate,
+                    quality=profile.quality
+                ))
+
+        self._score(candidates, rule)
+        candidates.sort(key=lambda candidate: candidate.score)  # Stable: ties keep fallback order
+        self._count(rule.name)
+        if candidates:
+            best = candidates[0]
+            reason = f"rule '{rule.name}' ranked {len(candidates)} candidates; best {best.provider}/{best.model}"
+        else:
+            reason = f"rule '{rule.name}' excluded every candidate; fallback order with default models"
+        return RouteDecision(request, rule.name, reason, candidates, excluded)
+
+    @staticmethod
+    def _constraint_failure(rule: PolicyRule, request: RouteRequest, model: str, completion_tokens: int) -> Optional[str]:
+        """Why a model can't serve a request under a rule, or None"""
+        if not rule.allows_model(model):
+            return "model not allowed by rule"
+        profile = get_model_profile(model)
+        if profile is None:
+            return "no cost profile for model"
+        if rule.min_quality and profile.quality < rule.min_quality:
+            return f"quality tier {profile.quality} below {rule.min_quality}"
+        limits = get_model_limits(model)
+        if limits is not None:
+            if rule.min_context_window and limits.context_window < rule.min_context_window:
+                return f"context window {limits.context_window} below {rule.min_context_window}"
+            # Trimmed history can still fit; the router's token budget decides then
+            needed = request.prompt_tokens + min(completion_tokens, limits.max_output_tokens or completion_tokens)
+            if not request.trim_history and needed > limits.context_window:
+                return f"prompt needs {needed} tokens, context window is {limits.context_window}"
+        elif rule.min_context_window:
+            return "unknown context window"
+        if rule.max_cost_per_call_usd is not None:
+            cost = estimate_cost(model, request.prompt_tokens, completion_tokens)
+            if cost > rule.max_cost_per_call_usd:
+                return f"estimated cost ${cost:.4f} above ${rule.max_cost_per_call_usd:.4f}"
+        return None
+
+    @staticmethod
+    def _score(candidates: List[CandidateScore], rule: PolicyRule):
+        """Weighted sum of normalized cost, latency, error and quality terms"""
+        if not candidates:
+            return
+
+        def log_scaled(values: List[float]) -> List[float]:
+            low, high = min(values), max(values)
+            if low <= 0 or high <= low:
+                return [0.0 if high <= low else (value - low) / (high - low) for value in values]
+            return [math.log(value / low) / math.log(high / low) for value in values]
+
+        costs = log_scaled([candidate.estimated_cost_usd for candidate in candidates])
+        latencies = log_scaled([float(candidate.latency_ms) for candidate in candidates])
+        best_quality = max(candidate.quality for candidate in candidates)
+        worst_quality = min(candidate.quality for candidate in candidates)
+        for candidate, cost, latency in zip(candidates, costs, latencies):
+            candidate.terms = {
+                'cost': cost,
+                'latency': latency,
+                'errors': candidate.error_rate,
+                'quality': (
+                    (best_quality - candidate.quality) / (best_quality - worst_quality)
+                    if best_quality > worst_quality else 0.0
+                )
+            }
+            candidate.score = sum(rule.weights.get(term, 0.0) * value for term, value in candidate.terms.items())
+
+    def record_attempt(self, provider: str, model: Optional[str], success: bool, latency_ms: int):
+        """Feed one provider call's outcome into the observations"""
+        if model:
+            self.observations.record(provider, model, success, latency_ms)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get rules, decisions per rule and observed models for monitoring"""
+        with self._lock:
+            decisions = dict(self._decisions)
+        return {
+            'rules': [rule.name for rule in self.rules],
+            'decisions': decisions,
+            'observed_models': self.observations.get_status()
+        }
+
+    def _count(self, rule_name: Optional[str]):
+        with self._lock:
+            self._decisions[rule_name or 'none'] += 1
+
+
+class TrafficLog:
+    """
+    Append-only JSON-lines log of routed provider calls, one line per
+    attempt, for replaying traffic against candidate policies offline
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        self._bytes = 0
+        self._errors = 0
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+            self._bytes = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Routing traffic log disabled: {e}")
+
+    def write(
+        self,
+        decision: RouteDecision,
+        provider: str,
+        model: Optional[str],
+        success: bool,
+        latency_ms: int,
+        metadata: Dict[str, Any]
+    ):
+        """Append one attempt of a routed request"""
+        if self._file is None:
+            return
+        request = decision.request
+        usage = reported_usage(metadata) or (None, None)
+        line = json.dumps({
+            'timestamp': datetime.now().isoformat(),
+            'request_id': request.request_id,
+            'workload': request.workload,
+            'priority': request.priority,
+            'prompt_tokens': request.prompt_tokens,
+            'max_tokens': request.max_tokens,
+            'trim_history': request.trim_history,
+            'rule': decision.rule,
+            'provider': provider,
+            'model': model,
+            'success': success,
+            'latency_ms': latency_ms,
+            'prompt_tokens_used': usage[0],
+            'completion_tokens_used': usage[1]
+        }) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line)
+                self._file.flush()
+                self._bytes += len(line)
+                if self._bytes > self.max_bytes:
+                    self._file.close()
+                    os.replace(self.path, self.path + ".1")
+                    self._file = open(self.path, "a", encoding="utf-8")
+                    self._bytes = 0
+            except OSError as e:
+                self._errors += 1
+                logger.warning(f"Routing traffic log disabled after write error: {e}")
+                self._file = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get the log path (None once disabled) and write errors"""
+        return {'path': self.path if self._file is not None else None, 'errors': self._errors}
+
+    def close(self):
+        """Close the log file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_traffic_log(path: str) -> List[Dict[str, Any]]:
+    """Logged requests in time order, each with its attempts in order"""
+    requests: Dict[str, Dict[str, Any]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Torn last line of a live log
+            request = requests.setdefault(entry['request_id'], {
+                key: entry.get(key)
+                for key in ('request_id', 'timestamp', 'workload', 'priority', 'prompt_tokens', 'max_tokens',
+                            'trim_history', 'rule')
+            })
+            request.setdefault('attempts', []).append({
+                key: entry.get(key)
+                for key in ('provider', 'model', 'success', 'latency_ms', 'prompt_tokens_used', 'completion_tokens_used')
+            })
+    return sorted(requests.values(), key=lambda request: request['timestamp'] or '')
@@ -0,0 +1,515 @@
+"""
+Shared Stats - Router statistics merged across worker processes
+Each worker publishes a snapshot of its counters and latency histograms into
+its own slot (a shared-memory segment for workers on one host, or Redis keys
+for several hosts); readers merge every live worker's slot on demand
+"""
+import json
+import logging
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .latency_histogram import DEFAULT_WINDOW, WindowedLatencyHistogram
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+    SHARED_MEMORY_AVAILABLE = True
+except ImportError:
+    SHARED_MEMORY_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# Per-provider values in a snapshot. Counters are summed across workers;
+# average_response_time_ms is weighted by successful requests, health_score averaged
+PROVIDER_FIELDS = (
+    'total_requests',
+    'successful_requests',
+    'failed_requests',
+    'average_response_time_ms',
+    'fallbacks',
+    'prompt_tokens',
+    'completion_tokens',
+    'circuit_open',
+    'health_score',
+    'rate_limit_in_flight',
+    'rate_limit_queue_depth',
+    'rate_limit_timed_out',
+    'rate_limit_throttled',
+)
+_AVERAGED_FIELDS = ('average_response_time_ms', 'health_score')
+
+# Latency histograms shared per provider; a snapshot carries one window's buckets
+LATENCY_OPERATIONS = ('chat', 'stream', 'stream_ttft', 'embedding')
+
+# Histogram whose bucket layout every worker uses; also summarizes merged buckets
+_LAYOUT = WindowedLatencyHistogram()
+
+_SEGMENT_MAGIC = 0x5642535441545301   # "VBSTATS" + layout version 1
+_SEGMENT_HEADER = 4                   # int64: magic, slots, max providers, bucket count
+_SLOT_HEADER = 4                      # int64: sequence, pid, heartbeat (ns), reserved
+_NAME_BYTES = 32
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]], window: str = DEFAULT_WINDOW) -> Dict[str, Any]:
+    """
+    Merge worker snapshots into one view of the whole deployment
+
+    Args:
+        snapshots: Snapshots from AsyncAIRouter.get_stats_snapshot()
+        window: Window the snapshots' latency buckets cover
+
+    Returns:
+        Totals, per-provider counters and latency percentiles across workers
+    """
+    providers: Dict[str, Dict[str, Any]] = {}
+    latency: Dict[str, Dict[str, List[Any]]] = {}
+    for snapshot in snapshots:
+        for provider, values in snapshot['providers'].items():
+            merged = providers.setdefault(provider, {
+                **{field: 0 for field in PROVIDER_FIELDS},
+                'health_scores': []
+            })
+            for field in PROVIDER_FIELDS:
+                if field not in _AVERAGED_FIELDS:
+                    merged[field] += values.get(field, 0)
+            merged['average_response_time_ms'] += (
+                values.get('average_response_time_ms', 0) * values.get('successful_requests', 0)
+            )
+            merged['health_scores'].append(values.get('health_score', 0))
+
+        for provider, operations in snapshot.get('latency', {}).items():
+            for operation, histogram in operations.items():
+                # [bucket counts, count, sum_ms, max_ms]
+                merged_histogram = latency.setdefault(provider, {}).setdefault(
+                    operation, [[0] * _LAYOUT.bucket_count, 0, 0, 0]
+                )
+                for index, bucket_count in histogram['buckets']:
+                    merged_histogram[0][index] += bucket_count
+                merged_histogram[1] += histogram['count']
+                merged_histogram[2] += histogram['sum_ms']
+                merged_histogram[3] = max(merged_histogram[3], histogram['max_ms'])
+
+    for provider, merged in providers.items():
+        scores = merged.pop('health_scores')
+        merged['average_response_time_ms'] = int(
+            merged['average_response_time_ms'] / max(merged['successful_requests'], 1)
+        )
+        merged['success_rate'] = merged['successful_requests'] / max(merged['total_requests'], 1) * 100
+        merged['circuit_open_workers'] = merged.pop('circuit_open')
+        merged['health_score'] = round(sum(scores) / len(scores), 3) if scores else None
+        merged['health_score_min'] = round(min(scores), 3) if scores else None
+        merged['latency'] = {
+            operation: _LAYOUT.summarize(*histogram)
+            for operation, histogram in latency.get(provider, {}).items()
+        }
+
+    total_requests = sum(merged['total_requests'] for merged in providers.values())
+    successful_requests = sum(merged['successful_requests'] for merged in providers.values())
+    return {
+        'workers': len(snapshots),
+        'worker_ids': sorted(snapshot['worker'] for snapshot in snapshots),
+        'window': window,
+        'total_requests': total_requests,
+        'successful_requests': successful_requests,
+        'overall_success_rate': successful_requests / max(total_requests, 1) * 100,
+        'providers': providers
+    }
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMemoryStatsBackend:
+    """
+    Worker slots in a named shared-memory segment, for workers on one host.
+
+    Each worker writes only its own slot, bracketed by a sequence counter
+    (odd while a write is in progress), so publishing takes no lock and
+    readers retry the rare slot that changed while they copied it. A lock
+    file serializes only slot claims. Slots of exited workers, and of workers
+    that stopped publishing, are skipped by readers and reclaimed.
+    """
+
+    name = "shm"
+
+    def __init__(
+        self,
+        segment_name: str = "vb_ai_router_stats",
+        slots: int = 32,
+        max_providers: int = 8,
+        stale_seconds: float = 30.0
+    ):
+        """
+        Attach to the segment, creating it if this is the first worker
+
+        Args:
+            segment_name: Shared memory name (/dev/shm/<name> on Linux)
+            slots: Maximum number of publishing workers
+            max_providers: Providers per slot
+            stale_seconds: Slots not published for this long are ignored
+        """
+        if not SHARED_MEMORY_AVAILABLE:
+            raise ImportError("multiprocessing.shared_memory is required for the shared-memory stats backend")
+        self.segment_name = segment_name
+        self.slots = slots
+        self.max_providers = max_providers
+        self.stale_seconds = stale_seconds
+
+        # Slot layout: int64 header, provider names, float64 values, float64 latency
+        self._values_shape = (max_providers, len(PROVIDER_FIELDS))
+        self._latency_shape = (max_providers, len(LATENCY_OPERATIONS), _LAYOUT.bucket_count + 3)
+        self._names_offset = _SLOT_HEADER * 8
+        self._values_offset = self._names_offset + max_providers * _NAME_BYTES
+        self._latency_offset = self._values_offset + int(np.prod(self._values_shape)) * 8
+        self.slot_size = self._latency_offset + int(np.prod(self._latency_shape)) * 8
+        size = _SEGMENT_HEADER * 8 + slots * self.slot_size
+
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{segment_name}.lock")
+        with self._claim_lock():
+            try:
+                self._shm = shared_memory.SharedMemory(name=segment_name, create=True, size=size)
+                created = True
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=segment_name)
+                created = False
+            # The segment outlives any one worker; don't let the resource tracker unlink it at exit
+            try:
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+            except Exception:
+                pass
+
+            header = np.ndarray((_SEGMENT_HEADER,), dtype=np.int64, buffer=self._shm.buf)
+            expected = (_SEGMENT_MAGIC, slots, max_providers, _LAYOUT.bucket_count)
+            if created:
+                header[:] = expected
+            elif self._shm.size < size or tuple(int(value) for value in header) != expected:
+                self._shm.close()
+                raise ValueError(
+                    f"Shared stats segment '{segment_name}' has a different layout; "
+                    f"remove it (/dev/shm/{segment_name}) or use another segment name"
+                )
+            self._slot_index = self._claim_slot()
+
+        self._own = self._slot_views(self._slot_index)
+        self._warned_providers = False
+
+    def publish(self, snapshot: Dict[str, Any]):
+        """Write a snapshot into this worker's slot"""
+        header, names, values, latency = self._own
+        providers = sorted(snapshot['providers'])
+        if len(providers) > self.max_providers:
+            if not self._warned_providers:
+                logger.warning(f"Shared stats slot holds {self.max_providers} providers; ignoring {providers[self.max_providers:]}")
+                self._warned_providers = True
+            providers = providers[:self.max_providers]
+
+        header[0] += 1  # Odd: write in progress
+        names[:] = 0
+        values[:] = 0
+        latency[:] = 0
+        for row, provider in enumerate(providers):
+            encoded = provider.encode()[:_NAME_BYTES]
+            names[row * _NAME_BYTES:row * _NAME_BYTES + len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+            provider_values = snapshot['providers'][provider]
+            values[row] = [provider_values.get(field, 0) for field in PROVIDER_FIELDS]
+            for column, operation in enumerate(LATENCY_OPERATIONS):
+                histogram = snapshot['latency'].get(provider, {}).get(operation)
+                if histogram is None:
+                    continue
+                for index, bucket_count in histogram['buckets']:
+                    latency[row, column, index] = bucket_count
+                latency[row, column, -3:] = (histogram['count'], histogram['sum_ms'], histogram['max_ms'])
+        header[2] = time.time_ns()
+        header[0] += 1  # Even: slot consistent
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Snapshots of every live worker's slot"""
+        snapshots = []
+        now_ns = time.time_ns()
+        for slot_index in range(self.slots):
+            header, names, values, latency = self._slot_views(slot_index)
+            for _ in range(10):
+                sequence = int(header[0])
+                if sequence % 2:
+                    time.sleep(0)
+                    continue
+                pid, heartbeat_ns = int(header[1]), int(header[2])
+                copied = (names.copy(), values.copy(), latency.copy())
+                if int(header[0]) == sequence:
+                    break
+            else:
+                continue  # Writer kept the slot busy; it will be fresh next read
+
+            if not pid or now_ns - heartbeat_ns > self.stale_seconds * 1e9 or not _pid_alive(pid):
+                continue
+            snapshots.append(self._decode(pid, heartbeat_ns, *copied))
+        return snapshots
+
+    def close(self):
+        """Free this worker's slot and detach from the segment"""
+        if self._own is None:
+            return
+        header = self._own[0]
+        header[0] += 1
+        header[1] = 0
+        header[0] += 1
+        self._own = None
+        self._shm.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get segment and slot information"""
+        return {
+            'backend': self.name,
+            'segment': self.segment_name,
+            'slots': self.slots,
+            'slot': self._slot_index,
+            'slot_bytes': self.slot_size
+        }
+
+    def _slot_views(self, slot_index: int):
+        """(header, names, values, latency) arrays over one slot"""
+        offset = _SEGMENT_HEADER * 8 + slot_index * self.slot_size
+        buffer = self._shm.buf
+        return (
+            np.ndarray((_SLOT_HEADER,), dtype=np.int64, buffer=buffer, offset=offset),
+            np.ndarray((self.max_providers * _NAME_BYTES,), dtype=np.uint8, buffer=buffer,
+                       offset=offset + self._names_offset),
+            np.ndarray(self._values_shape, dtype=np.float64, buffer=buffer, offset=offset + self._values_offset),
+            np.ndarray(self._latency_shape, dtype=np.float64, buffer=buffer, offset=offset + self._latency_offset)
+        )
+
+    def _claim_slot(self) -> int:
+        """Take the first free, abandoned or stale slot (claim lock held)"""
+        now_ns = time.time_ns()
+        for slot_index in range(self.slots):
+            header, names, values, latency = self._slot_views(slot_index)
+            pid, heartbeat_ns = int(header[1]), int(header[2])
+            if pid and now_ns - heartbeat_ns <= self.stale_seconds * 1e9 and _pid_alive(pid):
+                continue
+            # A previous owner may have died mid-write, leaving the sequence odd
+            header[0] += 1 if int(header[0]) % 2 == 0 else 0
+            names[:] = 0
+            values[:] = 0
+            latency[:] = 0
+            header[1] = os.getpid()
+            header[2] = now_ns
+            header[0] += 1
+            return slot_index
+        self._shm.close()
+        raise ValueError(f"All {self.slots} shared stats slots are in use; raise the slot count")
+
+    @contextmanager
+    def _claim_lock(self):
+        """Cross-process lock around segment creation and slot claims (a no-op without fcntl)"""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(self._lock_path, "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _decode(self, pid: int, heartbeat_ns: int, names, values, latency) -> Dict[str, Any]:
+        """Rebuild a snapshot from copied slot arrays"""
+        snapshot = {
+            'worker': f"{socket.gethostname()}:{pid}",
+            'updated_at': heartbeat_ns / 1e9,
+            'providers': {},
+            'latency': {}
+        }
+        for row in range(self.max_providers):
+            name = bytes(names[row * _NAME_BYTES:(row + 1) * _NAME_BYTES]).rstrip(b"\0").decode(errors="replace")
+            if not name:
+                continue
+            snapshot['providers'][name] = {
+                field: _number(value) for field, value in zip(PROVIDER_FIELDS, values[row])
+            }
+            operations = {}
+            for column, operation in enumerate(LATENCY_OPERATIONS):
+                counts = latency[row, column, :-3]
+                count, sum_ms, max_ms = latency[row, column, -3:]
+                if count:
+                    operations[operation] = {
+                        'buckets': [[int(index), int(counts[index])] for index in np.flatnonzero(counts)],
+                        'count': int(count),
+                        'sum_ms': int(sum_ms),
+                        'max_ms': int(max_ms)
+                    }
+            snapshot['latency'][name] = operations
+        return snapshot
+
+
+def _number(value: float):
+    """Slot values are float64; give counters back as ints"""
+    return int(value) if float(value).is_integer() else float(value)
+
+
+class RedisStatsBackend:
+    """
+    Worker snapshots as expiring Redis keys, for workers on several hosts.
+    A worker's key expires when it stops publishing, so readers only see
+    live workers.
+    """
+
+    name = "redis"
+
+    def __init__(self, redis_url: str, key_prefix: str = "vb:ai_router_stats:", stale_seconds: float = 30.0):
+        """
+        Initialize the backend
+
+        Args:
+            redis_url: Redis connection URL
+            key_prefix: Namespace for worker keys
+            stale_seconds: Expiry of a worker's key after its last publish
+        """
+        if not REDIS_AVAILABLE:
+            raise ImportError("redis package is required for the Redis stats backend")
+        self.key_prefix = key_prefix
+        self.stale_seconds = stale_seconds
+        self._client = redis.from_url(redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        self._key = f"{key_prefix}{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._errors = 0
+
+    def publish(self, snapshot: Dict[str, Any]):
+        """Store this worker's snapshot with expiry"""
+        try:
+            self._client.set(self._key, json.dumps(snapshot), ex=max(1, math.ceil(self.stale_seconds)))
+        except Exception as e:
+            self._errors += 1
+            logger.warning(f"Shared stats publish failed: {e}")
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Snapshots of every worker with an unexpired key"""
+        try:
+            keys = list(self._client.scan_iter(match=self.key_prefix + "*", count=100))
+            payloads = self._client.mget(keys) if keys else []
+        except Exception as e:
+            self._errors += 1
+            logger.warning(f"Shared stats read failed: {e}")
+            return []
+        return [json.loads(payload) for payload in payloads if payload is not None]
+
+    def close(self):
+        """Remove this worker's key and close the connection pool"""
+        try:
+            self._client.delete(self._key)
+            self._client.close()
+        except Exception:
+            pass
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get backend counters"""
+        return {
+            'backend': self.name,
+            'key_prefix': self.key_prefix,
+            'key': self._key,
+            'errors': self._errors
+        }
+
+
+class SharedStats:
+    """
+    Publishes a router's stats snapshot to a shared backend on a background
+    thread and merges every worker's snapshot on read
+    """
+
+    def __init__(
+        self,
+        backend,
+        snapshot: Callable[[], Dict[str, Any]],
+        publish_interval_seconds: float = 2.0,
+        window: str = DEFAULT_WINDOW
+    ):
+        """
+        Initialize shared stats
+
+        Args:
+            backend: SharedMemoryStatsBackend or RedisStatsBackend
+            snapshot: Returns this worker's current snapshot
+            publish_interval_seconds: Seconds between background publishes
+            window: Latency window carried in snapshots
+        """
+        self.backend = backend
+        self.snapshot = snapshot
+        self.publish_interval_seconds = publish_interval_seconds
+        self.window = window
+        self._publish_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._publishes = 0
+        self._errors = 0
+
+    def start(self):
+        """Start the background publisher thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ai-router-shared-stats", daemon=True)
+            self._thread.start()
+
+    def publish(self):
+        """Publish this worker's snapshot now"""
+        with self._publish_lock:
+            if self._stop.is_set():
+                return
+            try:
+                self.backend.publish(self.snapshot())
+                self._publishes += 1
+            except Exception as e:
+                self._errors += 1
+                logger.warning(f"Shared stats publish failed: {e}")
+
+    def read_merged(self) -> Dict[str, Any]:
+        """Stats merged across every live worker, this one's freshly published"""
+        self.publish()
+        merged = merge_snapshots(self.backend.read(), self.window)
+        merged['backend'] = self.backend.name
+        return merged
+
+    def close(self):
+        """Stop publishing and release this worker's slot"""
+        self._stop.set()
+        with self._publish_lock:
+            self.backend.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get publisher and backend status"""
+        return {
+            **self.backend.get_status(),
+            'publish_interval_seconds': self.publish_interval_seconds,
+            'publishes': self._publishes,
+            'errors': self._errors
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.publish_interval_seconds):
+            self.publish()
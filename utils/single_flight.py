@@ -0,0 +1,114 @@
+"""
+Single Flight - Coalescing of identical in-flight requests
+Concurrent callers with the same request key wait on one upstream call and
+share its result, so a burst of identical questions costs one provider call
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time on an event loop.
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it runs wait on the same task. Every caller, the first included,
+    waits through ``asyncio.shield`` with its own timeout, so one caller
+    giving up (timeout or cancellation) doesn't cancel the call for the
+    others. The task is cancelled only once every waiter has gone. Results
+    and exceptions are delivered to every waiter; nothing is kept after the
+    call completes (that is the response cache's job).
+    """
+
+    def __init__(self):
+        # key -> [task, waiters]
+        self._calls: Dict[str, list] = {}
+        self._stats = {'calls': 0, 'shared': 0, 'timeouts': 0, 'errors': 0, 'abandoned': 0}
+        self._max_waiters = 0
+        self._stats_lock = threading.Lock()
+
+    async def do(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Run ``call`` or join the identical call already in flight
+
+        Args:
+            key: Request key; equal keys must mean interchangeable results
+            call: Coroutine factory making the upstream call
+            timeout: Seconds this caller waits for the result (None: no limit)
+
+        Returns:
+            Tuple of (result, whether it was shared from another caller's call)
+
+        Raises:
+            asyncio.TimeoutError: This caller's timeout expired
+            Exception: Whatever the upstream call raised
+        """
+        entry = self._calls.get(key)
+        shared = entry is not None
+        if entry is None:
+            task = asyncio.ensure_future(call())
+            entry = [task, 0]
+            self._calls[key] = entry
+            task.add_done_callback(lambda _: self._finish(key, entry))
+            self._count('calls')
+        else:
+            self._count('shared')
+
+        task = entry[0]
+        entry[1] += 1
+        with self._stats_lock:
+            self._max_waiters = max(self._max_waiters, entry[1])
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout), shared
+        except asyncio.TimeoutError:
+            # A finished task means the upstream call itself timed out
+            self._count('errors' if task.done() else 'timeouts')
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._count('errors')
+            raise
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                # Nobody is waiting for the answer any more; new callers start afresh
+                if self._calls.get(key) is entry:
+                    del self._calls[key]
+                task.cancel()
+                self._count('abandoned')
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running"""
+        return len(self._calls)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get call, sharing and timeout counters for monitoring"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            max_waiters = self._max_waiters
+        requests = stats['calls'] + stats['shared']
+        return {
+            **stats,
+            'requests': requests,
+            'shared_ratio': (stats['shared'] / requests) if requests else 0.0,
+            'in_flight': self.in_flight(),
+            'max_waiters': max_waiters
+        }
+
+    def _finish(self, key: str, entry: list):
+        """Forget a completed call so the next request starts a fresh one"""
+        if self._calls.get(key) is entry:
+            del self._calls[key]
+        if not entry[0].cancelled():
+            entry[0].exception()  # Mark retrieved; waiters that left can't receive it
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
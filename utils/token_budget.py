@@ -0,0 +1,211 @@
+"""
+Token Budget - Prompt token accounting against model context windows
+Counts prompt tokens per provider before a request is sent and trims chat
+history to fit
+"""
+import fnmatch
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+# A prompt must leave at least this much room for the answer (or max_tokens, if smaller)
+MIN_COMPLETION_TOKENS = 256
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    """Token limits of one chat model"""
+    context_window: int                       # Prompt and completion together
+    max_output_tokens: Optional[int] = None   # Cap on completion tokens, if separate
+    max_input_tokens: Optional[int] = None    # Cap on prompt tokens, if separate
+
+
+# Context windows by model name; entries with wildcards match model families
+# and are tried in order after exact names
+CONTEXT_WINDOWS: Dict[str, ModelLimits] = {
+    'gpt-4': ModelLimits(8192),
+    'gpt-4-32k': ModelLimits(32768),
+    'gpt-4-turbo*': ModelLimits(128000, max_output_tokens=4096),
+    'gpt-4o*': ModelLimits(128000, max_output_tokens=4096),
+    'gpt-3.5-turbo*': ModelLimits(16385, max_output_tokens=4096),
+    'claude-3-sonnet-20240229': ModelLimits(200000, max_output_tokens=4096),
+    'claude-3-opus-20240229': ModelLimits(200000, max_output_tokens=4096),
+    'claude-3-haiku-20240307': ModelLimits(200000, max_output_tokens=4096),
+    'gemini-pro': ModelLimits(32768, max_output_tokens=2048, max_input_tokens=30720),
+    'pplx-7b-chat': ModelLimits(8192),
+    'pplx-*': ModelLimits(4096),
+}
+
+
+def get_model_limits(model: Optional[str]) -> Optional[ModelLimits]:
+    """Limits for a model, or None if unknown (the prompt is then sent unchecked)"""
+    if not model:
+        return None
+    limits = CONTEXT_WINDOWS.get(model)
+    if limits is not None:
+        return limits
+    for pattern, limits in CONTEXT_WINDOWS.items():
+        if '*' in pattern and fnmatch.fnmatchcase(model, pattern):
+            return limits
+    return None
+
+
+def register_model_limits(model: str, limits: ModelLimits):
+    """Add or override a context-window entry (exact name or wildcard pattern)"""
+    CONTEXT_WINDOWS[model] = limits
+
+
+class TokenEstimator:
+    """
+    Character-ratio token estimate for a provider's tokenizer.
+    Ratios are set on the low side for regulatory text (numbers, clause
+    references), so counts err towards too many tokens rather than too few.
+    """
+
+    def __init__(self, chars_per_token: float, tokens_per_message: int = 4, tokens_per_reply: int = 3):
+        """
+        Args:
+            chars_per_token: Average characters per token
+            tokens_per_message: Formatting overhead per chat message (role, separators)
+            tokens_per_reply: Overhead that primes the assistant reply
+        """
+        self.chars_per_token = chars_per_token
+        self.tokens_per_message = tokens_per_message
+        self.tokens_per_reply = tokens_per_reply
+
+    def count_text(self, text: str) -> int:
+        return int(len(text or "") / self.chars_per_token) + 1
+
+    def count_message(self, message: Dict[str, str]) -> int:
+        return self.tokens_per_message + self.count_text(message.get('content', ''))
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        return sum(self.count_message(message) for message in messages) + self.tokens_per_reply
+
+
+class TiktokenEstimator(TokenEstimator):
+    """Exact counts for OpenAI models with tiktoken"""
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        super().__init__(chars_per_token=4.0, tokens_per_message=3, tokens_per_reply=3)
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def count_text(self, text: str) -> int:
+        return len(self.encoding.encode(text or "", disallowed_special=()))
+
+
+# Estimate parameters per provider: (chars_per_token, tokens_per_message)
+PROVIDER_TOKEN_RATIOS = {
+    'openai': (3.5, 3),
+    'anthropic': (3.2, 5),
+    'gemini': (3.5, 4),
+    'perplexity': (3.0, 4),  # Llama-family tokenizer, smaller vocabulary
+}
+DEFAULT_TOKEN_RATIO = (3.0, 4)
+
+_estimators: Dict[str, TokenEstimator] = {}
+
+
+def get_token_estimator(provider: str) -> TokenEstimator:
+    """Token estimator for a provider's prompts (tiktoken for OpenAI when installed)"""
+    estimator = _estimators.get(provider)
+    if estimator is None:
+        if provider == 'openai' and TIKTOKEN_AVAILABLE:
+            estimator = TiktokenEstimator()
+        else:
+            chars_per_token, tokens_per_message = PROVIDER_TOKEN_RATIOS.get(provider, DEFAULT_TOKEN_RATIO)
+            estimator = TokenEstimator(chars_per_token, tokens_per_message)
+        _estimators[provider] = estimator
+    return estimator
+
+
+def reported_usage(metadata: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """(prompt tokens, completion tokens) a provider reported for a call, from any provider's metadata shape"""
+    for prompt_key, completion_key in (('prompt_tokens', 'completion_tokens'), ('input_tokens', 'output_tokens')):
+        if prompt_key in metadata or completion_key in metadata:
+            return metadata.get(prompt_key) or 0, metadata.get(completion_key) or 0
+    usage = metadata.get('usage')
+    if isinstance(usage, dict) and usage:
+        return usage.get('prompt_tokens') or 0, usage.get('completion_tokens') or 0
+    return None
+
+
+@dataclass
+class PromptFit:
+    """A prompt sized for one model"""
+    messages: List[Dict[str, str]]
+    prompt_tokens: int
+    max_tokens: Optional[int]
+    trimmed_messages: int = 0
+
+
+def fit_prompt(
+    messages: List[Dict[str, str]],
+    limits: Optional[ModelLimits],
+    estimator: TokenEstimator,
+    max_tokens: Optional[int] = None,
+    trim_history: bool = False,
+    min_completion_tokens: int = MIN_COMPLETION_TOKENS
+) -> Optional[PromptFit]:
+    """
+    Fit a chat prompt into a model's context window
+
+    With ``trim_history`` the oldest conversation turns are dropped until the
+    prompt leaves room for ``max_tokens``; system messages and the final
+    message are always kept, and the remaining history starts with a user
+    turn. ``max_tokens`` is lowered to the room left in the window.
+
+    Args:
+        messages: Chat messages
+        limits: Model limits (None: unknown model, prompt passes unchanged)
+        estimator: Token estimator for the provider
+        max_tokens: Requested completion tokens
+        trim_history: Whether conversation history may be dropped
+        min_completion_tokens: Room the answer needs at minimum
+
+    Returns:
+        PromptFit, or None if the prompt can't fit the window
+    """
+    counts = [estimator.count_message(message) for message in messages]
+    prompt_tokens = sum(counts) + estimator.tokens_per_reply
+    if limits is None:
+        return PromptFit(list(messages), prompt_tokens, max_tokens)
+
+    needed = min(max_tokens or min_completion_tokens, min_completion_tokens)
+    input_limit = min(limits.context_window - needed, limits.max_input_tokens or limits.context_window)
+    # Trimming aims to leave room for the whole requested answer, not just the minimum
+    wanted = max(min(max_tokens or needed, limits.max_output_tokens or limits.context_window), needed)
+    trim_limit = min(limits.context_window - wanted, input_limit)
+
+    kept = list(range(len(messages)))
+    if prompt_tokens > trim_limit and trim_history:
+        history = [i for i in kept[:-1] if messages[i].get('role') != 'system']
+        dropped = set()
+        while history and (prompt_tokens > trim_limit or messages[history[0]].get('role') != 'user'):
+            index = history.pop(0)
+            dropped.add(index)
+            prompt_tokens -= counts[index]
+        kept = [i for i in kept if i not in dropped]
+
+    if prompt_tokens > input_limit:
+        return None
+
+    room = limits.context_window - prompt_tokens
+    if limits.max_output_tokens:
+        room = min(room, limits.max_output_tokens)
+    if max_tokens is not None:
+        max_tokens = min(max_tokens, room)
+
+    return PromptFit(
+        [messages[i] for i in kept],
+        prompt_tokens,
+        max_tokens,
+        trimmed_messages=len(messages) - len(kept)
+    )
+